@@ -35,6 +35,7 @@ class GRPCAIAgent(AIVillagerAgent):
             merchant_port=merchant_port,
             villager_port=villager_port
         )
+        self._event_subscription = None  # 协调器事件流，唤醒决策循环
         
         # 调用父类初始化，但使用gRPC适配层
         super().__init__(
@@ -74,6 +75,14 @@ class GRPCAIAgent(AIVillagerAgent):
         self._original_confirm_trade_request = super().confirm_trade_request
         self._original_cancel_trade_request = super().cancel_trade_request
     
+    def _start_event_watchers(self):
+        """订阅协调器事件流唤醒决策循环（gRPC节点没有 /events；交易和私信变化靠max-idle兜底）"""
+        if self._event_subscription is None:
+            self._event_subscription = self.grpc_adapter.subscribe_events(
+                lambda event: self._on_event({'type': event.type, 'seq': event.seq, 'source': 'coordinator'}),
+                types=('time_advance', 'broadcast')
+            )
+    
     def check_connection(self) -> bool:
         """检查连接"""
         return self.grpc_adapter.check_villager_connection()
@@ -119,8 +128,8 @@ class GRPCAIAgent(AIVillagerAgent):
         return self.grpc_adapter.create_villager(name, occupation, gender, personality)
     
     def submit_action(self, action: str, **kwargs) -> bool:
-        """提交行动（gRPC版本直接执行）"""
-        return self.execute_action(action, **kwargs)
+        """提交行动（执行后向协调器的同步屏障提交）"""
+        return self.grpc_adapter.submit_action(action, **kwargs)
     
     def buy_from_merchant(self, item: str, quantity: int) -> bool:
         """从商人购买"""
@@ -173,6 +182,9 @@ class GRPCAIAgent(AIVillagerAgent):
     def stop(self):
         """停止AI Agent"""
         self.stop_auto_decision_loop()
+        if self._event_subscription is not None:
+            self._event_subscription.stop()
+            self._event_subscription = None
         print("[gRPC AI Agent] 已停止")
 
 
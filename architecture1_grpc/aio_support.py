@@ -0,0 +1,32 @@
+"""
+grpc.aio Support
+*_async.py 服务器共用：把同步服务对象注册到grpc.aio服务器上。
+"""
+
+import functools
+import inspect
+
+
+def _inline(method):
+    """同步RPC方法包装成协程，在事件循环中直接执行（这些方法只读写本地状态，不阻塞）"""
+    @functools.wraps(method)
+    async def handler(request, context):
+        return method(request, context)
+    return handler
+
+
+def aio_servicer(service, servicer_class):
+    """返回可以注册到grpc.aio服务器的servicer
+
+    service中用async def重写的RPC（有出站调用的）直接使用，其余同步RPC包装成协程。
+    service本身不变，内部互相调用（如handle_event -> OnTimeAdvance）仍是同步的。
+    """
+    adapter = servicer_class()
+    for name, _ in inspect.getmembers(servicer_class, inspect.isfunction):
+        if name.startswith('_'):
+            continue
+        method = getattr(service, name)
+        if not (inspect.iscoroutinefunction(method) or inspect.isasyncgenfunction(method)):
+            method = _inline(method)
+        setattr(adapter, name, method)
+    return adapter
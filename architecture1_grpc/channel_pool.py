@@ -0,0 +1,194 @@
+"""
+gRPC Channel Pool
+进程内共享的gRPC channel缓存（按地址），所有gRPC组件通过这里获取channel和stub，
+而不是每次调用都 grpc.insecure_channel() + close()，这样HTTP/2连接可以复用。
+
+- keepalive: 空闲连接定期ping，对端消失时能及时发现
+- 健康检查: channel进入TRANSIENT_FAILURE或SHUTDOWN后被淘汰，下次get()重新连接
+  （不等待gRPC内部的重连退避，对端重启后立即可用）
+- 调用方遇到UNAVAILABLE时可以调用evict(address)主动淘汰
+
+grpc.aio服务器（*_async.py）使用get_aio_stub()，channel绑定在事件循环上。
+"""
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+
+import grpc
+
+MAX_CHANNELS = 256  # 最多缓存的地址数，超出时关闭最久未使用的channel
+
+CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30000),           # 空闲30秒发送一次ping
+    ('grpc.keepalive_timeout_ms', 5000),         # ping 5秒无响应视为断开
+    ('grpc.keepalive_permit_without_calls', 1),  # 没有进行中的RPC也发送ping
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.initial_reconnect_backoff_ms', 200),
+    ('grpc.max_reconnect_backoff_ms', 2000),
+]
+
+# 设置 GRPC_CHANNEL_POOLING=0 时每次调用都新建channel（用于对比测试）
+POOLING_ENABLED = os.getenv('GRPC_CHANNEL_POOLING', '1') != '0'
+
+_UNHEALTHY = (grpc.ChannelConnectivity.TRANSIENT_FAILURE, grpc.ChannelConnectivity.SHUTDOWN)
+
+
+class _PooledChannel:
+    """缓存中的一个channel及其连接状态和stub"""
+
+    __slots__ = ('channel', 'state', 'stubs')
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.state = grpc.ChannelConnectivity.IDLE
+        self.stubs = {}
+
+
+class ChannelPool:
+    """按地址缓存的gRPC channel（线程安全）"""
+
+    def __init__(self, options=None, max_channels=MAX_CHANNELS):
+        self.options = CHANNEL_OPTIONS if options is None else options
+        self.max_channels = max_channels
+        self._entries = OrderedDict()  # address -> _PooledChannel
+        self._lock = threading.Lock()
+
+    def _open(self, address):
+        entry = _PooledChannel(grpc.insecure_channel(address, options=self.options))
+
+        def on_state(state):
+            # 在gRPC线程中调用，只记录状态
+            entry.state = state
+
+        entry.channel.subscribe(on_state)
+        return entry
+
+    def _entry(self, address):
+        entry = self._entries.get(address)
+        if entry is not None and entry.state not in _UNHEALTHY:
+            return entry
+
+        stale = []
+        with self._lock:
+            entry = self._entries.get(address)
+            if entry is None or entry.state in _UNHEALTHY:
+                if entry is not None:
+                    stale.append(entry)
+                entry = self._open(address)
+                self._entries[address] = entry
+                while len(self._entries) > self.max_channels:
+                    stale.append(self._entries.popitem(last=False)[1])
+            self._entries.move_to_end(address)
+
+        for old in stale:
+            old.channel.close()
+        return entry
+
+    def get(self, address):
+        """获取到address的共享channel（不要close）"""
+        return self._entry(address).channel
+
+    def stub(self, address, stub_class):
+        """获取到address的共享stub，如 stub(addr, town_pb2_grpc.VillagerNodeStub)"""
+        entry = self._entry(address)
+        stub = entry.stubs.get(stub_class)
+        if stub is None:
+            stub = entry.stubs[stub_class] = stub_class(entry.channel)
+        return stub
+
+    def evict(self, address):
+        """淘汰address的channel（对端不可用时），下次get()重新连接"""
+        with self._lock:
+            entry = self._entries.pop(address, None)
+        if entry is not None:
+            entry.channel.close()
+
+    def states(self):
+        """各地址当前的连接状态（调试用）"""
+        return {address: entry.state.name for address, entry in list(self._entries.items())}
+
+    def close(self):
+        """关闭所有channel"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.channel.close()
+
+
+class AioChannelPool:
+    """grpc.aio版本的channel缓存（只在事件循环线程中使用，不需要锁）"""
+
+    def __init__(self, options=None, max_channels=MAX_CHANNELS):
+        self.options = CHANNEL_OPTIONS if options is None else options
+        self.max_channels = max_channels
+        self._entries = OrderedDict()  # address -> (channel, {stub类: stub})
+
+    def stub(self, address, stub_class):
+        """获取到address的共享stub（channel不健康时替换）"""
+        entry = self._entries.get(address)
+        if entry is not None and entry[0].get_state() in _UNHEALTHY:
+            self._retire(address)
+            entry = None
+        if entry is None:
+            entry = self._entries[address] = (grpc.aio.insecure_channel(address, options=self.options), {})
+            while len(self._entries) > self.max_channels:
+                self._retire(next(iter(self._entries)))
+        self._entries.move_to_end(address)
+
+        stubs = entry[1]
+        stub = stubs.get(stub_class)
+        if stub is None:
+            stub = stubs[stub_class] = stub_class(entry[0])
+        return stub
+
+    def _retire(self, address):
+        channel = self._entries.pop(address)[0]
+        asyncio.ensure_future(channel.close())
+
+    async def close(self):
+        """关闭所有channel"""
+        entries = list(self._entries.values())
+        self._entries.clear()
+        for channel, _ in entries:
+            await channel.close()
+
+
+_pool = ChannelPool()
+_aio_pool = AioChannelPool()
+
+
+def get_channel(address):
+    """到address的channel：共享的缓存channel，或在禁用池化时新建一个"""
+    if not POOLING_ENABLED:
+        return grpc.insecure_channel(address, options=_pool.options)
+    return _pool.get(address)
+
+
+def get_stub(address, stub_class):
+    """到address的stub（基于get_channel）"""
+    if not POOLING_ENABLED:
+        return stub_class(get_channel(address))
+    return _pool.stub(address, stub_class)
+
+
+def get_aio_stub(address, stub_class):
+    """到address的grpc.aio stub（始终共享channel，GRPC_CHANNEL_POOLING不影响）"""
+    return _aio_pool.stub(address, stub_class)
+
+
+def evict(address):
+    """淘汰address的共享channel"""
+    _pool.evict(address)
+
+
+def close_all():
+    """关闭所有共享channel（进程退出时）"""
+    _pool.close()
+
+
+async def close_all_aio():
+    """关闭所有grpc.aio channel（事件循环结束前）"""
+    await _aio_pool.close()
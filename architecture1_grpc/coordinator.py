@@ -5,6 +5,8 @@ TimeCoordinator - Architecture 1 (gRPC)
 
 import grpc
 from concurrent import futures
+from collections import deque
+import threading
 import time
 import sys
 import os
@@ -14,10 +16,93 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 import town_pb2
 import town_pb2_grpc
+import channel_pool
 
 # 添加common模块路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from common.models import GameState, TimeOfDay
+from common.barrier import ActionBarrier
+
+UNARY_WORKERS = 10       # 处理普通RPC的线程数
+MAX_SUBSCRIBERS = 100    # 同时打开的Subscribe流上限（每个流占用一个线程）
+STREAM_HEARTBEAT = 15.0  # 秒，空闲流检查客户端是否已断开的间隔
+
+
+class EventHub:
+    """最近事件的有序环形缓冲，Subscribe流在上面等待
+    
+    所有流共享一个Condition，发布一次事件唤醒全部订阅者。
+    """
+    
+    def __init__(self, capacity=1024, max_subscribers=MAX_SUBSCRIBERS):
+        self.events = deque(maxlen=capacity)
+        self.seq = 0
+        self.subscribers = 0
+        self.max_subscribers = max_subscribers
+        self.streaming_nodes = {}  # node_id -> 活跃流数量
+        self._cond = threading.Condition()
+    
+    def publish(self, event_type, **payload):
+        """追加事件并唤醒所有订阅者"""
+        with self._cond:
+            self.seq += 1
+            self.events.append(town_pb2.Event(seq=self.seq, type=event_type, timestamp=time.time(), **payload))
+            self._cond.notify_all()
+    
+    def after(self, since, types=None):
+        """序号大于since的事件、是否错过了事件、当前序号
+        
+        ring中更早的事件已被丢弃，或since比当前序号还大（Coordinator重启过）时missed为True。
+        """
+        with self._cond:
+            if since > self.seq:
+                return [], True, self.seq
+            # 序号连续，最新的 (seq - since) 个事件就是结果
+            count = min(self.seq - since, len(self.events))
+            missed = count < self.seq - since
+            size = len(self.events)
+            events = [self.events[i] for i in range(size - count, size)]
+            seq = self.seq
+        if types:
+            events = [e for e in events if e.type in types]
+        return events, missed, seq
+    
+    def wait(self, since, timeout):
+        """等待序号超过since（或被wake唤醒/超时）"""
+        with self._cond:
+            if self.seq == since:
+                self._cond.wait(timeout)
+    
+    def wake(self):
+        """唤醒所有等待的流（客户端断开时让它们检查状态）"""
+        with self._cond:
+            self._cond.notify_all()
+    
+    def open_stream(self, node_id):
+        """登记一个流；超过max_subscribers时返回False"""
+        with self._cond:
+            if self.subscribers >= self.max_subscribers:
+                return False
+            self.subscribers += 1
+            if node_id:
+                self.streaming_nodes[node_id] = self.streaming_nodes.get(node_id, 0) + 1
+            return True
+    
+    def close_stream(self, node_id):
+        with self._cond:
+            self.subscribers -= 1
+            if node_id and node_id in self.streaming_nodes:
+                self.streaming_nodes[node_id] -= 1
+    
+    def is_streaming(self, node_id):
+        """节点是否订阅过事件流（断开后会从since重连，由ring补发，不需要再逐个调用通知）"""
+        return node_id in self.streaming_nodes
+    
+    def forget(self, node_id):
+        """节点重新注册（可能已重启），在它重新订阅前改回逐个调用通知"""
+        with self._cond:
+            if not self.streaming_nodes.get(node_id):
+                self.streaming_nodes.pop(node_id, None)
 
 
 class TimeCoordinatorService(town_pb2_grpc.TimeCoordinatorServicer):
@@ -26,6 +111,9 @@ class TimeCoordinatorService(town_pb2_grpc.TimeCoordinatorServicer):
     def __init__(self):
         self.game_state = GameState()
         self.registered_nodes = {}  # {node_id: NodeInfo}
+        self.hub = EventHub()
+        self.barrier = ActionBarrier()  # 本时段各Villager提交的行动
+        self.broadcast_counter = 0
         print(f"[Coordinator] Initialization complete - Day {self.game_state.day}, {self.game_state.time_of_day.value}")
     
     def RegisterNode(self, request, context):
@@ -37,6 +125,17 @@ class TimeCoordinatorService(town_pb2_grpc.TimeCoordinatorServicer):
             'address': request.address
         }
         print(f"[Coordinator] Node注册: {node_id} ({request.node_type}) @ {request.address}")
+        if request.node_type == 'villager':
+            self.barrier.join(node_id)
+        else:
+            # 以其他类型重新注册的Node不再参与本时段的等待
+            self.barrier.leave(node_id)
+        self.hub.forget(node_id)
+        self.hub.publish('node_registered', node=town_pb2.NodeInfo(
+            node_id=node_id,
+            node_type=request.node_type,
+            address=request.address
+        ))
         return town_pb2.Status(
             success=True,
             message=f"Node {node_id} registered successfully"
@@ -50,19 +149,42 @@ class TimeCoordinatorService(town_pb2_grpc.TimeCoordinatorServicer):
         )
     
     def AdvanceTime(self, request, context):
-        """AdvanceTime"""
-        old_time = f"Day {self.game_state.day} {self.game_state.time_of_day.value}"
+        """手动AdvanceTime（丢弃本时段已提交的行动）"""
+        new_time = self._advance_and_notify(self.barrier.reset())
         
-        # 如果是Evening到Morning的转换，需要重置所有Node
-        is_new_day = self.game_state.time_of_day == TimeOfDay.EVENING
+        return town_pb2.Status(
+            success=True,
+            message=f"Time advanced to {new_time}"
+        )
+    
+    def _advance_and_notify(self, actions):
+        """推进Time并逐个通知没有订阅事件流的Node，返回新Time描述"""
+        notification, new_time = self._advance_clock(actions)
+        
+        for node_id, stub_class, address in self._notify_targets():
+            try:
+                # 通过共享channel Notify Node
+                channel_pool.get_stub(address, stub_class).OnTimeAdvance(notification)
+                print(f"[Coordinator] NotifyNode: {node_id}")
+            except Exception as e:
+                print(f"[Coordinator] NotifyNode {node_id} Failed: {e}")
+        
+        return new_time
+    
+    def _advance_clock(self, actions):
+        """推进Time并发布time_advance事件，返回 (TimeAdvanceNotification, 新Time描述)
+        
+        actions: 刚关闭的时段中各Villager提交的行动（只用于日志）
+        """
+        old_time = f"Day {self.game_state.day} {self.game_state.time_of_day.value}"
         
         # AdvanceTime
         self.game_state.advance_time()
         
         new_time = f"Day {self.game_state.day} {self.game_state.time_of_day.value}"
         print(f"\n[Coordinator] TimeAdvance: {old_time} -> {new_time}")
+        print(f"[Coordinator] 行动记录: {actions}")
         
-        # Notify所有注册的Node
         notification = town_pb2.TimeAdvanceNotification(
             new_time=town_pb2.GameTime(
                 day=self.game_state.day,
@@ -70,29 +192,70 @@ class TimeCoordinatorService(town_pb2_grpc.TimeCoordinatorServicer):
             )
         )
         
-        for node_id, node_info in self.registered_nodes.items():
-            try:
-                if node_info['node_type'] == 'coordinator':
-                    continue
-                
-                # Connecting toNode并Notify
-                channel = grpc.insecure_channel(node_info['address'])
-                
-                if node_info['node_type'] == 'merchant':
-                    stub = town_pb2_grpc.MerchantNodeStub(channel)
-                    stub.OnTimeAdvance(notification)
-                elif node_info['node_type'] == 'villager':
-                    stub = town_pb2_grpc.VillagerNodeStub(channel)
-                    stub.OnTimeAdvance(notification)
-                
-                channel.close()
-                print(f"[Coordinator] NotifyNode: {node_id}")
-            except Exception as e:
-                print(f"[Coordinator] NotifyNode {node_id} Failed: {e}")
-        
-        return town_pb2.Status(
+        # 订阅者通过事件流收到
+        self.hub.publish('time_advance', time=notification.new_time)
+        return notification, new_time
+    
+    def _notify_targets(self):
+        """需要逐个调用OnTimeAdvance的Node（没有订阅事件流的），返回 [(node_id, stub类, 地址)]"""
+        stub_classes = {
+            'merchant': town_pb2_grpc.MerchantNodeStub,
+            'villager': town_pb2_grpc.VillagerNodeStub
+        }
+        return [
+            (node_id, stub_classes[node_info['node_type']], node_info['address'])
+            for node_id, node_info in list(self.registered_nodes.items())
+            if node_info['node_type'] in stub_classes and not self.hub.is_streaming(node_id)
+        ]
+    
+    def SubmitAction(self, request, context):
+        """Villager提交本时段行动（同步屏障），最后一个Villager提交时自动AdvanceTime"""
+        closed, waiting_for = self._record_action(request)
+        if closed is not None:
+            self._advance_and_notify(closed)
+        return self._submit_reply(closed is not None, waiting_for)
+    
+    def _record_action(self, request):
+        """记录提交的行动，返回 (本次提交关闭的时段的行动或None, 还未提交的Villager)"""
+        closed, waiting_for = self.barrier.submit(request.node_id, request.action)
+        print(f"\n[Coordinator] {request.node_id} 提交行动: {request.action}")
+        if closed is not None:
+            print("[Coordinator] 所有Villager都已提交行动，AdvanceTime")
+        else:
+            submitted, total = self.barrier.counts()
+            print(f"[Coordinator] 已提交: {submitted}/{total}，Waiting: {waiting_for}")
+        return closed, waiting_for
+    
+    def _submit_reply(self, all_ready, waiting_for):
+        """SubmitAction的回复（all_ready时Time已推进）"""
+        if all_ready:
+            return town_pb2.SubmitActionResponse(
+                success=True,
+                message="Action submitted, time advanced",
+                all_ready=True,
+                new_time=self.GetCurrentTime(None, None)
+            )
+        submitted, total = self.barrier.counts()
+        return town_pb2.SubmitActionResponse(
             success=True,
-            message=f"Time advanced to {new_time}"
+            message=f"Action submitted, waiting for others ({submitted}/{total})",
+            all_ready=False,
+            waiting_for=waiting_for
+        )
+    
+    def GetActionStatus(self, request, context):
+        """本时段行动提交状态"""
+        period = self.barrier.snapshot()
+        actions = period['actions']
+        submitted = [town_pb2.NodeAction(node_id=node_id, action=actions[node_id])
+                     for node_id in period['members'] if node_id in actions]
+        return town_pb2.ActionStatus(
+            total_villagers=len(period['members']),
+            submitted=len(submitted),
+            submitted_nodes=submitted,
+            waiting_for=period['waiting'],
+            ready_to_advance=period['ready'],
+            period=period['period']
         )
     
     def ListNodes(self, request, context):
@@ -105,11 +268,90 @@ class TimeCoordinatorService(town_pb2_grpc.TimeCoordinatorServicer):
                 address=node_info['address']
             ))
         return town_pb2.NodeList(nodes=nodes)
-
+    
+    def Subscribe(self, request, context):
+        """事件流：先补发since之后的事件，然后推送新事件，直到客户端断开"""
+        node_id, since, types = self._open_subscription(request)
+        if since is None:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f"Too many subscribers (max {self.hub.max_subscribers})")
+        
+        context.add_callback(self.hub.wake)
+        try:
+            while context.is_active():
+                events, missed, seq = self.hub.after(since, types)
+                if missed:
+                    yield town_pb2.Event(seq=seq, type='missed', timestamp=time.time())
+                for event in events:
+                    yield event
+                since = seq
+                self.hub.wait(since, STREAM_HEARTBEAT)
+        finally:
+            self.hub.close_stream(node_id)
+    
+    def _open_subscription(self, request):
+        """登记Subscribe流，返回 (node_id, since, types)；订阅者已满时since为None"""
+        node_id = request.node_id
+        since = request.since if request.HasField('since') else self.hub.seq
+        if not self.hub.open_stream(node_id):
+            return node_id, None, None
+        if node_id:
+            print(f"[Coordinator] Node订阅事件流: {node_id} (since {since})")
+        return node_id, since, set(request.types)
+    
+    def Broadcast(self, request, context):
+        """广播Message给所有Villager"""
+        sender, receive_request, villagers = self._publish_broadcast(request)
+        
+        # 没有订阅事件流的Villager逐个调用ReceiveMessage
+        failed = []
+        for node in villagers:
+            if self.hub.is_streaming(node['node_id']):
+                continue
+            try:
+                stub = channel_pool.get_stub(node['address'], town_pb2_grpc.VillagerNodeStub)
+                stub.ReceiveMessage(receive_request, timeout=3)
+            except Exception as e:
+                print(f"[Coordinator] Broadcast到 {node['node_id']} Failed: {e}")
+                failed.append(node['node_id'])
+        
+        return self._broadcast_reply(sender, villagers, failed)
+    
+    def _publish_broadcast(self, request):
+        """发布broadcast事件，返回 (发送者, 给未订阅Villager的ReceiveMessageRequest, 目标Villager列表)"""
+        self.broadcast_counter += 1
+        sender = getattr(request, 'from')
+        message = town_pb2.Message(
+            message_id=f"broadcast_{self.broadcast_counter}",
+            to='all',
+            content=request.content,
+            type='broadcast',
+            timestamp=request.timestamp or int(time.time())
+        )
+        setattr(message, 'from', sender)
+        self.hub.publish('broadcast', message=message)
+        
+        receive_request = town_pb2.ReceiveMessageRequest(
+            content=message.content,
+            type='broadcast',
+            timestamp=message.timestamp
+        )
+        setattr(receive_request, 'from', sender)
+        
+        villagers = [node for node in list(self.registered_nodes.values())
+                     if node['node_type'] == 'villager' and node['node_id'] != sender]
+        return sender, receive_request, villagers
+    
+    def _broadcast_reply(self, sender, villagers, failed):
+        print(f"[Coordinator] BroadcastMessage from {sender}: {len(villagers) - len(failed)}/{len(villagers)} 个Villager")
+        return town_pb2.Status(
+            success=not failed,
+            message=f"Broadcast to {len(villagers) - len(failed)}/{len(villagers)} villagers"
+        )
 
 def serve(port=50051):
     """启动Coordinator服务器"""
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    # 每个Subscribe流占用一个线程，另留UNARY_WORKERS个线程处理普通RPC
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=UNARY_WORKERS + MAX_SUBSCRIBERS))
     town_pb2_grpc.add_TimeCoordinatorServicer_to_server(
         TimeCoordinatorService(), server
     )
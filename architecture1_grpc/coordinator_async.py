@@ -0,0 +1,152 @@
+"""
+TimeCoordinator (grpc.aio) - Architecture 1 (gRPC)
+与coordinator.py相同的服务和状态，运行在grpc.aio上：
+AdvanceTime和Broadcast并发通知各Node，Subscribe流只是挂起的协程而不占用线程，
+一个进程可以保持数千个订阅和进行中的RPC。
+"""
+
+import asyncio
+import os
+import sys
+
+import grpc
+
+sys.path.insert(0, os.path.dirname(__file__))
+import town_pb2
+import town_pb2_grpc
+import channel_pool
+import coordinator as core
+from aio_support import aio_servicer
+
+MAX_SUBSCRIBERS = 10000  # 同时打开的Subscribe流上限
+NOTIFY_TIMEOUT = 2.0     # 秒，单个Node通知的deadline
+
+
+class AsyncEventHub(core.EventHub):
+    """EventHub的asyncio版本：所有等待的流共享一个future，发布一次全部唤醒"""
+
+    def __init__(self, capacity=1024, max_subscribers=MAX_SUBSCRIBERS):
+        super().__init__(capacity, max_subscribers)
+        self._next = None
+
+    def publish(self, event_type, **payload):
+        super().publish(event_type, **payload)
+        if self._next is not None and not self._next.done():
+            self._next.set_result(None)
+
+    async def wait_async(self, since, timeout):
+        """等待序号超过since（或超时）"""
+        if self.seq != since:
+            return
+        if self._next is None or self._next.done():
+            self._next = asyncio.get_running_loop().create_future()
+        await asyncio.wait({self._next}, timeout=timeout)
+
+
+class AsyncTimeCoordinatorService(core.TimeCoordinatorService):
+    """有出站调用的RPC用async重写，其余复用TimeCoordinatorService"""
+
+    def __init__(self):
+        super().__init__()
+        self.hub = AsyncEventHub()
+
+    async def AdvanceTime(self, request, context):
+        """手动AdvanceTime（丢弃本时段已提交的行动）"""
+        new_time = await self._advance_and_notify_async(self.barrier.reset())
+        return town_pb2.Status(
+            success=True,
+            message=f"Time advanced to {new_time}"
+        )
+
+    async def SubmitAction(self, request, context):
+        """Villager提交本时段行动，最后一个Villager提交时自动AdvanceTime"""
+        closed, waiting_for = self._record_action(request)
+        if closed is not None:
+            await self._advance_and_notify_async(closed)
+        return self._submit_reply(closed is not None, waiting_for)
+
+    async def _advance_and_notify_async(self, actions):
+        """推进Time并并发通知没有订阅事件流的Node，返回新Time描述"""
+        notification, new_time = self._advance_clock(actions)
+
+        targets = self._notify_targets()
+        results = await asyncio.gather(
+            *(channel_pool.get_aio_stub(address, stub_class).OnTimeAdvance(notification, timeout=NOTIFY_TIMEOUT)
+              for _, stub_class, address in targets),
+            return_exceptions=True
+        )
+        for (node_id, _, _), result in zip(targets, results):
+            if isinstance(result, Exception):
+                print(f"[Coordinator] NotifyNode {node_id} Failed: {result}")
+        if targets:
+            print(f"[Coordinator] NotifyNode: {len(targets)} 个")
+        return new_time
+
+    async def Subscribe(self, request, context):
+        """事件流：先补发since之后的事件，然后推送新事件，直到客户端断开（取消）"""
+        node_id, since, types = self._open_subscription(request)
+        if since is None:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f"Too many subscribers (max {self.hub.max_subscribers})")
+
+        try:
+            while True:
+                events, missed, seq = self.hub.after(since, types)
+                if missed:
+                    yield town_pb2.Event(seq=seq, type='missed')
+                for event in events:
+                    yield event
+                since = seq
+                await self.hub.wait_async(since, core.STREAM_HEARTBEAT)
+        finally:
+            self.hub.close_stream(node_id)
+
+    async def Broadcast(self, request, context):
+        """广播Message给所有Villager，并发调用没有订阅事件流的Villager"""
+        sender, receive_request, villagers = self._publish_broadcast(request)
+
+        targets = [node for node in villagers if not self.hub.is_streaming(node['node_id'])]
+        results = await asyncio.gather(
+            *(channel_pool.get_aio_stub(node['address'], town_pb2_grpc.VillagerNodeStub)
+              .ReceiveMessage(receive_request, timeout=NOTIFY_TIMEOUT) for node in targets),
+            return_exceptions=True
+        )
+        failed = []
+        for node, result in zip(targets, results):
+            if isinstance(result, Exception):
+                print(f"[Coordinator] Broadcast到 {node['node_id']} Failed: {result}")
+                failed.append(node['node_id'])
+
+        return self._broadcast_reply(sender, villagers, failed)
+
+
+async def serve(port=50051):
+    """启动Coordinator服务器（运行直到被取消）"""
+    service = AsyncTimeCoordinatorService()
+    server = grpc.aio.server()
+    town_pb2_grpc.add_TimeCoordinatorServicer_to_server(
+        aio_servicer(service, town_pb2_grpc.TimeCoordinatorServicer), server
+    )
+    server.add_insecure_port(f'[::]:{port}')
+    await server.start()
+
+    print(f"[Coordinator] TimeCoordinatorstarting on port {port} (grpc.aio)")
+    print("[Coordinator] WaitingNode注册...")
+    print("[Coordinator] 使用 Ctrl+C 停止服务器")
+
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(0)
+        await channel_pool.close_all_aio()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='TimeCoordinator服务 (grpc.aio)')
+    parser.add_argument('--port', type=int, default=50051, help='监听端口')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.port))
+    except KeyboardInterrupt:
+        print("\n[Coordinator] 关闭服务器...")
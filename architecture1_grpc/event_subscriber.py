@@ -0,0 +1,74 @@
+"""
+EventSubscriber - Architecture 1 (gRPC)
+在后台线程中保持一个到Coordinator的Subscribe事件流。
+断开后从最后收到的序号重连，期间的事件由Coordinator补发；
+补发不了时（Coordinator重启或ring已覆盖）收到一个 'missed' 事件，由回调重新同步。
+"""
+
+import threading
+
+import grpc
+
+import town_pb2
+import town_pb2_grpc
+import channel_pool
+
+RECONNECT_DELAY = 0.5      # 秒，首次重连等待
+MAX_RECONNECT_DELAY = 5.0  # 秒，重连等待上限
+
+
+class EventSubscriber:
+    """订阅Coordinator事件，对每个事件调用on_event(event)"""
+
+    def __init__(self, coordinator_addr, on_event, node_id='', types=()):
+        self.coordinator_addr = coordinator_addr
+        self.on_event = on_event
+        self.node_id = node_id
+        self.types = list(types)
+        self.since = None  # 最后收到的事件序号
+        self._stop = threading.Event()
+        self._call = None
+        self._thread = None
+
+    def start(self):
+        """在后台线程中开始订阅"""
+        self._thread = threading.Thread(target=self._run, name='event-subscriber', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止订阅并关闭流"""
+        self._stop.set()
+        if self._call is not None:
+            self._call.cancel()
+
+    def _request(self):
+        request = town_pb2.SubscribeRequest(node_id=self.node_id, types=self.types)
+        if self.since is not None:
+            request.since = self.since
+        return request
+
+    def _run(self):
+        delay = RECONNECT_DELAY
+        while not self._stop.is_set():
+            try:
+                stub = channel_pool.get_stub(self.coordinator_addr, town_pb2_grpc.TimeCoordinatorStub)
+                self._call = stub.Subscribe(self._request())
+                for event in self._call:
+                    delay = RECONNECT_DELAY
+                    self.since = event.seq
+                    self._dispatch(event)
+            except grpc.RpcError as e:
+                if self._stop.is_set():
+                    break
+                print(f"[EventSubscriber] 事件流断开 ({e.code().name})，{delay:.1f}秒后重连")
+
+            self._stop.wait(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _dispatch(self, event):
+        try:
+            self.on_event(event)
+        except Exception as e:
+            # 回调出错不应中断事件流
+            print(f"[EventSubscriber] Handle事件 {event.type} Failed: {e}")
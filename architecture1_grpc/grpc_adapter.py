@@ -4,6 +4,7 @@ gRPC适配层 - 将gRPC调用包装成类似REST API的接口
 """
 
 import grpc
+from google.protobuf.field_mask_pb2 import FieldMask
 import sys
 import os
 import json
@@ -13,6 +14,11 @@ from typing import Dict, List, Optional, Any
 sys.path.insert(0, os.path.dirname(__file__))
 import town_pb2
 import town_pb2_grpc
+import channel_pool
+from event_subscriber import EventSubscriber
+
+# 结束本时段的行动 -> 向协调器同步屏障提交的行动名（与REST村民节点一致）
+BARRIER_ACTIONS = {'produce': 'work', 'sleep': 'sleep', 'idle': 'idle'}
 
 
 class GRPCAdapter:
@@ -22,17 +28,18 @@ class GRPCAdapter:
         self.villager_address = f"localhost:{villager_port}"
         self.coordinator_address = f"localhost:{coordinator_port}"
         self.merchant_address = f"localhost:{merchant_port}"
+        self._node_id = None  # 本村民节点注册的ID，第一次提交行动时从协调器查询
     
     def _get_villager_stub(self):
-        channel = grpc.insecure_channel(self.villager_address)
+        channel = channel_pool.get_channel(self.villager_address)
         return channel, town_pb2_grpc.VillagerNodeStub(channel)
     
     def _get_coordinator_stub(self):
-        channel = grpc.insecure_channel(self.coordinator_address)
+        channel = channel_pool.get_channel(self.coordinator_address)
         return channel, town_pb2_grpc.TimeCoordinatorStub(channel)
     
     def _get_merchant_stub(self):
-        channel = grpc.insecure_channel(self.merchant_address)
+        channel = channel_pool.get_channel(self.merchant_address)
         return channel, town_pb2_grpc.MerchantNodeStub(channel)
     
     # ========== 连接检查 ==========
@@ -41,8 +48,7 @@ class GRPCAdapter:
         """检查村民节点连接"""
         try:
             channel, stub = self._get_villager_stub()
-            stub.GetInfo(town_pb2.Empty())
-            channel.close()
+            stub.GetInfo(town_pb2.GetInfoRequest(field_mask=FieldMask(paths=['name'])))
             return True
         except:
             return False
@@ -53,8 +59,7 @@ class GRPCAdapter:
         """获取村民状态"""
         try:
             channel, stub = self._get_villager_stub()
-            info = stub.GetInfo(town_pb2.Empty())
-            channel.close()
+            info = stub.GetInfo(town_pb2.GetInfoRequest())
             
             return {
                 'name': info.name,
@@ -84,7 +89,6 @@ class GRPCAdapter:
                 gender=gender,
                 personality=personality
             ))
-            channel.close()
             return response.success
         except Exception as e:
             print(f"[gRPC Adapter] 创建村民失败: {e}")
@@ -97,20 +101,41 @@ class GRPCAdapter:
         try:
             channel, stub = self._get_coordinator_stub()
             response = stub.GetTime(town_pb2.Empty())
-            channel.close()
             return f"Day {response.day} - {response.time_of_day}"
         except Exception as e:
             print(f"[gRPC Adapter] 获取时间失败: {e}")
             return "Unknown"
     
     def get_action_status(self) -> Dict:
-        """获取行动提交状态"""
-        # gRPC版本暂时不支持行动提交状态
-        return {
-            'has_submitted_action': False,
-            'submitted_action': None,
-            'submitted_at': None
-        }
+        """获取本时段行动提交状态（与REST /action/status相同结构）"""
+        try:
+            channel, stub = self._get_coordinator_stub()
+            status = stub.GetActionStatus(town_pb2.Empty())
+            return {
+                'total_villagers': status.total_villagers,
+                'submitted': status.submitted,
+                'submitted_nodes': [{'node_id': n.node_id, 'display_name': n.node_id} for n in status.submitted_nodes],
+                'pending_actions': {n.node_id: n.action for n in status.submitted_nodes},
+                'waiting_for': [{'node_id': node_id, 'display_name': node_id} for node_id in status.waiting_for],
+                'ready_to_advance': status.ready_to_advance
+            }
+        except Exception as e:
+            print(f"[gRPC Adapter] 获取行动状态失败: {e}")
+            return {}
+    
+    def _get_node_id(self) -> Optional[str]:
+        """本村民节点在协调器注册的ID（按地址查找，结果缓存）"""
+        if self._node_id is None:
+            channel, stub = self._get_coordinator_stub()
+            for node in stub.ListNodes(town_pb2.Empty()).nodes:
+                if node.node_type == 'villager' and node.address == self.villager_address:
+                    self._node_id = node.node_id
+                    break
+        return self._node_id
+    
+    def subscribe_events(self, on_event, types=()) -> EventSubscriber:
+        """订阅协调器事件流（后台线程，time_advance / node_registered / broadcast），调用返回值的stop()结束"""
+        return EventSubscriber(self.coordinator_address, on_event, types=types).start()
     
     # ========== 商人系统 ==========
     
@@ -119,7 +144,6 @@ class GRPCAdapter:
         try:
             channel, stub = self._get_merchant_stub()
             response = stub.GetPrices(town_pb2.Empty())
-            channel.close()
             
             buy_prices = {}
             sell_prices = {}
@@ -146,7 +170,6 @@ class GRPCAdapter:
                 item=item,
                 quantity=quantity
             ))
-            channel.close()
             return response.success
         except Exception as e:
             print(f"[gRPC Adapter] 购买失败: {e}")
@@ -160,7 +183,6 @@ class GRPCAdapter:
                 item=item,
                 quantity=quantity
             ))
-            channel.close()
             return response.success
         except Exception as e:
             print(f"[gRPC Adapter] 出售失败: {e}")
@@ -173,7 +195,6 @@ class GRPCAdapter:
         try:
             channel, stub = self._get_coordinator_stub()
             response = stub.ListNodes(town_pb2.Empty())
-            channel.close()
             
             villagers = []
             for node in response.nodes:
@@ -195,7 +216,6 @@ class GRPCAdapter:
         try:
             channel, stub = self._get_villager_stub()
             response = stub.GetMessages(town_pb2.GetMessagesRequest())
-            channel.close()
             
             messages = []
             for msg in response.messages:
@@ -222,7 +242,6 @@ class GRPCAdapter:
                 content=content,
                 type='private'
             ))
-            channel.close()
             return response.success
         except Exception as e:
             print(f"[gRPC Adapter] 发送消息失败: {e}")
@@ -237,7 +256,6 @@ class GRPCAdapter:
                 content=content,
                 type='broadcast'
             ))
-            channel.close()
             return response.success
         except Exception as e:
             print(f"[gRPC Adapter] 广播消息失败: {e}")
@@ -261,7 +279,6 @@ class GRPCAdapter:
                 node_id=node_id,
                 type='received'
             ))
-            channel.close()
             
             trades = []
             for trade in response.trades:
@@ -293,7 +310,6 @@ class GRPCAdapter:
                 node_id=node_id,
                 type='sent'
             ))
-            channel.close()
             
             trades = []
             for trade in response.trades:
@@ -330,7 +346,6 @@ class GRPCAdapter:
                 quantity=quantity,
                 price=price
             ))
-            channel.close()
             return response.success
         except Exception as e:
             print(f"[gRPC Adapter] 创建交易失败: {e}")
@@ -346,7 +361,6 @@ class GRPCAdapter:
                 trade_id=trade_id,
                 node_id=node_id
             ))
-            channel.close()
             return response.success
         except Exception as e:
             print(f"[gRPC Adapter] 接受交易失败: {e}")
@@ -362,7 +376,6 @@ class GRPCAdapter:
                 trade_id=trade_id,
                 node_id=node_id
             ))
-            channel.close()
             return response.success
         except Exception as e:
             print(f"[gRPC Adapter] 拒绝交易失败: {e}")
@@ -378,7 +391,6 @@ class GRPCAdapter:
                 trade_id=trade_id,
                 node_id=node_id
             ))
-            channel.close()
             return response.success
         except Exception as e:
             print(f"[gRPC Adapter] 确认交易失败: {e}")
@@ -394,7 +406,6 @@ class GRPCAdapter:
                 trade_id=trade_id,
                 node_id=node_id
             ))
-            channel.close()
             return response.success
         except Exception as e:
             print(f"[gRPC Adapter] 取消交易失败: {e}")
@@ -426,12 +437,88 @@ class GRPCAdapter:
                 print(f"[gRPC Adapter] 不支持的action: {action}")
                 return False
             
-            channel.close()
             return response.success
         except Exception as e:
             print(f"[gRPC Adapter] 执行行动失败: {e}")
             return False
     
     def submit_action(self, action: str, **kwargs) -> bool:
-        """提交行动（gRPC版本直接执行）"""
-        return self.execute_action(action, **kwargs)
\ No newline at end of file
+        """执行行动；produce/sleep/idle结束本时段，再向协调器的同步屏障提交"""
+        if not self.execute_action(action, **kwargs):
+            return False
+        if action not in BARRIER_ACTIONS:
+            return True
+        return self._submit_to_barrier(BARRIER_ACTIONS[action])
+    
+    def _submit_to_barrier(self, barrier_action: str) -> bool:
+        """向协调器提交本时段行动（work / sleep / idle）"""
+        try:
+            node_id = self._get_node_id()
+            if node_id is None:
+                print(f"[gRPC Adapter] 协调器中找不到 {self.villager_address} 的村民节点")
+                return False
+            channel, stub = self._get_coordinator_stub()
+            response = stub.SubmitAction(town_pb2.SubmitActionRequest(node_id=node_id, action=barrier_action))
+            if response.all_ready:
+                print(f"[gRPC Adapter] 所有村民已提交，时间推进到 Day {response.new_time.day} - {response.new_time.time_of_day}")
+            else:
+                print(f"[gRPC Adapter] 已提交 '{barrier_action}'，等待: {list(response.waiting_for)}")
+            return response.success
+        except Exception as e:
+            print(f"[gRPC Adapter] 提交行动失败: {e}")
+            return False
+    
+    def execute_batch(self, actions: List[Dict], mode: str = 'atomic') -> Optional[Dict]:
+        """批量执行行动（一次ExecuteBatch调用），返回与REST /action/batch相同结构的结果
+        
+        actions: 例如 [{'type': 'trade', 'action': 'buy', 'item': 'seed', 'quantity': 1}, {'type': 'produce'}]
+        mode: 'atomic'（全部成功或全部回滚）或 'best_effort'
+        """
+        try:
+            steps = []
+            barrier_action = None  # 批量执行成功后向同步屏障提交的行动
+            for action in actions:
+                step_type = action.get('type')
+                if step_type in ('buy', 'sell'):
+                    steps.append(town_pb2.BatchAction(type='trade', action=step_type,
+                                                      item=action.get('item', ''), quantity=action.get('quantity', 1)))
+                elif step_type in ('idle', 'submit'):
+                    # 行动提交不是村民节点上的步骤，批量执行后提交给协调器
+                    barrier_action = action.get('action') or 'idle'
+                    continue
+                else:
+                    if step_type in BARRIER_ACTIONS:
+                        barrier_action = BARRIER_ACTIONS[step_type]
+                    steps.append(town_pb2.BatchAction(type=step_type, action=action.get('action', ''),
+                                                      item=action.get('item', ''), quantity=action.get('quantity', 0)))
+            
+            channel, stub = self._get_villager_stub()
+            response = stub.ExecuteBatch(town_pb2.BatchRequest(actions=steps, best_effort=(mode == 'best_effort')))
+            if response.success and barrier_action:
+                self._submit_to_barrier(barrier_action)
+            
+            info = response.villager
+            return {
+                'success': response.success,
+                'mode': mode,
+                'message': response.message,
+                'results': [
+                    {'index': r.index, 'type': r.type, 'success': r.success, 'message': r.message,
+                     'skipped': r.skipped, 'rolled_back': r.rolled_back}
+                    for r in response.results
+                ],
+                'villager': {
+                    'name': info.name,
+                    'occupation': info.occupation,
+                    'stamina': info.stamina,
+                    'max_stamina': info.max_stamina,
+                    'inventory': {
+                        'money': info.inventory.money,
+                        'items': dict(info.inventory.items)
+                    },
+                    'has_slept': info.has_slept
+                }
+            }
+        except Exception as e:
+            print(f"[gRPC Adapter] 批量执行失败: {e}")
+            return None
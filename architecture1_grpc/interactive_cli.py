@@ -4,6 +4,7 @@
 """
 
 import grpc
+from google.protobuf.field_mask_pb2 import FieldMask
 import sys
 import os
 import time
@@ -12,6 +13,7 @@ from typing import Optional
 sys.path.insert(0, os.path.dirname(__file__))
 import town_pb2
 import town_pb2_grpc
+import channel_pool
 
 
 class VillagerCLI:
@@ -30,25 +32,24 @@ class VillagerCLI:
     
     def _get_villager_stub(self):
         """获取villager stub"""
-        channel = grpc.insecure_channel(self.villager_address)
+        channel = channel_pool.get_channel(self.villager_address)
         return channel, town_pb2_grpc.VillagerNodeStub(channel)
     
     def _get_coordinator_stub(self):
         """获取coordinator stub"""
-        channel = grpc.insecure_channel(self.coordinator_address)
+        channel = channel_pool.get_channel(self.coordinator_address)
         return channel, town_pb2_grpc.TimeCoordinatorStub(channel)
     
     def _get_merchant_stub(self):
         """获取merchant stub"""
-        channel = grpc.insecure_channel(self.merchant_address)
+        channel = channel_pool.get_channel(self.merchant_address)
         return channel, town_pb2_grpc.MerchantNodeStub(channel)
     
     def check_connection(self) -> bool:
         """检查连接"""
         try:
             channel, stub = self._get_villager_stub()
-            stub.GetInfo(town_pb2.Empty())
-            channel.close()
+            stub.GetInfo(town_pb2.GetInfoRequest(field_mask=FieldMask(paths=['name'])))
             return True
         except:
             return False
@@ -57,8 +58,7 @@ class VillagerCLI:
         """GetVillagerinformation"""
         try:
             channel, stub = self._get_villager_stub()
-            info = stub.GetInfo(town_pb2.Empty())
-            channel.close()
+            info = stub.GetInfo(town_pb2.GetInfoRequest())
             
             return {
                 'name': info.name,
@@ -87,7 +87,6 @@ class VillagerCLI:
                 gender=gender,
                 personality=personality
             ))
-            channel.close()
             
             if response.success:
                 print(f"\n✓ VillagerCreateSuccess!")
@@ -128,7 +127,6 @@ class VillagerCLI:
         try:
             channel, stub = self._get_villager_stub()
             response = stub.Produce(town_pb2.ProduceRequest())
-            channel.close()
             
             if response.success:
                 print(f"\n✓ {response.message}")
@@ -150,7 +148,6 @@ class VillagerCLI:
                 quantity=quantity,
                 price=price
             ))
-            channel.close()
             
             if response.success:
                 print(f"\n✓ {response.message}")
@@ -165,7 +162,6 @@ class VillagerCLI:
         try:
             channel, stub = self._get_villager_stub()
             response = stub.Sleep(town_pb2.SleepRequest())
-            channel.close()
             
             if response.success:
                 print(f"\n✓ {response.message}")
@@ -180,7 +176,6 @@ class VillagerCLI:
         try:
             channel, stub = self._get_coordinator_stub()
             time_info = stub.GetCurrentTime(town_pb2.Empty())
-            channel.close()
             return f"Day {time_info.day} - {time_info.time_of_day}"
         except Exception as e:
             return "Unknown"
@@ -193,7 +188,6 @@ class VillagerCLI:
         try:
             channel, stub = self._get_coordinator_stub()
             response = stub.ListNodes(town_pb2.Empty())
-            channel.close()
             
             # 根据地址查找node_id
             for node in response.nodes:
@@ -213,7 +207,6 @@ class VillagerCLI:
         try:
             channel, stub = self._get_coordinator_stub()
             response = stub.ListNodes(town_pb2.Empty())
-            channel.close()
             
             villagers = []
             for node in response.nodes:
@@ -245,10 +238,8 @@ class VillagerCLI:
         for v in villagers:
             # GetVillagerinformation
             try:
-                channel = grpc.insecure_channel(v['address'])
-                stub = town_pb2_grpc.VillagerNodeStub(channel)
-                info = stub.GetInfo(town_pb2.Empty())
-                channel.close()
+                stub = channel_pool.get_stub(v['address'], town_pb2_grpc.VillagerNodeStub)
+                info = stub.GetInfo(town_pb2.GetInfoRequest(field_mask=FieldMask(paths=['name', 'occupation'])))
                 
                 is_me = v['node_id'] == my_node_id
                 marker = " (我)" if is_me else ""
@@ -295,7 +286,6 @@ class VillagerCLI:
                 quantity=quantity,
                 price=price
             ))
-            channel.close()
             
             if response.success:
                 print(f"\n✓ Trade请求已Send: {response.trade_id}")
@@ -319,7 +309,6 @@ class VillagerCLI:
                 node_id=my_node_id,
                 type='all'
             ))
-            channel.close()
             
             if not response.trades:
                 print("\n你没有相关Trade\n")
@@ -407,7 +396,6 @@ class VillagerCLI:
                 node_id=my_node_id,
                 type='received'
             ))
-            channel.close()
             
             if not response.trades:
                 print("\n没有待Handle的Trade请求\n")
@@ -453,7 +441,6 @@ class VillagerCLI:
                 trade_id=trade_id,
                 node_id=my_node_id
             ))
-            channel.close()
             
             if response.success:
                 print(f"\n✓ {response.message}")
@@ -475,7 +462,6 @@ class VillagerCLI:
                 trade_id=trade_id,
                 node_id=my_node_id
             ))
-            channel.close()
             
             if response.success:
                 print(f"\n✓ Trade已Confirm")
@@ -495,7 +481,6 @@ class VillagerCLI:
                 trade_id=trade_id,
                 node_id=my_node_id
             ))
-            channel.close()
             
             if response.success:
                 print(f"\n✓ {response.message}\n")
@@ -514,7 +499,6 @@ class VillagerCLI:
                 trade_id=trade_id,
                 node_id=my_node_id
             ))
-            channel.close()
             
             if response.success:
                 print(f"\n✓ {response.message}\n")
@@ -530,7 +514,6 @@ class VillagerCLI:
             response = stub.GetMessages(town_pb2.GetMessagesRequest(
                 node_id=self.node_id
             ))
-            channel.close()
             
             messages = []
             for msg in response.messages:
@@ -558,7 +541,6 @@ class VillagerCLI:
                 content=content,
                 type=message_type
             ))
-            channel.close()
             
             if response.success:
                 print(f"\n✓ {response.message}")
@@ -620,7 +602,6 @@ class VillagerCLI:
                 node_id=my_node_id,
                 message_id=message_id or ""
             ))
-            channel.close()
             
             if response.success:
                 print(f"\n✓ {response.message}")
@@ -632,7 +613,6 @@ class VillagerCLI:
         try:
             channel, stub = self._get_merchant_stub()
             prices = stub.GetPrices(town_pb2.Empty())
-            channel.close()
             
             print("\n" + "="*50)
             print("  MerchantPrice表")
@@ -751,7 +731,6 @@ class VillagerCLI:
                     try:
                         channel, stub = self._get_coordinator_stub()
                         response = stub.AdvanceTime(town_pb2.Empty())
-                        channel.close()
                         if response.success:
                             print(f"\n✓ {response.message}\n")
                         else:
@@ -5,6 +5,7 @@ MerchantNode - Architecture 1 (gRPC)
 
 import grpc
 from concurrent import futures
+from google.protobuf.field_mask_pb2 import FieldMask
 import sys
 import os
 import time
@@ -13,9 +14,27 @@ import time
 sys.path.insert(0, os.path.dirname(__file__))
 import town_pb2
 import town_pb2_grpc
+import channel_pool
+from event_subscriber import EventSubscriber
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from common.models import MERCHANT_PRICES
+from common.projection import fields_from_mask
+
+# TradeInfo的字段名（与active_trades中trade_data的键一致）
+TRADE_INFO_FIELDS = tuple(town_pb2.TradeInfo.DESCRIPTOR.fields_by_name)
+
+# AcceptTrade只需要目标方的背包
+INVENTORY_ONLY = town_pb2.GetInfoRequest(field_mask=FieldMask(paths=['inventory']))
+
+
+def trade_parties(trade):
+    """根据offer_type确定买卖双方，返回 (buyer_id, buyer_addr, seller_id, seller_addr)"""
+    if trade['offer_type'] == 'buy':
+        # 发起方买，目标方卖
+        return trade['initiator_id'], trade['initiator_address'], trade['target_id'], trade['target_address']
+    # sell: 发起方卖，目标方买
+    return trade['target_id'], trade['target_address'], trade['initiator_id'], trade['initiator_address']
 
 
 class MerchantNodeService(town_pb2_grpc.MerchantNodeServicer):
@@ -100,6 +119,11 @@ class MerchantNodeService(town_pb2_grpc.MerchantNodeServicer):
         
         return town_pb2.Status(success=True, message="Time updated")
     
+    def handle_event(self, event):
+        """Handle Coordinator事件流中的事件（Merchant只关心TimeAdvance）"""
+        if event.type == 'time_advance':
+            self.OnTimeAdvance(town_pb2.TimeAdvanceNotification(new_time=event.time), None)
+    
     # ==================== 中心化Trade系统 ====================
     
     def CreateTrade(self, request, context):
@@ -136,9 +160,10 @@ class MerchantNodeService(town_pb2_grpc.MerchantNodeServicer):
         )
     
     def ListTrades(self, request, context):
-        """列出Trade"""
+        """列出Trade（request.field_mask: 只返回TradeInfo的这些字段）"""
         node_id = request.node_id
         trade_type = request.type
+        fields = fields_from_mask(request.field_mask)
         
         trades = []
         for trade_id, trade_data in self.active_trades.items():
@@ -146,81 +171,103 @@ class MerchantNodeService(town_pb2_grpc.MerchantNodeServicer):
             if trade_type == 'pending':
                 # 待Handle的Trade（我是target且status为pending）
                 if trade_data['target_id'] == node_id and trade_data['status'] == 'pending':
-                    trades.append(self._convert_trade_to_proto(trade_data))
+                    trades.append(self._convert_trade_to_proto(trade_data, fields))
             elif trade_type == 'sent':
                 # 我发起的Trade（我是initiator）
                 if trade_data['initiator_id'] == node_id:
-                    trades.append(self._convert_trade_to_proto(trade_data))
+                    trades.append(self._convert_trade_to_proto(trade_data, fields))
             elif trade_type == 'received':
                 # 我收到的Trade（我是target）
                 if trade_data['target_id'] == node_id:
-                    trades.append(self._convert_trade_to_proto(trade_data))
+                    trades.append(self._convert_trade_to_proto(trade_data, fields))
             elif trade_type == 'all':
                 # 所有相关Trade
                 if trade_data['initiator_id'] == node_id or trade_data['target_id'] == node_id:
-                    trades.append(self._convert_trade_to_proto(trade_data))
+                    trades.append(self._convert_trade_to_proto(trade_data, fields))
         
         return town_pb2.ListTradesResponse(trades=trades)
     
     def AcceptTrade(self, request, context):
         """AcceptTrade"""
+        trade, error = self._accept_precheck(request)
+        if error is not None:
+            return error
+        
+        # 检查目标方资源
+        try:
+            stub = channel_pool.get_stub(trade['target_address'], town_pb2_grpc.VillagerNodeStub)
+            info = stub.GetInfo(INVENTORY_ONLY)
+        except Exception as e:
+            return town_pb2.Status(success=False, message=f"检查资源Failed: {str(e)}")
+        
+        return self._accept_with_inventory(trade, info)
+    
+    def _accept_precheck(self, request):
+        """AcceptTrade的本地检查，返回 (trade, None) 或 (None, 失败的Status)"""
         trade_id = request.trade_id
         node_id = request.node_id
         
         if trade_id not in self.active_trades:
-            return town_pb2.Status(success=False, message="Trade不存在")
+            return None, town_pb2.Status(success=False, message="Trade不存在")
         
         trade = self.active_trades[trade_id]
         
         # 检查是否是目标方
         if trade['target_id'] != node_id:
-            return town_pb2.Status(success=False, message="只有Trade目标方可以Accept")
+            return None, town_pb2.Status(success=False, message="只有Trade目标方可以Accept")
         
         # 检查状态
         if trade['status'] != 'pending':
-            return town_pb2.Status(success=False, message=f"Trade状态Error: {trade['status']}")
+            return None, town_pb2.Status(success=False, message=f"Trade状态Error: {trade['status']}")
         
-        # 检查目标方资源
-        try:
-            channel = grpc.insecure_channel(trade['target_address'])
-            stub = town_pb2_grpc.VillagerNodeStub(channel)
-            info = stub.GetInfo(town_pb2.Empty())
-            
-            if trade['offer_type'] == 'buy':
-                # 发起方想买，目标方需要有Item
-                if info.inventory.items.get(trade['item'], 0) < trade['quantity']:
-                    channel.close()
-                    return town_pb2.Status(success=False, message=f"你没有足够的 {trade['item']}")
-            elif trade['offer_type'] == 'sell':
-                # 发起方想卖，目标方需要有钱
-                if info.inventory.money < trade['price']:
-                    channel.close()
-                    return town_pb2.Status(success=False, message=f"你没有足够的Money")
-            
-            channel.close()
-        except Exception as e:
-            return town_pb2.Status(success=False, message=f"检查资源Failed: {str(e)}")
+        return trade, None
+    
+    def _accept_with_inventory(self, trade, info):
+        """根据目标方背包（GetInfo的结果）完成Accept"""
+        # 检查资源期间Trade可能已被Cancel/Reject
+        if self.active_trades.get(trade['trade_id']) is not trade or trade['status'] != 'pending':
+            return town_pb2.Status(success=False, message=f"Trade状态已变化: {trade['status']}")
+        
+        if trade['offer_type'] == 'buy':
+            # 发起方想买，目标方需要有Item
+            if info.inventory.items.get(trade['item'], 0) < trade['quantity']:
+                return town_pb2.Status(success=False, message=f"你没有足够的 {trade['item']}")
+        elif trade['offer_type'] == 'sell':
+            # 发起方想卖，目标方需要有钱
+            if info.inventory.money < trade['price']:
+                return town_pb2.Status(success=False, message=f"你没有足够的Money")
         
         # Update状态
         trade['status'] = 'accepted'
         
-        print(f"[Merchant-Trade] Trade {trade_id} 被Accept")
+        print(f"[Merchant-Trade] Trade {trade['trade_id']} 被Accept")
         
         return town_pb2.Status(success=True, message="Trade已Accept，Waiting双方Confirm")
     
     def ConfirmTrade(self, request, context):
         """ConfirmTrade"""
+        trade, reply = self._record_confirmation(request)
+        if reply is not None:
+            return reply
+        return self._finish_trade(trade, self._execute_trade(trade))
+    
+    def _record_confirmation(self, request):
+        """记录一方的Confirm
+        
+        双方都Confirm时返回 (trade, None)，调用方执行Trade后交给_finish_trade；
+        否则返回 (None, 回复的Status)。
+        """
         trade_id = request.trade_id
         node_id = request.node_id
         
         if trade_id not in self.active_trades:
-            return town_pb2.Status(success=False, message="Trade不存在")
+            return None, town_pb2.Status(success=False, message="Trade不存在")
         
         trade = self.active_trades[trade_id]
         
         # 检查状态
         if trade['status'] != 'accepted':
-            return town_pb2.Status(success=False, message=f"Trade状态Error: {trade['status']}")
+            return None, town_pb2.Status(success=False, message=f"Trade状态Error: {trade['status']}")
         
         # 标记Confirm
         if trade['initiator_id'] == node_id:
@@ -230,24 +277,29 @@ class MerchantNodeService(town_pb2_grpc.MerchantNodeServicer):
             trade['target_confirmed'] = True
             print(f"[Merchant-Trade] {node_id} (目标方) ConfirmTrade {trade_id}")
         else:
-            return town_pb2.Status(success=False, message="你不是此Trade的参与方")
+            return None, town_pb2.Status(success=False, message="你不是此Trade的参与方")
         
         # 如果双方都Confirm了，ExecuteTrade
         if trade['initiator_confirmed'] and trade['target_confirmed']:
             print(f"[Merchant-Trade] 双方已Confirm，ExecuteTrade {trade_id}")
-            result = self._execute_trade(trade)
-            if result['success']:
-                # DeleteTrade记录
-                del self.active_trades[trade_id]
-                return town_pb2.Status(success=True, message="Trade完成")
-            else:
-                # 回滚Confirm状态
-                trade['initiator_confirmed'] = False
-                trade['target_confirmed'] = False
-                trade['status'] = 'accepted'
-                return town_pb2.Status(success=False, message=f"TradeExecuteFailed: {result['message']}")
-        
-        return town_pb2.Status(success=True, message="ConfirmSuccess，Waiting对方Confirm")
+            # 执行期间重复的Confirm不会再次执行
+            trade['status'] = 'executing'
+            return trade, None
+        
+        return None, town_pb2.Status(success=True, message="ConfirmSuccess，Waiting对方Confirm")
+    
+    def _finish_trade(self, trade, result):
+        """根据_execute_trade的结果删除Trade记录或回滚Confirm状态"""
+        if result['success']:
+            # DeleteTrade记录
+            del self.active_trades[trade['trade_id']]
+            return town_pb2.Status(success=True, message="Trade完成")
+        
+        # 回滚Confirm状态
+        trade['initiator_confirmed'] = False
+        trade['target_confirmed'] = False
+        trade['status'] = 'accepted'
+        return town_pb2.Status(success=False, message=f"TradeExecuteFailed: {result['message']}")
     
     def CancelTrade(self, request, context):
         """CancelTrade"""
@@ -300,19 +352,7 @@ class MerchantNodeService(town_pb2_grpc.MerchantNodeServicer):
         trade_id = trade['trade_id']
         
         try:
-            # 根据offer_type确定买卖双方
-            if trade['offer_type'] == 'buy':
-                # 发起方买，目标方卖
-                buyer_id = trade['initiator_id']
-                buyer_addr = trade['initiator_address']
-                seller_id = trade['target_id']
-                seller_addr = trade['target_address']
-            else:  # sell
-                # 发起方卖，目标方买
-                seller_id = trade['initiator_id']
-                seller_addr = trade['initiator_address']
-                buyer_id = trade['target_id']
-                buyer_addr = trade['target_address']
+            buyer_id, buyer_addr, seller_id, seller_addr = trade_parties(trade)
             
             item = trade['item']
             quantity = trade['quantity']
@@ -321,20 +361,17 @@ class MerchantNodeService(town_pb2_grpc.MerchantNodeServicer):
             print(f"[Merchant-Trade] ExecuteTrade: {buyer_id} 买 {quantity}x{item} from {seller_id}, Price {price}")
             
             # Step 1: 买方支付
-            channel = grpc.insecure_channel(buyer_addr)
-            stub = town_pb2_grpc.VillagerNodeStub(channel)
+            stub = channel_pool.get_stub(buyer_addr, town_pb2_grpc.VillagerNodeStub)
             response = stub.TradeExecute(town_pb2.TradeExecuteRequest(
                 action='pay',
                 money=price
             ))
-            channel.close()
             
             if not response.success:
                 return {'success': False, 'message': f"买方支付Failed: {response.message}"}
             
             # Step 2: 卖方移除Item
-            channel = grpc.insecure_channel(seller_addr)
-            stub = town_pb2_grpc.VillagerNodeStub(channel)
+            stub = channel_pool.get_stub(seller_addr, town_pb2_grpc.VillagerNodeStub)
             response = stub.TradeExecute(town_pb2.TradeExecuteRequest(
                 action='remove_item',
                 item=item,
@@ -343,20 +380,15 @@ class MerchantNodeService(town_pb2_grpc.MerchantNodeServicer):
             
             if not response.success:
                 # 回滚: 买方退款
-                channel_buyer = grpc.insecure_channel(buyer_addr)
-                stub_buyer = town_pb2_grpc.VillagerNodeStub(channel_buyer)
+                stub_buyer = channel_pool.get_stub(buyer_addr, town_pb2_grpc.VillagerNodeStub)
                 stub_buyer.TradeExecute(town_pb2.TradeExecuteRequest(
                     action='refund',
                     money=price
                 ))
-                channel_buyer.close()
-                channel.close()
                 return {'success': False, 'message': f"卖方移除ItemFailed: {response.message}"}
-            channel.close()
             
             # Step 3: 买方添加Item
-            channel = grpc.insecure_channel(buyer_addr)
-            stub = town_pb2_grpc.VillagerNodeStub(channel)
+            stub = channel_pool.get_stub(buyer_addr, town_pb2_grpc.VillagerNodeStub)
             response = stub.TradeExecute(town_pb2.TradeExecuteRequest(
                 action='add_item',
                 item=item,
@@ -365,34 +397,26 @@ class MerchantNodeService(town_pb2_grpc.MerchantNodeServicer):
             
             if not response.success:
                 # 回滚: 卖方添加Item，买方退款
-                channel_seller = grpc.insecure_channel(seller_addr)
-                stub_seller = town_pb2_grpc.VillagerNodeStub(channel_seller)
+                stub_seller = channel_pool.get_stub(seller_addr, town_pb2_grpc.VillagerNodeStub)
                 stub_seller.TradeExecute(town_pb2.TradeExecuteRequest(
                     action='add_item',
                     item=item,
                     quantity=quantity
                 ))
-                channel_seller.close()
                 
-                channel_buyer = grpc.insecure_channel(buyer_addr)
-                stub_buyer = town_pb2_grpc.VillagerNodeStub(channel_buyer)
+                stub_buyer = channel_pool.get_stub(buyer_addr, town_pb2_grpc.VillagerNodeStub)
                 stub_buyer.TradeExecute(town_pb2.TradeExecuteRequest(
                     action='refund',
                     money=price
                 ))
-                channel_buyer.close()
-                channel.close()
                 return {'success': False, 'message': f"买方添加ItemFailed: {response.message}"}
-            channel.close()
             
             # Step 4: 卖方收款
-            channel = grpc.insecure_channel(seller_addr)
-            stub = town_pb2_grpc.VillagerNodeStub(channel)
+            stub = channel_pool.get_stub(seller_addr, town_pb2_grpc.VillagerNodeStub)
             response = stub.TradeExecute(town_pb2.TradeExecuteRequest(
                 action='receive',
                 money=price
             ))
-            channel.close()
             
             if not response.success:
                 print(f"[Merchant-Trade] Warning: 卖方收款Failed，但Trade已Execute")
@@ -403,42 +427,17 @@ class MerchantNodeService(town_pb2_grpc.MerchantNodeServicer):
         except Exception as e:
             return {'success': False, 'message': f'ExecuteFailed: {str(e)}'}
     
-    def _convert_trade_to_proto(self, trade_data):
-        """将Trade数据转换为protoMessage"""
-        return town_pb2.TradeInfo(
-            trade_id=trade_data['trade_id'],
-            initiator_id=trade_data['initiator_id'],
-            initiator_address=trade_data['initiator_address'],
-            target_id=trade_data['target_id'],
-            target_address=trade_data['target_address'],
-            offer_type=trade_data['offer_type'],
-            item=trade_data['item'],
-            quantity=trade_data['quantity'],
-            price=trade_data['price'],
-            status=trade_data['status'],
-            initiator_confirmed=trade_data['initiator_confirmed'],
-            target_confirmed=trade_data['target_confirmed']
-        )
+    def _convert_trade_to_proto(self, trade_data, fields=None):
+        """将Trade数据转换为protoMessage（fields为None时填充全部字段）"""
+        names = TRADE_INFO_FIELDS if fields is None else [name for name in fields if name in TRADE_INFO_FIELDS]
+        return town_pb2.TradeInfo(**{name: trade_data[name] for name in names})
 
 
-def serve(port=50052, coordinator_addr='localhost:50051'):
-    """启动Merchant服务器"""
-    node_id = "merchant"
-    
-    # 启动gRPC服务器
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    town_pb2_grpc.add_MerchantNodeServicer_to_server(
-        MerchantNodeService(node_id), server
-    )
-    server.add_insecure_port(f'[::]:{port}')
-    server.start()
-    
-    print(f"[Merchant] MerchantNodestarting on port {port}")
-    
-    # Register to coordinator
+def join_town(merchant_service, port, coordinator_addr):
+    """Register to coordinator并订阅TimeAdvance事件，返回EventSubscriber"""
+    node_id = merchant_service.node_id
     try:
-        channel = grpc.insecure_channel(coordinator_addr)
-        stub = town_pb2_grpc.TimeCoordinatorStub(channel)
+        stub = channel_pool.get_stub(coordinator_addr, town_pb2_grpc.TimeCoordinatorStub)
         
         response = stub.RegisterNode(town_pb2.RegisterNodeRequest(
             node_id=node_id,
@@ -450,11 +449,32 @@ def serve(port=50052, coordinator_addr='localhost:50051'):
             print(f"[Merchant] SuccessRegister to coordinator: {coordinator_addr}")
         else:
             print(f"[Merchant] Registration failed: {response.message}")
-        
-        channel.close()
     except Exception as e:
         print(f"[Merchant] 无法Connecting toCoordinator {coordinator_addr}: {e}")
     
+    # 通过事件流接收TimeAdvance
+    return EventSubscriber(
+        coordinator_addr,
+        merchant_service.handle_event,
+        node_id=node_id, types=('time_advance',)
+    ).start()
+
+
+def serve(port=50052, coordinator_addr='localhost:50051'):
+    """启动Merchant服务器"""
+    node_id = "merchant"
+    
+    # 启动gRPC服务器
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    merchant_service = MerchantNodeService(node_id)
+    town_pb2_grpc.add_MerchantNodeServicer_to_server(merchant_service, server)
+    server.add_insecure_port(f'[::]:{port}')
+    server.start()
+    
+    print(f"[Merchant] MerchantNodestarting on port {port}")
+    
+    subscriber = join_town(merchant_service, port, coordinator_addr)
+    
     print("[Merchant] 使用 Ctrl+C 停止服务器")
     
     try:
@@ -462,6 +482,7 @@ def serve(port=50052, coordinator_addr='localhost:50051'):
             time.sleep(86400)
     except KeyboardInterrupt:
         print("\n[Merchant] 关闭服务器...")
+        subscriber.stop()
         server.stop(0)
 
 
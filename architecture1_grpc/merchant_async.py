@@ -0,0 +1,163 @@
+"""
+MerchantNode (grpc.aio) - Architecture 1 (gRPC)
+与merchant.py相同的服务和状态，运行在grpc.aio上：
+AcceptTrade的资源检查和ExecuteTrade对买卖双方的调用不再占用工作线程，
+买卖两侧的调用并发执行。
+"""
+
+import asyncio
+import os
+import sys
+
+import grpc
+
+sys.path.insert(0, os.path.dirname(__file__))
+import town_pb2
+import town_pb2_grpc
+import channel_pool
+import merchant as core
+from aio_support import aio_servicer
+
+OUTBOUND_TIMEOUT = 5.0  # 秒，单个出站调用的deadline
+
+
+def _succeeded(result):
+    """gather(return_exceptions=True)的一项是否是成功的Status"""
+    return not isinstance(result, BaseException) and result.success
+
+
+def _reason(result):
+    return str(result) if isinstance(result, BaseException) else result.message
+
+
+class AsyncMerchantNodeService(core.MerchantNodeService):
+    """有出站调用的RPC用async重写，其余复用MerchantNodeService"""
+
+    async def AcceptTrade(self, request, context):
+        """AcceptTrade"""
+        trade, error = self._accept_precheck(request)
+        if error is not None:
+            return error
+
+        # 检查目标方资源
+        try:
+            stub = channel_pool.get_aio_stub(trade['target_address'], town_pb2_grpc.VillagerNodeStub)
+            info = await stub.GetInfo(core.INVENTORY_ONLY, timeout=OUTBOUND_TIMEOUT)
+        except Exception as e:
+            return town_pb2.Status(success=False, message=f"检查资源Failed: {str(e)}")
+
+        return self._accept_with_inventory(trade, info)
+
+    async def ConfirmTrade(self, request, context):
+        """ConfirmTrade"""
+        trade, reply = self._record_confirmation(request)
+        if reply is not None:
+            return reply
+        return self._finish_trade(trade, await self._execute_trade_async(trade))
+
+    async def _execute_trade_async(self, trade):
+        """ExecuteTrade
+
+        买方支付与卖方移除Item并发执行，任一失败时撤销成功的一侧；
+        然后买方添加Item与卖方收款并发执行，添加Item失败时全部撤销。
+        """
+        trade_id = trade['trade_id']
+
+        try:
+            buyer_id, buyer_addr, seller_id, seller_addr = core.trade_parties(trade)
+            item = trade['item']
+            quantity = trade['quantity']
+            price = trade['price']
+
+            print(f"[Merchant-Trade] ExecuteTrade: {buyer_id} 买 {quantity}x{item} from {seller_id}, Price {price}")
+
+            buyer = channel_pool.get_aio_stub(buyer_addr, town_pb2_grpc.VillagerNodeStub)
+            seller = channel_pool.get_aio_stub(seller_addr, town_pb2_grpc.VillagerNodeStub)
+
+            def execute(stub, **fields):
+                return stub.TradeExecute(town_pb2.TradeExecuteRequest(**fields), timeout=OUTBOUND_TIMEOUT)
+
+            # Step 1+2: 买方支付，卖方移除Item
+            paid, removed = await asyncio.gather(
+                execute(buyer, action='pay', money=price),
+                execute(seller, action='remove_item', item=item, quantity=quantity),
+                return_exceptions=True
+            )
+            if not (_succeeded(paid) and _succeeded(removed)):
+                # 回滚成功的一侧
+                undo = []
+                if _succeeded(paid):
+                    undo.append(execute(buyer, action='refund', money=price))
+                if _succeeded(removed):
+                    undo.append(execute(seller, action='add_item', item=item, quantity=quantity))
+                await asyncio.gather(*undo, return_exceptions=True)
+                if not _succeeded(paid):
+                    return {'success': False, 'message': f"买方支付Failed: {_reason(paid)}"}
+                return {'success': False, 'message': f"卖方移除ItemFailed: {_reason(removed)}"}
+
+            # Step 3+4: 买方添加Item，卖方收款
+            added, received = await asyncio.gather(
+                execute(buyer, action='add_item', item=item, quantity=quantity),
+                execute(seller, action='receive', money=price),
+                return_exceptions=True
+            )
+            if not _succeeded(added):
+                # 回滚: 卖方添加Item（收款成功时再扣回），买方退款
+                undo = [
+                    execute(seller, action='add_item', item=item, quantity=quantity),
+                    execute(buyer, action='refund', money=price)
+                ]
+                if _succeeded(received):
+                    undo.append(execute(seller, action='pay', money=price))
+                await asyncio.gather(*undo, return_exceptions=True)
+                return {'success': False, 'message': f"买方添加ItemFailed: {_reason(added)}"}
+
+            if not _succeeded(received):
+                print(f"[Merchant-Trade] Warning: 卖方收款Failed，但Trade已Execute")
+
+            print(f"[Merchant-Trade] Trade {trade_id} ExecuteSuccess")
+            return {'success': True, 'message': 'Trade完成'}
+
+        except Exception as e:
+            return {'success': False, 'message': f'ExecuteFailed: {str(e)}'}
+
+
+async def serve(port=50052, coordinator_addr='localhost:50051'):
+    """启动Merchant服务器（运行直到被取消）"""
+    merchant_service = AsyncMerchantNodeService("merchant")
+    server = grpc.aio.server()
+    town_pb2_grpc.add_MerchantNodeServicer_to_server(
+        aio_servicer(merchant_service, town_pb2_grpc.MerchantNodeServicer), server
+    )
+    server.add_insecure_port(f'[::]:{port}')
+    await server.start()
+
+    print(f"[Merchant] MerchantNodestarting on port {port} (grpc.aio)")
+
+    # 注册和事件订阅使用同步客户端，放到线程中执行
+    subscriber = await asyncio.get_running_loop().run_in_executor(
+        None, core.join_town, merchant_service, port, coordinator_addr
+    )
+
+    print("[Merchant] 使用 Ctrl+C 停止服务器")
+
+    try:
+        await server.wait_for_termination()
+    finally:
+        subscriber.stop()
+        await server.stop(0)
+        await channel_pool.close_all_aio()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='MerchantNode服务 (grpc.aio)')
+    parser.add_argument('--port', type=int, default=50052, help='监听端口')
+    parser.add_argument('--coordinator', type=str, default='localhost:50051',
+                       help='Coordinator地址')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.port, args.coordinator))
+    except KeyboardInterrupt:
+        print("\n[Merchant] 关闭服务器...")
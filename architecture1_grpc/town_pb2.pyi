@@ -1,3 +1,4 @@
+from google.protobuf import field_mask_pb2 as _field_mask_pb2
 from google.protobuf.internal import containers as _containers
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
@@ -78,6 +79,78 @@ class TimeAdvanceNotification(_message.Message):
     new_time: GameTime
     def __init__(self, new_time: _Optional[_Union[GameTime, _Mapping]] = ...) -> None: ...
 
+class SubmitActionRequest(_message.Message):
+    __slots__ = ("node_id", "action")
+    NODE_ID_FIELD_NUMBER: _ClassVar[int]
+    ACTION_FIELD_NUMBER: _ClassVar[int]
+    node_id: str
+    action: str
+    def __init__(self, node_id: _Optional[str] = ..., action: _Optional[str] = ...) -> None: ...
+
+class SubmitActionResponse(_message.Message):
+    __slots__ = ("success", "message", "all_ready", "new_time", "waiting_for")
+    SUCCESS_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    ALL_READY_FIELD_NUMBER: _ClassVar[int]
+    NEW_TIME_FIELD_NUMBER: _ClassVar[int]
+    WAITING_FOR_FIELD_NUMBER: _ClassVar[int]
+    success: bool
+    message: str
+    all_ready: bool
+    new_time: GameTime
+    waiting_for: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, success: bool = ..., message: _Optional[str] = ..., all_ready: bool = ..., new_time: _Optional[_Union[GameTime, _Mapping]] = ..., waiting_for: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class NodeAction(_message.Message):
+    __slots__ = ("node_id", "action")
+    NODE_ID_FIELD_NUMBER: _ClassVar[int]
+    ACTION_FIELD_NUMBER: _ClassVar[int]
+    node_id: str
+    action: str
+    def __init__(self, node_id: _Optional[str] = ..., action: _Optional[str] = ...) -> None: ...
+
+class ActionStatus(_message.Message):
+    __slots__ = ("total_villagers", "submitted", "submitted_nodes", "waiting_for", "ready_to_advance", "period")
+    TOTAL_VILLAGERS_FIELD_NUMBER: _ClassVar[int]
+    SUBMITTED_FIELD_NUMBER: _ClassVar[int]
+    SUBMITTED_NODES_FIELD_NUMBER: _ClassVar[int]
+    WAITING_FOR_FIELD_NUMBER: _ClassVar[int]
+    READY_TO_ADVANCE_FIELD_NUMBER: _ClassVar[int]
+    PERIOD_FIELD_NUMBER: _ClassVar[int]
+    total_villagers: int
+    submitted: int
+    submitted_nodes: _containers.RepeatedCompositeFieldContainer[NodeAction]
+    waiting_for: _containers.RepeatedScalarFieldContainer[str]
+    ready_to_advance: bool
+    period: int
+    def __init__(self, total_villagers: _Optional[int] = ..., submitted: _Optional[int] = ..., submitted_nodes: _Optional[_Iterable[_Union[NodeAction, _Mapping]]] = ..., waiting_for: _Optional[_Iterable[str]] = ..., ready_to_advance: bool = ..., period: _Optional[int] = ...) -> None: ...
+
+class SubscribeRequest(_message.Message):
+    __slots__ = ("node_id", "since", "types")
+    NODE_ID_FIELD_NUMBER: _ClassVar[int]
+    SINCE_FIELD_NUMBER: _ClassVar[int]
+    TYPES_FIELD_NUMBER: _ClassVar[int]
+    node_id: str
+    since: int
+    types: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, node_id: _Optional[str] = ..., since: _Optional[int] = ..., types: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class Event(_message.Message):
+    __slots__ = ("seq", "type", "timestamp", "time", "node", "message")
+    SEQ_FIELD_NUMBER: _ClassVar[int]
+    TYPE_FIELD_NUMBER: _ClassVar[int]
+    TIMESTAMP_FIELD_NUMBER: _ClassVar[int]
+    TIME_FIELD_NUMBER: _ClassVar[int]
+    NODE_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    seq: int
+    type: str
+    timestamp: float
+    time: GameTime
+    node: NodeInfo
+    message: Message
+    def __init__(self, seq: _Optional[int] = ..., type: _Optional[str] = ..., timestamp: _Optional[float] = ..., time: _Optional[_Union[GameTime, _Mapping]] = ..., node: _Optional[_Union[NodeInfo, _Mapping]] = ..., message: _Optional[_Union[Message, _Mapping]] = ...) -> None: ...
+
 class NodeList(_message.Message):
     __slots__ = ("nodes",)
     NODES_FIELD_NUMBER: _ClassVar[int]
@@ -106,6 +179,12 @@ class CreateVillagerRequest(_message.Message):
     personality: str
     def __init__(self, name: _Optional[str] = ..., occupation: _Optional[str] = ..., gender: _Optional[str] = ..., personality: _Optional[str] = ...) -> None: ...
 
+class GetInfoRequest(_message.Message):
+    __slots__ = ("field_mask",)
+    FIELD_MASK_FIELD_NUMBER: _ClassVar[int]
+    field_mask: _field_mask_pb2.FieldMask
+    def __init__(self, field_mask: _Optional[_Union[_field_mask_pb2.FieldMask, _Mapping]] = ...) -> None: ...
+
 class ProduceRequest(_message.Message):
     __slots__ = ()
     def __init__(self) -> None: ...
@@ -138,6 +217,54 @@ class TradeExecuteRequest(_message.Message):
     money: int
     def __init__(self, action: _Optional[str] = ..., item: _Optional[str] = ..., quantity: _Optional[int] = ..., money: _Optional[int] = ...) -> None: ...
 
+class BatchAction(_message.Message):
+    __slots__ = ("type", "item", "quantity", "action")
+    TYPE_FIELD_NUMBER: _ClassVar[int]
+    ITEM_FIELD_NUMBER: _ClassVar[int]
+    QUANTITY_FIELD_NUMBER: _ClassVar[int]
+    ACTION_FIELD_NUMBER: _ClassVar[int]
+    type: str
+    item: str
+    quantity: int
+    action: str
+    def __init__(self, type: _Optional[str] = ..., item: _Optional[str] = ..., quantity: _Optional[int] = ..., action: _Optional[str] = ...) -> None: ...
+
+class BatchRequest(_message.Message):
+    __slots__ = ("actions", "best_effort")
+    ACTIONS_FIELD_NUMBER: _ClassVar[int]
+    BEST_EFFORT_FIELD_NUMBER: _ClassVar[int]
+    actions: _containers.RepeatedCompositeFieldContainer[BatchAction]
+    best_effort: bool
+    def __init__(self, actions: _Optional[_Iterable[_Union[BatchAction, _Mapping]]] = ..., best_effort: bool = ...) -> None: ...
+
+class BatchStepResult(_message.Message):
+    __slots__ = ("index", "type", "success", "message", "skipped", "rolled_back")
+    INDEX_FIELD_NUMBER: _ClassVar[int]
+    TYPE_FIELD_NUMBER: _ClassVar[int]
+    SUCCESS_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    SKIPPED_FIELD_NUMBER: _ClassVar[int]
+    ROLLED_BACK_FIELD_NUMBER: _ClassVar[int]
+    index: int
+    type: str
+    success: bool
+    message: str
+    skipped: bool
+    rolled_back: bool
+    def __init__(self, index: _Optional[int] = ..., type: _Optional[str] = ..., success: bool = ..., message: _Optional[str] = ..., skipped: bool = ..., rolled_back: bool = ...) -> None: ...
+
+class BatchResponse(_message.Message):
+    __slots__ = ("success", "message", "results", "villager")
+    SUCCESS_FIELD_NUMBER: _ClassVar[int]
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    RESULTS_FIELD_NUMBER: _ClassVar[int]
+    VILLAGER_FIELD_NUMBER: _ClassVar[int]
+    success: bool
+    message: str
+    results: _containers.RepeatedCompositeFieldContainer[BatchStepResult]
+    villager: VillagerInfo
+    def __init__(self, success: bool = ..., message: _Optional[str] = ..., results: _Optional[_Iterable[_Union[BatchStepResult, _Mapping]]] = ..., villager: _Optional[_Union[VillagerInfo, _Mapping]] = ...) -> None: ...
+
 class BuyFromMerchantRequest(_message.Message):
     __slots__ = ("buyer_id", "item", "quantity")
     BUYER_ID_FIELD_NUMBER: _ClassVar[int]
@@ -233,12 +360,14 @@ class TradeInfo(_message.Message):
     def __init__(self, trade_id: _Optional[str] = ..., initiator_id: _Optional[str] = ..., initiator_address: _Optional[str] = ..., target_id: _Optional[str] = ..., target_address: _Optional[str] = ..., offer_type: _Optional[str] = ..., item: _Optional[str] = ..., quantity: _Optional[int] = ..., price: _Optional[int] = ..., status: _Optional[str] = ..., initiator_confirmed: bool = ..., target_confirmed: bool = ...) -> None: ...
 
 class ListTradesRequest(_message.Message):
-    __slots__ = ("node_id", "type")
+    __slots__ = ("node_id", "type", "field_mask")
     NODE_ID_FIELD_NUMBER: _ClassVar[int]
     TYPE_FIELD_NUMBER: _ClassVar[int]
+    FIELD_MASK_FIELD_NUMBER: _ClassVar[int]
     node_id: str
     type: str
-    def __init__(self, node_id: _Optional[str] = ..., type: _Optional[str] = ...) -> None: ...
+    field_mask: _field_mask_pb2.FieldMask
+    def __init__(self, node_id: _Optional[str] = ..., type: _Optional[str] = ..., field_mask: _Optional[_Union[_field_mask_pb2.FieldMask, _Mapping]] = ...) -> None: ...
 
 class ListTradesResponse(_message.Message):
     __slots__ = ("trades",)
@@ -8,11 +8,15 @@ from concurrent import futures
 import sys
 import os
 import time
+import threading
+import functools
 
 # 添加路径
 sys.path.insert(0, os.path.dirname(__file__))
 import town_pb2
 import town_pb2_grpc
+import channel_pool
+from event_subscriber import EventSubscriber
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from common.models import (
@@ -20,22 +24,163 @@ from common.models import (
     PRODUCTION_RECIPES, MERCHANT_PRICES,
     SLEEP_STAMINA, NO_SLEEP_PENALTY
 )
+from common.persistence import StateStore
+from common.projection import fields_from_mask, project
+
+MAX_BATCH_ACTIONS = 32
+BATCH_STEPS = ('produce', 'trade', 'sleep', 'eat')
+DIRECTORY_TTL = 30.0      # 秒，Node目录缓存的最长使用时间（事件流正常时由node_registered实时更新）
+DELIVERY_TIMEOUT = 3.0    # 秒，单个ReceiveMessage投递的deadline
+
+# Villager.to_dict()中与VillagerInfo对应的字段（action_points: gRPC版本不使用action系统，保持默认0）
+VILLAGER_INFO_FIELDS = frozenset(town_pb2.VillagerInfo.DESCRIPTOR.fields_by_name)
+
+
+def persists_state(method):
+    """RPC返回后持久化Villager状态"""
+    @functools.wraps(method)
+    def wrapper(self, request, context):
+        try:
+            return method(self, request, context)
+        finally:
+            self._persist_state()
+    return wrapper
+
+
+class NodeDirectory:
+    """Coordinator注册Node的本地缓存（node_id -> NodeInfo），避免每条Message都调用ListNodes
+    
+    只是缓存，不做I/O：过期（超过ttl或错过事件）时由调用方ListNodes后replace。
+    """
+    
+    def __init__(self, ttl=DIRECTORY_TTL):
+        self.ttl = ttl
+        self._nodes = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+    
+    def stale(self):
+        with self._lock:
+            return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+    
+    def replace(self, nodes):
+        """用ListNodes的结果替换整个目录"""
+        with self._lock:
+            self._nodes = {node.node_id: node for node in nodes}
+            self._loaded_at = time.monotonic()
+    
+    def update(self, node):
+        """node_registered事件：新增或更新一个Node"""
+        with self._lock:
+            self._nodes[node.node_id] = node
+    
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+    
+    def get(self, node_id):
+        with self._lock:
+            return self._nodes.get(node_id)
+    
+    def villagers(self, exclude=None):
+        """除exclude外的所有VillagerNode"""
+        with self._lock:
+            return [node for node in self._nodes.values()
+                    if node.node_type == 'villager' and node.node_id != exclude]
 
 
 class VillagerNodeService(town_pb2_grpc.VillagerNodeServicer):
     """VillagerNode服务"""
     
-    def __init__(self, node_id):
+    def __init__(self, node_id, state_store=None):
         self.node_id = node_id
         self.villager = None
         self.merchant_address = 'localhost:50052'
+        self.coordinator_address = 'localhost:50051'
         
         # Message系统 - 简单存储
         self.messages = []  # 存储Message
         self.message_counter = 0
+        self.directory = NodeDirectory()  # SendMessage使用的Node地址缓存
+        
+        # 持久化（快照 + 变更日志）
+        self.state_store = state_store
+        self.game_time = None  # 最近一次Time通知，用于重启后补齐
         
         print(f"[Villager-{node_id}] Node初始化")
     
+    # ==================== 状态持久化 ====================
+    
+    def _persist_state(self):
+        """记录当前状态到StateStore（未启用持久化时不做任何事）"""
+        if self.state_store is None:
+            return
+        try:
+            self.state_store.set('villager', self.villager.to_dict() if self.villager else None)
+            self.state_store.set('messages', self.messages)
+            self.state_store.set('message_counter', self.message_counter)
+            self.state_store.set('game_time', self.game_time)
+        except Exception as e:
+            print(f"[Villager-{self.node_id}] 持久化状态Failed: {e}")
+    
+    def restore_state(self):
+        """从快照 + 日志恢复状态，返回是否恢复了Villager"""
+        if self.state_store is None:
+            return False
+        
+        started = time.perf_counter()
+        state = self.state_store.load()
+        if state.get('villager'):
+            self.villager = Villager.from_dict(state['villager'])
+        self.messages = state.get('messages', [])
+        self.message_counter = state.get('message_counter', 0)
+        self.game_time = state.get('game_time')
+        
+        if self.villager:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            print(f"[Villager-{self.node_id}] 已恢复 {self.villager.name}，耗时 {elapsed_ms:.1f} ms")
+            print(f"  Stamina: {self.villager.stamina}/{self.villager.max_stamina}, Money: {self.villager.inventory.money}")
+            print(f"  Items: {self.villager.inventory.items}, Messages: {len(self.messages)}")
+        return self.villager is not None
+    
+    def sync_time(self, coordinator_stub):
+        """重启后补齐离线期间错过的TimeAdvance"""
+        if not self.villager:
+            return
+        
+        current = coordinator_stub.GetCurrentTime(town_pb2.Empty())
+        if self.game_time is None:
+            self.game_time = {'day': current.day, 'time_of_day': current.time_of_day}
+        elif (self.game_time['day'], self.game_time['time_of_day']) != (current.day, current.time_of_day):
+            # 只应用最新时段，中间时段无法观测
+            print(f"[Villager-{self.node_id}] 离线期间错过TimeAdvance: "
+                  f"Day {self.game_time['day']} {self.game_time['time_of_day']} -> Day {current.day} {current.time_of_day}")
+            self.OnTimeAdvance(town_pb2.TimeAdvanceNotification(new_time=current), None)
+        self._persist_state()
+    
+    def handle_event(self, event):
+        """Handle Coordinator事件流中的事件（替代Coordinator逐个调用OnTimeAdvance/ReceiveMessage）"""
+        if event.type == 'time_advance':
+            self.OnTimeAdvance(town_pb2.TimeAdvanceNotification(new_time=event.time), None)
+        elif event.type == 'broadcast':
+            sender = getattr(event.message, 'from')
+            if sender == self.node_id:
+                return
+            receive_request = town_pb2.ReceiveMessageRequest(
+                content=event.message.content,
+                type='broadcast',
+                timestamp=event.message.timestamp
+            )
+            setattr(receive_request, 'from', sender)
+            self.ReceiveMessage(receive_request, None)
+        elif event.type == 'node_registered':
+            self.directory.update(event.node)
+        elif event.type == 'missed':
+            # 错过的事件无法补发，按当前Time重新同步；目录下次使用时重新获取
+            self.directory.invalidate()
+            self.sync_time(channel_pool.get_stub(self.coordinator_address, town_pb2_grpc.TimeCoordinatorStub))
+    
+    @persists_state
     def CreateVillager(self, request, context):
         """Create/初始化Villager"""
         try:
@@ -67,32 +212,27 @@ class VillagerNodeService(town_pb2_grpc.VillagerNodeServicer):
             )
     
     def GetInfo(self, request, context):
-        """GetVillagerinformation"""
+        """GetVillagerinformation（request.field_mask: 只返回这些字段）"""
         if not self.villager:
             context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
             context.set_details('Villager not initialized')
             return town_pb2.VillagerInfo()
         
-        # 转换Inventory
-        inventory = town_pb2.Inventory(
-            money=self.villager.inventory.money,
-            items=self.villager.inventory.items
-        )
-        
-        return town_pb2.VillagerInfo(
-            name=self.villager.name,
-            occupation=self.villager.occupation.value,
-            gender=self.villager.gender.value,
-            personality=self.villager.personality,
-            stamina=self.villager.stamina,
-            max_stamina=self.villager.max_stamina,
-            inventory=inventory,
-            action_points=0,  # gRPC版本不使用action系统
-            has_slept=self.villager.has_slept
-        )
+        return self._villager_info(fields_from_mask(request.field_mask))
     
+    def _villager_info(self, fields=None):
+        """当前Villager状态转换为VillagerInfo（fields为None时填充全部字段）"""
+        # 基于缓存的to_dict()，只复制选中的字段
+        data = project(self.villager.to_dict(), fields)
+        return town_pb2.VillagerInfo(**{name: value for name, value in data.items() if name in VILLAGER_INFO_FIELDS})
+    
+    @persists_state
     def Produce(self, request, context):
         """ExecuteProduction"""
+        return self._produce()
+    
+    def _produce(self):
+        """Production（不持久化，供Produce和ExecuteBatch使用）"""
         if not self.villager:
             return town_pb2.Status(success=False, message="Villager not initialized")
         
@@ -137,6 +277,7 @@ class VillagerNodeService(town_pb2_grpc.VillagerNodeServicer):
             message=f"ProductionSuccess: {recipe.output_quantity}x {recipe.output_item}"
         )
     
+    @persists_state
     def Trade(self, request, context):
         """ExecuteTrade
         现在统一使用中心化Trade系统
@@ -165,83 +306,109 @@ class VillagerNodeService(town_pb2_grpc.VillagerNodeServicer):
         """与MerchantTrade
         action: 'buy' 或 'sell'
         """
+        prepared = self._prepare_merchant_trade(item, quantity, action)
+        if isinstance(prepared, town_pb2.Status):
+            return prepared
+        method, trade_request, amount = prepared
+        
         try:
-            channel = grpc.insecure_channel(self.merchant_address)
-            stub = town_pb2_grpc.MerchantNodeStub(channel)
+            # 调用Merchant服务
+            stub = channel_pool.get_stub(self.merchant_address, town_pb2_grpc.MerchantNodeStub)
+            response = getattr(stub, method)(trade_request)
+        except Exception as e:
+            # Merchant没有收到或没有完成请求：退还buy时预扣的Money
+            self._refund_merchant_trade(action, amount)
+            return town_pb2.Status(
+                success=False,
+                message=f"TradeFailed: {str(e)}"
+            )
+        return self._finish_merchant_trade(item, quantity, action, amount, response)
+    
+    def _refund_merchant_trade(self, action, amount):
+        """退还buy时_prepare_merchant_trade预扣的Money（sell不预扣）"""
+        if action == 'buy':
+            self.villager.inventory.add_money(amount)
+    
+    @staticmethod
+    def _merchant_trade_changes(item, quantity, action):
+        """一次成功的Merchant交易对Villager的改动，供Villager.revert()回滚使用"""
+        sign = 1 if action == 'buy' else -1
+        total = MERCHANT_PRICES[action][item] * quantity
+        return {'money': -sign * total, 'items': {item: sign * quantity}}
+    
+    def _prepare_merchant_trade(self, item, quantity, action):
+        """检查Trade条件（buy时先扣Money），返回 (Merchant方法名, 请求, 金额) 或失败的Status"""
+        if action == 'buy':
+            # 从Merchant处Buy
+            if item not in MERCHANT_PRICES['buy']:
+                return town_pb2.Status(success=False, message=f"Merchant不Sell {item}")
             
-            if action == 'buy':
-                # 从Merchant处Buy
-                if item not in MERCHANT_PRICES['buy']:
-                    return town_pb2.Status(success=False, message=f"Merchant不Sell {item}")
-                
-                total_cost = MERCHANT_PRICES['buy'][item] * quantity
-                
-                if not self.villager.inventory.remove_money(total_cost):
-                    return town_pb2.Status(
-                        success=False,
-                        message=f"Money不足 (需要{total_cost}, 拥有{self.villager.inventory.money})"
-                    )
-                
-                # 调用Merchant服务
-                response = stub.BuyItem(town_pb2.BuyFromMerchantRequest(
-                    buyer_id=self.node_id,
-                    item=item,
-                    quantity=quantity
-                ))
-                
-                if response.success:
-                    self.villager.inventory.add_item(item, quantity)
-                    print(f"[Villager-{self.node_id}] {self.villager.name} 从Merchant处Buy {quantity}x {item}, 花费 {total_cost}")
-                    return town_pb2.Status(
-                        success=True,
-                        message=f"BuySuccess: {quantity}x {item}, 花费 {total_cost}"
-                    )
-                else:
-                    # 退款
-                    self.villager.inventory.add_money(total_cost)
-                    return response
+            total_cost = MERCHANT_PRICES['buy'][item] * quantity
             
-            elif action == 'sell':
-                # Sell给Merchant
-                if item not in MERCHANT_PRICES['sell']:
-                    return town_pb2.Status(success=False, message=f"Merchant不收购 {item}")
-                
-                if not self.villager.inventory.has_item(item, quantity):
-                    return town_pb2.Status(
-                        success=False,
-                        message=f"Item不足: {item} (需要{quantity})"
-                    )
-                
-                total_income = MERCHANT_PRICES['sell'][item] * quantity
-                
-                # 调用Merchant服务
-                response = stub.SellItem(town_pb2.SellToMerchantRequest(
-                    seller_id=self.node_id,
-                    item=item,
-                    quantity=quantity
-                ))
-                
-                if response.success:
-                    self.villager.inventory.remove_item(item, quantity)
-                    self.villager.inventory.add_money(total_income)
-                    print(f"[Villager-{self.node_id}] {self.villager.name} 向MerchantSell {quantity}x {item}, 获得 {total_income}")
-                    return town_pb2.Status(
-                        success=True,
-                        message=f"SellSuccess: {quantity}x {item}, 获得 {total_income}"
-                    )
-                else:
-                    return response
+            if not self.villager.inventory.remove_money(total_cost):
+                return town_pb2.Status(
+                    success=False,
+                    message=f"Money不足 (需要{total_cost}, 拥有{self.villager.inventory.money})"
+                )
             
-            channel.close()
+            return 'BuyItem', town_pb2.BuyFromMerchantRequest(
+                buyer_id=self.node_id,
+                item=item,
+                quantity=quantity
+            ), total_cost
+        
+        if action == 'sell':
+            # Sell给Merchant
+            if item not in MERCHANT_PRICES['sell']:
+                return town_pb2.Status(success=False, message=f"Merchant不收购 {item}")
             
-        except Exception as e:
+            if not self.villager.inventory.has_item(item, quantity):
+                return town_pb2.Status(
+                    success=False,
+                    message=f"Item不足: {item} (需要{quantity})"
+                )
+            
+            total_income = MERCHANT_PRICES['sell'][item] * quantity
+            
+            return 'SellItem', town_pb2.SellToMerchantRequest(
+                seller_id=self.node_id,
+                item=item,
+                quantity=quantity
+            ), total_income
+        
+        return town_pb2.Status(success=False, message=f"Unknown trade action: {action}")
+    
+    def _finish_merchant_trade(self, item, quantity, action, amount, response):
+        """根据Merchant的响应完成Trade（Buy失败时退款）"""
+        if action == 'buy':
+            if response.success:
+                self.villager.inventory.add_item(item, quantity)
+                print(f"[Villager-{self.node_id}] {self.villager.name} 从Merchant处Buy {quantity}x {item}, 花费 {amount}")
+                return town_pb2.Status(
+                    success=True,
+                    message=f"BuySuccess: {quantity}x {item}, 花费 {amount}"
+                )
+            # 退款
+            self._refund_merchant_trade(action, amount)
+            return response
+        
+        if response.success:
+            self.villager.inventory.remove_item(item, quantity)
+            self.villager.inventory.add_money(amount)
+            print(f"[Villager-{self.node_id}] {self.villager.name} 向MerchantSell {quantity}x {item}, 获得 {amount}")
             return town_pb2.Status(
-                success=False,
-                message=f"TradeFailed: {str(e)}"
+                success=True,
+                message=f"SellSuccess: {quantity}x {item}, 获得 {amount}"
             )
+        return response
     
+    @persists_state
     def Sleep(self, request, context):
         """Sleep"""
+        return self._sleep()
+    
+    def _sleep(self):
+        """Sleep（不持久化，供Sleep和ExecuteBatch使用）"""
         if not self.villager:
             return town_pb2.Status(success=False, message="Villager not initialized")
         
@@ -277,12 +444,131 @@ class VillagerNodeService(town_pb2_grpc.VillagerNodeServicer):
             message=f"SleepSuccess，恢复Stamina {SLEEP_STAMINA}。{sleep_message}。"
         )
     
+    def _eat(self):
+        """吃面包恢复Stamina"""
+        if not self.villager:
+            return town_pb2.Status(success=False, message="Villager not initialized")
+        
+        old_stamina = self.villager.stamina
+        if not self.villager.eat_bread():
+            return town_pb2.Status(success=False, message="没有面包可以吃")
+        
+        restored = self.villager.stamina - old_stamina
+        print(f"[Villager-{self.node_id}] {self.villager.name} 吃了面包，恢复Stamina {restored}")
+        return town_pb2.Status(success=True, message=f"吃了面包，恢复Stamina {restored}")
+    
+    # ==================== 批量行动 ====================
+    
+    @persists_state
+    def ExecuteBatch(self, request, context):
+        """批量执行一组行动，一次往返完成一个回合
+        
+        默认全部成功或全部回滚：某一步失败时停止，并撤销已执行步骤各自的改动
+        （退款、收回买到的Item、恢复Stamina等），期间其他请求的改动（交易、时间推进）保留
+        （Merchant不记录库存，撤销本地改动即可撤销与Merchant的交易）。
+        best_effort=True 时跳过失败的步骤继续执行。
+        """
+        error = self._batch_check(request)
+        if error is not None:
+            return error
+        
+        results, undo = [], []
+        for index, action in enumerate(request.actions):
+            status, changes = self._batch_step(action, context)
+            if status.success and changes:
+                undo.append(changes)
+            if not self._batch_record(request, results, index, action, status):
+                break
+        
+        return self._batch_response(request, undo, results)
+    
+    def _batch_check(self, request):
+        """检查批量请求，有错误时返回BatchResponse"""
+        if not self.villager:
+            return town_pb2.BatchResponse(success=False, message="Villager not initialized")
+        
+        actions = request.actions
+        if not actions:
+            return town_pb2.BatchResponse(success=False, message="actions不能为空")
+        if len(actions) > MAX_BATCH_ACTIONS:
+            return town_pb2.BatchResponse(success=False, message=f"每批最多 {MAX_BATCH_ACTIONS} 个行动")
+        for index, action in enumerate(actions):
+            if action.type not in BATCH_STEPS:
+                return town_pb2.BatchResponse(
+                    success=False,
+                    message=f"Step {index}: 未知类型 '{action.type}'（可选: {', '.join(BATCH_STEPS)}）"
+                )
+        return None
+    
+    def _batch_record(self, request, results, index, action, status):
+        """记录一步的结果，返回是否继续执行后面的步骤"""
+        results.append(town_pb2.BatchStepResult(
+            index=index, type=action.type, success=status.success, message=status.message
+        ))
+        return status.success or request.best_effort
+    
+    def _batch_response(self, request, undo, results):
+        """汇总批量结果；非best_effort且有失败时按倒序撤销undo中各步的改动"""
+        actions = request.actions
+        failed_at = next((result.index for result in results if not result.success), None)
+        
+        if failed_at is not None and not request.best_effort:
+            # 全部回滚：只撤销本批量自己的改动
+            for changes in reversed(undo):
+                self.villager.revert(changes)
+            for result in results[:-1]:
+                result.rolled_back = True
+            for index in range(failed_at + 1, len(actions)):
+                results.append(town_pb2.BatchStepResult(
+                    index=index, type=actions[index].type, success=False, skipped=True,
+                    message="前面的步骤Failed，未执行"
+                ))
+            message = f"批量执行已回滚: {results[failed_at].message}"
+            print(f"[Villager-{self.node_id}] 批量执行在第 {failed_at} 步回滚: {results[failed_at].message}")
+        else:
+            succeeded = sum(1 for result in results if result.success)
+            message = f"{succeeded}/{len(actions)} 步Success"
+        
+        return town_pb2.BatchResponse(
+            success=failed_at is None,
+            message=message,
+            results=results,
+            villager=self._villager_info()
+        )
+    
+    def _batch_step(self, action, context):
+        """执行单个批量步骤，返回 (Status, 该步的改动)，改动供Villager.revert()回滚使用"""
+        stamina = self.villager.stamina
+        if action.type == 'produce':
+            recipe = PRODUCTION_RECIPES.get(self.villager.occupation)
+            status = self._produce()
+            if not status.success:
+                return status, None
+            items = {item: -quantity for item, quantity in recipe.input_items.items()}
+            items[recipe.output_item] = items.get(recipe.output_item, 0) + recipe.output_quantity
+            return status, {'items': items, 'stamina': -recipe.stamina_cost}
+        if action.type == 'sleep':
+            status = self._sleep()
+            return status, {'stamina': self.villager.stamina - stamina, 'slept': True}
+        if action.type == 'eat':
+            status = self._eat()
+            return status, {'items': {'bread': -1}, 'stamina': self.villager.stamina - stamina}
+        # trade: 与Merchant交易
+        if action.action not in ('buy', 'sell'):
+            return town_pb2.Status(success=False, message=f"Unknown trade action: {action.action}"), None
+        status = self._trade_with_merchant(action.item, action.quantity, action.action, context)
+        if not status.success:
+            return status, None
+        return status, self._merchant_trade_changes(action.item, action.quantity, action.action)
+    
+    @persists_state
     def OnTimeAdvance(self, request, context):
         """TimeAdvanceNotify"""
         if not self.villager:
             return town_pb2.Status(success=True, message="No villager")
         
         new_time = request.new_time
+        self.game_time = {'day': new_time.day, 'time_of_day': new_time.time_of_day}
         print(f"[Villager-{self.node_id}] TimeAdvance: Day {new_time.day} {new_time.time_of_day}")
         
         # 如果是新的一天（早晨）
@@ -299,6 +585,7 @@ class VillagerNodeService(town_pb2_grpc.VillagerNodeServicer):
         
         return town_pb2.Status(success=True, message="Time updated")
     
+    @persists_state
     def TradeExecute(self, request, context):
         """TradeExecute（原子操作）"""
         if not self.villager:
@@ -353,8 +640,9 @@ class VillagerNodeService(town_pb2_grpc.VillagerNodeServicer):
         except Exception as e:
             return town_pb2.Status(success=False, message=f"Execute failed: {str(e)}")
     
+    @persists_state
     def SendMessage(self, request, context):
-        """SendMessage"""
+        """SendMessage（Broadcast时用future并发投递给所有在线Villager）"""
         try:
             if not self.villager:
                 return town_pb2.SendMessageResponse(
@@ -362,116 +650,58 @@ class VillagerNodeService(town_pb2_grpc.VillagerNodeServicer):
                     message="Villager未初始化"
                 )
             
-            import time
             self.message_counter += 1
             message_id = f"msg_{self.message_counter}"
+            receive_request = self._receive_request(request)
             
             # 如果是BroadcastMessage
             if request.type == 'broadcast':
-                # Send给所有在线VillagerNode
-                sent_count = 0
                 try:
-                    import town_pb2_grpc
-                    import grpc
-                    
-                    # Connecting tocoordinator获取所有在线Villager
-                    coordinator_channel = grpc.insecure_channel('localhost:50051')
-                    coordinator_stub = town_pb2_grpc.TimeCoordinatorStub(coordinator_channel)
-                    
-                    nodes_response = coordinator_stub.ListNodes(town_pb2.Empty())
-                    coordinator_channel.close()
-                    
-                    # Send给所有VillagerNode
-                    for node in nodes_response.nodes:
-                        if node.node_type == 'villager' and node.node_id != self.node_id:
-                            try:
-                                # Connecting to目标VillagerNode
-                                target_channel = grpc.insecure_channel(node.address)
-                                target_stub = town_pb2_grpc.VillagerNodeStub(target_channel)
-                                
-                                # 调用目标Node的ReceiveMessage方法
-                                receive_request = town_pb2.ReceiveMessageRequest(
-                                    content=request.content,
-                                    type='broadcast',
-                                    timestamp=int(time.time())
-                                )
-                                # Setfrom字段（因为from是Python关键字）
-                                setattr(receive_request, 'from', self.node_id)
-                                response = target_stub.ReceiveMessage(receive_request)
-                                
-                                if response.success:
-                                    sent_count += 1
-                                
-                                target_channel.close()
-                            except Exception as e:
-                                print(f"[Villager-{self.node_id}] SendBroadcastMessage到 {node.node_id} Failed: {e}")
-                                continue
-                    
-                    print(f"[Villager-{self.node_id}] BroadcastMessageSend给 {sent_count} 个Node")
-                    
-                except Exception as e:
-                    print(f"[Villager-{self.node_id}] 获取在线VillagerFailed: {e}")
+                    targets = self._directory().villagers(exclude=self.node_id)
+                except grpc.RpcError as e:
+                    print(f"[Villager-{self.node_id}] 获取在线VillagerFailed: {e.details()}")
+                    targets = []
+                
+                # 先发出所有调用，再逐个收集结果：总耗时取决于最慢的Node
+                pending = [
+                    (node, channel_pool.get_stub(node.address, town_pb2_grpc.VillagerNodeStub)
+                           .ReceiveMessage.future(receive_request, timeout=DELIVERY_TIMEOUT))
+                    for node in targets
+                ]
+                sent_count = 0
+                for node, future in pending:
+                    try:
+                        if future.result().success:
+                            sent_count += 1
+                    except grpc.RpcError as e:
+                        print(f"[Villager-{self.node_id}] SendBroadcastMessage到 {node.node_id} Failed: {e.details()}")
+                
+                print(f"[Villager-{self.node_id}] BroadcastMessageSend给 {sent_count} 个Node")
                 
             else:
                 # P2PMessage，Send给指定目标
                 try:
-                    import town_pb2_grpc
-                    import grpc
-                    
-                    # Connecting tocoordinator获取目标Villager地址
-                    coordinator_channel = grpc.insecure_channel('localhost:50051')
-                    coordinator_stub = town_pb2_grpc.TimeCoordinatorStub(coordinator_channel)
-                    
-                    nodes_response = coordinator_stub.ListNodes(town_pb2.Empty())
-                    coordinator_channel.close()
+                    target = self._lookup(request.target)
+                    if target is None:
+                        return town_pb2.SendMessageResponse(
+                            success=False,
+                            message=f"找不到目标Villager: {request.target}"
+                        )
                     
-                    # 查找目标Villager
-                    target_address = None
-                    for node in nodes_response.nodes:
-                        if node.node_id == request.target:
-                            target_address = node.address
-                            break
+                    target_stub = channel_pool.get_stub(target.address, town_pb2_grpc.VillagerNodeStub)
+                    response = target_stub.ReceiveMessage(receive_request, timeout=DELIVERY_TIMEOUT)
                     
-                    if target_address:
-                        # Send给目标Villager
-                        try:
-                            target_channel = grpc.insecure_channel(target_address)
-                            target_stub = town_pb2_grpc.VillagerNodeStub(target_channel)
-                            
-                            # 调用目标Node的ReceiveMessage方法
-                            receive_request = town_pb2.ReceiveMessageRequest(
-                                content=request.content,
-                                type='private',
-                                timestamp=int(time.time())
-                            )
-                            # Setfrom字段（因为from是Python关键字）
-                            setattr(receive_request, 'from', self.node_id)
-                            response = target_stub.ReceiveMessage(receive_request)
-                            
-                            if response.success:
-                                print(f"[Villager-{self.node_id}] P2PMessageSend给 {request.target}")
-                            else:
-                                return town_pb2.SendMessageResponse(
-                                    success=False,
-                                    message=f"SendFailed: {response.message}"
-                                )
-                            
-                            target_channel.close()
-                        except Exception as e:
-                            return town_pb2.SendMessageResponse(
-                                success=False,
-                                message=f"SendFailed: {str(e)}"
-                            )
-                    else:
+                    if not response.success:
                         return town_pb2.SendMessageResponse(
                             success=False,
-                            message=f"找不到目标Villager: {request.target}"
+                            message=f"SendFailed: {response.message}"
                         )
-                        
-                except Exception as e:
+                    print(f"[Villager-{self.node_id}] P2PMessageSend给 {request.target}")
+                
+                except grpc.RpcError as e:
                     return town_pb2.SendMessageResponse(
                         success=False,
-                        message=f"SendFailed: {str(e)}"
+                        message=f"SendFailed: {e.details()}"
                     )
             
             return town_pb2.SendMessageResponse(
@@ -486,6 +716,33 @@ class VillagerNodeService(town_pb2_grpc.VillagerNodeServicer):
                 message=f"SendMessageFailed: {str(e)}"
             )
     
+    def _receive_request(self, request):
+        """SendMessageRequest -> 投递给目标Node的ReceiveMessageRequest"""
+        receive_request = town_pb2.ReceiveMessageRequest(
+            content=request.content,
+            type='broadcast' if request.type == 'broadcast' else 'private',
+            timestamp=int(time.time())
+        )
+        # Setfrom字段（因为from是Python关键字）
+        setattr(receive_request, 'from', self.node_id)
+        return receive_request
+    
+    def _directory(self):
+        """Node目录，过期时从Coordinator重新获取"""
+        if self.directory.stale():
+            coordinator_stub = channel_pool.get_stub(self.coordinator_address, town_pb2_grpc.TimeCoordinatorStub)
+            self.directory.replace(coordinator_stub.ListNodes(town_pb2.Empty(), timeout=DELIVERY_TIMEOUT).nodes)
+        return self.directory
+    
+    def _lookup(self, node_id):
+        """查找目标Node；缓存中没有时（可能刚注册）强制刷新一次"""
+        node = self._directory().get(node_id)
+        if node is None:
+            self.directory.invalidate()
+            node = self._directory().get(node_id)
+        return node
+    
+    @persists_state
     def ReceiveMessage(self, request, context):
         """ReceiveMessage（由其他VillagerNode调用）"""
         try:
@@ -555,21 +812,22 @@ class VillagerNodeService(town_pb2_grpc.VillagerNodeServicer):
     
 
 
-def serve(port, node_id, coordinator_addr='localhost:50051'):
-    """启动Villager服务器"""
-    # 启动gRPC服务器
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    villager_service = VillagerNodeService(node_id)
-    town_pb2_grpc.add_VillagerNodeServicer_to_server(villager_service, server)
-    server.add_insecure_port(f'[::]:{port}')
-    server.start()
-    
-    print(f"[Villager-{node_id}] VillagerNodestarting on port {port}")
-    
-    # Register to coordinator
+def create_service(node_id, coordinator_addr, state_dir=None, service_class=None):
+    """创建Villager服务并恢复持久化状态"""
+    state_store = StateStore(state_dir, node_id) if state_dir else None
+    villager_service = (service_class or VillagerNodeService)(node_id, state_store)
+    villager_service.coordinator_address = coordinator_addr
+    villager_service.restore_state()
+    if state_store is not None:
+        state_store.start_periodic_snapshots()
+    return villager_service
+
+
+def join_town(villager_service, port, coordinator_addr):
+    """Register to coordinator、补齐Time并订阅事件，返回EventSubscriber"""
+    node_id = villager_service.node_id
     try:
-        channel = grpc.insecure_channel(coordinator_addr)
-        stub = town_pb2_grpc.TimeCoordinatorStub(channel)
+        stub = channel_pool.get_stub(coordinator_addr, town_pb2_grpc.TimeCoordinatorStub)
         
         response = stub.RegisterNode(town_pb2.RegisterNodeRequest(
             node_id=node_id,
@@ -582,10 +840,33 @@ def serve(port, node_id, coordinator_addr='localhost:50051'):
         else:
             print(f"[Villager-{node_id}] Registration failed: {response.message}")
         
-        channel.close()
+        villager_service.sync_time(stub)
     except Exception as e:
         print(f"[Villager-{node_id}] 无法Connecting toCoordinator {coordinator_addr}: {e}")
     
+    # 通过事件流接收TimeAdvance和BroadcastMessage
+    return EventSubscriber(
+        coordinator_addr, villager_service.handle_event,
+        node_id=node_id, types=('time_advance', 'broadcast', 'node_registered')
+    ).start()
+
+
+def serve(port, node_id, coordinator_addr='localhost:50051', state_dir=None, merchant_addr='localhost:50052'):
+    """启动Villager服务器"""
+    # 先恢复持久化状态，再注册，使Node以同一Villager身份重新加入
+    villager_service = create_service(node_id, coordinator_addr, state_dir)
+    villager_service.merchant_address = merchant_addr
+    
+    # 启动gRPC服务器
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    town_pb2_grpc.add_VillagerNodeServicer_to_server(villager_service, server)
+    server.add_insecure_port(f'[::]:{port}')
+    server.start()
+    
+    print(f"[Villager-{node_id}] VillagerNodestarting on port {port}")
+    
+    subscriber = join_town(villager_service, port, coordinator_addr)
+    
     # 使用纯gRPCMessage系统
     print(f"[Villager-{node_id}] 使用纯gRPCMessage系统，无需HTTP服务器")
     
@@ -596,7 +877,10 @@ def serve(port, node_id, coordinator_addr='localhost:50051'):
             time.sleep(86400)
     except KeyboardInterrupt:
         print(f"\n[Villager-{node_id}] 关闭服务器...")
+        subscriber.stop()
         server.stop(0)
+        if villager_service.state_store is not None:
+            villager_service.state_store.close()
 
 
 if __name__ == '__main__':
@@ -606,7 +890,11 @@ if __name__ == '__main__':
     parser.add_argument('--id', type=str, required=True, help='NodeID')
     parser.add_argument('--coordinator', type=str, default='localhost:50051',
                        help='Coordinator地址')
+    parser.add_argument('--merchant', type=str, default='localhost:50052',
+                       help='Merchant地址')
+    parser.add_argument('--state-dir', type=str, default=os.getenv('VILLAGER_STATE_DIR'),
+                       help='状态快照和变更日志目录（启用热重启）')
     args = parser.parse_args()
     
-    serve(args.port, args.id, args.coordinator)
+    serve(args.port, args.id, args.coordinator, args.state_dir, args.merchant)
 
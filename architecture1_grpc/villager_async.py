@@ -0,0 +1,213 @@
+"""
+VillagerNode (grpc.aio) - Architecture 1 (gRPC)
+与villager.py相同的服务和状态，运行在grpc.aio上：与Merchant、Coordinator和其他Villager的
+出站调用（Trade、ExecuteBatch中的Trade步骤、SendMessage）不再占用工作线程，
+Broadcast并发发送给所有Villager。没有出站调用的RPC直接复用villager.py中的实现。
+"""
+
+import asyncio
+import functools
+import os
+import sys
+
+import grpc
+
+sys.path.insert(0, os.path.dirname(__file__))
+import town_pb2
+import town_pb2_grpc
+import channel_pool
+import villager as core
+from aio_support import aio_servicer
+
+OUTBOUND_TIMEOUT = 5.0  # 秒，单个出站调用的deadline
+
+
+def persists_state(method):
+    """RPC返回后持久化Villager状态（async版本）"""
+    @functools.wraps(method)
+    async def wrapper(self, request, context):
+        try:
+            return await method(self, request, context)
+        finally:
+            self._persist_state()
+    return wrapper
+
+
+class AsyncVillagerNodeService(core.VillagerNodeService):
+    """有出站调用的RPC用async重写，其余复用VillagerNodeService"""
+
+    @persists_state
+    async def Trade(self, request, context):
+        """ExecuteTrade（只支持与Merchant交易，与同步版本一致）"""
+        if not self.villager:
+            return town_pb2.Status(success=False, message="Villager not initialized")
+
+        if request.target_node == 'merchant':
+            # price==0表示buy
+            action = 'buy' if request.price == 0 else 'sell'
+            status, _ = await self._trade_with_merchant_async(request.item, request.quantity, action)
+            return status
+        return town_pb2.Status(
+            success=False,
+            message="Villager间Trade请使用交互式CLI或AI Agent"
+        )
+
+    async def _trade_with_merchant_async(self, item, quantity, action):
+        """与MerchantTrade，action: 'buy' 或 'sell'；返回 (Status, 改动)，改动同_batch_step，失败时为None"""
+        prepared = self._prepare_merchant_trade(item, quantity, action)
+        if isinstance(prepared, town_pb2.Status):
+            return prepared, None
+        method, trade_request, amount = prepared
+
+        try:
+            stub = channel_pool.get_aio_stub(self.merchant_address, town_pb2_grpc.MerchantNodeStub)
+            response = await getattr(stub, method)(trade_request, timeout=OUTBOUND_TIMEOUT)
+        except Exception as e:
+            # 退还buy时预扣的Money
+            self._refund_merchant_trade(action, amount)
+            return town_pb2.Status(
+                success=False,
+                message=f"TradeFailed: {str(e)}"
+            ), None
+        status = self._finish_merchant_trade(item, quantity, action, amount, response)
+        if not status.success:
+            return status, None
+        return status, self._merchant_trade_changes(item, quantity, action)
+
+    @persists_state
+    async def ExecuteBatch(self, request, context):
+        """批量执行一组行动（语义同VillagerNodeService.ExecuteBatch）"""
+        error = self._batch_check(request)
+        if error is not None:
+            return error
+
+        results, undo = [], []
+        for index, action in enumerate(request.actions):
+            if action.type == 'trade' and action.action in ('buy', 'sell'):
+                status, changes = await self._trade_with_merchant_async(action.item, action.quantity, action.action)
+            else:
+                status, changes = self._batch_step(action, context)
+            if status.success and changes:
+                undo.append(changes)
+            if not self._batch_record(request, results, index, action, status):
+                break
+
+        return self._batch_response(request, undo, results)
+
+    @persists_state
+    async def SendMessage(self, request, context):
+        """SendMessage（Broadcast时并发发送给所有在线Villager）"""
+        if not self.villager:
+            return town_pb2.SendMessageResponse(
+                success=False,
+                message="Villager未初始化"
+            )
+
+        self.message_counter += 1
+        message_id = f"msg_{self.message_counter}"
+        receive_request = self._receive_request(request)
+
+        if request.type == 'broadcast':
+            try:
+                targets = (await self._directory_async()).villagers(exclude=self.node_id)
+            except grpc.aio.AioRpcError as e:
+                print(f"[Villager-{self.node_id}] 获取在线VillagerFailed: {e.details()}")
+                targets = []
+            results = await asyncio.gather(
+                *(self._deliver(node.address, receive_request) for node in targets),
+                return_exceptions=True
+            )
+            sent_count = 0
+            for node, result in zip(targets, results):
+                if isinstance(result, Exception):
+                    print(f"[Villager-{self.node_id}] SendBroadcastMessage到 {node.node_id} Failed: {result}")
+                elif result.success:
+                    sent_count += 1
+            print(f"[Villager-{self.node_id}] BroadcastMessageSend给 {sent_count} 个Node")
+        else:
+            try:
+                target = (await self._directory_async()).get(request.target)
+                if target is None:
+                    # 缓存中没有时（可能刚注册）强制刷新一次
+                    self.directory.invalidate()
+                    target = (await self._directory_async()).get(request.target)
+                if target is None:
+                    return town_pb2.SendMessageResponse(
+                        success=False,
+                        message=f"找不到目标Villager: {request.target}"
+                    )
+                response = await self._deliver(target.address, receive_request)
+            except grpc.aio.AioRpcError as e:
+                return town_pb2.SendMessageResponse(success=False, message=f"SendFailed: {e.details()}")
+            if not response.success:
+                return town_pb2.SendMessageResponse(success=False, message=f"SendFailed: {response.message}")
+            print(f"[Villager-{self.node_id}] P2PMessageSend给 {request.target}")
+
+        return town_pb2.SendMessageResponse(
+            success=True,
+            message="MessageSendSuccess",
+            message_id=message_id
+        )
+
+    async def _directory_async(self):
+        """Node目录，过期时从Coordinator重新获取"""
+        if self.directory.stale():
+            coordinator_stub = channel_pool.get_aio_stub(self.coordinator_address, town_pb2_grpc.TimeCoordinatorStub)
+            self.directory.replace((await coordinator_stub.ListNodes(town_pb2.Empty(), timeout=core.DELIVERY_TIMEOUT)).nodes)
+        return self.directory
+
+    def _deliver(self, address, receive_request):
+        """调用目标Node的ReceiveMessage（返回awaitable）"""
+        stub = channel_pool.get_aio_stub(address, town_pb2_grpc.VillagerNodeStub)
+        return stub.ReceiveMessage(receive_request, timeout=core.DELIVERY_TIMEOUT)
+
+
+async def serve(port, node_id, coordinator_addr='localhost:50051', state_dir=None, merchant_addr='localhost:50052'):
+    """启动Villager服务器（运行直到被取消）"""
+    # 先恢复持久化状态，再注册，使Node以同一Villager身份重新加入
+    villager_service = core.create_service(node_id, coordinator_addr, state_dir, AsyncVillagerNodeService)
+    villager_service.merchant_address = merchant_addr
+
+    server = grpc.aio.server()
+    town_pb2_grpc.add_VillagerNodeServicer_to_server(
+        aio_servicer(villager_service, town_pb2_grpc.VillagerNodeServicer), server
+    )
+    server.add_insecure_port(f'[::]:{port}')
+    await server.start()
+
+    print(f"[Villager-{node_id}] VillagerNodestarting on port {port} (grpc.aio)")
+
+    # 注册、补齐Time和事件订阅使用同步客户端，放到线程中执行
+    subscriber = await asyncio.get_running_loop().run_in_executor(
+        None, core.join_town, villager_service, port, coordinator_addr
+    )
+
+    print(f"[Villager-{node_id}] 使用 Ctrl+C 停止服务器")
+
+    try:
+        await server.wait_for_termination()
+    finally:
+        subscriber.stop()
+        await server.stop(0)
+        await channel_pool.close_all_aio()
+        if villager_service.state_store is not None:
+            villager_service.state_store.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='VillagerNode服务 (grpc.aio)')
+    parser.add_argument('--port', type=int, required=True, help='监听端口')
+    parser.add_argument('--id', type=str, required=True, help='NodeID')
+    parser.add_argument('--coordinator', type=str, default='localhost:50051',
+                       help='Coordinator地址')
+    parser.add_argument('--merchant', type=str, default='localhost:50052',
+                       help='Merchant地址')
+    parser.add_argument('--state-dir', type=str, default=os.getenv('VILLAGER_STATE_DIR'),
+                       help='状态快照和变更日志目录（启用热重启）')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.port, args.id, args.coordinator, args.state_dir, args.merchant))
+    except KeyboardInterrupt:
+        print(f"\n[Villager-{args.id}] 关闭服务器...")
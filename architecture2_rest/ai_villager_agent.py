@@ -4,25 +4,234 @@ AI Agent Villager - GPT-based intelligent villager agent
 Can automatically read states and decide what to do during the current period
 """
 
-import requests
 import json
 import time
 import threading
 import os
 import sys
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
 from typing import Dict, List, Optional, Any
 import openai
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from common import http_client
+from common.context_collector import ContextCollector
+from common.town_directory import merge_read
+from common.decision_cache import DecisionCache, decision_key
+from common.decision_history import DecisionHistory
+from common.models import MERCHANT_PRICES, NO_SLEEP_PENALTY, PRODUCTION_RECIPES, Occupation, Villager
+from common.llm_backends import BACKENDS, HedgedBackend, LLM_TIMEOUT, LLMBackend, OpenAIBackend, create_backend
+from common.prompt_builder import DEFAULT_BUDGET, PromptBuilder
+
+# Context sources that rarely change are cached (and dropped when the time period changes)
+PRICES_TTL = 60.0   # seconds
+MARKET_TTL = 300.0  # trade recommendations are matched once per period
+
+# Event-driven decision loop: wake on node events, decide again after max-idle at the latest
+EVENT_POLL_TIMEOUT = 25.0   # seconds a GET /events long-poll is held open
+EVENT_DEBOUNCE = 0.5        # quiet time to wait after an event so a burst triggers one decision
+MAX_DEBOUNCE = 2.0          # upper bound on that wait
+EVENT_RETRY_DELAY = 2.0     # seconds before re-polling a node that could not be reached
+
+# Decisions that only read information: their result reaches the model through the
+# observation history, not the state, so replaying them from the cache would loop
+UNCACHED_ACTIONS = {'price', 'trades', 'mytrades', 'send'}
+
+# Actions that use up the period; after any other successful action (buy, eat, trade...)
+# the agent decides again straight away, up to MAX_FOLLOWUPS times in a row
+PERIOD_ACTIONS = {'produce', 'sleep', 'idle', 'batch'}
+MAX_FOLLOWUPS = 3
+
+# Fast path: forced decisions settled by rules without the LLM (same thresholds as the system prompt)
+EAT_STAMINA = 35    # eat bread at or below this
+SLEEP_STAMINA = 45  # sleep in the evening at or below this
+
+MESSAGE_CHARS = 120  # longer message contents are clipped
+
+
+# ReAct system prompt. Sent first and byte-identical on every call, so providers can
+# cache it as a prompt prefix; everything that changes goes in the user prompt.
+REACT_SYSTEM_PROMPT = """You are a **ReAct Villager Agent** in the *Distributed Virtual Town* simulation.
+
+You must follow the ReAct (Reasoning + Acting) pattern:
+
+**THOUGHT**: Analyze the current situation, consider your goals, and reason about what action to take.
+**ACTION**: Execute exactly one command based on your reasoning.
+**OBSERVATION**: The result of your action will be provided for the next cycle.
+
+## Available Actions:
+- `buy <item> <quantity>` - Buy from merchant (no action cost)
+- `sell <item> <quantity>` - Sell to merchant (no action cost)  
+- `eat` - Eat bread to restore stamina (no action cost) **⚠️ REQUIRES BREAD IN INVENTORY!**
+- `produce` - Produce items (consumes action point + stamina)
+- `sleep` - Sleep to restore stamina (consumes action point, evening only, REQUIRES HOUSE OR TEMP_ROOM!)
+- `idle` - Skip current segment (consumes action point)
+- `price` - Check merchant prices (no action cost)
+- `mytrades` - Check all trade requests (sent and received) (no action cost) - **READ ONLY**
+- `trade <node_id> <buy/sell> <item> <quantity> <total_price>` - **SEND trade request to villager** 
+  **⚠️ IMPORTANT: Use node_id (like 'node1', 'node2') NOT villager names!**
+- `accept <trade_id>` - Accept received trade request (receiver only)
+- `reject <trade_id>` - Reject received trade request (receiver only)
+- `cancel <trade_id>` - Cancel your own trade request (initiator only)
+- `confirm <trade_id>` - Confirm trade (both parties must confirm to complete)
+- `send <node_id> <message>` - Send message to another villager
+  **⚠️ IMPORTANT: Use node_id (like 'node1', 'node2') NOT villager names!**
+
+## Game Rules:
+- Each time segment allows ONE main action (produce/sleep/idle)
+- Trading and eating don't consume action points
+- Stamina: 0-100, work consumes stamina, sleep restores stamina
+- Hunger: -10 stamina daily, -20 extra if no sleep at night
+- **CRITICAL: Sleep requires a HOUSE or TEMP_ROOM! Temp room costs 15 gold (affordable!) and lasts 1 day.**
+- **IMPORTANT: Buy and produce are SEPARATE decisions! Buy resources first, then produce in the next decision.**
+- **ACTION SUBMISSION STATUS: If you have already submitted your action for this time segment, you can still:**
+  - Respond to trade requests (accept/reject)
+  - Send and read messages
+  - Eat bread to restore stamina
+  - Check prices and trades
+  - **Send new trade requests to other villagers**
+  - **BUT CANNOT: produce, sleep, buy, sell, or idle (these consume action points)**
+  - **IMPORTANT: Trading is ALWAYS allowed, even after submitting actions!**
+
+## Priority Order (CRITICAL - Follow This Order):
+1. **SURVIVAL**: 
+   - Eat if stamina ≤ 35
+   - ⚠️ **EVENING/NIGHT WITHOUT HOUSE**: Buy temp_room (15 gold) BEFORE sleeping!
+   - Sleep if night and stamina ≤ 45 (requires house/temp_room)
+
+2. **CONFIRM TRADES**: ⚠️ Check `mytrades` and `trades` for status="accepted" → USE `confirm <trade_id>`!
+
+3. **CHECK PRICES** (if not checked recently):
+   - Look at PREVIOUS OBSERVATIONS first
+   - If last 2-3 decisions include "PRICE" action → prices already known, can skip
+   - Recommended to check once before making economic decisions
+   - Prices are stable within the same day
+
+4. **ACQUIRE RESOURCES**: Buy materials from merchant if needed
+   - Recommended to check prices first (Step 3) for informed decisions
+   - Knowing prices helps optimize spending
+
+5. **PRODUCTION**: Produce items if you have materials and stamina ≥ 20
+
+6. **TRADING**: 
+   - First: Handle received trade requests (accept/reject)
+   - Then: Send P2P trade requests (recommended to use prices from step 3)
+   - Format: `trade <node_id> <buy/sell> <item> <quantity> <price>`
+   - Knowing current prices helps make fair offers
+
+7. **COMMUNICATION**: For non-trade coordination when needed
+
+8. **IDLE**: When no productive action is currently possible
+
+💡 **Smart Strategy**: Check prices early in your decision cycle
+- Helps you make informed buy/sell/trade decisions
+- Allows you to compare merchant vs P2P options
+- One price check can inform multiple subsequent decisions
+
+## P2P Trading Strategy (HIGH PRIORITY):
+- **ACTIVE SELLING**: If you have products (wheat/bread/houses), ALWAYS try to sell them to villagers FIRST before selling to merchant!
+- **ACTIVE BUYING**: Try to buy materials from villagers at better prices than merchant sell prices
+- **Smart Pricing**: Use prices between merchant buy/sell prices (e.g., merchant buys at 5, sells at 10 → use 7)
+- **Targeting**: Farmers have wheat/seeds, Chefs have bread, Builders have wood
+- **SURVIVAL TRADING**: If you need bread for stamina but don't have any, try buying from chefs!
+- **No Spam**: Don't send duplicate trade requests to the same villager
+- **⚠️ DIRECT TRADING**: Send `trade` command DIRECTLY, NO negotiation messages!
+- **Commands**: `trades`=view received, `mytrades`=view sent, `trade`=send new request
+- **Fallback**: If no response after 2-3 decisions, trade with merchant instead
+- **Examples (DO THIS - USE NODE_ID)**:
+  - Farmer (node1) selling to Chef (node2): `trade node2 sell wheat 5 35` (5 wheat at 7 gold each)
+  - Chef (node2) buying from Farmer (node1): `trade node1 buy wheat 3 21` (3 wheat at 7 gold each)
+  - **SURVIVAL**: Farmer buying bread from Chef: `trade node2 buy bread 2 30` (2 bread at 15 gold each)
+
+## Trading Workflow (Centralized System via Merchant):
+1. **Initiate Phase**: Use `trade` command to create trade request (status: pending)
+2. **Accept/Reject Phase**: Receiver uses `accept` or `reject` on the trade
+   - After `accept`: status changes to "accepted"
+3. **Confirm Phase**: ⚠️ BOTH parties must `confirm` to complete the trade!
+   - Check `mytrades` or `trades` to see if status is "accepted"
+   - If status is "accepted", use `confirm <trade_id>` to finalize
+   - Trade completes only when BOTH parties confirm
+4. **Cancel Phase**: Initiator can use `cancel` before receiver accepts
+
+**TRADE FLOW EXAMPLE** (⚠️ USE NODE_ID, NOT NAME):
+- Alice (node1): `trade node2 buy wheat 3 21` → Creates trade_1
+- Bob (node2): `trades` → Sees trade_1 from Alice
+- Bob: `accept trade_1` → Accepts the trade (resources checked)
+- Bob: `confirm trade_1` → Bob confirms
+- Alice: `confirm trade_1` → Alice confirms → Trade completes automatically!
+
+**CRITICAL POINTS**:
+- **INVENTORY CHECK**: System checks resources when accepting trade
+- **ATOMIC COMPLETION**: Trade completes when BOTH parties confirm
+- **UNIQUE IDs**: All trades have unique IDs managed by Merchant
+- **STATUS TRACKING**: Use `trades` and `mytrades` to monitor trade status
+- **TRADE ID CLARITY**: `trades` shows requests YOU received, `mytrades` shows requests YOU sent
+- **REJECT vs CANCEL**: Receiver uses `reject`, initiator uses `cancel`
+- **PRICE NEGOTIATION**: 
+  * If you RECEIVE a trade with bad price → `reject <trade_id>` + optionally send message with counter-offer
+  * If your SENT trade is rejected → check `mytrades` status, then send new trade with adjusted price
+  * Don't negotiate before sending first trade - let the trade request itself be the first offer!
+- **PRODUCTIVITY FOCUS**: Don't get stuck negotiating - move to actual trades quickly!
+- **NO SPAM**: Don't send duplicate trade requests to the same villager
+
+## Trading Decision Process (Recommended Flow):
+1. **Check prices when needed** (but avoid repeating):
+   - Check PREVIOUS OBSERVATIONS: If you see "PRICE" action recently → prices already known
+   - Use `price` command if you haven't checked recently (within last 2-3 decisions)
+   - Once you know prices, you can use them for multiple decisions
+   - Example: If merchant sells wheat at 10g, you can offer 7-8g for P2P buy
+
+2. **Direct trade requests work well**: Skip lengthy negotiations
+   - Less effective: send node2 "Hi, interested in wheat?" then wait for reply
+   - More effective: After knowing prices, directly send: `trade node2 buy wheat 3 21`
+   - Trade request itself serves as your offer
+
+3. **Smart pricing strategy**: Base your P2P prices on merchant prices
+   - For buying: Offer slightly more than merchant's buy price (e.g., 7g if merchant buys at 5g)
+   - For selling: Ask slightly less than merchant's sell price (e.g., 9g if merchant sells at 10g)
+   - Win-win pricing encourages trades!
+
+4. **Use node_id for trades**: Look at "Online Villagers" list to find node_id (e.g., node1, node2)
+
+5. **Avoid spam**: Don't send duplicate messages or trade requests
+
+## Production & Housing:
+- Farmer: 1 seed → 5 wheat (20 stamina) | Chef: 3 wheat → 2 bread (15 stamina) | Carpenter: 10 wood → 1 house (30 stamina)
+- TEMP_ROOM: 15 gold from the merchant, lasts 1 day | HOUSE: permanent, 260 gold from the merchant or trade with a carpenter
+- Trade status: pending → accepted (BOTH must confirm) → completed; or rejected / cancelled
+- Use `price` to check merchant prices (don't send messages to the merchant)
+
+## Output Format:
+Always follow this exact format:
+
+THOUGHT: [Your reasoning about the current situation and what action to take]
+
+ACTION: [Single command to execute]
+
+Example:
+THOUGHT: I'm a farmer with 0 seeds and 100 stamina. I need seeds to produce wheat. I should buy 1-2 seeds first.
+
+ACTION: buy seed 2
+
+Remember: Only output THOUGHT and ACTION. The OBSERVATION will be provided in the next cycle."""
+
+
 class AIVillagerAgent:
     """AIVillager Agent"""
     
     def __init__(self, villager_port: int, coordinator_port: int = 5000, merchant_port: int = 5001, 
-                 api_key: str = None, model: str = "gpt-4.1", use_react: bool = False):
+                 api_key: str = None, model: str = "gpt-4.1", use_react: bool = False,
+                 decision_cache: Optional[DecisionCache] = None, llm_backend: Optional[LLMBackend] = None,
+                 context_executor: Optional[Executor] = None, prompt_budget: int = DEFAULT_BUDGET,
+                 history_path: Optional[str] = None, fast_path: bool = True, speculate: bool = True,
+                 stream: bool = True):
         self.villager_url = f"http://localhost:{villager_port}"
         self.coordinator_url = f"http://localhost:{coordinator_port}"
         self.merchant_url = f"http://localhost:{merchant_port}"
         self.villager_port = villager_port
+        self.node_id = None  # Filled in on first use by get_node_id()
         
         # OpenAI configuration
         self.api_key = api_key
@@ -30,6 +239,20 @@ class AIVillagerAgent:
         self.use_react = use_react
         if api_key:
             openai.api_key = api_key
+        # Source of decision text (OpenAI unless another backend is given; none without a key)
+        self.llm = llm_backend or (OpenAIBackend(model, api_key) if api_key else None)
+        # Stream replies and act as soon as the ACTION line is complete (see LLMBackend.complete_action)
+        self.stream_replies = stream
+        
+        # Seconds spent in each phase of the last make_decision_and_act()
+        # (context, decide = prompt + llm + parse, execute, total)
+        self.last_timings: Dict[str, float] = {}
+        self.last_action = None
+        self.wants_followup = False  # last decision was a free action that succeeded
+        
+        # Token budget of the decision prompt, and what the last build kept (see PromptBuilder.stats)
+        self.prompt_budget = prompt_budget
+        self.last_prompt_stats: Dict = {}
         
         # Villager Info
         self.villager_info = None
@@ -40,8 +263,31 @@ class AIVillagerAgent:
         self.running = False
         self.decision_thread = None
         
-        # Decision history
-        self.decision_history = []
+        # Events that arrived since the last decision; the loop wakes when one is set
+        self._wake = threading.Event()
+        self._wake_events = []
+        self._wake_lock = threading.Lock()
+        self.event_watchers = []
+        
+        # Forced decisions are settled by rules (see _fast_path_command); counts by how each was made
+        self.fast_path = fast_path
+        self.decision_stats = {'fast_path': 0, 'cached': 0, 'speculative': 0, 'llm': 0}
+        
+        # Speculation: on a time advance, the next decision is made ahead from the predicted
+        # state (see start_speculation) and used if the real state matches
+        self.speculate = speculate
+        self.speculation_stats = {'started': 0, 'committed': 0, 'discarded': 0}
+        self._speculation = None  # (match key, history total, Future of (decision, raw reply))
+        self._speculation_lock = threading.Lock()
+        self.last_context: Optional[Dict] = None
+        self.villager_snapshot: Optional[Dict] = None  # latest villager state seen (context or action reply)
+        
+        # Decision history: recent decisions in memory, full records (with context) to history_path
+        self.decision_history = DecisionHistory(history_path)
+        
+        # LLM decisions by context hash (DECISION_CACHE_PATH: SQLite file shared by agent processes)
+        self.decision_cache = decision_cache or DecisionCache(path=os.getenv('DECISION_CACHE_PATH'))
+        self._last_decision_key = None  # key of the decision being executed, dropped if it fails
         
         # Trade tracking
         self.sent_trades_tracker = {}  # Track sent Trade requests
@@ -49,12 +295,41 @@ class AIVillagerAgent:
         # Message tracking
         self.sent_messages_tracker = []  # Track recently sent Messages
         
+        # Town directory (other villagers' public state), refreshed with ?since=
+        self.directory_cache = {}
+        self.directory_version = None
+        self._directory_lock = threading.Lock()
+        
+        # Decision context, fetched concurrently (on a pool shared by other agents when given)
+        self.context_collector = self._build_context_collector(context_executor)
+        
         print(f"[AI Agent] Initialization complete, connecting to Villager Node: {villager_port}")
     
+    def _build_context_collector(self, executor: Optional[Executor] = None) -> ContextCollector:
+        """Sources of the decision context (all fetched at once, each with its own timeout)"""
+        return (ContextCollector(executor=executor)
+                .add('villager', self.get_villager_status)
+                .add('time', self.get_current_time, default=lambda: 'Unknown')
+                .add('action_status', self.get_action_status)
+                .add('prices', self.get_merchant_prices, ttl=PRICES_TTL)
+                .add('messages', self.get_messages, default=list)
+                .add('trades_received', self.get_trades_received, default=list)
+                .add('trades_sent', self.get_trades_sent, default=list)
+                .add('market', self.get_market_recommendations, default=list, ttl=MARKET_TTL)
+                .add('villagers', self.get_online_villagers, default=list, timeout=10.0))
+    
+    def collect_context(self) -> Dict:
+        """Villager, time, action status, prices, messages, trades, trade recommendations and online villagers"""
+        context = self.context_collector.collect(tick_source='time')
+        self.last_context = context
+        if context.get('villager'):
+            self.villager_snapshot = context['villager']
+        return context
+    
     def check_connection(self) -> bool:
         """Check connection"""
         try:
-            response = requests.get(f"{self.villager_url}/health", timeout=2)
+            response = http_client.get(f"{self.villager_url}/health", timeout=2)
             return response.status_code == 200
         except:
             return False
@@ -62,7 +337,7 @@ class AIVillagerAgent:
     def get_villager_status(self) -> Optional[Dict]:
         """Get Villager Status"""
         try:
-            response = requests.get(f"{self.villager_url}/villager", timeout=5)
+            response = http_client.get(f"{self.villager_url}/villager", timeout=5)
             if response.status_code == 200:
                 return response.json()
             return None
@@ -70,10 +345,21 @@ class AIVillagerAgent:
             print(f"[AI Agent] Failed to get Villager status: {e}")
             return None
     
+    def get_node_id(self) -> Optional[str]:
+        """Own node_id (fetched once with ?fields=node_id; it never changes)"""
+        if self.node_id is None:
+            try:
+                response = http_client.get(f"{self.villager_url}/villager", params={'fields': 'node_id'}, timeout=5)
+                if response.status_code == 200:
+                    self.node_id = response.json().get('node_id')
+            except Exception as e:
+                print(f"[AI Agent] Failed to get node_id: {e}")
+        return self.node_id
+    
     def get_current_time(self) -> str:
         """Get current Time"""
         try:
-            response = requests.get(f"{self.coordinator_url}/time", timeout=5)
+            response = http_client.get(f"{self.coordinator_url}/time", timeout=5)
             if response.status_code == 200:
                 time_data = response.json()
                 return f"Day {time_data['day']} - {time_data['time_of_day']}"
@@ -85,7 +371,7 @@ class AIVillagerAgent:
     def get_action_status(self) -> Optional[Dict]:
         """Get Action Submit Status"""
         try:
-            response = requests.get(f"{self.coordinator_url}/action/status", timeout=5)
+            response = http_client.get(f"{self.coordinator_url}/action/status", timeout=5)
             if response.status_code == 200:
                 return response.json()
             return None
@@ -96,7 +382,7 @@ class AIVillagerAgent:
     def get_merchant_prices(self) -> Optional[Dict]:
         """Get Merchant Prices"""
         try:
-            response = requests.get(f"{self.merchant_url}/prices", timeout=5)
+            response = http_client.get(f"{self.merchant_url}/prices", timeout=5)
             if response.status_code == 200:
                 return response.json()
             return None
@@ -107,13 +393,12 @@ class AIVillagerAgent:
     def get_trades_received(self) -> List[Dict]:
         """Get received Trade requests (from Merchant centralized system)"""
         try:
-            villager_state = self.get_villager_status() or {}
-            my_node_id = villager_state.get('node_id')
+            my_node_id = self.get_node_id()
             
             if not my_node_id:
                 return []
             
-            response = requests.get(f"{self.merchant_url}/trade/list",
+            response = http_client.get(f"{self.merchant_url}/trade/list",
                                   params={'node_id': my_node_id, 'type': 'pending'},
                                   timeout=5)
             if response.status_code == 200:
@@ -126,13 +411,12 @@ class AIVillagerAgent:
     def get_trades_sent(self) -> List[Dict]:
         """Get sent Trade requests (from Merchant centralized system)"""
         try:
-            villager_state = self.get_villager_status() or {}
-            my_node_id = villager_state.get('node_id')
+            my_node_id = self.get_node_id()
             
             if not my_node_id:
                 return []
             
-            response = requests.get(f"{self.merchant_url}/trade/list",
+            response = http_client.get(f"{self.merchant_url}/trade/list",
                                   params={'node_id': my_node_id, 'type': 'sent'},
                                   timeout=5)
             if response.status_code == 200:
@@ -145,7 +429,7 @@ class AIVillagerAgent:
     def get_messages(self) -> List[Dict]:
         """Get Message list"""
         try:
-            response = requests.get(f"{self.villager_url}/messages", timeout=5)
+            response = http_client.get(f"{self.villager_url}/messages", timeout=5)
             if response.status_code == 200:
                 return response.json().get('messages', [])
             return []
@@ -153,179 +437,92 @@ class AIVillagerAgent:
             print(f"[AI Agent] Failed to get Messages: {e}")
             return []
     
-    def get_online_villagers(self) -> List[Dict]:
-        """Get list of online Villagers (including submission status)"""
+    def get_market_recommendations(self) -> List[Dict]:
+        """This villager's side of the trades the coordinator matched town-wide for this period"""
         try:
-            response = requests.get(f"{self.coordinator_url}/nodes", timeout=5)
+            my_node_id = self.get_node_id()
+            
+            if not my_node_id:
+                return []
+            
+            response = http_client.get(f"{self.coordinator_url}/market/recommendations",
+                                  params={'node_id': my_node_id}, timeout=5)
             if response.status_code == 200:
-                nodes_data = response.json()
-                villagers = []
-                for node in nodes_data['nodes']:
-                    if node['node_type'] == 'villager':
-                        # Get detailed Villager status
-                        try:
-                            villager_response = requests.get(f"http://{node['address']}/villager", timeout=3)
-                            if villager_response.status_code == 200:
-                                villager_data = villager_response.json()
-                                villagers.append({
-                                    'node_id': node['node_id'],
-                                    'name': villager_data.get('name', node['node_id']),
-                                    'occupation': villager_data.get('occupation', 'unknown'),
-                                    'has_submitted_action': villager_data.get('has_submitted_action', False),
-                                    'stamina': villager_data.get('stamina', 0),
-                                    'inventory': villager_data.get('inventory', {}),
-                                    'address': node['address']
-                                })
-                            else:
-                                # If unable to get details, use basic info
-                                villagers.append({
-                                    'node_id': node['node_id'],
-                                    'name': node.get('name', node['node_id']),
-                                    'occupation': node.get('occupation', 'unknown'),
-                                    'has_submitted_action': False,
-                                    'stamina': 0,
-                                    'inventory': {},
-                                    'address': node['address']
-                                })
-                        except Exception as e:
-                            # If getting detailed info fails, use basic info
-                            villagers.append({
-                                'node_id': node['node_id'],
-                                'name': node.get('name', node['node_id']),
-                                'occupation': node.get('occupation', 'unknown'),
-                                'has_submitted_action': False,
-                                'stamina': 0,
-                                'inventory': {},
-                                'address': node['address']
-                            })
-                return villagers
+                return response.json().get('trades', [])
             return []
+        except Exception as e:
+            print(f"[AI Agent] Failed to get trade recommendations: {e}")
+            return []
+    
+    def get_online_villagers(self) -> List[Dict]:
+        """Get list of online Villagers (including submission status) from the coordinator's town directory
+        
+        One GET /directory call for all peers; after the first read only entries
+        changed since the last seen version are transferred.
+        """
+        try:
+            with self._directory_lock:
+                params = {} if self.directory_version is None else {'since': self.directory_version}
+                response = http_client.get(f"{self.coordinator_url}/directory", params=params, timeout=5)
+                if response.status_code != 200:
+                    return []
+                result = response.json()
+                merge_read(self.directory_cache, result)
+                self.directory_version = result['version']
+                entries = list(self.directory_cache.values())
+            
+            return [
+                {
+                    'node_id': entry['node_id'],
+                    'name': entry.get('name') or entry['node_id'],
+                    'occupation': entry.get('occupation') or 'unknown',
+                    'has_submitted_action': entry.get('has_submitted_action', False),
+                    'stamina': entry.get('stamina', 0),
+                    'inventory': entry.get('inventory', {}),
+                    'address': entry['address']
+                }
+                for entry in entries
+            ]
         except Exception as e:
             print(f"[AI Agent] Failed to get online Villagers: {e}")
             return []
     
     def analyze_p2p_opportunities(self, context: Dict) -> Dict:
-        """Analyze P2P Trade opportunities"""
+        """Analyze P2P Trade opportunities
+        
+        The coordinator matches surplus and demand of all villagers once per period
+        (see common/trade_matcher.py), so no two agents are pointed at the same units.
+        This turns this villager's side of those trades into opportunities: trades to
+        propose as the seller, and trades to expect (and accept) as the buyer.
+        """
         opportunities = {
             'sell_opportunities': [],
             'buy_opportunities': [],
             'recommendations': []
         }
         
-        villager = context.get('villager', {})
-        occupation = villager.get('occupation')
-        inventory = villager.get('inventory', {})
-        villagers = context.get('villagers', [])
-        prices = context.get('prices', {})
-        
-        # Analyze selling opportunities
-        if occupation == 'farmer' and inventory.get('wheat', 0) > 0:
-            # Farmer sells Wheat to Chef
-            for other_villager in villagers:
-                if other_villager.get('occupation') == 'chef':
-                    other_inventory = other_villager.get('inventory', {})
-                    if other_inventory.get('wheat', 0) < 3:  # Chef needs Wheat
-                        quantity = min(inventory['wheat'], 3 - other_inventory.get('wheat', 0))
-                        if quantity > 0:
-                            target_node_id = other_villager['node_id']
-                            suggested_price = 7
-                            total_price = suggested_price * quantity
-                            
-                            # Check if a similar Trade request has already been sent
-                            if not self.has_sent_trade_request(target_node_id, 'wheat', quantity, total_price):
-                                opportunities['sell_opportunities'].append({
-                                    'target': target_node_id,
-                                    'target_name': other_villager.get('name', 'Unknown'),
-                                    'item': 'wheat',
-                                    'quantity': quantity,
-                                    'suggested_price': suggested_price,
-                                    'total_price': total_price,
-                                    'merchant_buy_price': prices.get('sell', {}).get('wheat', 5),
-                                    'merchant_sell_price': prices.get('buy', {}).get('wheat', 10),
-                                    'negotiation_message': f"Hi! I have {quantity}x wheat to sell for {total_price} gold total ({suggested_price} gold each). This is better than the merchant's buy price of 5 gold each. Would you like to buy?"
-                                })
-        
-        elif occupation == 'chef' and inventory.get('bread', 0) > 2:  # Keep 2 Bread for self-use
-            # Chef sells Bread to other Villagers
-            for other_villager in villagers:
-                if other_villager.get('node_id') != villager.get('node_id'):
-                    other_inventory = other_villager.get('inventory', {})
-                    if other_inventory.get('bread', 0) < 2:  # Other villagers need Bread
-                        quantity = min(inventory['bread'] - 2, 2 - other_inventory.get('bread', 0))
-                        if quantity > 0:
-                            opportunities['sell_opportunities'].append({
-                                'target': other_villager['node_id'],
-                                'target_name': other_villager.get('name', 'Unknown'),
-                                'item': 'bread',
-                                'quantity': quantity,
-                                'suggested_price': 35,  # Between 22.5 (merchant buy) and 45 (merchant sell)
-                                'total_price': 35 * quantity,
-                                'merchant_buy_price': prices.get('sell', {}).get('bread', 22.5),
-                                'merchant_sell_price': prices.get('buy', {}).get('bread', 45)
-                            })
-        
-        elif occupation == 'carpenter' and inventory.get('house', 0) > 0:
-            # Carpenter sells house to villagers without one
-            for other_villager in villagers:
-                if other_villager.get('node_id') != villager.get('node_id'):
-                    other_inventory = other_villager.get('inventory', {})
-                    if other_inventory.get('house', 0) == 0:  # Has no house
-                        opportunities['sell_opportunities'].append({
-                            'target': other_villager['node_id'],
-                            'target_name': other_villager.get('name', 'Unknown'),
-                            'item': 'house',
-                            'quantity': 1,
-                            'suggested_price': 180,  # Between 130 (merchant buy) and 260 (merchant sell)
-                            'total_price': 180,
-                            'merchant_buy_price': prices.get('sell', {}).get('house', 130),
-                            'merchant_sell_price': prices.get('buy', {}).get('house', 260)
-                        })
-        
-        # Analyze buying opportunities
-        if occupation == 'chef' and inventory.get('wheat', 0) < 3:
-            # Chef buys Wheat from Farmer
-            for other_villager in villagers:
-                if other_villager.get('occupation') == 'farmer':
-                    other_inventory = other_villager.get('inventory', {})
-                    if other_inventory.get('wheat', 0) > 0:
-                        quantity = min(3 - inventory.get('wheat', 0), other_inventory['wheat'])
-                        if quantity > 0:
-                            target_node_id = other_villager['node_id']
-                            suggested_price = 7
-                            total_price = suggested_price * quantity
-                            
-                            # Check if a similar Trade request has already been sent
-                            if not self.has_sent_trade_request(target_node_id, 'wheat', quantity, total_price):
-                                opportunities['buy_opportunities'].append({
-                                    'target': target_node_id,
-                                    'target_name': other_villager.get('name', 'Unknown'),
-                                    'item': 'wheat',
-                                    'quantity': quantity,
-                                    'suggested_price': suggested_price,
-                                    'total_price': total_price,
-                                    'merchant_buy_price': prices.get('sell', {}).get('wheat', 5),
-                                    'merchant_sell_price': prices.get('buy', {}).get('wheat', 10),
-                                    'negotiation_message': f"Hi! I'd like to buy {quantity}x wheat from you for {total_price} gold total ({suggested_price} gold each). This is better than the merchant's price of 10 gold each. Are you interested?"
-                                })
-        
-        elif occupation == 'carpenter' and inventory.get('wood', 0) < 10:
-            # Carpenter buys Wood from other Villagers (if available)
-            for other_villager in villagers:
-                if other_villager.get('node_id') != villager.get('node_id'):
-                    other_inventory = other_villager.get('inventory', {})
-                    if other_inventory.get('wood', 0) > 0:
-                        quantity = min(10 - inventory.get('wood', 0), other_inventory['wood'])
-                        if quantity > 0:
-                            opportunities['buy_opportunities'].append({
-                                'target': other_villager['node_id'],
-                                'target_name': other_villager.get('name', 'Unknown'),
-                                'item': 'wood',
-                                'quantity': quantity,
-                                'suggested_price': 7,  # Between 5 (merchant buy) and 10 (merchant sell)
-                                'total_price': 7 * quantity,
-                                'merchant_buy_price': prices.get('sell', {}).get('wood', 5),
-                                'merchant_sell_price': prices.get('buy', {}).get('wood', 10)
-                            })
+        prices = context.get('prices') or {}
+        names = {v.get('node_id'): v.get('name', 'Unknown') for v in context.get('villagers', [])}
+        
+        for trade in context.get('market', []):
+            item = trade['item']
+            opportunity = {
+                'target': trade['partner'],
+                'target_name': names.get(trade['partner'], trade['partner']),
+                'item': item,
+                'quantity': trade['quantity'],
+                'suggested_price': trade['unit_price'],
+                'total_price': trade['price'],
+                'merchant_buy_price': prices.get('sell', {}).get(item, MERCHANT_PRICES['sell'].get(item, 0)),
+                'merchant_sell_price': prices.get('buy', {}).get(item, MERCHANT_PRICES['buy'].get(item, 0))
+            }
+            if trade['role'] == 'propose':
+                # Check if a similar Trade request has already been sent
+                if not self.has_sent_trade_request(trade['partner'], item, trade['quantity'], trade['price']):
+                    opportunities['sell_opportunities'].append(opportunity)
+                    opportunities['recommendations'].append(trade['command'])
+            else:
+                opportunities['buy_opportunities'].append(opportunity)
         
         return opportunities
     
@@ -344,7 +541,6 @@ class AIVillagerAgent:
                 profit_per_item = op['suggested_price'] - op['merchant_buy_price']
                 result.append(f"  → Sell {op['quantity']}x {op['item']} to {op['target_name']} ({op['target']})")
                 result.append(f"    Command: trade {op['target']} sell {op['item']} {op['quantity']} {op['total_price']}")
-                result.append(f"    Negotiation: send {op['target']} \"{op.get('negotiation_message', '')}\"")
                 result.append(f"    Price: {op['suggested_price']} gold each (vs merchant {op['merchant_buy_price']} gold)")
                 result.append(f"    Extra profit: +{profit_per_item * op['quantity']} gold")
                 result.append(f"    ⚠️ IMPORTANT: Use node ID '{op['target']}' not name '{op['target_name']}'")
@@ -357,8 +553,7 @@ class AIVillagerAgent:
             for op in buy_ops:
                 savings_per_item = op['merchant_sell_price'] - op['suggested_price']
                 result.append(f"  → Buy {op['quantity']}x {op['item']} from {op['target_name']} ({op['target']})")
-                result.append(f"    Command: trade {op['target']} buy {op['item']} {op['quantity']} {op['total_price']}")
-                result.append(f"    Negotiation: send {op['target']} \"{op.get('negotiation_message', '')}\"")
+                result.append(f"    {op['target']} will send this trade request: accept <trade_id> when it arrives")
                 result.append(f"    Price: {op['suggested_price']} gold each (vs merchant {op['merchant_sell_price']} gold)")
                 result.append(f"    Savings: -{savings_per_item * op['quantity']} gold")
                 result.append(f"    ⚠️ IMPORTANT: Use node ID '{op['target']}' not name '{op['target_name']}'")
@@ -372,30 +567,11 @@ class AIVillagerAgent:
     def check_villager_status(self, node_id: str) -> Dict:
         """Check the status of the specified Villager"""
         try:
-            # Get node information from Coordinator
-            response = requests.get(f"{self.coordinator_url}/nodes", timeout=5)
-            if response.status_code != 200:
-                return {"error": "Cannot get nodes list"}
-            
-            nodes_data = response.json()
-            target_node = None
-            
-            # Find target node
-            for node in nodes_data['nodes']:
-                if node['node_id'] == node_id:
-                    target_node = node
-                    break
-            
-            if not target_node:
+            # Current public state of the target from the town directory (delta refresh)
+            villager_data = next((v for v in self.get_online_villagers() if v['node_id'] == node_id), None)
+            if villager_data is None:
                 return {"error": f"Node {node_id} not found"}
             
-            # Get detailed status of the target Villager
-            villager_response = requests.get(f"http://{target_node['address']}/villager", timeout=5)
-            if villager_response.status_code != 200:
-                return {"error": f"Cannot get villager status for {node_id}"}
-            
-            villager_data = villager_response.json()
-            
             # Check whether trading is possible
             can_trade = True
             reason = ""
@@ -430,7 +606,7 @@ class AIVillagerAgent:
                 message = f"Hi! I have {quantity}x {item} to sell for {price} gold total ({price//quantity} gold each). This is better than the merchant's buy price of {price//quantity - 2} gold each. Would you like to buy?"
             
             # Send Message
-            response = requests.post(f"{self.villager_url}/messages/send",
+            response = http_client.post(f"{self.villager_url}/messages/send",
                                    json={
                                        'target': target,
                                        'content': message,
@@ -591,7 +767,7 @@ class AIVillagerAgent:
     def create_villager(self, name: str, occupation: str, gender: str, personality: str) -> bool:
         """CreateVillager"""
         try:
-            response = requests.post(
+            response = http_client.post(
                 f"{self.villager_url}/villager",
                 json={
                     'name': name,
@@ -633,30 +809,226 @@ class AIVillagerAgent:
             return items.get('wood', 0) >= 10 and stamina >= 30
         return False
 
+    def _fast_path_command(self, context: Dict):
+        """(reason, command) when the state leaves one sensible move, else None (ask the LLM)
+        
+        Forced: confirming a trade the other side accepted, eating when exhausted,
+        waiting for the time barrier once the action is submitted, sleeping tired in the
+        evening, producing when the recipe can run, buying missing recipe inputs.
+        Open (LLM): trade requests to answer, unread messages, recommended trades, and
+        anything the rules below do not settle.
+        """
+        villager = context.get('villager') or {}
+        items = villager.get('inventory', {}).get('items', {}) or {}
+        money = villager.get('inventory', {}).get('money', 0)
+        stamina = villager.get('stamina', 0)
+        time_info = str(context.get('time', '')).lower()
+        buy_prices = (context.get('prices') or {}).get('buy') or MERCHANT_PRICES['buy']
+        trades_received = context.get('trades_received') or []
+        trades_sent = context.get('trades_sent') or []
+        
+        # The other side accepted: only this villager's confirmation is missing
+        for trades, role in ((trades_received, 'target'), (trades_sent, 'initiator')):
+            for trade in trades:
+                if trade.get('status') == 'accepted' and not trade.get(f'{role}_confirmed', False):
+                    return f"Trade {trade.get('trade_id')} was accepted, confirming it", f"confirm {trade.get('trade_id')}"
+        
+        open_choices = (any(t.get('status') == 'pending' for t in trades_received)
+                        or any(not m.get('read', False) for m in context.get('messages') or [])
+                        or context.get('market'))
+        
+        if villager.get('has_submitted_action', False):
+            if open_choices:
+                return None
+            # produce/sleep/idle are forbidden now; nothing else to handle until time advances
+            return "Action already submitted and nothing to handle, waiting for time to advance", "idle"
+        
+        if stamina <= EAT_STAMINA and items.get('bread', 0) > 0:
+            return f"Stamina is {stamina}, eating bread before anything else", "eat"
+        if open_choices:
+            return None
+        
+        if ('evening' in time_info or 'night' in time_info) and not villager.get('has_slept', False) \
+                and stamina <= SLEEP_STAMINA:
+            if items.get('house', 0) > 0 or items.get('temp_room', 0) > 0:
+                return f"Evening with stamina {stamina}, sleeping to restore it", "sleep"
+            if money >= buy_prices.get('temp_room', MERCHANT_PRICES['buy']['temp_room']):
+                return "Evening without a house, buying a temporary room to sleep", "buy temp_room 1"
+            return None
+        
+        if self._can_produce_now(villager):
+            return "Recipe inputs and stamina are available, producing", "produce"
+        
+        try:
+            recipe = PRODUCTION_RECIPES.get(Occupation(villager.get('occupation', '').lower()))
+        except ValueError:
+            recipe = None
+        if recipe is None or stamina < recipe.stamina_cost:
+            return None
+        for item, required in recipe.input_items.items():
+            missing = required - items.get(item, 0)
+            if missing > 0:
+                cost = missing * buy_prices.get(item, MERCHANT_PRICES['buy'].get(item, 0))
+                if money >= cost:
+                    return f"Missing {missing} {item} for production, buying them for {cost} gold", f"buy {item} {missing}"
+                return None
+        return None
+    
+    def _fast_path_decision(self, context: Dict) -> Optional[Dict]:
+        """Decision settled by _fast_path_command, recorded like an LLM decision, or None"""
+        planned = self._fast_path_command(context)
+        if planned is None:
+            return None
+        reason, command = planned
+        with self._speculation_lock:
+            self._discard_speculation()  # the real state was not the predicted one
+        # Not a cached decision: if it fails, no cache entry is to blame
+        self._last_decision_key = None
+        decision_text = f"THOUGHT: {reason}\nACTION: {command}"
+        decision = self._parse_react_decision(decision_text)
+        print(f"[AI Agent] Fast path (no LLM call): {command}")
+        self.decision_stats['fast_path'] += 1
+        self.decision_history.append({
+            'timestamp': datetime.now().isoformat(),
+            'context': context,
+            'decision': decision,
+            'raw_response': decision_text,
+            'fast_path': True
+        })
+        return decision
+    
+    # ========== Speculative decisions ==========
+    
+    def _predict_after_advance(self, day: int, time_of_day: str) -> Optional[Dict]:
+        """Context expected right after a time advance, from the local snapshots (no requests)
+        
+        The villager gets the node's time advance rules (a missed night's penalty and
+        the daily reset in the morning, a new period otherwise), everyone's action is
+        pending again, and the rest is the last context seen.
+        """
+        last = self.last_context
+        if self.villager_snapshot is None or not last:
+            return None
+        villager = Villager.from_dict(self.villager_snapshot)
+        if time_of_day == 'morning':
+            if not villager.has_slept:
+                villager.consume_stamina(NO_SLEEP_PENALTY)
+            villager.reset_daily()
+        else:
+            villager.reset_time_period()
+        return {
+            **last,
+            'villager': {**villager.to_dict(), 'node_id': self.villager_snapshot.get('node_id')},
+            'time': f"Day {day} - {time_of_day}",
+            'villagers': [{**v, 'has_submitted_action': False} for v in last.get('villagers', [])]
+        }
+    
+    def start_speculation(self, event: Dict, executor: Optional[Executor] = None) -> bool:
+        """On a time advance event: decide the next period ahead, while the loop is still waking up
+        
+        The decision is made from _predict_after_advance() on executor (a thread of
+        its own by default). The next real decision uses it if its context matches
+        the predicted one (_take_speculation), otherwise it is discarded. Returns
+        whether a speculation was started: not when the fast path or the decision
+        cache settles the predicted state anyway.
+        """
+        data = event.get('data') or {}
+        if not self.speculate or self.llm is None or 'day' not in data or 'time_of_day' not in data:
+            return False
+        context = self._predict_after_advance(data['day'], data['time_of_day'])
+        if context is None or (self.fast_path and self._fast_path_command(context) is not None):
+            return False
+        if self.decision_cache.get(self._decision_key(context)) is not None:
+            return False
+        
+        future = Future()
+        with self._speculation_lock:
+            if self._speculation is not None:
+                self._discard_speculation()
+            self._speculation = (self._decision_key(context, with_submitted=False), self.decision_history.total, future)
+            self.speculation_stats['started'] += 1
+        
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self._speculative_decision(context))
+            except Exception as e:
+                future.set_exception(e)
+        
+        if executor is not None:
+            executor.submit(run)
+        else:
+            threading.Thread(target=run, name='speculate', daemon=True).start()
+        print(f"[AI Agent] Time advanced to Day {data['day']} {data['time_of_day']}, deciding ahead")
+        return True
+    
+    def _speculative_decision(self, context: Dict):
+        """(decision, raw reply) for a predicted context; recorded only when committed"""
+        prompt = self._build_react_prompt(context)
+        decision_text = self._complete(self._get_react_system_prompt(), prompt, context, 800)
+        return self._parse_react_decision(decision_text), decision_text
+    
+    def _take_speculation(self, context: Dict):
+        """(decision, raw reply) decided ahead for this context, or None (none, or discarded)
+        
+        It matches when the context has the predicted decision-relevant state
+        (other villagers' submit flags aside) and no decision was recorded since it
+        started. A matching speculation still waiting for a worker is dropped rather
+        than waited for; one in flight is waited for, as it is ahead of a new call.
+        """
+        with self._speculation_lock:
+            speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            return None
+        key, history_total, future = speculation
+        if key != self._decision_key(context, with_submitted=False) or history_total != self.decision_history.total \
+                or future.cancel():
+            self._discard_speculation(speculation)
+            return None
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"[AI Agent] Speculative decision failed: {e}")
+            self.speculation_stats['discarded'] += 1
+            return None
+        self.speculation_stats['committed'] += 1
+        return result
+    
+    def _discard_speculation(self, speculation=None) -> None:
+        """Drop a speculation (the current one by default; its call finishes unused)"""
+        if speculation is None:
+            speculation, self._speculation = self._speculation, None
+            if speculation is None:
+                return
+        speculation[2].cancel()
+        self.speculation_stats['discarded'] += 1
+        print("[AI Agent] Discarding the speculative decision (state differs from the prediction)")
+    
     def execute_action(self, action: str, **kwargs) -> bool:
         """ExecuteAction"""
         try:
             if action == "produce":
-                response = requests.post(f"{self.villager_url}/action/produce", timeout=10)
+                response = http_client.post(f"{self.villager_url}/action/produce", timeout=10)
             elif action == "sleep":
-                response = requests.post(f"{self.villager_url}/action/sleep", timeout=10)
+                response = http_client.post(f"{self.villager_url}/action/sleep", timeout=10)
             elif action == "idle":
-                response = requests.post(f"{self.villager_url}/action/submit", 
+                response = http_client.post(f"{self.villager_url}/action/submit", 
                                        json={'action': 'idle'}, timeout=10)
             elif action == "buy":
                 item = kwargs.get('item')
                 quantity = kwargs.get('quantity')
-                response = requests.post(f"{self.villager_url}/action/trade",
+                response = http_client.post(f"{self.villager_url}/action/trade",
                                        json={'action': 'buy', 'target': 'merchant', 'item': item, 'quantity': quantity}, timeout=10)
             elif action == "sell":
                 item = kwargs.get('item')
                 quantity = kwargs.get('quantity')
-                response = requests.post(f"{self.villager_url}/action/trade",
+                response = http_client.post(f"{self.villager_url}/action/trade",
                                        json={'action': 'sell', 'target': 'merchant', 'item': item, 'quantity': quantity}, timeout=10)
             elif action == "eat":
-                response = requests.post(f"{self.villager_url}/action/eat", timeout=10)
+                response = http_client.post(f"{self.villager_url}/action/eat", timeout=10)
             elif action == "price":
-                response = requests.get(f"{self.merchant_url}/prices", timeout=10)
+                response = http_client.get(f"{self.merchant_url}/prices", timeout=10)
                 if response.status_code == 200:
                     prices_data = response.json()
                     print(f"[AI Agent] MerchantPrice: {prices_data}")
@@ -666,15 +1038,14 @@ class AIVillagerAgent:
                     return False
             elif action == "trades":
                 # Trades received from Merchant query
-                villager_state = self.get_villager_status() or {}
-                my_node_id = villager_state.get('node_id')
+                my_node_id = self.get_node_id()
                 
                 if not my_node_id:
                     print(f"[AI Agent] ✗ Unable to get node_id")
                     return False
                 
                 merchant_url = self.merchant_url
-                response = requests.get(f"{merchant_url}/trade/list",
+                response = http_client.get(f"{merchant_url}/trade/list",
                                       params={'node_id': my_node_id, 'type': 'pending'},
                                       timeout=10)
                 if response.status_code == 200:
@@ -686,15 +1057,14 @@ class AIVillagerAgent:
                     return False
             elif action == "mytrades":
                 # Trades sent from Merchant query
-                villager_state = self.get_villager_status() or {}
-                my_node_id = villager_state.get('node_id')
+                my_node_id = self.get_node_id()
                 
                 if not my_node_id:
                     print(f"[AI Agent] ✗ Unable to get node_id")
                     return False
                 
                 merchant_url = self.merchant_url
-                response = requests.get(f"{merchant_url}/trade/list",
+                response = http_client.get(f"{merchant_url}/trade/list",
                                       params={'node_id': my_node_id, 'type': 'sent'},
                                       timeout=10)
                 if response.status_code == 200:
@@ -736,7 +1106,7 @@ class AIVillagerAgent:
                     print(f"[AI Agent] ✗ Unable to get own node_id")
                     return False
                 
-                nodes_response = requests.get(f"http://{coordinator_addr}/nodes", timeout=5)
+                nodes_response = http_client.get(f"http://{coordinator_addr}/nodes", timeout=5)
                 
                 if nodes_response.status_code != 200:
                     print(f"[AI Agent] ✗ Failed to get node list: HTTP {nodes_response.status_code}")
@@ -757,7 +1127,7 @@ class AIVillagerAgent:
                 
                 # Create trade via Merchant
                 merchant_url = self.merchant_url  # Merchant default port
-                response = requests.post(f"{merchant_url}/trade/create", 
+                response = http_client.post(f"{merchant_url}/trade/create", 
                                         json={
                                             'initiator_id': my_node_id,
                                             'initiator_address': f'localhost:{self.villager_port}',
@@ -783,7 +1153,7 @@ class AIVillagerAgent:
                 target = kwargs.get('target')
                 content = kwargs.get('content')
                 message_type = kwargs.get('type', 'private')
-                response = requests.post(f"{self.villager_url}/messages/send",
+                response = http_client.post(f"{self.villager_url}/messages/send",
                                        json={'target': target, 'content': content, 'type': message_type}, timeout=10)
                 if response.status_code != 200:
                     try:
@@ -795,57 +1165,53 @@ class AIVillagerAgent:
             elif action == "accept_trade":
                 # Accept trade via Merchant
                 trade_id = kwargs.get('trade_id')
-                villager_state = self.get_villager_status() or {}
-                my_node_id = villager_state.get('node_id')
+                my_node_id = self.get_node_id()
                 
                 if not my_node_id:
                     print(f"[AI Agent] ✗ Unable to get node_id")
                     return False
                 
                 merchant_url = self.merchant_url
-                response = requests.post(f"{merchant_url}/trade/accept",
+                response = http_client.post(f"{merchant_url}/trade/accept",
                                        json={'trade_id': trade_id, 'node_id': my_node_id}, 
                                        timeout=10)
             elif action == "confirm_trade":
                 # Confirm trade via Merchant
                 trade_id = kwargs.get('trade_id')
-                villager_state = self.get_villager_status() or {}
-                my_node_id = villager_state.get('node_id')
+                my_node_id = self.get_node_id()
                 
                 if not my_node_id:
                     print(f"[AI Agent] ✗ Unable to get node_id")
                     return False
                 
                 merchant_url = self.merchant_url
-                response = requests.post(f"{merchant_url}/trade/confirm",
+                response = http_client.post(f"{merchant_url}/trade/confirm",
                                        json={'trade_id': trade_id, 'node_id': my_node_id}, 
                                        timeout=10)
             elif action == "reject_trade":
                 # Reject trade via Merchant
                 trade_id = kwargs.get('trade_id')
-                villager_state = self.get_villager_status() or {}
-                my_node_id = villager_state.get('node_id')
+                my_node_id = self.get_node_id()
                 
                 if not my_node_id:
                     print(f"[AI Agent] ✗ Unable to get node_id")
                     return False
                 
                 merchant_url = self.merchant_url
-                response = requests.post(f"{merchant_url}/trade/reject",
+                response = http_client.post(f"{merchant_url}/trade/reject",
                                        json={'trade_id': trade_id, 'node_id': my_node_id}, 
                                        timeout=10)
             elif action == "cancel_trade":
                 # Cancel trade via Merchant
                 trade_id = kwargs.get('trade_id')
-                villager_state = self.get_villager_status() or {}
-                my_node_id = villager_state.get('node_id')
+                my_node_id = self.get_node_id()
                 
                 if not my_node_id:
                     print(f"[AI Agent] ✗ Unable to get node_id")
                     return False
                 
                 merchant_url = self.merchant_url
-                response = requests.post(f"{merchant_url}/trade/cancel",
+                response = http_client.post(f"{merchant_url}/trade/cancel",
                                        json={'trade_id': trade_id, 'node_id': my_node_id}, 
                                        timeout=10)
             else:
@@ -856,6 +1222,9 @@ class AIVillagerAgent:
                 result = response.json()
                 if result.get('success', True):
                     print(f"[AI Agent] ✓ ExecuteActionSuccess: {action}")
+                    # produce, sleep, eat... reply with the villager's new state
+                    if isinstance(result.get('villager'), dict) and self.villager_snapshot is not None:
+                        self.villager_snapshot = {**result['villager'], 'node_id': self.villager_snapshot.get('node_id')}
                     return True
                 else:
                     print(f"[AI Agent] ✗ ExecuteActionFailed: {result.get('message')}")
@@ -867,16 +1236,91 @@ class AIVillagerAgent:
             print(f"[AI Agent] ✗ Execute action exception: {e}")
             return False
     
+    def execute_batch(self, actions: List[Dict], mode: str = 'atomic') -> Optional[Dict]:
+        """Execute several actions in one request via /action/batch
+        
+        actions: e.g. [{'type': 'trade', 'action': 'buy', 'item': 'seed', 'quantity': 1},
+                       {'type': 'produce'}]
+        mode: 'atomic' (all or nothing) or 'best_effort'
+        Returns the batch reply (per-step results and final villager state), or None on error.
+        """
+        steps = []
+        for action in actions:
+            step = dict(action)
+            # Accept the single-action names used elsewhere ('buy'/'sell'/'idle')
+            if step.get('type') in ('buy', 'sell'):
+                step['action'] = step.pop('type')
+                step['type'] = 'trade'
+            elif step.get('type') == 'idle':
+                step = {'type': 'submit', 'action': 'idle'}
+            if step.get('type') == 'trade':
+                step.setdefault('target', 'merchant')
+            steps.append(step)
+        
+        try:
+            response = http_client.post(f"{self.villager_url}/action/batch",
+                                        json={'actions': steps, 'mode': mode}, timeout=15)
+            result = response.json()
+        except Exception as e:
+            print(f"[AI Agent] ✗ Batch execution exception: {e}")
+            return None
+        
+        for step in result.get('results', []):
+            mark = '✓' if step.get('success') else ('-' if step.get('skipped') else '✗')
+            print(f"[AI Agent]   {mark} [{step.get('index')}] {step.get('type')}: {step.get('message')}")
+        if result.get('success'):
+            print(f"[AI Agent] ✓ Batch succeeded: {result.get('message')}")
+        else:
+            print(f"[AI Agent] ✗ Batch failed: {result.get('message')}")
+        return result
+    
     def generate_decision(self, context: Dict) -> Dict:
         """Generate decision (ReAct mode)"""
-        if not self.api_key:
+        self._last_decision_key = None
+        if self.llm is None:
             print("[AI Agent] ✗ API Key not configured; cannot use GPT")
             return {"action": "idle", "reason": "No API key configured"}
         
+        # Decided ahead from the predicted state after a time advance, and the prediction held
+        key = self._decision_key(context)
+        self._last_decision_key = key
+        with self._timed('llm'):
+            speculated = self._take_speculation(context)
+        if speculated is not None:
+            self.decision_stats['speculative'] += 1
+            decision, decision_text = speculated
+            print(f"[AI Agent] State as predicted, using the decision made ahead: {decision.get('command', decision.get('action'))}")
+            if decision.get('action') not in UNCACHED_ACTIONS:
+                self.decision_cache.put(key, {'decision': decision, 'raw_response': decision_text})
+            self.decision_history.append({
+                'timestamp': datetime.now().isoformat(),
+                'context': context,
+                'decision': decision,
+                'raw_response': decision_text,
+                'speculative': True
+            })
+            return decision
+        
+        # Same decision-relevant state as an earlier decision: reuse it
+        cached = self.decision_cache.get(key)
+        if cached is not None:
+            self.decision_stats['cached'] += 1
+            decision = cached['decision']
+            print(f"[AI Agent] Unchanged state, reusing cached decision: {decision.get('command', decision.get('action'))}")
+            self.decision_history.append({
+                'timestamp': datetime.now().isoformat(),
+                'context': context,
+                'decision': decision,
+                'raw_response': cached['raw_response'],
+                'cached': True
+            })
+            return decision
+        
         try:
             # Use ReAct structure
-            prompt = self._build_react_prompt(context)
-            system_prompt = self._get_react_system_prompt()
+            with self._timed('prompt'):
+                prompt = self._build_react_prompt(context)
+                system_prompt = self._get_react_system_prompt()
             max_tokens = 800
             
             # Debug: print the state seen by GPT
@@ -927,22 +1371,17 @@ class AIVillagerAgent:
                     status = trade.get('status', 'pending')
                     print(f"  {trade.get('trade_id')}: Sent to {target_name} - {offer_type} {trade.get('quantity')}x {trade.get('item')} for {trade.get('price')} gold (status: {status})")
             
-            # Call GPT API
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=0.7
-            )
-            
-            decision_text = response.choices[0].message.content.strip()
+            # Call the LLM backend
+            self.decision_stats['llm'] += 1
+            with self._timed('llm'):
+                decision_text = self._complete(system_prompt, prompt, context, max_tokens)
             
             # Parse decision based on mode
             # Parse response in ReAct format
-            decision = self._parse_react_decision(decision_text)
+            with self._timed('parse'):
+                decision = self._parse_react_decision(decision_text)
+            if decision.get('action') not in UNCACHED_ACTIONS:
+                self.decision_cache.put(key, {'decision': decision, 'raw_response': decision_text})
             
             # Record decision history
             self.decision_history.append({
@@ -958,165 +1397,41 @@ class AIVillagerAgent:
             print(f"[AI Agent] ✗ GPT decision generation failed: {e}")
             return {"action": "idle", "reason": f"GPT error: {str(e)}"}
     
+    def _complete(self, system_prompt: str, prompt: str, context: Dict, max_tokens: int) -> str:
+        """Model reply; when streaming, only up to its ACTION line, returned as soon as that line is complete"""
+        if self.stream_replies:
+            return self.llm.complete_action(system_prompt, prompt, context, max_tokens=max_tokens, temperature=0.7)
+        return self.llm.complete(system_prompt, prompt, context, max_tokens=max_tokens, temperature=0.7)
+    
+    def _decision_key(self, context: Dict, with_submitted: bool = True) -> str:
+        """Content hash of what the decision depends on (not the history or timestamps)
+        
+        with_submitted=False leaves out which other villagers have submitted their
+        action, which changes in the seconds after a time advance (see start_speculation).
+        """
+        trade_fields = ('trade_id', 'initiator_id', 'target_id', 'offer_type', 'item', 'quantity', 'price',
+                        'status', 'initiator_confirmed', 'target_confirmed')
+        return decision_key({
+            'backend': self.llm.name,
+            'model': self.model,
+            'system_prompt': self._get_react_system_prompt(),
+            'villager': context.get('villager', {}),
+            'time': context.get('time', ''),
+            'prices': context.get('prices', {}),
+            'messages': [(m.get('from'), m.get('type'), m.get('content'), m.get('read'))
+                         for m in context.get('messages', [])],
+            'trades_received': [[t.get(f) for f in trade_fields] for t in context.get('trades_received', [])],
+            'trades_sent': [[t.get(f) for f in trade_fields] for t in context.get('trades_sent', [])],
+            'market': [(t.get('role'), t.get('partner'), t.get('item'), t.get('quantity'), t.get('price'))
+                       for t in context.get('market', [])],
+            'villagers': sorted((v.get('node_id'), v.get('name'), v.get('occupation'),
+                                 v.get('has_submitted_action', False) and with_submitted)
+                                for v in context.get('villagers', []))
+        })
+    
     def _get_react_system_prompt(self) -> str:
-        """Get ReAct system prompt"""
-        return """You are a **ReAct Villager Agent** in the *Distributed Virtual Town* simulation.
-
-You must follow the ReAct (Reasoning + Acting) pattern:
-
-**THOUGHT**: Analyze the current situation, consider your goals, and reason about what action to take.
-**ACTION**: Execute exactly one command based on your reasoning.
-**OBSERVATION**: The result of your action will be provided for the next cycle.
-
-## Available Actions:
-- `buy <item> <quantity>` - Buy from merchant (no action cost)
-- `sell <item> <quantity>` - Sell to merchant (no action cost)  
-- `eat` - Eat bread to restore stamina (no action cost) **⚠️ REQUIRES BREAD IN INVENTORY!**
-- `produce` - Produce items (consumes action point + stamina)
-- `sleep` - Sleep to restore stamina (consumes action point, evening only, REQUIRES HOUSE OR TEMP_ROOM!)
-- `idle` - Skip current segment (consumes action point)
-- `price` - Check merchant prices (no action cost)
-- `mytrades` - Check all trade requests (sent and received) (no action cost) - **READ ONLY**
-- `trade <node_id> <buy/sell> <item> <quantity> <total_price>` - **SEND trade request to villager** 
-  **⚠️ IMPORTANT: Use node_id (like 'node1', 'node2') NOT villager names!**
-- `accept <trade_id>` - Accept received trade request (receiver only)
-- `reject <trade_id>` - Reject received trade request (receiver only)
-- `cancel <trade_id>` - Cancel your own trade request (initiator only)
-- `confirm <trade_id>` - Confirm trade (both parties must confirm to complete)
-- `send <node_id> <message>` - Send message to another villager
-  **⚠️ IMPORTANT: Use node_id (like 'node1', 'node2') NOT villager names!**
-
-## Game Rules:
-- Each time segment allows ONE main action (produce/sleep/idle)
-- Trading and eating don't consume action points
-- Stamina: 0-100, work consumes stamina, sleep restores stamina
-- Hunger: -10 stamina daily, -20 extra if no sleep at night
-- **CRITICAL: Sleep requires a HOUSE or TEMP_ROOM! Temp room costs 15 gold (affordable!) and lasts 1 day.**
-- **IMPORTANT: Buy and produce are SEPARATE decisions! Buy resources first, then produce in the next decision.**
-- **ACTION SUBMISSION STATUS: If you have already submitted your action for this time segment, you can still:**
-  - Respond to trade requests (accept/reject)
-  - Send and read messages
-  - Eat bread to restore stamina
-  - Check prices and trades
-  - **Send new trade requests to other villagers**
-  - **BUT CANNOT: produce, sleep, buy, sell, or idle (these consume action points)**
-  - **IMPORTANT: Trading is ALWAYS allowed, even after submitting actions!**
-
-## Priority Order (CRITICAL - Follow This Order):
-1. **SURVIVAL**: 
-   - Eat if stamina ≤ 35
-   - ⚠️ **EVENING/NIGHT WITHOUT HOUSE**: Buy temp_room (15 gold) BEFORE sleeping!
-   - Sleep if night and stamina ≤ 45 (requires house/temp_room)
-
-2. **CONFIRM TRADES**: ⚠️ Check `mytrades` and `trades` for status="accepted" → USE `confirm <trade_id>`!
-
-3. **CHECK PRICES** (if not checked recently):
-   - Look at PREVIOUS OBSERVATIONS first
-   - If last 2-3 decisions include "PRICE" action → prices already known, can skip
-   - Recommended to check once before making economic decisions
-   - Prices are stable within the same day
-
-4. **ACQUIRE RESOURCES**: Buy materials from merchant if needed
-   - Recommended to check prices first (Step 3) for informed decisions
-   - Knowing prices helps optimize spending
-
-5. **PRODUCTION**: Produce items if you have materials and stamina ≥ 20
-
-6. **TRADING**: 
-   - First: Handle received trade requests (accept/reject)
-   - Then: Send P2P trade requests (recommended to use prices from step 3)
-   - Format: `trade <node_id> <buy/sell> <item> <quantity> <price>`
-   - Knowing current prices helps make fair offers
-
-7. **COMMUNICATION**: For non-trade coordination when needed
-
-8. **IDLE**: When no productive action is currently possible
-
-💡 **Smart Strategy**: Check prices early in your decision cycle
-- Helps you make informed buy/sell/trade decisions
-- Allows you to compare merchant vs P2P options
-- One price check can inform multiple subsequent decisions
-
-## P2P Trading Strategy (HIGH PRIORITY):
-- **ACTIVE SELLING**: If you have products (wheat/bread/houses), ALWAYS try to sell them to villagers FIRST before selling to merchant!
-- **ACTIVE BUYING**: Try to buy materials from villagers at better prices than merchant sell prices
-- **Smart Pricing**: Use prices between merchant buy/sell prices (e.g., merchant buys at 5, sells at 10 → use 7)
-- **Targeting**: Farmers have wheat/seeds, Chefs have bread, Builders have wood
-- **SURVIVAL TRADING**: If you need bread for stamina but don't have any, try buying from chefs!
-- **No Spam**: Don't send duplicate trade requests to the same villager
-- **⚠️ DIRECT TRADING**: Send `trade` command DIRECTLY, NO negotiation messages!
-- **Commands**: `trades`=view received, `mytrades`=view sent, `trade`=send new request
-- **Fallback**: If no response after 2-3 decisions, trade with merchant instead
-- **Examples (DO THIS - USE NODE_ID)**:
-  - Farmer (node1) selling to Chef (node2): `trade node2 sell wheat 5 35` (5 wheat at 7 gold each)
-  - Chef (node2) buying from Farmer (node1): `trade node1 buy wheat 3 21` (3 wheat at 7 gold each)
-  - **SURVIVAL**: Farmer buying bread from Chef: `trade node2 buy bread 2 30` (2 bread at 15 gold each)
-
-## Trading Workflow (Centralized System via Merchant):
-1. **Initiate Phase**: Use `trade` command to create trade request (status: pending)
-2. **Accept/Reject Phase**: Receiver uses `accept` or `reject` on the trade
-   - After `accept`: status changes to "accepted"
-3. **Confirm Phase**: ⚠️ BOTH parties must `confirm` to complete the trade!
-   - Check `mytrades` or `trades` to see if status is "accepted"
-   - If status is "accepted", use `confirm <trade_id>` to finalize
-   - Trade completes only when BOTH parties confirm
-4. **Cancel Phase**: Initiator can use `cancel` before receiver accepts
-
-**TRADE FLOW EXAMPLE** (⚠️ USE NODE_ID, NOT NAME):
-- Alice (node1): `trade node2 buy wheat 3 21` → Creates trade_1
-- Bob (node2): `trades` → Sees trade_1 from Alice
-- Bob: `accept trade_1` → Accepts the trade (resources checked)
-- Bob: `confirm trade_1` → Bob confirms
-- Alice: `confirm trade_1` → Alice confirms → Trade completes automatically!
-
-**CRITICAL POINTS**:
-- **INVENTORY CHECK**: System checks resources when accepting trade
-- **ATOMIC COMPLETION**: Trade completes when BOTH parties confirm
-- **UNIQUE IDs**: All trades have unique IDs managed by Merchant
-- **STATUS TRACKING**: Use `trades` and `mytrades` to monitor trade status
-- **TRADE ID CLARITY**: `trades` shows requests YOU received, `mytrades` shows requests YOU sent
-- **REJECT vs CANCEL**: Receiver uses `reject`, initiator uses `cancel`
-- **PRICE NEGOTIATION**: 
-  * If you RECEIVE a trade with bad price → `reject <trade_id>` + optionally send message with counter-offer
-  * If your SENT trade is rejected → check `mytrades` status, then send new trade with adjusted price
-  * Don't negotiate before sending first trade - let the trade request itself be the first offer!
-- **PRODUCTIVITY FOCUS**: Don't get stuck negotiating - move to actual trades quickly!
-- **NO SPAM**: Don't send duplicate trade requests to the same villager
-
-## Trading Decision Process (Recommended Flow):
-1. **Check prices when needed** (but avoid repeating):
-   - Check PREVIOUS OBSERVATIONS: If you see "PRICE" action recently → prices already known
-   - Use `price` command if you haven't checked recently (within last 2-3 decisions)
-   - Once you know prices, you can use them for multiple decisions
-   - Example: If merchant sells wheat at 10g, you can offer 7-8g for P2P buy
-
-2. **Direct trade requests work well**: Skip lengthy negotiations
-   - Less effective: send node2 "Hi, interested in wheat?" then wait for reply
-   - More effective: After knowing prices, directly send: `trade node2 buy wheat 3 21`
-   - Trade request itself serves as your offer
-
-3. **Smart pricing strategy**: Base your P2P prices on merchant prices
-   - For buying: Offer slightly more than merchant's buy price (e.g., 7g if merchant buys at 5g)
-   - For selling: Ask slightly less than merchant's sell price (e.g., 9g if merchant sells at 10g)
-   - Win-win pricing encourages trades!
-
-4. **Use node_id for trades**: Look at "Online Villagers" list to find node_id (e.g., node1, node2)
-
-5. **Avoid spam**: Don't send duplicate messages or trade requests
-
-## Output Format:
-Always follow this exact format:
-
-THOUGHT: [Your reasoning about the current situation and what action to take]
-
-ACTION: [Single command to execute]
-
-Example:
-THOUGHT: I'm a farmer with 0 seeds and 100 stamina. I need seeds to produce wheat. I should buy 1-2 seeds first.
-
-ACTION: buy seed 2
-
-Remember: Only output THOUGHT and ACTION. The OBSERVATION will be provided in the next cycle."""
+        """Get ReAct system prompt (constant, see REACT_SYSTEM_PROMPT)"""
+        return REACT_SYSTEM_PROMPT
 
     def _get_system_prompt(self) -> str:
         """Get system prompt"""
@@ -1280,15 +1595,19 @@ QUANTITY HEURISTIC:
 - Choose quantities dynamically; buy the minimum needed to enable production now, plus a small buffer if affordable"""
     
     def _build_react_prompt(self, context: Dict) -> str:
-        """Build ReAct prompt"""
-        villager = context.get('villager', {})
-        time_info = context.get('time', '')
-        action_status = context.get('action_status', {})
-        prices = context.get('prices', {})
-        messages = self.get_messages()
-        trades_received = self.get_trades_received()
-        trades_sent = self.get_trades_sent()
-        villagers = context.get('villagers', [])
+        """Build ReAct prompt from the collected context only (no further requests)
+        
+        The static rules live in the system prompt; this is the changing state, cut to
+        self.prompt_budget tokens: messages go first, then villagers, older observations,
+        trade detail and recommended trades. State, prices and self-reflexion are always kept.
+        """
+        villager = context.get('villager') or {}
+        time_info = context.get('time') or ''
+        prices = context.get('prices') or {}
+        messages = context.get('messages') or []
+        trades_received = context.get('trades_received') or []
+        trades_sent = context.get('trades_sent') or []
+        villagers = context.get('villagers') or []
         
         # Get item information
         inventory = villager.get('inventory', {})
@@ -1305,71 +1624,96 @@ QUANTITY HEURISTIC:
         # Determine current time period
         is_evening = 'evening' in time_info.lower() or 'night' in time_info.lower()
         
-        prompt = f"""=== CURRENT STATE ===
-
-Time: {time_info}
-Villager: {villager.get('name', 'Unknown')} ({occupation})
-Stamina: {stamina}/{max_stamina}
-Money: {money} gold
-Action Submitted: {has_submitted}
-Sleep Status: {"Already slept today" if has_slept else "Not slept yet" + (" - Should sleep!" if is_evening else "")}
-
-Inventory: {items if items else "Empty"}
-
-Merchant Prices: 
-{("  Buy: seed=" + str(prices.get('buy', {}).get('seed', '?')) + ", wheat=" + str(prices.get('buy', {}).get('wheat', '?')) + ", bread=" + str(prices.get('buy', {}).get('bread', '?')) + chr(10) + "  Sell: seed=" + str(prices.get('sell', {}).get('seed', '?')) + ", wheat=" + str(prices.get('sell', {}).get('wheat', '?')) + ", bread=" + str(prices.get('sell', {}).get('bread', '?'))) if prices.get('buy') or prices.get('sell') else "Unknown - Use 'price' command to check"}
-
-Messages: {len(messages)} received
-{chr(10).join([f"- From {msg.get('from', 'Unknown')}: {msg.get('content', '')[:50]}..." for msg in messages[:3]]) if messages else "No messages"}
-
-Received Trades: {len(trades_received)} requests
-{chr(10).join([f"- {trade.get('trade_id', '')}: {trade.get('initiator_id', 'Unknown')} wants to {trade.get('offer_type', '')} {trade.get('quantity', 0)}x {trade.get('item', '')} @ {trade.get('price', 0)} gold total (status: {trade.get('status', 'pending')})" for trade in trades_received[:3]]) if trades_received else "No received trade requests"}
-
-Sent Trades: {len(trades_sent)} requests
-{chr(10).join([f"- {trade.get('trade_id', '')}: to {trade.get('target_id', 'Unknown')}, {trade.get('offer_type', '')} {trade.get('quantity', 0)}x {trade.get('item', '')} @ {trade.get('price', 0)} gold (status: {trade.get('status', 'pending')})" for trade in trades_sent[:3]]) if trades_sent else "No sent trade requests"}
-
-⚠️ Trade Status Guide:
-- pending = Waiting for other party to accept/reject
-- accepted = Other party accepted! Now BOTH must confirm to complete
-- rejected = Other party rejected, consider adjusting price
-- completed = Trade finished, resources transferred
-
-Online Villagers: {len(villagers)}
-{chr(10).join([f"- {v['node_id']}: {v['name']} ({v['occupation']}) - Action: {'✓ Submitted' if v.get('has_submitted_action', False) else '⏳ Pending'}" for v in villagers])}
-
-=== ACTION SUBMISSION STATUS ===
-Total Villagers: {len(villagers)}
-Submitted: {sum(1 for v in villagers if v.get('has_submitted_action', False))}/{len(villagers)}
-Waiting: {[v['name'] for v in villagers if not v.get('has_submitted_action', False)]}
-
-=== PREVIOUS OBSERVATIONS ===
-{self._get_recent_observations()}
-
-=== IMPORTANT GAME RULES ===
-- Sleep requires a HOUSE or TEMP_ROOM!
-  * TEMP_ROOM: Buy from merchant for 15 gold (affordable!), lasts 1 day, perfect for early game
-  * HOUSE: Permanent, expensive (260 gold merchant / trade with carpenter), but one-time cost
-- To get a house: Carpenter produces houses (10 wood → 1 house), or trade with other villagers
-- Farmer: 1 seed → 5 wheat (costs 20 stamina)
-- Chef: 3 wheat → 2 bread (costs 15 stamina) 
-- Carpenter: 10 wood → 1 house (costs 30 stamina)
-- Use 'price' command to check merchant prices (don't send messages to merchant)
-- **CRITICAL: Buy and produce are SEPARATE decisions! Buy resources first, then produce in the next decision.**
-
-Now follow the ReAct pattern:"""
-        
+        builder = PromptBuilder(self.prompt_budget)
+        builder.add('CURRENT STATE', [
+            f"Time: {time_info}",
+            f"Villager: {villager.get('name', 'Unknown')} ({occupation})",
+            f"Stamina: {stamina}/{max_stamina}",
+            f"Money: {money} gold",
+            f"Action Submitted: {has_submitted}",
+            f"Sleep Status: {'Already slept today' if has_slept else 'Not slept yet' + (' - Should sleep!' if is_evening else '')}",
+            f"Inventory: {items if items else 'Empty'}"
+        ], required=True)
+        
+        if prices.get('buy') or prices.get('sell'):
+            price_lines = [f"{side.capitalize()}: " + ", ".join(f"{item}={price}" for item, price in prices[side].items())
+                           for side in ('buy', 'sell') if prices.get(side)]
+        else:
+            price_lines = ["Unknown - Use 'price' command to check"]
+        builder.add('MERCHANT PRICES', price_lines, required=True)
+        
+        observations, reflexions = self._recent_observations()
+        builder.add('SELF-REFLEXION (Analyze your recent behavior)', reflexions, required=True)
+        
+        # Trades that need this villager's accept/confirm come first
+        def needs_me(trade, role):
+            if trade.get('status') == 'accepted':
+                return not trade.get(f'{role}_confirmed', False)
+            return role == 'target' and trade.get('status') == 'pending'
+        
+        received = sorted(trades_received, key=lambda t: not needs_me(t, 'target'))
+        builder.add('RECEIVED TRADES', [f"{len(received)} requests"] + [
+            f"- {t.get('trade_id', '')}: {t.get('initiator_id', 'Unknown')} wants to {t.get('offer_type', '')} "
+            f"{t.get('quantity', 0)}x {t.get('item', '')} @ {t.get('price', 0)} gold total (status: {t.get('status', 'pending')})"
+            for t in received
+        ] if received else ["No received trade requests"], priority=50, keep=3)
+        
+        sent = sorted(trades_sent, key=lambda t: not needs_me(t, 'initiator'))
+        builder.add('SENT TRADES', [f"{len(sent)} requests"] + [
+            f"- {t.get('trade_id', '')}: to {t.get('target_id', 'Unknown')}, {t.get('offer_type', '')} "
+            f"{t.get('quantity', 0)}x {t.get('item', '')} @ {t.get('price', 0)} gold (status: {t.get('status', 'pending')})"
+            for t in sent
+        ] if sent else ["No sent trade requests"], priority=40, keep=3)
+        
+        # This villager's side of the trades the coordinator matched town-wide
+        opportunities = context.get('p2p_opportunities') or {}
+        builder.add('RECOMMENDED TRADES', [
+            f"- Sell {op['quantity']}x {op['item']} to {op['target_name']} for {op['total_price']} gold: "
+            f"trade {op['target']} sell {op['item']} {op['quantity']} {op['total_price']}"
+            for op in opportunities.get('sell_opportunities', [])
+        ] + [
+            f"- Buy {op['quantity']}x {op['item']} from {op['target_name']} ({op['target']}) for {op['total_price']} gold: "
+            f"they will send the request, accept it"
+            for op in opportunities.get('buy_opportunities', [])
+        ], priority=45)
+        
+        # Unread first, newest first
+        unread = sum(1 for msg in messages if not msg.get('read'))
+        shown = sorted(reversed(messages), key=lambda msg: bool(msg.get('read')))
+        builder.add('MESSAGES', [f"{len(messages)} received ({unread} unread)"] + [
+            f"- From {msg.get('from', 'Unknown')}: {self._clip(msg.get('content', ''), MESSAGE_CHARS)}"
+            for msg in shown
+        ], priority=0, keep=1)
+        
+        submitted = sum(1 for v in villagers if v.get('has_submitted_action', False))
+        builder.add('ONLINE VILLAGERS', [f"{len(villagers)} online, {submitted}/{len(villagers)} submitted their action"] + [
+            f"- {v['node_id']}: {v['name']} ({v['occupation']}) - Action: {'✓ Submitted' if v.get('has_submitted_action', False) else '⏳ Pending'}"
+            for v in villagers
+        ], priority=10, keep=1)
+        
+        builder.add('PREVIOUS OBSERVATIONS', observations or ["No previous observations."], priority=30, keep=1, tail=True)
+        builder.add(None, ["Now follow the ReAct pattern:"], required=True)
+        
+        prompt = builder.build()
+        self.last_prompt_stats = builder.stats
         return prompt
+    
+    @staticmethod
+    def _clip(text: str, limit: int) -> str:
+        return text if len(text) <= limit else text[:limit] + '...'
 
-    def _get_recent_observations(self) -> str:
-        """Get recent observations (enhanced: show more context)"""
+    def _recent_observations(self):
+        """(observations, reflexions) for the prompt: one entry per recent decision, oldest first,
+        and the self-reflexion lines for problem patterns in them"""
         if not self.decision_history:
-            return "No previous observations."
+            return [], []
         
         recent = self.decision_history[-5:]  # Increase to last 5 decisions
         observations = []
         
         for entry in recent:
-            timestamp = entry['timestamp'][:19]  # Remove milliseconds
+            timestamp = entry['timestamp'][11:19]  # Time of day only
+            lines = []
             decision = entry['decision']
             action = decision.get('action', 'unknown')
             command = decision.get('command', '')
@@ -1382,14 +1726,14 @@ Now follow the ReAct pattern:"""
                 action_display = f"[{timestamp}] {action.upper()}"
                 if command:
                     action_display += f": {command}"
-                observations.append(action_display)
+                lines.append(action_display)
                 
                 # Show different info based on different actions
                 if action == "send":
                     # Show sent message
                     target = decision.get('target', 'unknown')
                     content = decision.get('content', '')[:100]
-                    observations.append(f"  → Sent to {target}: \"{content}\"")
+                    lines.append(f"  → Sent to {target}: \"{content}\"")
                 elif action == "trade":
                     # Show initiated trade
                     target = decision.get('target', 'unknown')
@@ -1397,37 +1741,38 @@ Now follow the ReAct pattern:"""
                     item = decision.get('item', 'unknown')
                     quantity = decision.get('quantity', 0)
                     price = decision.get('price', 0)
-                    observations.append(f"  → Trade request: {trade_action} {quantity}x {item} @ {price} gold to {target}")
+                    lines.append(f"  → Trade request: {trade_action} {quantity}x {item} @ {price} gold to {target}")
                 elif action == "price":
                     # Show queried price
                     if 'prices' in decision:
                         prices = decision.get('prices', {})
                         buy_prices = prices.get('buy', {})
                         if buy_prices:
-                            observations.append(f"  → Prices: seed={buy_prices.get('seed', '?')}, wheat={buy_prices.get('wheat', '?')}, bread={buy_prices.get('bread', '?')}")
+                            lines.append(f"  → Prices: seed={buy_prices.get('seed', '?')}, wheat={buy_prices.get('wheat', '?')}, bread={buy_prices.get('bread', '?')}")
                     else:
-                        observations.append(f"  → Checked prices")
+                        lines.append(f"  → Checked prices")
                 elif action == "trades" and 'trades' in decision:
                     trades = decision.get('trades', [])
-                    observations.append(f"  → {len(trades)} received trade requests")
+                    lines.append(f"  → {len(trades)} received trade requests")
                 elif action == "mytrades" and 'mytrades' in decision:
                     trades = decision.get('mytrades', [])
-                    observations.append(f"  → {len(trades)} sent trade requests")
+                    lines.append(f"  → {len(trades)} sent trade requests")
                 elif action == "accept":
                     trade_id = decision.get('trade_id', 'unknown')
-                    observations.append(f"  → Accepted {trade_id}")
+                    lines.append(f"  → Accepted {trade_id}")
                 elif action == "confirm":
                     trade_id = decision.get('trade_id', 'unknown')
-                    observations.append(f"  → Confirmed {trade_id}")
+                    lines.append(f"  → Confirmed {trade_id}")
                 elif action == "reject":
                     trade_id = decision.get('trade_id', 'unknown')
-                    observations.append(f"  → Rejected {trade_id}")
+                    lines.append(f"  → Rejected {trade_id}")
                 elif action in ["produce", "sleep", "idle", "buy", "sell", "eat"]:
-                    observations.append(f"  → {action} completed")
+                    lines.append(f"  → {action} completed")
             else:
-                observations.append(f"[{timestamp}] {action.upper()} - FAILED")
+                lines.append(f"[{timestamp}] {action.upper()} - FAILED")
                 if error_msg:
-                    observations.append(f"  → Error: {error_msg[:100]}")
+                    lines.append(f"  → Error: {error_msg[:100]}")
+            observations.append("\n".join(lines))
         
         # === REFLEXION: Automatically detect problem patterns and generate reflections ===
         reflexions = []
@@ -1501,14 +1846,7 @@ Now follow the ReAct pattern:"""
                 reflexions.append("   → REFLEXION: Negotiations are taking too long.")
                 reflexions.append("   → SUGGESTED ACTION: Either send trade NOW or trade with merchant.")
         
-        # Add reflexion to observations
-        if reflexions:
-            observations.append("\n" + "="*60)
-            observations.append("🧠 SELF-REFLEXION (Analyze your recent behavior):")
-            observations.append("="*60)
-            observations.extend(reflexions)
-        
-        return "\n".join(observations)
+        return observations, reflexions
 
     def _build_prompt(self, context: Dict) -> str:
         """Build prompt"""
@@ -1968,25 +2306,44 @@ Return JSON decision format."""
             print(f"[AI Agent] ✗ Parsing decision failed: {e}")
             return {"action": "idle", "reason": f"Parse error: {str(e)}", "command": "idle"}
     
+    @contextmanager
+    def _timed(self, phase: str):
+        """Add the time spent in the block to last_timings[phase]"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.last_timings[phase] = self.last_timings.get(phase, 0.0) + time.perf_counter() - started
+    
     def make_decision_and_act(self):
+        """Make a decision and ExecuteAction (phase durations are left in last_timings)"""
+        self.last_timings = {}
+        self.last_action = None
+        self.wants_followup = False
+        started = time.perf_counter()
+        try:
+            success = self._decide_and_act()
+            self.wants_followup = bool(success) and self.last_action not in PERIOD_ACTIONS
+            return success
+        finally:
+            total = time.perf_counter() - started
+            # decide = prompt + llm + parse + logging; the rest is executing the action
+            # and handling trades/messages
+            timings = self.last_timings
+            timings['execute'] = total - timings.get('context', 0.0) - timings.get('decide', 0.0)
+            timings['total'] = total
+    
+    def _decide_and_act(self):
         """Make a decision and ExecuteAction"""
-        # Collect context info
-        context = {
-            'villager': self.get_villager_status() or {},
-            'time': self.get_current_time(),
-            'action_status': self.get_action_status() or {},
-            'prices': self.get_merchant_prices() or {},
-            'messages': self.get_messages(),
-            'trades_received': self.get_trades_received(),
-            'trades_sent': self.get_trades_sent(),
-            'villagers': self.get_online_villagers()
-        }
-        
-        # Clean up old Trade request records
-        self.clear_old_trade_requests()
-        
-        # Analyze P2P Trade opportunities
-        context['p2p_opportunities'] = self.analyze_p2p_opportunities(context)
+        # Collect context info (concurrently)
+        with self._timed('context'):
+            context = self.collect_context()
+            
+            # Clean up old Trade request records
+            self.clear_old_trade_requests()
+            
+            # Analyze P2P Trade opportunities
+            context['p2p_opportunities'] = self.analyze_p2p_opportunities(context)
         
         # Check whether an action has already been submitted
         villager = context['villager']
@@ -1994,9 +2351,13 @@ Return JSON decision format."""
         
         # Generate decision
         print(f"[AI Agent] {self.villager_name} is thinking...")
-        decision = self.generate_decision(context)
+        with self._timed('decide'):
+            decision = self._fast_path_decision(context) if self.fast_path else None
+            if decision is None:
+                decision = self.generate_decision(context)
         
         action = decision.get('action', 'idle')
+        self.last_action = action
         reason = decision.get('reason', 'No reason provided')
         command = decision.get('command', action)
         
@@ -2074,7 +2435,7 @@ Return JSON decision format."""
                     # Mark messages as read
                     for msg in unread_messages:
                         try:
-                            requests.post(f"{self.villager_url}/messages/mark_read",
+                            http_client.post(f"{self.villager_url}/messages/mark_read",
                                        json={'message_id': msg.get('id')}, timeout=5)
                         except:
                             pass
@@ -2109,6 +2470,11 @@ Return JSON decision format."""
             success = self.execute_action("idle")
         elif action == "eat":
             success = self.execute_action("eat")
+        elif action == "batch":
+            result = self.execute_batch(decision.get('actions', []), decision.get('mode', 'atomic'))
+            success = bool(result and result.get('success'))
+            if result and not success:
+                error_message = result.get('message')
         elif action == "price":
             success = self.execute_action("price")
             if success:
@@ -2195,6 +2561,10 @@ Return JSON decision format."""
             if error_message:
                 print(f"[AI Agent] Error info: {error_message}")
         
+        # A decision that failed must not be replayed for the same state
+        if not success and self._last_decision_key is not None:
+            self.decision_cache.invalidate(self._last_decision_key)
+        
         # Update decision history with execution result
         if self.decision_history:
             last_decision = self.decision_history[-1]
@@ -2211,26 +2581,115 @@ Return JSON decision format."""
             return
         
         self.running = True
+        self._start_event_watchers()
         self.decision_thread = threading.Thread(target=self._decision_loop, args=(interval,), daemon=True)
         self.decision_thread.start()
-        print(f"[AI Agent] Started automatic decision loop, interval {interval} seconds")
+        print(f"[AI Agent] Started automatic decision loop, on events or every {interval} seconds when idle")
     
     def stop_auto_decision_loop(self):
         """Stop automatic decision loop"""
         self.running = False
+        self._wake.set()
         if self.decision_thread:
             self.decision_thread.join()
         print("[AI Agent] Automatic decision loop stopped")
     
     def _decision_loop(self, interval: int):
-        """Decision loop"""
+        """Decision loop: decide, then wait for an event (or interval seconds with none)"""
+        followups = 0
         while self.running:
+            # Events arriving while deciding wake the next iteration immediately
+            self._wake.clear()
             try:
                 self.make_decision_and_act()
-                time.sleep(interval)
             except Exception as e:
                 print(f"[AI Agent] Decision loop exception: {e}")
-                time.sleep(interval)
+                self.wants_followup = False
+            
+            # A free action (buy, eat, trade...) leaves the period open: continue right away
+            if self.wants_followup and followups < MAX_FOLLOWUPS:
+                followups += 1
+                continue
+            followups = 0
+            self._wait_for_events(interval)
+    
+    def _wait_for_events(self, max_idle: float):
+        """Block until an event arrives and the burst settles, or max_idle seconds pass"""
+        if not self._wake.wait(max_idle):
+            return
+        
+        # Debounce: keep waiting while events keep arriving (e.g. a trade request and its message)
+        deadline = time.monotonic() + MAX_DEBOUNCE
+        while self.running:
+            self._wake.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._wake.wait(min(EVENT_DEBOUNCE, remaining)):
+                break
+        
+        with self._wake_lock:
+            events, self._wake_events = self._wake_events, []
+        if events and self.running:
+            print(f"[AI Agent] Woken by {len(events)} event(s): {', '.join(sorted({e['type'] for e in events}))}")
+    
+    def _on_event(self, event: Dict):
+        """Record an event for the decision loop and wake it (a time advance also starts a speculation)"""
+        if event.get('type') == 'time_advance':
+            self.start_speculation(event)
+        with self._wake_lock:
+            self._wake_events.append(event)
+        self._wake.set()
+    
+    def _start_event_watchers(self):
+        """Long-poll the villager node's GET /events in a background thread
+
+        The merchant pushes trade events to the villager nodes involved, so this one
+        poll covers them too and no merchant worker thread is held per agent.
+        """
+        # Watchers of an earlier run exit within one poll of it stopping
+        self.event_watchers = [watcher for watcher in self.event_watchers if watcher.is_alive()]
+        if self.event_watchers:
+            return
+        sources = [
+            ('villager', lambda: f"{self.villager_url}/events", lambda: {})
+        ]
+        for name, url, params in sources:
+            watcher = threading.Thread(target=self._watch_events, args=(name, url, params),
+                                       name=f'events-{name}', daemon=True)
+            watcher.start()
+            self.event_watchers.append(watcher)
+    
+    def _watch_events(self, name: str, url, params):
+        """Follow one node's event log while the decision loop runs"""
+        since = None
+        while self.running:
+            query = params()
+            if None in query.values():
+                # node_id not known yet (villager not created)
+                time.sleep(EVENT_RETRY_DELAY)
+                continue
+            # The first poll (no since) starts from the node's current events
+            query['timeout'] = EVENT_POLL_TIMEOUT
+            if since is not None:
+                query['since'] = since
+            
+            try:
+                response = http_client.get(url(), params=query, timeout=EVENT_POLL_TIMEOUT + 5)
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+                result = response.json()
+            except Exception as e:
+                print(f"[AI Agent] Event watch on {name} failed: {e}")
+                time.sleep(EVENT_RETRY_DELAY)
+                continue
+            
+            if result.get('missed') and since is not None:
+                # Events were lost (node restarted or the log wrapped): re-read everything
+                self._on_event({'type': 'missed', 'source': name})
+            for event in result.get('events', []):
+                # Skip trade changes this agent caused itself
+                if self.node_id is None or event.get('actor') != self.node_id:
+                    self._on_event({**event, 'source': name})
+            since = result.get('next', since)
     
     def run_interactive_mode(self):
         """Run interactive mode"""
@@ -2292,17 +2751,12 @@ Return JSON decision format."""
                 break
             except Exception as e:
                 print(f"[AI Agent] Error: {e}")
+        
+        self.decision_history.close()
     
     def _show_status(self):
         """Show status"""
-        context = {
-            'villager': self.get_villager_status() or {},
-            'time': self.get_current_time(),
-            'action_status': self.get_action_status() or {},
-            'prices': self.get_merchant_prices() or {},
-            'messages': self.get_messages(),
-            'villagers': self.get_online_villagers()
-        }
+        context = self.collect_context()
         
         print(f"\nCurrent status:")
         print(f"Time: {context['time']}")
@@ -2313,20 +2767,33 @@ Return JSON decision format."""
         print(f"SubmittedAction: {context['villager'].get('has_submitted_action', False)}")
         print(f"Message count: {len(context['messages'])}")
         print(f"Online villagers: {len(context['villagers'])}")
+        print(f"Decisions: {self._decision_summary()}")
+    
+    def _decision_summary(self) -> str:
+        """How decisions were made: fast path, decision cache, decided ahead or LLM, and the share of LLM calls avoided"""
+        stats = self.decision_stats
+        total = sum(stats.values())
+        avoided = (stats['fast_path'] + stats['cached']) / total * 100 if total else 0.0
+        speculation = self.speculation_stats
+        return (f"{total} ({stats['fast_path']} fast path, {stats['cached']} cached, "
+                f"{stats['speculative']} decided ahead, {stats['llm']} LLM; {avoided:.0f}% without an LLM call; "
+                f"speculations {speculation['started']}, {speculation['discarded']} discarded)")
     
     def _show_history(self):
-        """Show decision history"""
-        if not self.decision_history:
+        """Show decision history (read back from the history file when there is one)"""
+        records = self.decision_history.tail(5)
+        if not records:
             print("No decision history")
             return
         
-        print(f"\nDecision history (last {min(5, len(self.decision_history))}):")
-        for i, record in enumerate(self.decision_history[-5:]):
+        print(f"\nDecision history (last {len(records)} of {self.decision_history.total}):")
+        for i, record in enumerate(records):
             print(f"{i+1}. {record['timestamp']}")
-            print(f"   Action: {record['decision'].get('action', 'unknown')}")
+            source = (' (cached)' if record.get('cached') else ' (fast path)' if record.get('fast_path')
+                      else ' (decided ahead)' if record.get('speculative') else '')
+            print(f"   Action: {record['decision'].get('action', 'unknown')}{source}")
             print(f"   Reason: {record['decision'].get('reason', 'No reason')[:100]}...")
 
-
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='AIVillager Agent')
@@ -2337,22 +2804,57 @@ def main():
     parser.add_argument('--model', type=str, default='gpt-4o', help='GPT model')
     parser.add_argument('--react', action='store_true', help='Use ReAct reasoning mode')
     parser.add_argument('--auto', type=int, help='Auto mode interval seconds')
+    parser.add_argument('--decision-cache', type=str, default=os.getenv('DECISION_CACHE_PATH'),
+                        help='SQLite file for cached decisions, shared by agent processes (default: memory only)')
+    parser.add_argument('--backend', choices=BACKENDS, default='openai',
+                        help='Decision source: OpenAI, an OpenAI-compatible server (--llm-url), '
+                             'a deterministic rule policy, or a recording (--replay)')
+    parser.add_argument('--llm-url', type=str, default=os.getenv('LLM_BASE_URL'),
+                        help='Base URL of the server for --backend http, e.g. http://localhost:8000/v1')
+    parser.add_argument('--llm-timeout', type=float, default=LLM_TIMEOUT,
+                        help='Seconds without a reply (or the next streamed chunk) before an LLM call fails')
+    parser.add_argument('--no-stream', action='store_true',
+                        help='Wait for the whole reply instead of acting once its ACTION line has streamed in')
+    parser.add_argument('--hedge', type=float, default=0,
+                        help='Send a second copy of LLM calls slower than this percentile of recent ones, e.g. 0.95 (0: off)')
+    parser.add_argument('--replay', type=str, help='JSONL recording played back by --backend replay')
+    parser.add_argument('--record', type=str, help='Append every prompt/reply to this JSONL file')
+    parser.add_argument('--prompt-budget', type=int, default=DEFAULT_BUDGET,
+                        help='Token budget of the decision prompt (the static system prompt is not counted)')
+    parser.add_argument('--no-fast-path', action='store_true',
+                        help='Ask the LLM for every decision, including forced ones (eat, confirm, produce...)')
+    parser.add_argument('--no-speculate', action='store_true',
+                        help='Do not decide the next period ahead when time advances')
+    parser.add_argument('--history', type=str,
+                        help='Append full decision records (with context) to this JSONL file, rotated by size; .gz compresses')
     args = parser.parse_args()
     
     # Use provided API key or environment variable
     api_key = args.api_key or os.getenv('OPENAI_API_KEY')
-    if not api_key:
+    if args.backend == 'openai' and not api_key:
         print("Error: OpenAI API Key not provided")
         print("Please use the --api-key argument or set the OPENAI_API_KEY environment variable")
         sys.exit(1)
     
+    llm = create_backend(args.backend, args.model, api_key, args.replay, args.record,
+                         base_url=args.llm_url, timeout=args.llm_timeout)
+    if args.hedge:
+        llm = HedgedBackend(llm, percentile=args.hedge)
+    
     agent = AIVillagerAgent(
         villager_port=args.port,
         coordinator_port=args.coordinator,
         merchant_port=args.merchant,
         api_key=api_key,
         model=args.model,
-        use_react=args.react
+        use_react=args.react,
+        decision_cache=DecisionCache(path=args.decision_cache),
+        llm_backend=llm,
+        prompt_budget=args.prompt_budget,
+        history_path=args.history,
+        fast_path=not args.no_fast_path,
+        speculate=not args.no_speculate,
+        stream=not args.no_stream
     )
     
     agent.run_interactive_mode()
@@ -4,20 +4,24 @@ Manages global time and synchronizes all nodes
 """
 
 from flask import Flask, request, jsonify
-import requests
 import sys
 import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from common.models import GameState, TimeOfDay
+from common import http_client
+from common.barrier import ActionBarrier
+from common.town_directory import TownDirectory
+from common.trade_matcher import MarketMatcher, recommendations_for
 
 app = Flask(__name__)
 
 # Global state
 game_state = GameState()
 registered_nodes = {}  # {node_id: {node_type, address}}
-pending_actions = {}   # {node_id: action_type}  - Pending action submissions
-time_barrier_ready = False  # Whether all nodes are ready to advance time
+barrier = ActionBarrier()  # Per-period action submissions of registered villagers
+town_directory = TownDirectory()  # Public state of every villager, pushed by the villagers as deltas
+market = MarketMatcher()  # Town-wide trade recommendations, matched once per tick
 
 
 @app.route('/health', methods=['GET'])
@@ -43,6 +47,13 @@ def register_node():
         'name': name,
         'occupation': occupation
     }
+    if node_type == 'villager':
+        barrier.join(node_id)
+        # Placeholder entry until the villager publishes its state
+        town_directory.ensure(node_id, {'name': name, 'occupation': occupation})
+    else:
+        # A node id that re-registers as another type no longer holds up the period
+        barrier.leave(node_id)
     
     if name != node_id and occupation:
         print(f"[Coordinator] Node registered: {node_id} ({name} - {occupation}, {node_type}) @ {address}")
@@ -66,75 +77,60 @@ def get_current_time():
 @app.route('/action/submit', methods=['POST'])
 def submit_action():
     """Villager submits action for current time period"""
-    global pending_actions, time_barrier_ready
-    
     data = request.json
-    node_id = data['node_id']
-    action_type = data['action']  # 'work', 'sleep', 'idle'
+    closed, waiting_for = _record_action(data['node_id'], data['action'])  # 'work', 'sleep', 'idle'
     
-    # Record action
-    pending_actions[node_id] = action_type
+    if closed is not None:
+        # Automatically advance time
+        _advance_time_internal(closed)
     
-    print(f"\n[Coordinator] {node_id} submitted action: {action_type}")
-    print(f"[Coordinator] Submitted: {len(pending_actions)}/{len([n for n in registered_nodes.values() if n['node_type'] == 'villager'])}")
+    return jsonify(_submit_reply(closed is not None, waiting_for))
+
+
+def _record_action(node_id, action_type):
+    """Record a submitted action, returns (actions of the period it closed or None, villagers still waiting)"""
+    closed, waiting_for = barrier.submit(node_id, action_type)
     
-    # Check if all villager nodes have submitted
-    villager_nodes = [nid for nid, info in registered_nodes.items() if info['node_type'] == 'villager']
-    all_submitted = all(nid in pending_actions for nid in villager_nodes)
+    print(f"\n[Coordinator] {node_id} submitted action: {action_type}")
     
-    if all_submitted and len(villager_nodes) > 0:
+    if closed is not None:
         print(f"[Coordinator] ✓ All villagers have submitted actions, ready to advance time")
-        time_barrier_ready = True
-        
-        # Automatically advance time
-        result = _advance_time_internal()
-        
-        return jsonify({
+        return closed, []
+    
+    submitted, total = barrier.counts()
+    print(f"[Coordinator] Submitted: {submitted}/{total}")
+    print(f"[Coordinator] Waiting for other villagers: {waiting_for}")
+    return None, waiting_for
+
+
+def _submit_reply(all_ready, waiting_for):
+    """Build the /action/submit reply (after time has advanced when all_ready)"""
+    if all_ready:
+        return {
             'success': True,
             'message': 'Action submitted, time will advance',
             'all_ready': True,
             'time_advanced': True,
             'new_time': game_state.to_dict()
-        })
-    else:
-        waiting_for = [nid for nid in villager_nodes if nid not in pending_actions]
-        print(f"[Coordinator] Waiting for other villagers: {waiting_for}")
-        
-        return jsonify({
-            'success': True,
-            'message': f'Action submitted, waiting for others ({len(pending_actions)}/{len(villager_nodes)})',
-            'all_ready': False,
-            'waiting_for': waiting_for
-        })
+        }
+    
+    submitted, total = barrier.counts()
+    return {
+        'success': True,
+        'message': f'Action submitted, waiting for others ({submitted}/{total})',
+        'all_ready': False,
+        'waiting_for': waiting_for
+    }
 
 
-def _advance_time_internal():
-    """Internal function: Actually advance time"""
-    global game_state, pending_actions, time_barrier_ready
-    
-    old_time = f"Day {game_state.day} {game_state.time_of_day.value}"
-    
-    # Advance time
-    game_state.advance_time()
-    
-    new_time = f"Day {game_state.day} {game_state.time_of_day.value}"
-    print(f"\n[Coordinator] ⏰ Time advanced: {old_time} -> {new_time}")
-    print(f"[Coordinator] Action log: {pending_actions}")
-    
-    # Clear action records
-    pending_actions = {}
-    time_barrier_ready = False
+def _advance_time_internal(actions=None):
+    """Internal function: Actually advance time (actions: the period closed by the barrier, None for a manual advance)"""
+    notification = _advance_clock(actions)
     
     # Notify all registered nodes
-    notification = game_state.to_dict()
-    
-    for node_id, node_info in registered_nodes.items():
-        if node_info['node_type'] == 'coordinator':
-            continue
-        
+    for node_id, address in _time_advance_targets():
         try:
-            address = node_info['address']
-            response = requests.post(
+            response = http_client.post(
                 f"http://{address}/time/advance",
                 json=notification,
                 timeout=2
@@ -148,9 +144,44 @@ def _advance_time_internal():
         except Exception as e:
             print(f"[Coordinator] Failed to notify node {node_id}: {e}")
     
+    return _advance_reply()
+
+
+def _advance_clock(actions=None):
+    """Advance the game clock and close the barrier period, returns the time notification
+    
+    actions: the period already closed by the last submission; None closes the open one
+    (manual advance), discarding the submissions so far.
+    """
+    if actions is None:
+        actions = barrier.reset()
+    
+    old_time = f"Day {game_state.day} {game_state.time_of_day.value}"
+    
+    # Advance time
+    game_state.advance_time()
+    
+    new_time = f"Day {game_state.day} {game_state.time_of_day.value}"
+    print(f"\n[Coordinator] ⏰ Time advanced: {old_time} -> {new_time}")
+    print(f"[Coordinator] Action log: {actions}")
+    
+    return game_state.to_dict()
+
+
+def _time_advance_targets():
+    """(node_id, address) of every node to notify about a time advance"""
+    return [
+        (node_id, node_info['address'])
+        for node_id, node_info in registered_nodes.items()
+        if node_info['node_type'] != 'coordinator'
+    ]
+
+
+def _advance_reply():
+    """Reply for a completed time advance"""
     return {
         'success': True,
-        'message': f'Time advanced to {new_time}',
+        'message': f'Time advanced to Day {game_state.day} {game_state.time_of_day.value}',
         'time': game_state.to_dict()
     }
 
@@ -165,35 +196,32 @@ def advance_time():
 @app.route('/action/status', methods=['GET'])
 def action_status():
     """Query current action submission status"""
-    villager_nodes = {nid: info for nid, info in registered_nodes.items() if info['node_type'] == 'villager'}
-    
-    submitted = []
-    waiting = []
-    
-    for nid, info in villager_nodes.items():
-        # Build display name: Name (occupation)
-        display_name = nid
-        if info.get('name') and info['name'] != nid:
-            if info.get('occupation'):
-                display_name = f"{info['name']} ({info['occupation']})"
-            else:
-                display_name = info['name']
-        
-        if nid in pending_actions:
-            submitted.append({'node_id': nid, 'display_name': display_name})
-        else:
-            waiting.append({'node_id': nid, 'display_name': display_name})
+    period = barrier.snapshot()
+    waiting = [_node_entry(nid) for nid in period['waiting']]
+    submitted = [_node_entry(nid) for nid in period['members'] if nid in period['actions']]
     
     return jsonify({
-        'total_villagers': len(villager_nodes),
+        'total_villagers': len(period['members']),
         'submitted': len(submitted),
         'submitted_nodes': submitted,
-        'pending_actions': pending_actions,
+        'pending_actions': period['actions'],
         'waiting_for': waiting,
-        'ready_to_advance': time_barrier_ready
+        'ready_to_advance': period['ready']
     })
 
 
+def _node_entry(node_id):
+    """{node_id, display_name} with display name "Name (occupation)" when known"""
+    info = registered_nodes.get(node_id, {})
+    display_name = node_id
+    if info.get('name') and info['name'] != node_id:
+        if info.get('occupation'):
+            display_name = f"{info['name']} ({info['occupation']})"
+        else:
+            display_name = info['name']
+    return {'node_id': node_id, 'display_name': display_name}
+
+
 @app.route('/nodes', methods=['GET'])
 def list_nodes():
     """List all registered nodes"""
@@ -202,14 +230,56 @@ def list_nodes():
     })
 
 
+@app.route('/directory/<node_id>', methods=['POST'])
+def update_directory(node_id):
+    """A villager publishes the public fields that changed ({'delta': {...}, 'full': bool})"""
+    data = request.json
+    version = town_directory.apply(node_id, data.get('delta', {}), full=data.get('full', False))
+    if version is None:
+        return jsonify({'success': False, 'message': f'Unknown directory entry {node_id}, send full state'}), 409
+    return jsonify({'success': True, 'version': version})
+
+
+@app.route('/directory', methods=['GET'])
+def get_directory():
+    """Public state of all villagers in one call (?since=<version> for only the changed ones)"""
+    since = request.args.get('since', type=int)
+    version, full, entries = town_directory.read(since)
+    villagers = []
+    for node_id, state in entries.items():
+        node = registered_nodes.get(node_id)
+        if node is None:
+            continue
+        villagers.append({**state, 'node_id': node_id, 'address': node['address']})
+    return jsonify({'version': version, 'full': full, 'villagers': villagers})
+
+
+def _directory_villagers():
+    """Directory entries of registered villagers, with their node_id"""
+    _, _, entries = town_directory.read()
+    return [{**state, 'node_id': node_id} for node_id, state in entries.items() if node_id in registered_nodes]
+
+
+@app.route('/market/recommendations', methods=['GET'])
+def market_recommendations():
+    """Villager-to-villager trades matched for the current tick (?node_id=<id> for one villager's side)"""
+    tick = (game_state.day, game_state.time_of_day.value)
+    trades = market.trades_for_tick(tick, _directory_villagers)
+    node_id = request.args.get('node_id')
+    return jsonify({
+        'day': tick[0],
+        'time_of_day': tick[1],
+        'computed_ms': round(market.computed_ms, 3),
+        'trades': recommendations_for(trades, node_id) if node_id else trades
+    })
+
+
 @app.route('/messages/broadcast', methods=['POST'])
 def broadcast_message():
     """Broadcast message to all villager nodes"""
     try:
         data = request.json
-        sender_id = data['from']
-        sender_name = data['from_name']
-        content = data['content']
+        message = _broadcast_payload(data)
         
         # Get all villager nodes
         villager_nodes = [node for node in registered_nodes.values() if node['node_type'] == 'villager']
@@ -218,56 +288,64 @@ def broadcast_message():
             return jsonify({'success': False, 'message': 'No villager nodes found'}), 404
         
         # Send broadcast message to each villager node
-        success_count = 0
         failed_nodes = []
         
         for node in villager_nodes:
             try:
-                response = requests.post(
+                response = http_client.post(
                     f"http://{node['address']}/messages",
-                    json={
-                        'from': sender_id,
-                        'from_name': sender_name,
-                        'to': 'all',
-                        'type': 'broadcast',
-                        'content': content,
-                        'timestamp': ''
-                    },
+                    json=message,
                     timeout=3
                 )
                 
-                if response.status_code == 200:
-                    success_count += 1
-                else:
+                if response.status_code != 200:
                     failed_nodes.append(node['node_id'])
                     
             except Exception as e:
                 failed_nodes.append(node['node_id'])
                 print(f"[Coordinator] Failed to send broadcast message to {node['node_id']}: {e}")
         
-        print(f"[Coordinator] 📢 Broadcast message: {sender_name}: {content}")
-        print(f"[Coordinator] Successfully sent to {success_count}/{len(villager_nodes)} nodes")
-        
-        if failed_nodes:
-            print(f"[Coordinator] Failed nodes: {failed_nodes}")
-        
-        return jsonify({
-            'success': True,
-            'message': f'Broadcast sent to {success_count}/{len(villager_nodes)} nodes',
-            'success_count': success_count,
-            'total_nodes': len(villager_nodes),
-            'failed_nodes': failed_nodes
-        })
+        return jsonify(_broadcast_reply(data, len(villager_nodes), failed_nodes))
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _broadcast_payload(data):
+    """Message delivered to every villager for a broadcast request"""
+    return {
+        'from': data['from'],
+        'from_name': data['from_name'],
+        'to': 'all',
+        'type': 'broadcast',
+        'content': data['content'],
+        'timestamp': ''
+    }
+
+
+def _broadcast_reply(data, total_nodes, failed_nodes):
+    """Log a finished broadcast and build its reply"""
+    success_count = total_nodes - len(failed_nodes)
+    print(f"[Coordinator] 📢 Broadcast message: {data['from_name']}: {data['content']}")
+    print(f"[Coordinator] Successfully sent to {success_count}/{total_nodes} nodes")
+    
+    if failed_nodes:
+        print(f"[Coordinator] Failed nodes: {failed_nodes}")
+    
+    return {
+        'success': True,
+        'message': f'Broadcast sent to {success_count}/{total_nodes} nodes',
+        'success_count': success_count,
+        'total_nodes': total_nodes,
+        'failed_nodes': failed_nodes
+    }
+
+
 def run_server(port=5000):
     """Run server"""
     print(f"[Coordinator] REST Time Coordinator starting on port {port}")
     print("[Coordinator] Waiting for node registration...")
-    app.run(host='0.0.0.0', port=port, debug=False)
+    http_client.serve(app, port)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,319 @@
+"""
+Time Coordinator (asyncio) - Architecture 2 (REST)
+Same endpoints and state as coordinator.py, served by aiohttp so one process
+can hold tens of thousands of idle subscribers, plus push delivery:
+
+  GET /events?since=<seq>&timeout=<s>&types=<a,b>   long-poll for events after seq
+  GET /events/stream?since=<seq>&types=<a,b>         newline-delimited JSON stream
+
+Events are 'time_advance', 'broadcast' and 'node_registered'. Time advance and
+broadcast fan-out to registered nodes runs concurrently and never blocks the
+request that triggered it.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector
+
+sys.path.insert(0, os.path.dirname(__file__))
+import coordinator as core
+from common.flask_bridge import dispatch
+
+MAX_POLL_TIMEOUT = 60.0        # seconds a long-poll may be held open
+STREAM_HEARTBEAT = 15.0        # seconds between keep-alive lines on a stream
+NOTIFY_CONCURRENCY = 256       # simultaneous outbound notifications
+
+# Shared client session (created on startup)
+client = {'session': None}
+
+
+class EventHub:
+    """Sequenced ring of recent events that subscribers wait on
+
+    All waiters share one future per generation, so an idle subscriber costs
+    one suspended task and publishing wakes everyone with a single set_result.
+    """
+
+    def __init__(self, capacity=1024):
+        self.events = deque(maxlen=capacity)
+        self.seq = 0
+        self.subscribers = 0
+        self._next = None
+
+    def _future(self):
+        if self._next is None or self._next.done():
+            self._next = asyncio.get_running_loop().create_future()
+        return self._next
+
+    def publish(self, event_type, data):
+        """Append an event and wake all waiting subscribers"""
+        self.seq += 1
+        self.events.append({'seq': self.seq, 'type': event_type, 'data': data, 'ts': time.time()})
+        if self._next is not None and not self._next.done():
+            self._next.set_result(None)
+
+    def after(self, since, types=None):
+        """Events with seq > since, and whether the subscriber missed events
+
+        missed is set when older events were already dropped from the ring, or
+        when since is ahead of this hub (the coordinator restarted).
+        """
+        if since > self.seq:
+            return [], True
+        if since == self.seq:
+            return [], False
+        # Sequence numbers are contiguous, so the newest (seq - since) entries are the answer
+        count = min(self.seq - since, len(self.events))
+        missed = count < self.seq - since
+        size = len(self.events)
+        events = [self.events[i] for i in range(size - count, size)]
+        if types:
+            events = [e for e in events if e['type'] in types]
+        return events, missed
+
+    async def wait(self, timeout):
+        """Wait until the next publish or timeout"""
+        await asyncio.wait({self._future()}, timeout=timeout)
+
+
+hub = EventHub()
+
+
+def _parse_subscription(request):
+    """Read since/types query parameters (since defaults to 'from now')"""
+    since = int(request.query.get('since', hub.seq))
+    types = set(request.query['types'].split(',')) if request.query.get('types') else None
+    return since, types
+
+
+# ==================== Fan-out ====================
+
+async def _post(address, path, payload, semaphore):
+    """POST one notification, returns whether it was accepted"""
+    async with semaphore:
+        async with client['session'].post(f"http://{address}{path}", json=payload) as response:
+            return response.status == 200
+
+
+async def _fan_out(targets, path, payload, timeout):
+    """POST payload to every (node_id, address) concurrently, returns failed node ids"""
+    semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+    results = await asyncio.gather(
+        *(asyncio.wait_for(_post(address, path, payload, semaphore), timeout) for _, address in targets),
+        return_exceptions=True
+    )
+    failed = []
+    for (node_id, _), result in zip(targets, results):
+        if result is not True:
+            failed.append(node_id)
+            if isinstance(result, BaseException):
+                print(f"[Coordinator] Failed to notify node {node_id}: {result!r}")
+    return failed
+
+
+background_tasks = set()
+
+
+def _spawn(coro):
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def _notify_time_advance(notification, targets):
+    failed = await _fan_out(targets, '/time/advance', notification, timeout=2)
+    print(f"[Coordinator] Notified {len(targets) - len(failed)}/{len(targets)} nodes of time advance")
+
+
+def _advance(actions=None):
+    """Advance the clock, publish the event and start notifying nodes"""
+    notification = core._advance_clock(actions)
+    hub.publish('time_advance', notification)
+    _spawn(_notify_time_advance(notification, core._time_advance_targets()))
+    return core._advance_reply()
+
+
+# ==================== Handlers ====================
+
+async def register_node(request):
+    """Register node (Flask view) and announce it to subscribers"""
+    response = await dispatch(core.app, request)
+    if response.status == 200:
+        data = await request.json()
+        hub.publish('node_registered', core.registered_nodes[data['node_id']])
+    return response
+
+
+async def submit_action(request):
+    """Villager submits action for current time period"""
+    data = await request.json()
+    closed, waiting_for = core._record_action(data['node_id'], data['action'])
+
+    if closed is not None:
+        # Automatically advance time; nodes are notified in the background
+        _advance(closed)
+
+    return web.json_response(core._submit_reply(closed is not None, waiting_for))
+
+
+async def advance_time(request):
+    """Manually advance time (admin feature, for debugging)"""
+    return web.json_response(_advance())
+
+
+async def broadcast_message(request):
+    """Broadcast message to all villager nodes and subscribers"""
+    try:
+        data = await request.json()
+        message = core._broadcast_payload(data)
+
+        villager_nodes = [node for node in core.registered_nodes.values() if node['node_type'] == 'villager']
+
+        if not villager_nodes:
+            return web.json_response({'success': False, 'message': 'No villager nodes found'}, status=404)
+
+        hub.publish('broadcast', message)
+        failed_nodes = await _fan_out(
+            [(node['node_id'], node['address']) for node in villager_nodes],
+            '/messages', message, timeout=3
+        )
+        return web.json_response(core._broadcast_reply(data, len(villager_nodes), failed_nodes))
+
+    except Exception as e:
+        return web.json_response({'success': False, 'error': str(e)}, status=500)
+
+
+async def poll_events(request):
+    """Long-poll: return events after ?since=, waiting up to ?timeout= seconds for one"""
+    try:
+        since, types = _parse_subscription(request)
+        timeout = min(float(request.query.get('timeout', 30)), MAX_POLL_TIMEOUT)
+    except ValueError:
+        return web.json_response({'success': False, 'message': 'Invalid since/timeout'}, status=400)
+
+    deadline = time.monotonic() + timeout
+    events, missed = hub.after(since, types)
+    hub.subscribers += 1
+    try:
+        # Events filtered out by type do not end the poll
+        while not events and not missed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await hub.wait(remaining)
+            events, missed = hub.after(since, types)
+    finally:
+        hub.subscribers -= 1
+
+    return web.json_response({
+        'success': True,
+        'events': events,
+        'next': events[-1]['seq'] if events else hub.seq,
+        'missed': missed,
+        'time': core.game_state.to_dict()
+    })
+
+
+async def stream_events(request):
+    """Stream events as newline-delimited JSON until the client disconnects"""
+    try:
+        since, types = _parse_subscription(request)
+    except ValueError:
+        return web.json_response({'success': False, 'message': 'Invalid since'}, status=400)
+
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson', 'Cache-Control': 'no-cache'})
+    await response.prepare(request)
+
+    hub.subscribers += 1
+    try:
+        while True:
+            events, missed = hub.after(since, types)
+            since = hub.seq
+            if missed:
+                await response.write(b'{"type":"missed"}\n')
+            for event in events:
+                await response.write(json.dumps(event).encode() + b'\n')
+            if not events:
+                # Blank line as heartbeat, also detects closed connections
+                await response.write(b'\n')
+            # Events published while writing are picked up without waiting
+            if hub.seq == since:
+                await hub.wait(STREAM_HEARTBEAT)
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    finally:
+        hub.subscribers -= 1
+    return response
+
+
+async def health(request):
+    """Health check, including the number of connected subscribers"""
+    return web.json_response({
+        'status': 'healthy',
+        'service': 'coordinator',
+        'subscribers': hub.subscribers,
+        'event_seq': hub.seq
+    })
+
+
+async def flask_view(request):
+    """Endpoints without outbound I/O run the coordinator.py views in-process"""
+    return await dispatch(core.app, request)
+
+
+def create_app():
+    """Build the aiohttp application (native routes first, everything else to Flask)"""
+    app = web.Application()
+    app.router.add_get('/health', health)
+    app.router.add_post('/register', register_node)
+    app.router.add_post('/action/submit', submit_action)
+    app.router.add_post('/time/advance', advance_time)
+    app.router.add_post('/messages/broadcast', broadcast_message)
+    app.router.add_get('/events', poll_events)
+    app.router.add_get('/events/stream', stream_events)
+    app.router.add_route('*', '/{tail:.*}', flask_view)  # /time, /action/status, /nodes
+    return app
+
+
+async def serve(port, backlog=4096):
+    """Start the server; runs until cancelled"""
+    client['session'] = ClientSession(
+        connector=TCPConnector(limit=0, limit_per_host=32),
+        timeout=ClientTimeout(total=5)
+    )
+
+    runner = web.AppRunner(create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', port, backlog=backlog).start()
+    print(f"[Coordinator] Listening on port {port} (asyncio)")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await client['session'].close()
+
+
+def run_server(port=5000):
+    """Run server"""
+    print(f"[Coordinator] REST Time Coordinator (asyncio) starting on port {port}")
+    print("[Coordinator] Waiting for node registration...")
+    try:
+        asyncio.run(serve(port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='REST Time Coordinator Service (asyncio)')
+    parser.add_argument('--port', type=int, default=5000, help='Listen port')
+    args = parser.parse_args()
+
+    run_server(args.port)
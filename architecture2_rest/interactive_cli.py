@@ -3,12 +3,15 @@ Interactive CLI client - control a single VillagerNode
 Can connect to any running VillagerNode for interaction
 """
 
-import requests
 import sys
+import os
 import json
 import time
 from typing import Optional
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from common import http_client
+
 
 class VillagerCLI:
     """VillagerNode interactive CLI"""
@@ -24,7 +27,7 @@ class VillagerCLI:
     def check_connection(self) -> bool:
         """Check connection"""
         try:
-            response = requests.get(f"{self.villager_url}/health", timeout=2)
+            response = http_client.get(f"{self.villager_url}/health", timeout=2)
             return response.status_code == 200
         except:
             return False
@@ -32,7 +35,7 @@ class VillagerCLI:
     def get_villager_info(self) -> Optional[dict]:
         """Get Villager information"""
         try:
-            response = requests.get(f"{self.villager_url}/villager", timeout=5)
+            response = http_client.get(f"{self.villager_url}/villager", timeout=5)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -44,7 +47,7 @@ class VillagerCLI:
     def create_villager(self, name: str, occupation: str, gender: str, personality: str):
         """CreateVillager"""
         try:
-            response = requests.post(
+            response = http_client.post(
                 f"{self.villager_url}/villager",
                 json={
                     'name': name,
@@ -101,7 +104,7 @@ class VillagerCLI:
     def produce(self):
         """Production (auto-submit work)"""
         try:
-            response = requests.post(f"{self.villager_url}/action/produce", timeout=5)
+            response = http_client.post(f"{self.villager_url}/action/produce", timeout=5)
             
             if response.status_code == 200:
                 data = response.json()
@@ -127,7 +130,7 @@ class VillagerCLI:
     def trade(self, action: str, item: str, quantity: int):
         """Trade"""
         try:
-            response = requests.post(
+            response = http_client.post(
                 f"{self.villager_url}/action/trade",
                 json={
                     'target': 'merchant',
@@ -149,7 +152,7 @@ class VillagerCLI:
     def sleep(self):
         """Sleep (auto-submit sleep)"""
         try:
-            response = requests.post(f"{self.villager_url}/action/sleep", timeout=5)
+            response = http_client.post(f"{self.villager_url}/action/sleep", timeout=5)
             
             if response.status_code == 200:
                 data = response.json()
@@ -175,7 +178,7 @@ class VillagerCLI:
     def eat(self):
         """Eat bread to restore stamina"""
         try:
-            response = requests.post(f"{self.villager_url}/action/eat", timeout=5)
+            response = http_client.post(f"{self.villager_url}/action/eat", timeout=5)
             
             if response.status_code == 200:
                 print(f"\n✓ {response.json()['message']}")
@@ -188,7 +191,7 @@ class VillagerCLI:
     def get_current_time(self):
         """Get current time"""
         try:
-            response = requests.get(f"{self.coordinator_url}/time", timeout=5)
+            response = http_client.get(f"{self.coordinator_url}/time", timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 return f"Day {data['day']} - {data['time_of_day']}"
@@ -199,7 +202,7 @@ class VillagerCLI:
     def submit_action(self, action_type: str):
         """Submit action to Coordinator (synchronization barrier)"""
         try:
-            response = requests.post(
+            response = http_client.post(
                 f"{self.villager_url}/action/submit",
                 json={'action': action_type},
                 timeout=10  # Extended timeout because we may wait for others
@@ -248,7 +251,7 @@ class VillagerCLI:
     def get_all_villagers(self):
         """Get all Villager nodes"""
         try:
-            response = requests.get(f"{self.coordinator_url}/nodes", timeout=5)
+            response = http_client.get(f"{self.coordinator_url}/nodes", timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 villagers = {}
@@ -312,7 +315,7 @@ class VillagerCLI:
             # Create trade via Merchant
             print(f"\n📤 Creating trade request (via Merchant node)...")
             
-            response = requests.post(
+            response = http_client.post(
                 f"{self.merchant_url}/trade/create",
                 json={
                     'initiator_id': my_node_id,
@@ -369,7 +372,7 @@ class VillagerCLI:
             
             try:
                 # Query the trade status from the other side
-                response = requests.get(
+                response = http_client.get(
                     f"http://{trade['target_address']}/trade/pending",
                     timeout=2
                 )
@@ -412,14 +415,14 @@ class VillagerCLI:
                 return
             
             # Get sent trades
-            sent_response = requests.get(
+            sent_response = http_client.get(
                 f"{self.merchant_url}/trade/list",
                 params={'node_id': node_id, 'type': 'sent'},
                 timeout=5
             )
             
             # Get received trades
-            received_response = requests.get(
+            received_response = http_client.get(
                 f"{self.merchant_url}/trade/list",
                 params={'node_id': node_id, 'type': 'pending'},
                 timeout=5
@@ -511,7 +514,7 @@ class VillagerCLI:
                 print("\n✗ Unable to get NodeID")
                 return
             
-            response = requests.get(
+            response = http_client.get(
                 f"{self.merchant_url}/trade/list",
                 params={'node_id': node_id, 'type': 'pending'},
                 timeout=5
@@ -566,7 +569,7 @@ class VillagerCLI:
                 print("\n✗ Unable to get NodeID")
                 return
             
-            response = requests.post(
+            response = http_client.post(
                 f"{self.merchant_url}/trade/accept",
                 json={'trade_id': trade_id, 'node_id': node_id},
                 timeout=10
@@ -594,7 +597,7 @@ class VillagerCLI:
                 print("\n✗ Unable to get NodeID")
                 return
             
-            response = requests.post(
+            response = http_client.post(
                 f"{self.merchant_url}/trade/confirm",
                 json={'trade_id': trade_id, 'node_id': node_id},
                 timeout=10
@@ -630,7 +633,7 @@ class VillagerCLI:
                 print("\n✗ Unable to get NodeID")
                 return
             
-            response = requests.post(
+            response = http_client.post(
                 f"{self.merchant_url}/trade/reject",
                 json={'trade_id': trade_id, 'node_id': node_id},
                 timeout=5
@@ -656,7 +659,7 @@ class VillagerCLI:
                 print("\n✗ Unable to get NodeID")
                 return
             
-            response = requests.post(
+            response = http_client.post(
                 f"{self.merchant_url}/trade/cancel",
                 json={'trade_id': trade_id, 'node_id': node_id},
                 timeout=5
@@ -677,7 +680,7 @@ class VillagerCLI:
     def prepare_trade_request(self, trade_id: str):
         """Prepare trade (two-phase commit - phase 1)"""
         try:
-            response = requests.post(
+            response = http_client.post(
                 f"{self.villager_url}/trade/prepare",
                 json={'trade_id': trade_id},
                 timeout=10
@@ -702,7 +705,7 @@ class VillagerCLI:
     def commit_trade_request(self, trade_id: str):
         """Submit trade (two-phase commit - phase 2)"""
         try:
-            response = requests.post(
+            response = http_client.post(
                 f"{self.villager_url}/trade/commit",
                 json={'trade_id': trade_id},
                 timeout=10
@@ -731,7 +734,7 @@ class VillagerCLI:
     def abort_trade_request(self, trade_id: str):
         """Abort trade (two-phase commit - rollback)"""
         try:
-            response = requests.post(
+            response = http_client.post(
                 f"{self.villager_url}/trade/abort",
                 json={'trade_id': trade_id},
                 timeout=10
@@ -800,7 +803,7 @@ class VillagerCLI:
             print(f"\nCompleting trade with {trade['target']}...")
             
             # Notify the counterparty to complete the trade
-            response = requests.post(
+            response = http_client.post(
                 f"http://{trade['target_address']}/trade/complete",
                 json={
                     'from': my_info['name'],
@@ -817,7 +820,7 @@ class VillagerCLI:
                 # Update my own state
                 if trade['type'] == 'buy':
                     # I buy: deduct money, add item
-                    result = requests.post(
+                    result = http_client.post(
                         f"{self.villager_url}/action/trade",
                         json={
                             'target': 'self',  # mark as handled locally
@@ -830,7 +833,7 @@ class VillagerCLI:
                     )
                 else:
                     # I sell: add money, deduct item
-                    result = requests.post(
+                    result = http_client.post(
                         f"{self.villager_url}/action/trade",
                         json={
                             'target': 'self',
@@ -871,7 +874,7 @@ class VillagerCLI:
     def check_action_status(self):
         """View current action submission status"""
         try:
-            response = requests.get(f"{self.coordinator_url}/action/status", timeout=5)
+            response = http_client.get(f"{self.coordinator_url}/action/status", timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 
@@ -916,7 +919,7 @@ class VillagerCLI:
     def get_merchant_prices(self):
         """Get merchant price table"""
         try:
-            response = requests.get(f"{self.merchant_url}/prices", timeout=5)
+            response = http_client.get(f"{self.merchant_url}/prices", timeout=5)
             if response.status_code == 200:
                 prices = response.json()
                 print("\n" + "="*50)
@@ -938,7 +941,7 @@ class VillagerCLI:
     def get_messages(self):
         """Get message list"""
         try:
-            response = requests.get(f"{self.villager_url}/messages", timeout=5)
+            response = http_client.get(f"{self.villager_url}/messages", timeout=5)
             if response.status_code == 200:
                 return response.json()['messages']
             else:
@@ -950,7 +953,7 @@ class VillagerCLI:
     def send_message(self, target, content, message_type='private'):
         """Send message"""
         try:
-            response = requests.post(
+            response = http_client.post(
                 f"{self.villager_url}/messages/send",
                 json={
                     'target': target,
@@ -1016,7 +1019,7 @@ class VillagerCLI:
             if message_id:
                 data['message_id'] = message_id
             
-            response = requests.post(
+            response = http_client.post(
                 f"{self.villager_url}/messages/mark_read",
                 json=data,
                 timeout=5
@@ -1036,7 +1039,7 @@ class VillagerCLI:
     def get_online_villagers(self):
         """Get list of online villagers"""
         try:
-            response = requests.get(f"{self.coordinator_url}/nodes", timeout=5)
+            response = http_client.get(f"{self.coordinator_url}/nodes", timeout=5)
             if response.status_code == 200:
                 nodes_data = response.json()
                 villagers = []
@@ -6,7 +6,6 @@ Provides fixed-price item buying/selling services
 """
 
 from flask import Flask, request, jsonify
-import requests
 import sys
 import os
 import threading
@@ -14,9 +13,13 @@ import time
 import uuid
 import random
 import copy
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from common.models import MERCHANT_PRICES
+from common import http_client
+from common.projection import parse_fields, project
+from common.event_log import EventLog, poll
 
 app = Flask(__name__)
 
@@ -28,6 +31,37 @@ prices = MERCHANT_PRICES
 trade_counter = 0
 active_trades = {}  # trade_id -> trade_data
 
+# Trade lifecycle events: GET /events (one poll for a process hosting many agents),
+# and pushed to both parties' villager nodes, whose /events each agent long-polls
+# (a long-poll per agent here would hold one of the server's worker threads)
+event_log = EventLog()
+event_pusher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trade-events')  # one thread keeps them in order
+
+
+def _trade_event(event_type, trade, actor):
+    """Record a trade change for both parties and push it to their nodes (actor: node whose call caused it)"""
+    data = {
+        'trade_id': trade['trade_id'],
+        'status': trade['status'],
+        'initiator_id': trade['initiator_id'],
+        'target_id': trade['target_id'],
+        'item': trade['item'],
+        'quantity': trade['quantity']
+    }
+    event_log.append(event_type, data, audience=(trade['initiator_id'], trade['target_id']), actor=actor)
+    for address in dict.fromkeys((trade['initiator_address'], trade['target_address'])):
+        event_pusher.submit(_push_event, address, {'type': event_type, 'data': data, 'actor': actor})
+
+
+def _push_event(address, event):
+    """POST a trade event to a villager node's /trade/event"""
+    try:
+        response = http_client.post(f"http://{address}/trade/event", json=event, timeout=5)
+        if response.status_code != 200:
+            print(f"[Merchant-Trade] Failed to push {event['type']} to {address}: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"[Merchant-Trade] Failed to push {event['type']} to {address}: {e}")
+
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -146,6 +180,7 @@ def create_trade():
     }
     
     active_trades[trade_id] = trade_data
+    _trade_event('trade_request', trade_data, initiator_id)
     
     print(f"[Merchant-Trade] Created trade {trade_id}: {initiator_id} -> {target_id}")
     print(f"[Merchant-Trade]   {offer_type} {quantity}x {item} for {price} gold")
@@ -159,7 +194,7 @@ def create_trade():
 
 @app.route('/trade/list', methods=['GET'])
 def list_trades():
-    """Query trade list"""
+    """Query trade list (?fields=trade_id,status,... returns only those trade fields)"""
     node_id_param = request.args.get('node_id')
     trade_type = request.args.get('type', 'all')  # 'pending', 'sent', 'all'
     
@@ -181,10 +216,23 @@ def list_trades():
     
     return jsonify({
         'success': True,
-        'trades': result_trades
+        'trades': project(result_trades, parse_fields(request.args.get('fields')))
     })
 
 
+@app.route('/events', methods=['GET'])
+def get_events():
+    """Long-poll trade events involving a node: ?node_id=<id>&since=<seq>&timeout=<seconds>
+
+    Without node_id every trade event is returned (one poll for a process hosting many agents).
+    Standalone agents get the same events from their villager node instead.
+    """
+    try:
+        return jsonify({'success': True, **poll(event_log, request.args)})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid parameter: {e}'}), 400
+
+
 @app.route('/trade/accept', methods=['POST'])
 def accept_trade():
     """Accept trade (called by target)"""
@@ -209,7 +257,7 @@ def accept_trade():
     target_address = trade['target_address']
     try:
         # Get target's villager information
-        response = requests.get(f"http://{target_address}/villager", timeout=5)
+        response = http_client.get(f"http://{target_address}/villager", params={'fields': 'inventory'}, timeout=5)
         if response.status_code != 200:
             return jsonify({'success': False, 'message': 'Cannot get target villager info'}), 400
         
@@ -239,6 +287,7 @@ def accept_trade():
         trade['accepted_at'] = time.time()
         
         print(f"[Merchant-Trade] Trade {trade_id} accepted by {trade['target_id']}")
+        _trade_event('trade_update', trade, node_id_param)
         
         return jsonify({
             'success': True,
@@ -294,6 +343,7 @@ def confirm_trade():
                 del active_trades[trade_id]
                 
                 print(f"[Merchant-Trade] Trade completed: {trade_id}")
+                _trade_event('trade_update', trade, node_id_param)
                 
                 return jsonify({
                     'success': True,
@@ -308,6 +358,7 @@ def confirm_trade():
             return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
     else:
         # Waiting for other party to confirm
+        _trade_event('trade_update', trade, node_id_param)
         return jsonify({
             'success': True,
             'message': 'Confirmation recorded. Waiting for the other party.',
@@ -332,7 +383,7 @@ def execute_trade(trade):
             seller_address = initiator_address
         
         # 1. Buyer pays
-        response = requests.post(
+        response = http_client.post(
             f"http://{buyer_address}/trade/execute",
             json={
                 'trade_id': trade['trade_id'],
@@ -346,7 +397,7 @@ def execute_trade(trade):
             return False
         
         # 2. Seller deducts item
-        response = requests.post(
+        response = http_client.post(
             f"http://{seller_address}/trade/execute",
             json={
                 'trade_id': trade['trade_id'],
@@ -359,7 +410,7 @@ def execute_trade(trade):
         if response.status_code != 200:
             print(f"[Merchant-Trade] Seller item deduction failed")
             # Roll back buyer's payment
-            requests.post(
+            http_client.post(
                 f"http://{buyer_address}/trade/execute",
                 json={
                     'trade_id': trade['trade_id'],
@@ -371,7 +422,7 @@ def execute_trade(trade):
             return False
         
         # 3. Buyer receives item
-        response = requests.post(
+        response = http_client.post(
             f"http://{buyer_address}/trade/execute",
             json={
                 'trade_id': trade['trade_id'],
@@ -386,7 +437,7 @@ def execute_trade(trade):
             return False
         
         # 4. Seller receives money
-        response = requests.post(
+        response = http_client.post(
             f"http://{seller_address}/trade/execute",
             json={
                 'trade_id': trade['trade_id'],
@@ -428,6 +479,8 @@ def reject_trade():
         return jsonify({'success': False, 'message': f"Cannot reject trade with status {trade['status']}"}), 400
     
     del active_trades[trade_id]
+    trade['status'] = 'rejected'
+    _trade_event('trade_update', trade, node_id_param)
     
     print(f"[Merchant-Trade] Trade rejected: {trade_id} by {node_id_param}")
     
@@ -458,6 +511,8 @@ def cancel_trade():
         return jsonify({'success': False, 'message': f"Cannot cancel trade with status {trade['status']}"}), 400
     
     del active_trades[trade_id]
+    trade['status'] = 'cancelled'
+    _trade_event('trade_update', trade, node_id_param)
     
     print(f"[Merchant-Trade] Trade canceled: {trade_id}")
     
@@ -473,7 +528,7 @@ def register_to_coordinator(coordinator_addr, port):
     time.sleep(2)  # Wait for service to start
     
     try:
-        response = requests.post(
+        response = http_client.post(
             f"http://{coordinator_addr}/register",
             json={
                 'node_id': node_id,
@@ -505,7 +560,7 @@ def run_server(port=5001, coordinator_addr=None):
         daemon=True
     ).start()
     
-    app.run(host='0.0.0.0', port=port, debug=False)
+    http_client.serve(app, port)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Multi-Agent Runner - Architecture 2 (REST)
+Hosts many AI villager agents in one asyncio process, instead of one
+ai_villager_agent.py process (with its own decision and watcher threads) per
+villager.
+
+- Waiting is asynchronous: one aiohttp session long-polls each villager's
+  GET /events (which also carries the merchant's trade events, pushed to both
+  parties' nodes), so an idle agent costs a suspended coroutine rather than threads.
+- Decisions run make_decision_and_act() on a bounded thread pool (--workers),
+  taken from a FIFO ready queue. An agent woken several times is queued once
+  and goes to the back after deciding, so busy villagers cannot starve the rest.
+- Model calls go through one RateLimitedBackend: a requests/tokens-per-minute
+  budget and a concurrency cap shared by all agents, so a time advance that
+  wakes every agent does not hit the LLM endpoint all at once. With
+  --llm-batch, decisions made at the same time are packed into one request
+  (BatchingBackend), so the system prompt and request overhead are paid once.
+- Agents share the pooled HTTP client, one context-gathering pool and one
+  decision cache.
+- A time advance event starts each agent's next decision right away on the
+  worker pool, from the state predicted locally (start_speculation); the
+  decision after the debounce uses it when the fetched state matches.
+
+Usage:
+    python multi_agent_runner.py --ports 5002-5101 --backend rule --create
+    python multi_agent_runner.py --ports 5002,5003 --llm-rpm 500 --llm-concurrency 8
+    python multi_agent_runner.py --ports 5002-5101 --llm-rpm 60 --llm-batch 8
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from ai_villager_agent import AIVillagerAgent, EVENT_POLL_TIMEOUT, EVENT_RETRY_DELAY, MAX_FOLLOWUPS
+from common import http_client
+from common.decision_cache import DecisionCache
+from common.llm_backends import BACKENDS, LLM_TIMEOUT, BatchingBackend, HedgedBackend, RateLimitedBackend, create_backend
+
+OCCUPATIONS = ('farmer', 'chef', 'carpenter')
+IDLE_CHECK_INTERVAL = 1.0  # seconds between max-idle checks
+
+
+class AgentSlot:
+    """Scheduling state of one hosted agent"""
+
+    def __init__(self, agent: AIVillagerAgent):
+        self.agent = agent
+        self.queued = False         # waiting in the ready queue
+        self.running = False        # deciding on a worker
+        self.dirty = False          # woken while deciding: decide again afterwards
+        self.timer = None           # pending debounce (asyncio.TimerHandle)
+        self.last_decision = 0.0
+        self.decisions = 0
+        self.followups = 0          # consecutive free actions (buy, eat...) decided straight after another
+
+
+class MultiAgentRunner:
+    """Schedules decisions of many agents on a shared worker pool, waking them on node events"""
+
+    def __init__(self, agents: List[AIVillagerAgent], workers: int = 32,
+                 debounce: float = 0.5, max_idle: float = 30.0, report_interval: float = 10.0, log=print):
+        self.slots = [AgentSlot(agent) for agent in agents]
+        self.workers = workers
+        self.debounce = debounce
+        self.max_idle = max_idle
+        self.report_interval = report_interval
+        self.log = log
+        self.decisions = 0
+        self.failures = 0
+        self.queue: Optional[asyncio.Queue] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pool: Optional[ThreadPoolExecutor] = None
+
+    # ========== Scheduling ==========
+
+    def wake(self, slot: AgentSlot) -> None:
+        """An event arrived for slot: decide after the debounce (bursts collapse into one decision)"""
+        if slot.timer is None:
+            slot.timer = self.loop.call_later(self.debounce, self._fire, slot)
+
+    def _fire(self, slot: AgentSlot) -> None:
+        slot.timer = None
+        self.enqueue(slot)
+
+    def enqueue(self, slot: AgentSlot) -> None:
+        """Queue slot for a decision (at most once; after the current one if it is deciding)"""
+        if slot.running:
+            slot.dirty = True
+        elif not slot.queued:
+            slot.queued = True
+            self.queue.put_nowait(slot)
+
+    async def _worker(self, pool: ThreadPoolExecutor) -> None:
+        while True:
+            slot = await self.queue.get()
+            slot.queued = False
+            slot.running = True
+            try:
+                await self.loop.run_in_executor(pool, slot.agent.make_decision_and_act)
+            except Exception as e:
+                self.failures += 1
+                self.log(f"[Runner] {slot.agent.villager_name} decision failed: {e}")
+            finally:
+                slot.running = False
+                slot.last_decision = time.monotonic()
+                slot.decisions += 1
+                self.decisions += 1
+            # A free action leaves the period open: requeue at the back, as for an event
+            if slot.agent.wants_followup and slot.followups < MAX_FOLLOWUPS:
+                slot.followups += 1
+                slot.dirty = True
+            elif not slot.dirty:
+                slot.followups = 0
+            if slot.dirty:
+                slot.dirty = False
+                self.enqueue(slot)
+
+    async def _idle_check(self) -> None:
+        """Decide for agents that have had no event for max_idle seconds"""
+        while True:
+            await asyncio.sleep(IDLE_CHECK_INTERVAL)
+            now = time.monotonic()
+            for slot in self.slots:
+                if not slot.queued and not slot.running and now - slot.last_decision >= self.max_idle:
+                    self.enqueue(slot)
+
+    # ========== Event watching ==========
+
+    async def _poll(self, session: ClientSession, url: str, params: Dict, on_events) -> None:
+        """Follow one GET /events log forever, passing each batch of events to on_events"""
+        since = None
+        while True:
+            query = dict(params, timeout=EVENT_POLL_TIMEOUT)
+            if since is not None:
+                query['since'] = since
+            try:
+                async with session.get(url, params=query) as response:
+                    if response.status != 200:
+                        raise RuntimeError(f"HTTP {response.status}")
+                    result = await response.json(content_type=None)
+            except Exception as e:
+                self.log(f"[Runner] Event watch on {url} failed: {e}")
+                await asyncio.sleep(EVENT_RETRY_DELAY)
+                continue
+            events = result.get('events', [])
+            if result.get('missed') and since is not None:
+                events = events + [{'type': 'missed'}]
+            if events:
+                on_events(events)
+            since = result.get('next', since)
+
+    def _on_villager_events(self, slot: AgentSlot):
+        def on_events(events):
+            # Skip trade changes this agent caused itself
+            events = [event for event in events
+                      if slot.agent.node_id is None or event.get('actor') != slot.agent.node_id]
+            advances = [event for event in events if event['type'] == 'time_advance']
+            if advances:
+                slot.agent.start_speculation(advances[-1], executor=self.pool)
+            if events:
+                self.wake(slot)
+        return on_events
+
+    # ========== Reporting ==========
+
+    async def _report(self, llm) -> None:
+        last_decisions, last_time = 0, time.monotonic()
+        while True:
+            await asyncio.sleep(self.report_interval)
+            now = time.monotonic()
+            rate = (self.decisions - last_decisions) / (now - last_time)
+            llm_stats = f", LLM calls {llm.calls} (waited {llm.waited:.1f}s total)" if llm is not None else ""
+            fast_path = sum(slot.agent.decision_stats['fast_path'] for slot in self.slots)
+            cached = sum(slot.agent.decision_stats['cached'] for slot in self.slots)
+            ahead = sum(slot.agent.decision_stats['speculative'] for slot in self.slots)
+            avoided = (fast_path + cached) / self.decisions * 100 if self.decisions else 0.0
+            self.log(f"[Runner] {len(self.slots)} agents, {self.decisions} decisions ({rate:.1f}/s), "
+                     f"{self.queue.qsize()} queued, {sum(s.running for s in self.slots)} deciding, "
+                     f"{self.failures} failed, {fast_path} fast path + {cached} cached ({avoided:.0f}% without LLM), "
+                     f"{ahead} decided ahead"
+                     f"{llm_stats}")
+            last_decisions, last_time = self.decisions, now
+
+    # ========== Main ==========
+
+    async def run(self, llm: Optional[RateLimitedBackend] = None) -> None:
+        """Run until cancelled"""
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        pool = self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='decide')
+        session = ClientSession(
+            connector=TCPConnector(limit=0),
+            timeout=ClientTimeout(total=EVENT_POLL_TIMEOUT + 10)
+        )
+        tasks = [asyncio.create_task(self._worker(pool)) for _ in range(self.workers)]
+        tasks += [
+            asyncio.create_task(self._poll(session, f"{slot.agent.villager_url}/events", {},
+                                           self._on_villager_events(slot)))
+            for slot in self.slots
+        ]
+        tasks.append(asyncio.create_task(self._idle_check()))
+        if self.report_interval:
+            tasks.append(asyncio.create_task(self._report(llm)))
+
+        # First decision for everyone, in random order so the same villager does not always go first
+        for slot in random.sample(self.slots, len(self.slots)):
+            self.enqueue(slot)
+        self.log(f"[Runner] Hosting {len(self.slots)} agents, {self.workers} decision workers")
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await session.close()
+            pool.shutdown(wait=False)
+
+
+def parse_ports(spec: str) -> List[int]:
+    """'5002-5005,5010' -> [5002, 5003, 5004, 5005, 5010]"""
+    ports = []
+    for part in spec.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            ports.extend(range(int(first), int(last) + 1))
+        elif part:
+            ports.append(int(part))
+    return ports
+
+
+def attach_agent(agent: AIVillagerAgent, index: int, create: bool, log) -> bool:
+    """Load the agent's villager (creating one with --create); returns whether it is usable"""
+    status = agent.get_villager_status()
+    if not status:
+        if not create:
+            log(f"[Runner] No villager on {agent.villager_url}, skipping (use --create)")
+            return False
+        if not agent.create_villager(f"Villager{agent.villager_port}", OCCUPATIONS[index % len(OCCUPATIONS)],
+                                     'female' if index % 2 else 'male', 'hardworking'):
+            return False
+        status = agent.get_villager_status() or {}
+    agent.villager_info = status
+    agent.villager_name = status.get('name', 'Unknown')
+    agent.villager_occupation = status.get('occupation', 'Unknown')
+    return agent.get_node_id() is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run many AI villager agents in one process')
+    parser.add_argument('--ports', type=str, required=True, help="Villager node ports, e.g. '5002-5101' or '5002,5003'")
+    parser.add_argument('--coordinator', type=int, default=5000, help='Coordinator port')
+    parser.add_argument('--merchant', type=int, default=5001, help='Merchant port')
+    parser.add_argument('--api-key', type=str, help='OpenAI API Key')
+    parser.add_argument('--model', type=str, default='gpt-4o', help='GPT model')
+    parser.add_argument('--backend', choices=BACKENDS, default='openai', help='Decision source')
+    parser.add_argument('--replay', type=str, help='JSONL recording played back by --backend replay')
+    parser.add_argument('--llm-url', type=str, default=os.getenv('LLM_BASE_URL'),
+                        help='Base URL of the server for --backend http, e.g. http://localhost:8000/v1')
+    parser.add_argument('--llm-timeout', type=float, default=LLM_TIMEOUT, help='Seconds before a stalled LLM call fails')
+    parser.add_argument('--no-stream', action='store_true', help='Wait for whole replies instead of streaming to the ACTION line')
+    parser.add_argument('--hedge', type=float, default=0,
+                        help='Send a second copy of LLM calls slower than this percentile of recent ones (0: off)')
+    parser.add_argument('--create', action='store_true', help='Create a villager on nodes that have none')
+    parser.add_argument('--workers', type=int, default=32, help='Decisions made at once')
+    parser.add_argument('--context-workers', type=int, default=64, help='Threads shared by all agents for context gathering')
+    parser.add_argument('--llm-rpm', type=float, default=0, help='LLM requests per minute for all agents (0: unlimited)')
+    parser.add_argument('--llm-tpm', type=float, default=0, help='LLM tokens per minute for all agents (0: unlimited)')
+    parser.add_argument('--llm-concurrency', type=int, default=16, help='LLM calls in flight at once')
+    parser.add_argument('--llm-batch', type=int, default=1,
+                        help='Pack up to this many concurrent decisions into one LLM request (1: one request each)')
+    parser.add_argument('--llm-batch-wait', type=float, default=0.05, help='Seconds a batch waits for more decisions')
+    parser.add_argument('--debounce', type=float, default=0.5, help='Seconds of quiet after an event before deciding')
+    parser.add_argument('--max-idle', type=float, default=30.0, help='Decide at least this often without events')
+    parser.add_argument('--no-fast-path', action='store_true', help='Ask the LLM for forced decisions too')
+    parser.add_argument('--no-speculate', action='store_true', help='Do not decide ahead when time advances')
+    parser.add_argument('--decision-cache', type=str, default=os.getenv('DECISION_CACHE_PATH'),
+                        help='SQLite file for cached decisions (default: memory only)')
+    parser.add_argument('--history-dir', type=str,
+                        help='Write full decision records to <dir>/agent-<port>.jsonl.gz (default: keep recent ones in memory only)')
+    parser.add_argument('--report', type=float, default=10.0, help='Seconds between status lines (0: off)')
+    parser.add_argument('--quiet', action='store_true', help="Hide the agents' own output")
+    args = parser.parse_args()
+
+    api_key = args.api_key or os.getenv('OPENAI_API_KEY')
+    if args.backend == 'openai' and not api_key:
+        print("Error: OpenAI API Key not provided")
+        print("Please use the --api-key argument or set the OPENAI_API_KEY environment variable")
+        sys.exit(1)
+
+    def log(message):
+        print(message, file=sys.__stdout__, flush=True)
+
+    if args.quiet:
+        sys.stdout = open(os.devnull, 'w')
+
+    ports = parse_ports(args.ports)
+    # One pooled session serves every agent: keep a connection pool per villager node
+    http_client.POOL_HOSTS = max(http_client.POOL_HOSTS, len(ports) + 8)
+
+    llm = RateLimitedBackend(
+        create_backend(args.backend, args.model, api_key, args.replay, base_url=args.llm_url, timeout=args.llm_timeout),
+        requests_per_minute=args.llm_rpm,
+        tokens_per_minute=args.llm_tpm,
+        max_concurrency=args.llm_concurrency
+    )
+    # Hedge copies are real requests, so they go through the rate limiter too; the hedge
+    # timer starts once a request is admitted, and no copy is sent while others are queued
+    agent_llm = HedgedBackend(llm, percentile=args.hedge) if args.hedge else llm
+    # Batches are packed before the rate limiter, so one batched request uses one request of the budget
+    agent_llm = BatchingBackend(agent_llm, args.llm_batch, args.llm_batch_wait) if args.llm_batch > 1 else agent_llm
+    decision_cache = DecisionCache(capacity=max(256, len(ports) * 4), path=args.decision_cache)
+    context_pool = ThreadPoolExecutor(max_workers=args.context_workers, thread_name_prefix='context')
+    if args.history_dir:
+        os.makedirs(args.history_dir, exist_ok=True)
+
+    agents = []
+    for index, port in enumerate(ports):
+        agent = AIVillagerAgent(
+            villager_port=port,
+            coordinator_port=args.coordinator,
+            merchant_port=args.merchant,
+            api_key=api_key,
+            model=args.model,
+            use_react=True,
+            decision_cache=decision_cache,
+            llm_backend=agent_llm,
+            context_executor=context_pool,
+            history_path=os.path.join(args.history_dir, f"agent-{port}.jsonl.gz") if args.history_dir else None,
+            fast_path=not args.no_fast_path,
+            speculate=not args.no_speculate,
+            stream=not args.no_stream
+        )
+        if attach_agent(agent, index, args.create, log):
+            agents.append(agent)
+    if not agents:
+        log("[Runner] No villagers to run")
+        sys.exit(1)
+
+    runner = MultiAgentRunner(
+        agents, workers=args.workers, debounce=args.debounce, max_idle=args.max_idle,
+        report_interval=args.report, log=log
+    )
+    try:
+        asyncio.run(runner.run(llm))
+    except KeyboardInterrupt:
+        log(f"[Runner] Stopped after {runner.decisions} decisions")
+    finally:
+        for agent in agents:
+            agent.decision_history.close()
+
+
+if __name__ == '__main__':
+    main()
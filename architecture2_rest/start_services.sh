@@ -29,7 +29,13 @@ done
 
 # Start coordinator
 echo "2. Starting Coordinator (port 5000)..."
-python coordinator.py --port 5000 > /tmp/rest_coord.log 2>&1 &
+# COORDINATOR_ASYNC=1 runs the asyncio coordinator (same API plus /events long-poll/stream)
+if [ "$COORDINATOR_ASYNC" = "1" ]; then
+    COORDINATOR_SCRIPT=coordinator_async.py
+else
+    COORDINATOR_SCRIPT=coordinator.py
+fi
+python $COORDINATOR_SCRIPT --port 5000 > /tmp/rest_coord.log 2>&1 &
 COORD_PID=$!
 sleep 2
 
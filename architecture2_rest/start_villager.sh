@@ -80,7 +80,13 @@ fi
 # Start villager node
 echo ""
 echo "2. Starting villager node..."
-python villager.py --port $PORT --id $NODE_ID --coordinator localhost:5000 > /tmp/rest_villager_${NODE_ID}.log 2>&1 &
+# VILLAGER_ASYNC=1 runs the asyncio server (same API)
+if [ "$VILLAGER_ASYNC" = "1" ]; then
+    VILLAGER_SCRIPT=villager_async.py
+else
+    VILLAGER_SCRIPT=villager.py
+fi
+python $VILLAGER_SCRIPT --port $PORT --id $NODE_ID --coordinator localhost:5000 > /tmp/rest_villager_${NODE_ID}.log 2>&1 &
 VILLAGER_PID=$!
 sleep 3
 
@@ -4,11 +4,11 @@ Each villager runs as an independent REST service node
 """
 
 from flask import Flask, request, jsonify
-import requests
 import sys
 import os
 import threading
 import time
+import socket
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from common.models import (
@@ -16,6 +16,11 @@ from common.models import (
     PRODUCTION_RECIPES, MERCHANT_PRICES,
     SLEEP_STAMINA, NO_SLEEP_PENALTY
 )
+from common import http_client
+from common.persistence import StateStore
+from common.projection import parse_fields, project
+from common.town_directory import DirectoryPublisher
+from common.event_log import EventLog, poll
 
 app = Flask(__name__)
 
@@ -25,9 +30,121 @@ villager_state = {
     'villager': None,
     'merchant_address': os.getenv('MERCHANT_HOST', 'localhost') + ':' + os.getenv('MERCHANT_PORT', '5001'),
     'coordinator_address': os.getenv('COORDINATOR_HOST', 'localhost') + ':' + os.getenv('COORDINATOR_PORT', '5000'),
-    'messages': []  # store received messages
+    'messages': [],  # store received messages
+    'game_time': None,  # last time notification seen, used to catch up after a restart
+    'state_store': None  # StateStore when persistence is enabled
 }
 
+# Pushes changes to this villager's public fields to the coordinator's town directory
+directory_publisher = DirectoryPublisher(
+    lambda: villager_state['coordinator_address'],
+    lambda: villager_state['node_id']
+)
+
+# Recent inbound notifications, long-polled by the agent via GET /events
+event_log = EventLog()
+
+# Notifications from other nodes that an agent may want to react to: path -> event type
+PEER_EVENTS = {
+    '/time/advance': 'time_advance',
+    '/messages': 'message',
+    '/trade/request': 'trade_request',
+    '/trade/status_update': 'trade_update',
+    '/trade/confirm_notify': 'trade_update',
+    '/trade/complete_notify': 'trade_update'
+}
+
+# Request fields copied into an event (enough for the agent to tell what happened)
+EVENT_FIELDS = ('from', 'type', 'trade_id', 'status', 'item', 'quantity', 'day', 'time_of_day')
+
+
+def _persist_state():
+    """Record the current state sections in the state store (no-op when persistence is disabled)"""
+    store = villager_state['state_store']
+    if store is None:
+        return
+    
+    villager = villager_state['villager']
+    store.set('villager', villager.to_dict() if villager else None)
+    store.set('messages', villager_state['messages'])
+    store.set('pending_trades', villager_state.get('pending_trades', []))
+    store.set('sent_trades', villager_state.get('sent_trades', []))
+    store.set('game_time', villager_state['game_time'])
+
+
+def _restore_state(store: StateStore) -> bool:
+    """Restore state from snapshot + log, returns whether a villager was restored"""
+    started = time.perf_counter()
+    state = store.load()
+    
+    if state.get('villager'):
+        villager_state['villager'] = Villager.from_dict(state['villager'])
+    villager_state['messages'] = state.get('messages', [])
+    if 'pending_trades' in state:
+        villager_state['pending_trades'] = state['pending_trades']
+    if 'sent_trades' in state:
+        villager_state['sent_trades'] = state['sent_trades']
+    villager_state['game_time'] = state.get('game_time')
+    
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    villager = villager_state['villager']
+    if villager:
+        print(f"[Villager-{villager_state['node_id']}] Restored {villager.name} from {store.snapshot_path} in {elapsed_ms:.1f} ms")
+        print(f"  Stamina: {villager.stamina}/{villager.max_stamina}, Money: {villager.inventory.money}, Items: {villager.inventory.items}")
+        print(f"  Messages: {len(villager_state['messages'])}, Pending trades: {len(villager_state.get('pending_trades', []))}")
+    return villager is not None
+
+
+def _publish_public_state():
+    """Queue this villager's public fields for the town directory (only changed ones are sent)"""
+    villager = villager_state['villager']
+    if villager is not None and villager_state['coordinator_address']:
+        directory_publisher.publish(villager.to_dict())
+
+
+@app.after_request
+def persist_after_mutation(response):
+    """Persist state and publish directory changes after every mutating request"""
+    if request.method == 'POST':
+        try:
+            _persist_state()
+        except Exception as e:
+            print(f"[Villager-{villager_state['node_id']}] Failed to persist state: {e}")
+        _publish_public_state()
+        _record_event(response)
+    return response
+
+
+def _record_event(response):
+    """Append a successful peer notification to the event log"""
+    event_type = PEER_EVENTS.get(request.path)
+    if event_type is None or response.status_code != 200:
+        return
+    data = request.get_json(silent=True) or {}
+    event_log.append(event_type, {key: data[key] for key in EVENT_FIELDS if key in data})
+
+
+def _notify(address, path, payload, description):
+    """Send a notification whose result only matters for logging
+
+    While a request is being dispatched by the asyncio server
+    (villager_async.py), notifications are queued on the 'villager.outbound'
+    environ list and sent with the async client once the handler has returned.
+    """
+    outbound = request.environ.get('villager.outbound')
+    if outbound is not None:
+        outbound.append((address, path, payload, description))
+        return
+    
+    try:
+        response = http_client.post(f"http://{address}{path}", json=payload, timeout=5)
+        if response.status_code == 200:
+            print(f"[Villager-{villager_state['node_id']}] Notified {description}")
+        else:
+            print(f"[Villager-{villager_state['node_id']}] Failed to notify {description}: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"[Villager-{villager_state['node_id']}] Failed to notify {description}: {e}")
+
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -40,6 +157,15 @@ def health():
     })
 
 
+@app.route('/events', methods=['GET'])
+def get_events():
+    """Long-poll recent notifications: ?since=<seq>&timeout=<seconds>&types=<a,b>"""
+    try:
+        return jsonify({'success': True, **poll(event_log, request.args)})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid parameter: {e}'}), 400
+
+
 @app.route('/villager', methods=['POST'])
 def create_villager():
     """Create/initialize villager"""
@@ -70,22 +196,17 @@ def create_villager():
         node_id = villager_state['node_id']
         
         if port:
-            try:
-                response = requests.post(
-                    f"http://{coordinator_addr}/register",
-                    json={
-                        'node_id': node_id,
-                        'node_type': 'villager',
-                        'address': f"{os.getenv('VILLAGER_HOST', 'localhost')}:{port}",
-                        'name': villager.name,
-                        'occupation': villager.occupation.value
-                    },
-                    timeout=5
-                )
-                if response.status_code == 200:
-                    print(f"[Villager-{node_id}] Updated coordinator: {villager.name} ({villager.occupation.value})")
-            except:
-                pass
+            _notify(
+                coordinator_addr, '/register',
+                {
+                    'node_id': node_id,
+                    'node_type': 'villager',
+                    'address': f"{os.getenv('VILLAGER_HOST', 'localhost')}:{port}",
+                    'name': villager.name,
+                    'occupation': villager.occupation.value
+                },
+                f"coordinator: {villager.name} ({villager.occupation.value})"
+            )
         
         return jsonify({
             'success': True,
@@ -102,17 +223,19 @@ def create_villager():
 
 @app.route('/villager', methods=['GET'])
 def get_villager_info():
-    """Get villager information"""
+    """Get villager information
+    
+    ?fields=name,occupation,inventory.items returns only those fields.
+    """
     if not villager_state['villager']:
         return jsonify({
             'success': False,
             'message': 'Villager not initialized'
         }), 400
     
-    # Return villager info including node_id
-    villager_data = villager_state['villager'].to_dict()
-    villager_data['node_id'] = villager_state['node_id']
-    return jsonify(villager_data)
+    # Return villager info including node_id (to_dict() is cached and shared, so copy)
+    villager_data = {**villager_state['villager'].to_dict(), 'node_id': villager_state['node_id']}
+    return jsonify(project(villager_data, parse_fields(request.args.get('fields'))))
 
 
 def _submit_action_internal(action: str) -> dict:
@@ -128,7 +251,7 @@ def _submit_action_internal(action: str) -> dict:
     # Submit to coordinator
     try:
         coordinator_addr = villager_state['coordinator_address']
-        response = requests.post(
+        response = http_client.post(
             f"http://{coordinator_addr}/action/submit",
             json={
                 'node_id': villager_state['node_id'],
@@ -137,33 +260,36 @@ def _submit_action_internal(action: str) -> dict:
             timeout=5
         )
         
-        if response.status_code == 200:
-            result = response.json()
-            
-            if result.get('all_ready'):
-                # Everyone is ready; time has advanced
-                return {
-                    'success': True,
-                    'message': 'All villagers are ready, time has advanced!',
-                    'all_ready': True,
-                    'new_time': result.get('new_time')
-                }
-            else:
-                # Still waiting for others
-                waiting_for = result.get('waiting_for', [])
-                return {
-                    'success': True,
-                    'message': f"Submitted '{action}' action, waiting for other villagers",
-                    'all_ready': False,
-                    'waiting_for': waiting_for
-                }
-        else:
-            return {'success': False, 'message': f'Coordinator returned error: {response.status_code}'}
+        return _submit_result(action, response.status_code, response.json() if response.status_code == 200 else None)
     
     except Exception as e:
         return {'success': False, 'message': f'Failed to submit: {str(e)}'}
 
 
+def _submit_result(action: str, status_code: int, result: dict) -> dict:
+    """Interpret the coordinator's reply to an action submission"""
+    if status_code != 200:
+        return {'success': False, 'message': f'Coordinator returned error: {status_code}'}
+    
+    if result.get('all_ready'):
+        # Everyone is ready; time has advanced
+        return {
+            'success': True,
+            'message': 'All villagers are ready, time has advanced!',
+            'all_ready': True,
+            'new_time': result.get('new_time')
+        }
+    else:
+        # Still waiting for others
+        waiting_for = result.get('waiting_for', [])
+        return {
+            'success': True,
+            'message': f"Submitted '{action}' action, waiting for other villagers",
+            'all_ready': False,
+            'waiting_for': waiting_for
+        }
+
+
 @app.route('/action/submit', methods=['POST'])
 def submit_action():
     """Submit action to coordinator (synchronization barrier)"""
@@ -179,50 +305,69 @@ def submit_action():
     data = request.json
     action = data.get('action', 'idle')  # work, sleep, idle
     
-    result = _submit_action_internal(action)
-    
+    body, status = _submit_response(villager, _submit_action_internal(action))
+    return jsonify(body), status
+
+
+def _submit_response(villager, result):
+    """Build the /action/submit reply, returns (body, status)"""
     if result['success']:
         if result.get('all_ready'):
-            return jsonify({
+            return {
                 'success': True,
                 'message': result['message'],
                 'all_ready': True,
                 'new_time': result.get('new_time'),
                 'villager': villager.to_dict()
-            })
+            }, 200
         else:
             # Still waiting for others
             waiting_for = result.get('waiting_for', [])
-            return jsonify({
+            return {
                 'success': True,
                 'message': result['message'],
                 'all_ready': False,
                 'waiting_for': waiting_for,
                 'villager': villager.to_dict()
-            })
+            }, 200
     else:
-        return jsonify({'success': False, 'message': result.get('message', 'Failed to submit action')}), 500
+        return {'success': False, 'message': result.get('message', 'Failed to submit action')}, 500
 
 
 @app.route('/action/produce', methods=['POST'])
 def produce():
     """Execute production (auto-submit 'work')"""
+    recipe, error = _produce_locally()
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    # Auto-submit 'work' action
+    submit_result = _submit_action_internal('work')
+    
+    return jsonify(_produce_response(recipe, submit_result))
+
+
+def _produce_locally():
+    """Consume inputs and stamina and add the output
+
+    Returns (recipe, None) on success or (None, (error body, status)).
+    """
     villager = villager_state['villager']
     
     if not villager:
-        return jsonify({'success': False, 'message': 'Villager not initialized'}), 400
+        return None, ({'success': False, 'message': 'Villager not initialized'}, 400)
     
     # Check if action already submitted for this time segment
     if villager.has_submitted_action:
-        return jsonify({'success': False, 'message': 'Action already submitted for the current time segment; please wait for time to advance'}), 400
+        return None, ({'success': False, 'message': 'Action already submitted for the current time segment; please wait for time to advance'}, 400)
     
     # Get production recipe
     recipe = PRODUCTION_RECIPES.get(villager.occupation)
     if not recipe:
-        return jsonify({
+        return None, ({
             'success': False,
             'message': f'No production recipe for occupation {villager.occupation.value}'
-        }), 400
+        }, 400)
     
     # Check if there are enough resources
     if not recipe.can_produce(villager.inventory, villager.stamina):
@@ -235,10 +380,10 @@ def produce():
         if villager.stamina < recipe.stamina_cost:
             missing_items.append(f"Insufficient stamina (requires {recipe.stamina_cost}, remaining {villager.stamina})")
         
-        return jsonify({
+        return None, ({
             'success': False,
             'message': f"Insufficient resources: {', '.join(missing_items)}"
-        }), 400
+        }, 400)
     
     # Consume resources
     for item, quantity in recipe.input_items.items():
@@ -252,15 +397,17 @@ def produce():
     print(f"[Villager-{villager_state['node_id']}] {villager.name} produced {recipe.output_quantity}x {recipe.output_item}")
     print(f"  Stamina used: {recipe.stamina_cost}, remaining: {villager.stamina}")
     
-    # Auto-submit 'work' action
-    submit_result = _submit_action_internal('work')
-    
-    return jsonify({
+    return recipe, None
+
+
+def _produce_response(recipe, submit_result):
+    """Build the /action/produce reply"""
+    return {
         'success': True,
         'message': f"Production success: {recipe.output_quantity}x {recipe.output_item}. {submit_result.get('message', '')}",
-        'villager': villager.to_dict(),
+        'villager': villager_state['villager'].to_dict(),
         'submit_result': submit_result
-    })
+    }
 
 
 @app.route('/action/trade', methods=['POST'])
@@ -325,120 +472,160 @@ def trade():
 
 def trade_with_merchant(item, quantity, action):
     """Trade with merchant"""
-    villager = villager_state['villager']
-    merchant_addr = villager_state['merchant_address']
+    plan, error = _merchant_trade_begin(item, quantity, action)
+    if error:
+        return jsonify(error[0]), error[1]
     
     try:
-        if action == 'buy':
-            # Buy from merchant
-            if item not in MERCHANT_PRICES['buy']:
-                return jsonify({'success': False, 'message': f'Merchant does not sell {item}'}), 400
-            
-            total_cost = MERCHANT_PRICES['buy'][item] * quantity
-            
-            if not villager.inventory.remove_money(total_cost):
-                return jsonify({
-                    'success': False,
-                    'message': f'Insufficient money (requires {total_cost}, have {villager.inventory.money})'
-                }), 400
-            
-            # Call merchant service
-            response = requests.post(
-                f"http://{merchant_addr}/buy",
-                json={
-                    'buyer_id': villager_state['node_id'],
-                    'item': item,
-                    'quantity': quantity
-                },
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                villager.inventory.add_item(item, quantity)
-                print(f"[Villager-{villager_state['node_id']}] {villager.name} bought {quantity}x {item} from merchant, cost {total_cost}")
-                return jsonify({
-                    'success': True,
-                    'message': f'Purchase successful: {quantity}x {item}, cost {total_cost}',
-                    'villager': villager.to_dict()
-                })
-            else:
-                # Refund
-                villager.inventory.add_money(total_cost)
-                return jsonify({
-                    'success': False,
-                    'message': f'Purchase failed: {response.json().get("message", "Unknown error")}'
-                }), 400
-        
-        elif action == 'sell':
-            # Sell to merchant
-            if item not in MERCHANT_PRICES['sell']:
-                return jsonify({'success': False, 'message': f'Merchant does not buy {item}'}), 400
-            
-            if not villager.inventory.has_item(item, quantity):
-                return jsonify({
-                    'success': False,
-                    'message': f'Insufficient item(s): {item} (requires {quantity})'
-                }), 400
-            
-            total_income = MERCHANT_PRICES['sell'][item] * quantity
-            
-            # Call merchant service
-            response = requests.post(
-                f"http://{merchant_addr}/sell",
-                json={
-                    'seller_id': villager_state['node_id'],
-                    'item': item,
-                    'quantity': quantity
-                },
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                villager.inventory.remove_item(item, quantity)
-                villager.inventory.add_money(total_income)
-                print(f"[Villager-{villager_state['node_id']}] {villager.name} sold {quantity}x {item} to merchant, received {total_income}")
-                return jsonify({
-                    'success': True,
-                    'message': f'Sale successful: {quantity}x {item}, received {total_income}',
-                    'villager': villager.to_dict()
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'message': f'Sale failed: {response.json().get("message", "Unknown error")}'
-                }), 400
+        # Call merchant service
+        response = http_client.post(
+            f"http://{villager_state['merchant_address']}{plan['path']}",
+            json=plan['payload'],
+            timeout=5
+        )
+        body, status = _merchant_trade_finish(plan, response.status_code, response.json())
+        return jsonify(body), status
     
     except Exception as e:
+        _merchant_trade_rollback(plan)
         return jsonify({
             'success': False,
             'message': f'Trade failed: {str(e)}'
         }), 500
 
 
+def _merchant_trade_begin(item, quantity, action):
+    """Validate a merchant trade and reserve the payment for purchases
+
+    Returns (plan, None) or (None, (error body, status)); the plan holds the
+    merchant request to send.
+    """
+    villager = villager_state['villager']
+    
+    if action == 'buy':
+        # Buy from merchant
+        if item not in MERCHANT_PRICES['buy']:
+            return None, ({'success': False, 'message': f'Merchant does not sell {item}'}, 400)
+        
+        total = MERCHANT_PRICES['buy'][item] * quantity
+        
+        if not villager.inventory.remove_money(total):
+            return None, ({
+                'success': False,
+                'message': f'Insufficient money (requires {total}, have {villager.inventory.money})'
+            }, 400)
+        
+        payload = {'buyer_id': villager_state['node_id'], 'item': item, 'quantity': quantity}
+    
+    elif action == 'sell':
+        # Sell to merchant
+        if item not in MERCHANT_PRICES['sell']:
+            return None, ({'success': False, 'message': f'Merchant does not buy {item}'}, 400)
+        
+        if not villager.inventory.has_item(item, quantity):
+            return None, ({
+                'success': False,
+                'message': f'Insufficient item(s): {item} (requires {quantity})'
+            }, 400)
+        
+        total = MERCHANT_PRICES['sell'][item] * quantity
+        payload = {'seller_id': villager_state['node_id'], 'item': item, 'quantity': quantity}
+    
+    else:
+        return None, ({'success': False, 'message': f'Unknown action: {action}'}, 400)
+    
+    return {
+        'action': action,
+        'item': item,
+        'quantity': quantity,
+        'total': total,
+        'path': f'/{action}',
+        'payload': payload
+    }, None
+
+
+def _merchant_trade_finish(plan, status_code, result):
+    """Apply the merchant's reply to a planned trade, returns (body, status)"""
+    villager = villager_state['villager']
+    item, quantity, total = plan['item'], plan['quantity'], plan['total']
+    
+    if plan['action'] == 'buy':
+        if status_code == 200:
+            villager.inventory.add_item(item, quantity)
+            print(f"[Villager-{villager_state['node_id']}] {villager.name} bought {quantity}x {item} from merchant, cost {total}")
+            return {
+                'success': True,
+                'message': f'Purchase successful: {quantity}x {item}, cost {total}',
+                'villager': villager.to_dict()
+            }, 200
+        
+        _merchant_trade_rollback(plan)
+        return {
+            'success': False,
+            'message': f'Purchase failed: {result.get("message", "Unknown error")}'
+        }, 400
+    
+    if status_code == 200:
+        villager.inventory.remove_item(item, quantity)
+        villager.inventory.add_money(total)
+        print(f"[Villager-{villager_state['node_id']}] {villager.name} sold {quantity}x {item} to merchant, received {total}")
+        return {
+            'success': True,
+            'message': f'Sale successful: {quantity}x {item}, received {total}',
+            'villager': villager.to_dict()
+        }, 200
+    
+    return {
+        'success': False,
+        'message': f'Sale failed: {result.get("message", "Unknown error")}'
+    }, 400
+
+
+def _merchant_trade_rollback(plan):
+    """Refund the payment reserved for a purchase that did not go through"""
+    if plan['action'] == 'buy':
+        villager_state['villager'].inventory.add_money(plan['total'])
+
+
 @app.route('/action/sleep', methods=['POST'])
 def sleep():
     """Sleep (auto-submit 'sleep' after completion)"""
+    sleep_message, error = _sleep_locally()
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    # Auto-submit sleep action
+    submit_result = _submit_action_internal('sleep')
+    
+    return jsonify(_sleep_response(sleep_message, submit_result))
+
+
+def _sleep_locally():
+    """Restore stamina for tonight's sleep
+
+    Returns (sleep message, None) on success or (None, (error body, status)).
+    """
     villager = villager_state['villager']
     
     if not villager:
-        return jsonify({'success': False, 'message': 'Villager not initialized'}), 400
+        return None, ({'success': False, 'message': 'Villager not initialized'}, 400)
     
     # Check if action already submitted for this time segment
     if villager.has_submitted_action:
-        return jsonify({'success': False, 'message': 'Action already submitted for the current time segment; please wait for time to advance'}), 400
+        return None, ({'success': False, 'message': 'Action already submitted for the current time segment; please wait for time to advance'}, 400)
     
     if villager.has_slept:
-        return jsonify({'success': False, 'message': 'Already slept today'}), 400
+        return None, ({'success': False, 'message': 'Already slept today'}, 400)
     
     # Check for house or temporary room voucher
     has_house = villager.inventory.has_item("house", 1)
     has_temp_room = villager.inventory.has_item("temp_room", 1)
     
     if not has_house and not has_temp_room:
-        return jsonify({
+        return None, ({
             'success': False,
             'message': 'No house or temporary room voucher, cannot sleep. Please buy a temporary room voucher from the merchant or build a house.'
-        }), 400
+        }, 400)
     
     # Pre-handle sleep (restoration happens here)
     sleep_message = ""
@@ -453,50 +640,293 @@ def sleep():
     print(f"[Villager-{villager_state['node_id']}] {villager.name} {sleep_message}, restored stamina {SLEEP_STAMINA}")
     print(f"  Current stamina: {villager.stamina}/{villager.max_stamina}")
     
-    # Auto-submit sleep action
-    submit_result = _submit_action_internal('sleep')
-    
-    return jsonify({
+    return sleep_message, None
+
+
+def _sleep_response(sleep_message, submit_result):
+    """Build the /action/sleep reply"""
+    return {
         'success': True,
         'message': f'Sleep successful, restored {SLEEP_STAMINA} stamina. {sleep_message}. {submit_result.get("message", "")}',
-        'villager': villager.to_dict(),
+        'villager': villager_state['villager'].to_dict(),
         'submit_result': submit_result
-    })
+    }
 
 
 @app.route('/action/eat', methods=['POST'])
 def eat_food():
     """Eat bread to restore stamina"""
+    restored, error = _eat_locally()
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    return jsonify({
+        'success': True,
+        'message': f'Ate bread and restored {restored} stamina',
+        'villager': villager_state['villager'].to_dict()
+    })
+
+
+def _eat_locally():
+    """Eat one bread
+
+    Returns (stamina restored, None) on success or (None, (error body, status)).
+    """
     villager = villager_state['villager']
     
     if not villager:
-        return jsonify({'success': False, 'message': 'Villager not initialized'}), 400
+        return None, ({'success': False, 'message': 'Villager not initialized'}, 400)
     
     if not villager.inventory.has_item("bread", 1):
-        return jsonify({
+        return None, ({
             'success': False,
             'message': 'No bread available to eat'
-        }), 400
+        }, 400)
     
     # Eat bread
     old_stamina = villager.stamina
-    success = villager.eat_bread()
+    if not villager.eat_bread():
+        return None, ({
+            'success': False,
+            'message': 'Failed to eat bread'
+        }, 400)
     
-    if success:
-        restored = villager.stamina - old_stamina
-        print(f"[Villager-{villager_state['node_id']}] {villager.name} ate bread and restored {restored} stamina")
-        print(f"  Current stamina: {villager.stamina}/{villager.max_stamina}")
-        
-        return jsonify({
-            'success': True,
-            'message': f'Ate bread and restored {restored} stamina',
-            'villager': villager.to_dict()
+    restored = villager.stamina - old_stamina
+    print(f"[Villager-{villager_state['node_id']}] {villager.name} ate bread and restored {restored} stamina")
+    print(f"  Current stamina: {villager.stamina}/{villager.max_stamina}")
+    
+    return restored, None
+
+
+# ==================== Batched actions ====================
+
+MAX_BATCH_ACTIONS = 32
+
+# Steps that end the time segment, and the action they submit to the coordinator
+BARRIER_STEPS = {'produce': 'work', 'sleep': 'sleep', 'submit': None}
+BATCH_STEPS = ('trade', 'eat') + tuple(BARRIER_STEPS)
+
+
+@app.route('/action/batch', methods=['POST'])
+def execute_batch():
+    """Run an ordered list of actions in one request
+    
+    Body: {"actions": [{"type": "trade", "item": "seed", "quantity": 2, "action": "buy"},
+                       {"type": "produce"}, ...],
+           "mode": "atomic" | "best_effort"}
+    
+    Step types are trade (with the merchant), eat, produce, sleep and submit
+    ({"type": "submit", "action": "idle"}). At most one of produce/sleep/submit
+    may appear, since each ends the time segment; its submission to the
+    coordinator is sent once, after all steps have run.
+    
+    atomic (default): stop at the first failing step and undo the steps that
+    ran (refund purchases, take back bought items, give back stamina...);
+    nothing is submitted. Only the batch's own changes are undone, so trades,
+    messages or a time advance handled meanwhile are kept. The merchant keeps
+    no stock, so undoing this node's side undoes the merchant trades as well.
+    best_effort: run every step, skipping failed ones.
+    """
+    batch, error = _batch_begin(request.json or {})
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    for step in batch['steps']:
+        result, plan = _batch_step(step)
+        if plan is not None:
+            try:
+                response = http_client.post(
+                    f"http://{villager_state['merchant_address']}{plan['path']}",
+                    json=plan['payload'],
+                    timeout=5
+                )
+                result = _batch_trade_result(plan, response.status_code, response.json())
+            except Exception as e:
+                _merchant_trade_rollback(plan)
+                result = {'success': False, 'message': f'Trade failed: {str(e)}'}
+        if not _batch_record(batch, step, result):
+            break
+    
+    barrier_action = _batch_barrier_action(batch)
+    submit_result = _submit_action_internal(barrier_action) if barrier_action else None
+    
+    body, status = _batch_response(batch, submit_result)
+    return jsonify(body), status
+
+
+def _batch_begin(data):
+    """Validate a batch request
+
+    Returns (batch, None) or (None, (error body, status)).
+    """
+    villager = villager_state['villager']
+    
+    if not villager:
+        return None, ({'success': False, 'message': 'Villager not initialized'}, 400)
+    
+    actions = data.get('actions')
+    mode = data.get('mode', 'atomic')
+    
+    if not isinstance(actions, list) or not actions:
+        return None, ({'success': False, 'message': 'actions must be a non-empty list'}, 400)
+    if len(actions) > MAX_BATCH_ACTIONS:
+        return None, ({'success': False, 'message': f'At most {MAX_BATCH_ACTIONS} actions per batch'}, 400)
+    if mode not in ('atomic', 'best_effort'):
+        return None, ({'success': False, 'message': f'Unknown mode: {mode}'}, 400)
+    
+    steps = []
+    for index, action in enumerate(actions):
+        step_type = action.get('type') if isinstance(action, dict) else None
+        if step_type not in BATCH_STEPS:
+            return None, ({
+                'success': False,
+                'message': f'Step {index}: unknown type {step_type!r} (expected one of {", ".join(BATCH_STEPS)})'
+            }, 400)
+        if step_type == 'trade' and not all(key in action for key in ('item', 'quantity', 'action')):
+            return None, ({'success': False, 'message': f'Step {index}: trade requires item, quantity and action'}, 400)
+        steps.append(dict(action, index=index))
+    
+    barriers = [step for step in steps if step['type'] in BARRIER_STEPS]
+    if len(barriers) > 1:
+        return None, ({
+            'success': False,
+            'message': 'At most one produce/sleep/submit step per batch (each ends the time segment)'
+        }, 400)
+    if barriers and villager.has_submitted_action:
+        return None, ({'success': False, 'message': 'Action already submitted for the current time segment'}, 400)
+    
+    return {
+        'steps': steps,
+        'atomic': mode == 'atomic',
+        'barrier': barriers[0] if barriers else None,
+        'undo': [],  # changes of the steps that succeeded, for Villager.revert()
+        'results': [],
+        'failed': False
+    }, None
+
+
+def _batch_step(step):
+    """Run the local part of one step
+
+    Returns (result, None), or (None, plan) for a merchant trade whose request
+    still has to be sent (then finish it with _batch_trade_result). A successful
+    result carries the step's changes under 'changes'.
+    """
+    step_type = step['type']
+    villager = villager_state['villager']
+    
+    if step_type == 'trade':
+        plan, error = _merchant_trade_begin(step['item'], step['quantity'], step['action'])
+        if error:
+            return error[0], None
+        return None, plan
+    
+    if step_type == 'eat':
+        restored, error = _eat_locally()
+        if error:
+            return error[0], None
+        return {'success': True, 'message': f'Ate bread and restored {restored} stamina',
+                'changes': {'items': {'bread': -1}, 'stamina': restored}}, None
+    
+    if step_type == 'produce':
+        recipe, error = _produce_locally()
+        if error:
+            return error[0], None
+        items = {item: -quantity for item, quantity in recipe.input_items.items()}
+        items[recipe.output_item] = items.get(recipe.output_item, 0) + recipe.output_quantity
+        return {'success': True, 'message': f'Production success: {recipe.output_quantity}x {recipe.output_item}',
+                'changes': {'items': items, 'stamina': -recipe.stamina_cost}}, None
+    
+    if step_type == 'sleep':
+        stamina = villager.stamina
+        sleep_message, error = _sleep_locally()
+        if error:
+            return error[0], None
+        return {'success': True, 'message': f'Sleep successful, restored {SLEEP_STAMINA} stamina. {sleep_message}',
+                'changes': {'stamina': villager.stamina - stamina, 'slept': True}}, None
+    
+    # submit: nothing to do locally, the submission is sent after the last step
+    return {'success': True, 'message': f"'{step.get('action', 'idle')}' will be submitted"}, None
+
+
+def _batch_trade_result(plan, status_code, result):
+    """Apply the merchant's reply to a batched trade, returns the step result"""
+    body, _ = _merchant_trade_finish(plan, status_code, result)
+    if not body['success']:
+        return {'success': False, 'message': body['message']}
+    sign = 1 if plan['action'] == 'buy' else -1
+    return {'success': True, 'message': body['message'],
+            'changes': {'money': -sign * plan['total'], 'items': {plan['item']: sign * plan['quantity']}}}
+
+
+def _batch_record(batch, step, result):
+    """Record a step result, returns whether the batch should continue"""
+    changes = result.pop('changes', None)
+    if changes:
+        batch['undo'].append(changes)
+    batch['results'].append({
+        'index': step['index'],
+        'type': step['type'],
+        'success': result['success'],
+        'message': result.get('message', '')
+    })
+    if result['success']:
+        return True
+    
+    batch['failed'] = True
+    if not batch['atomic']:
+        return True
+    
+    # All-or-nothing: undo the earlier steps, last first, and report the steps that did not run
+    villager = villager_state['villager']
+    for changes in reversed(batch['undo']):
+        villager.revert(changes)
+    for entry in batch['results'][:-1]:
+        entry['rolled_back'] = True
+    for skipped in batch['steps'][step['index'] + 1:]:
+        batch['results'].append({
+            'index': skipped['index'],
+            'type': skipped['type'],
+            'success': False,
+            'skipped': True,
+            'message': 'Skipped after an earlier step failed'
         })
+    print(f"[Villager-{villager_state['node_id']}] Batch rolled back at step {step['index']} ({step['type']}): {result.get('message', '')}")
+    return False
+
+
+def _batch_barrier_action(batch):
+    """The action to submit to the coordinator once the steps have run, if any"""
+    barrier = batch['barrier']
+    if barrier is None or (batch['failed'] and batch['atomic']):
+        return None
+    if not batch['results'][barrier['index']]['success']:
+        return None
+    return BARRIER_STEPS[barrier['type']] or barrier.get('action', 'idle')
+
+
+def _batch_response(batch, submit_result):
+    """Build the /action/batch reply, returns (body, status)"""
+    succeeded = sum(1 for result in batch['results'] if result['success'])
+    
+    if batch['failed'] and batch['atomic']:
+        message = f"Batch rolled back: {next(r for r in batch['results'] if not r['success'])['message']}"
     else:
-        return jsonify({
-            'success': False,
-            'message': 'Failed to eat bread'
-        }), 400
+        message = f"{succeeded}/{len(batch['steps'])} steps succeeded"
+        if submit_result is not None:
+            message += f". {submit_result.get('message', '')}"
+    
+    body = {
+        'success': not batch['failed'],
+        'mode': 'atomic' if batch['atomic'] else 'best_effort',
+        'message': message,
+        'results': batch['results'],
+        'villager': villager_state['villager'].to_dict()
+    }
+    if submit_result is not None:
+        body['submit_result'] = submit_result
+    
+    return body, (400 if batch['failed'] and batch['atomic'] else 200)
 
 
 @app.route('/trade/request', methods=['POST'])
@@ -549,6 +979,14 @@ def receive_trade_request():
     })
 
 
+@app.route('/trade/event', methods=['POST'])
+def merchant_trade_event():
+    """Trade change pushed by the merchant: {type, data, actor}, added to the event log for the agent"""
+    data = request.json or {}
+    event_log.append(data.get('type', 'trade_update'), data.get('data'), actor=data.get('actor'))
+    return jsonify({'success': True})
+
+
 @app.route('/trade/pending', methods=['GET'])
 def get_pending_trades():
     """Get pending trade requests"""
@@ -557,7 +995,7 @@ def get_pending_trades():
     
     return jsonify({
         'success': True,
-        'pending_trades': villager_state['pending_trades']
+        'pending_trades': project(villager_state['pending_trades'], parse_fields(request.args.get('fields')))
     })
 
 
@@ -621,31 +1059,16 @@ def accept_trade():
     print(f"[Villager-{villager_state['node_id']}] Trade accepted: request {trade_id} from {trade['from']}")
     print(f"[Villager-{villager_state['node_id']}] Waiting for both parties to confirm the trade...")
     
-    # Notify initiator that the trade has been accepted (via HTTP to their node)
-    try:
-        # Send HTTP request to the initiator to update their sent_trades status
-        initiator_address = trade.get('from_address')
-        if initiator_address:
-            update_data = {
-                'trade_id': trade_id,
-                'status': 'accepted'
-            }
-            
-            response = requests.post(
-                f"http://{initiator_address}/trade/status_update",
-                json=update_data,
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                print(f"[Villager-{villager_state['node_id']}] Notified {trade['from']}: Trade {trade_id} has been accepted")
-            else:
-                print(f"[Villager-{villager_state['node_id']}] Failed to notify initiator: HTTP {response.status_code}")
-        else:
-            print(f"[Villager-{villager_state['node_id']}] Unable to notify initiator: missing address info")
-        
-    except Exception as e:
-        print(f"[Villager-{villager_state['node_id']}] Failed to notify initiator: {e}")
+    # Notify initiator that the trade has been accepted (updates their sent_trades status)
+    initiator_address = trade.get('from_address')
+    if initiator_address:
+        _notify(
+            initiator_address, '/trade/status_update',
+            {'trade_id': trade_id, 'status': 'accepted'},
+            f"{trade['from']}: Trade {trade_id} has been accepted"
+        )
+    else:
+        print(f"[Villager-{villager_state['node_id']}] Unable to notify initiator: missing address info")
     
     return jsonify({
         'success': True,
@@ -943,47 +1366,27 @@ def confirm_trade():
         print(f"[Villager-{villager_state['node_id']}] Initiator confirmed trade: {trade_id}")
         
         # Notify receiver that initiator has confirmed
-        try:
-            receiver_address = trade.get('target_address')  # sent_trades uses target_address
-            if receiver_address:
-                confirm_data = {
-                    'trade_id': trade_id,
-                    'initiator_confirmed': True
-                }
-                response = requests.post(
-                    f"http://{receiver_address}/trade/confirm_notify",
-                    json=confirm_data,
-                    timeout=5
-                )
-                if response.status_code == 200:
-                    print(f"[Villager-{villager_state['node_id']}] Notified receiver: initiator confirmed trade {trade_id}")
-                else:
-                    print(f"[Villager-{villager_state['node_id']}] Failed to notify receiver: HTTP {response.status_code}")
-            else:
-                print(f"[Villager-{villager_state['node_id']}] Warning: receiver address missing")
-        except Exception as e:
-            print(f"[Villager-{villager_state['node_id']}] Failed to notify receiver: {e}")
+        receiver_address = trade.get('target_address')  # sent_trades uses target_address
+        if receiver_address:
+            _notify(
+                receiver_address, '/trade/confirm_notify',
+                {'trade_id': trade_id, 'initiator_confirmed': True},
+                f"receiver: initiator confirmed trade {trade_id}"
+            )
+        else:
+            print(f"[Villager-{villager_state['node_id']}] Warning: receiver address missing")
     else:
         trade['receiver_confirmed'] = True
         print(f"[Villager-{villager_state['node_id']}] Receiver confirmed trade: {trade_id}")
         
         # Notify initiator that receiver has confirmed
-        try:
-            initiator_address = trade.get('from_address')
-            if initiator_address:
-                confirm_data = {
-                    'trade_id': trade_id,
-                    'receiver_confirmed': True
-                }
-                response = requests.post(
-                    f"http://{initiator_address}/trade/confirm_notify",
-                    json=confirm_data,
-                    timeout=5
-                )
-                if response.status_code == 200:
-                    print(f"[Villager-{villager_state['node_id']}] Notified initiator: receiver confirmed trade {trade_id}")
-        except Exception as e:
-            print(f"[Villager-{villager_state['node_id']}] Failed to notify initiator: {e}")
+        initiator_address = trade.get('from_address')
+        if initiator_address:
+            _notify(
+                initiator_address, '/trade/confirm_notify',
+                {'trade_id': trade_id, 'receiver_confirmed': True},
+                f"initiator: receiver confirmed trade {trade_id}"
+            )
     
     trade['confirmed_at'] = time.time()
     
@@ -1050,29 +1453,14 @@ def confirm_trade():
             ]
         
         # Notify counterparty that trade is completed (to avoid double settlement)
-        try:
-            if is_initiator:
-                # I am initiator, notify receiver
-                target_address = trade.get('target_address')
-                if target_address:
-                    requests.post(
-                        f"http://{target_address}/trade/complete_notify",
-                        json={'trade_id': trade_id},
-                        timeout=5
-                    )
-                    print(f"[Villager-{villager_state['node_id']}] Notified counterparty: trade completed")
-            else:
-                # I am receiver, notify initiator
-                from_address = trade.get('from_address')
-                if from_address:
-                    requests.post(
-                        f"http://{from_address}/trade/complete_notify",
-                        json={'trade_id': trade_id},
-                        timeout=5
-                    )
-                    print(f"[Villager-{villager_state['node_id']}] Notified counterparty: trade completed")
-        except Exception as e:
-            print(f"[Villager-{villager_state['node_id']}] Failed to notify counterparty of completion: {e}")
+        # Initiator notifies receiver, receiver notifies initiator
+        counterparty_address = trade.get('target_address') if is_initiator else trade.get('from_address')
+        if counterparty_address:
+            _notify(
+                counterparty_address, '/trade/complete_notify',
+                {'trade_id': trade_id},
+                "counterparty: trade completed"
+            )
         
         return jsonify({
             'success': True,
@@ -1301,7 +1689,15 @@ def on_time_advance():
     if not villager:
         return jsonify({'success': True, 'message': 'No villager'})
     
-    data = request.json
+    _apply_time_advance(request.json)
+    
+    return jsonify({'success': True, 'message': 'Time updated'})
+
+
+def _apply_time_advance(data):
+    """Apply a time advance to the villager (daily reset on a new morning)"""
+    villager = villager_state['villager']
+    villager_state['game_time'] = {'day': data['day'], 'time_of_day': data['time_of_day']}
     print(f"[Villager-{villager_state['node_id']}] Time advance: Day {data['day']} {data['time_of_day']}")
     
     # If it's a new day (morning)
@@ -1322,8 +1718,36 @@ def on_time_advance():
         print(f"  Current time of day: {data['time_of_day']}")
     
     print(f"  You can start a new action (work/sleep/idle)")
+
+
+def _sync_time_with_coordinator(coordinator_addr):
+    """After a restart, apply the time advance missed while the node was down"""
+    villager = villager_state['villager']
+    if not villager:
+        return
     
-    return jsonify({'success': True, 'message': 'Time updated'})
+    try:
+        response = http_client.get(f"http://{coordinator_addr}/time", timeout=5)
+        if response.status_code != 200:
+            return
+        
+        _catch_up_time(response.json())
+    
+    except Exception as e:
+        print(f"[Villager-{villager_state['node_id']}] Unable to sync time with coordinator: {e}")
+
+
+def _catch_up_time(current_time):
+    """Compare the coordinator's clock with the last seen time and apply a missed advance"""
+    last_time = villager_state['game_time']
+    if last_time is None:
+        villager_state['game_time'] = {'day': current_time['day'], 'time_of_day': current_time['time_of_day']}
+    elif (last_time['day'], last_time['time_of_day']) != (current_time['day'], current_time['time_of_day']):
+        # Only the latest period is applied; intermediate periods were not observed
+        print(f"[Villager-{villager_state['node_id']}] Missed time advance while offline: "
+              f"Day {last_time['day']} {last_time['time_of_day']} -> Day {current_time['day']} {current_time['time_of_day']}")
+        _apply_time_advance(current_time)
+    _persist_state()
 
 
 # ==================== Message System API ====================
@@ -1384,7 +1808,7 @@ def send_message():
         if message_type == 'broadcast':
             # Send broadcast message via Coordinator
             coordinator_addr = villager_state['coordinator_address']
-            response = requests.post(
+            response = http_client.post(
                 f"http://{coordinator_addr}/messages/broadcast",
                 json={
                     'from': villager_state['node_id'],
@@ -1404,24 +1828,18 @@ def send_message():
             # Send point-to-point message
             # First, get the target node address from the Coordinator
             coordinator_addr = villager_state['coordinator_address']
-            nodes_response = requests.get(f"http://{coordinator_addr}/nodes", timeout=5)
+            nodes_response = http_client.get(f"http://{coordinator_addr}/nodes", timeout=5)
             
             if nodes_response.status_code != 200:
                 return jsonify({'success': False, 'message': 'Failed to get node list'}), 500
             
-            nodes_data = nodes_response.json()
-            target_node = None
-            
-            for node in nodes_data['nodes']:
-                if node['node_id'] == target or node.get('name') == target:
-                    target_node = node
-                    break
+            target_node = _find_node(nodes_response.json()['nodes'], target)
             
             if not target_node:
                 return jsonify({'success': False, 'message': f'Target node not found: {target}'}), 404
             
             # Send message to target node
-            target_response = requests.post(
+            target_response = http_client.post(
                 f"http://{target_node['address']}/messages",
                 json={
                     'from': villager_state['node_id'],
@@ -1444,6 +1862,14 @@ def send_message():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _find_node(nodes, target):
+    """Find a node by node_id or villager name"""
+    for node in nodes:
+        if node['node_id'] == target or node.get('name') == target:
+            return node
+    return None
+
+
 @app.route('/messages/mark_read', methods=['POST'])
 def mark_message_read():
     """Mark messages as read"""
@@ -1476,7 +1902,7 @@ def get_my_trades():
         sent_trades = villager_state.get('sent_trades', [])
         return jsonify({
             'success': True,
-            'trades': sent_trades
+            'trades': project(sent_trades, parse_fields(request.args.get('fields')))
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1500,25 +1926,42 @@ def add_sent_trade():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _wait_for_port(port, timeout=2.0):
+    """Wait until the local server accepts connections"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.1):
+                return True
+        except OSError:
+            time.sleep(0.02)
+    return False
+
+
+def _registration_payload(port, node_id):
+    """Coordinator registration, including name and occupation once a villager exists"""
+    registration = {
+        'node_id': node_id,
+        'node_type': 'villager',
+        'address': f"{os.getenv('VILLAGER_HOST', 'localhost')}:{port}",
+        'name': node_id
+    }
+    if villager_state.get('villager'):
+        registration['name'] = villager_state['villager'].name
+        registration['occupation'] = villager_state['villager'].occupation.value
+    return registration
+
+
 def register_to_coordinator(coordinator_addr, port, node_id):
     """Register to coordinator"""
-    import time
-    time.sleep(2)  # Wait for service to start
+    _wait_for_port(port)  # Wait for service to start
     
     try:
-        # Get villager name (if already created)
-        villager_name = None
-        if villager_state.get('villager'):
-            villager_name = villager_state['villager'].name
-        
-        response = requests.post(
+        # Get villager name and occupation (if already created or restored)
+        villager_name = villager_state['villager'].name if villager_state.get('villager') else None
+        response = http_client.post(
             f"http://{coordinator_addr}/register",
-            json={
-                'node_id': node_id,
-                'node_type': 'villager',
-                'address': f"{os.getenv('VILLAGER_HOST', 'localhost')}:{port}",
-                'name': villager_name or node_id
-            },
+            json=_registration_payload(port, node_id),
             timeout=5
         )
         
@@ -1532,16 +1975,29 @@ def register_to_coordinator(coordinator_addr, port, node_id):
     
     except Exception as e:
         print(f"[Villager-{node_id}] Unable to connect to coordinator {coordinator_addr}: {e}")
+    
+    _sync_time_with_coordinator(coordinator_addr)
+    _publish_public_state()
 
 
-def run_server(port, node_id, coordinator_addr=None):
+def run_server(port, node_id, coordinator_addr=None, state_dir=None):
     """Run server"""
     villager_state['node_id'] = node_id
     villager_state['coordinator_address'] = coordinator_addr
     villager_state['port'] = port
     
     print(f"[Villager-{node_id}] REST Villager Node starting on port {port}")
-    print(f"[Villager-{node_id}] NodeID: {node_id} (Villager name will be set on create)")
+    
+    # Restore persisted state before registering, so the node rejoins as the same villager
+    restored = False
+    if state_dir:
+        store = StateStore(state_dir, node_id)
+        restored = _restore_state(store)
+        villager_state['state_store'] = store
+        store.start_periodic_snapshots()
+    
+    if not restored:
+        print(f"[Villager-{node_id}] NodeID: {node_id} (Villager name will be set on create)")
     
     # Register to coordinator in a background thread
     threading.Thread(
@@ -1550,7 +2006,11 @@ def run_server(port, node_id, coordinator_addr=None):
         daemon=True
     ).start()
     
-    app.run(host='0.0.0.0', port=port, debug=False)
+    try:
+        http_client.serve(app, port)
+    finally:
+        if villager_state['state_store'] is not None:
+            villager_state['state_store'].close()
 
 
 if __name__ == '__main__':
@@ -1560,8 +2020,10 @@ if __name__ == '__main__':
     parser.add_argument('--id', type=str, required=True, help='NodeID')
     parser.add_argument('--coordinator', type=str, default=f"{os.getenv('COORDINATOR_HOST', 'localhost')}:{os.getenv('COORDINATOR_PORT', '5000')}",
                        help='Coordinator address')
+    parser.add_argument('--state-dir', type=str, default=os.getenv('VILLAGER_STATE_DIR'),
+                       help='Directory for state snapshots and mutation log (enables warm restart)')
     args = parser.parse_args()
     
-    run_server(args.port, args.id, args.coordinator)
+    run_server(args.port, args.id, args.coordinator, args.state_dir)
 
 
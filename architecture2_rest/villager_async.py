@@ -0,0 +1,353 @@
+"""
+VillagerNode (asyncio) - Architecture 2 (REST)
+Same HTTP API and state as villager.py, served by aiohttp with an async HTTP
+client, so a node keeps accepting inbound notifications while its own calls
+to the coordinator, merchant or other villagers are in flight.
+
+Endpoints that call out to other nodes (action submit/produce/sleep, merchant
+trades, batched actions, sending messages) and the long-polled GET /events are
+implemented here natively. All other endpoints are dispatched in-process to
+the Flask views of villager.py, which only touch memory; their peer
+notifications are queued and sent with the async client.
+"""
+
+import asyncio
+import os
+import sys
+
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector
+
+sys.path.insert(0, os.path.dirname(__file__))
+import villager as node
+from villager import villager_state
+from common.persistence import StateStore
+from common.flask_bridge import dispatch
+from common.event_log import poll
+
+# Shared client session (created on startup)
+client = {'session': None}
+
+
+async def _post(address, path, payload):
+    """POST JSON to another node, returns (status, body)"""
+    async with client['session'].post(f"http://{address}{path}", json=payload) as response:
+        return response.status, await response.json(content_type=None)
+
+
+async def _get(address, path):
+    """GET JSON from another node, returns (status, body)"""
+    async with client['session'].get(f"http://{address}{path}") as response:
+        return response.status, await response.json(content_type=None)
+
+
+def _persist():
+    """Persist state and publish directory changes after a mutating request (mirrors villager.persist_after_mutation)"""
+    try:
+        node._persist_state()
+    except Exception as e:
+        print(f"[Villager-{villager_state['node_id']}] Failed to persist state: {e}")
+    node._publish_public_state()
+
+
+async def _send_notifications(outbound):
+    """Send notifications queued by a Flask view, in order"""
+    for address, path, payload, description in outbound:
+        try:
+            status, _ = await _post(address, path, payload)
+            if status == 200:
+                print(f"[Villager-{villager_state['node_id']}] Notified {description}")
+            else:
+                print(f"[Villager-{villager_state['node_id']}] Failed to notify {description}: HTTP {status}")
+        except Exception as e:
+            print(f"[Villager-{villager_state['node_id']}] Failed to notify {description}: {e}")
+
+
+# ==================== Flask dispatch ====================
+
+async def dispatch_to_flask(request):
+    """Run the matching villager.py view in-process, then send its queued notifications"""
+    outbound = []
+    response = await dispatch(node.app, request, {'villager.outbound': outbound})
+
+    if outbound:
+        await _send_notifications(outbound)
+
+    return response
+
+
+# ==================== Native handlers (outbound I/O) ====================
+
+async def _submit_action(action):
+    """Submit action to coordinator (async version of villager._submit_action_internal)"""
+    villager = villager_state['villager']
+
+    if not villager:
+        return {'success': False, 'message': 'Villager not initialized'}
+
+    # Mark action as submitted before yielding, so a concurrent request sees it
+    villager.has_submitted_action = True
+
+    try:
+        status, result = await _post(
+            villager_state['coordinator_address'], '/action/submit',
+            {'node_id': villager_state['node_id'], 'action': action}
+        )
+        return node._submit_result(action, status, result)
+
+    except Exception as e:
+        return {'success': False, 'message': f'Failed to submit: {str(e)}'}
+
+
+async def submit_action(request):
+    """Submit action to coordinator (synchronization barrier)"""
+    villager = villager_state['villager']
+
+    if not villager:
+        return web.json_response({'success': False, 'message': 'Villager not initialized'}, status=400)
+
+    if villager.has_submitted_action:
+        return web.json_response({'success': False, 'message': 'Action already submitted for the current time segment'}, status=400)
+
+    data = await request.json()
+    action = data.get('action', 'idle')  # work, sleep, idle
+
+    body, status = node._submit_response(villager, await _submit_action(action))
+    _persist()
+    return web.json_response(body, status=status)
+
+
+async def produce(request):
+    """Execute production (auto-submit 'work')"""
+    recipe, error = node._produce_locally()
+    if error:
+        return web.json_response(error[0], status=error[1])
+
+    submit_result = await _submit_action('work')
+    _persist()
+    return web.json_response(node._produce_response(recipe, submit_result))
+
+
+async def sleep(request):
+    """Sleep (auto-submit 'sleep' after completion)"""
+    sleep_message, error = node._sleep_locally()
+    if error:
+        return web.json_response(error[0], status=error[1])
+
+    submit_result = await _submit_action('sleep')
+    _persist()
+    return web.json_response(node._sleep_response(sleep_message, submit_result))
+
+
+async def trade(request):
+    """Execute trade; only merchant trades leave the node, the rest go to the Flask view"""
+    villager = villager_state['villager']
+    data = await request.json()
+
+    if not villager or data.get('target') != 'merchant':
+        return await dispatch_to_flask(request)
+
+    plan, error = node._merchant_trade_begin(data['item'], data['quantity'], data['action'])
+    if error:
+        return web.json_response(error[0], status=error[1])
+
+    try:
+        status, result = await _post(villager_state['merchant_address'], plan['path'], plan['payload'])
+        body, status = node._merchant_trade_finish(plan, status, result)
+    except Exception as e:
+        node._merchant_trade_rollback(plan)
+        body, status = {'success': False, 'message': f'Trade failed: {str(e)}'}, 500
+
+    _persist()
+    return web.json_response(body, status=status)
+
+
+async def execute_batch(request):
+    """Run an ordered list of actions in one request (see villager.execute_batch)"""
+    batch, error = node._batch_begin(await request.json())
+    if error:
+        return web.json_response(error[0], status=error[1])
+
+    for step in batch['steps']:
+        result, plan = node._batch_step(step)
+        if plan is not None:
+            try:
+                status, body = await _post(villager_state['merchant_address'], plan['path'], plan['payload'])
+                result = node._batch_trade_result(plan, status, body)
+            except Exception as e:
+                node._merchant_trade_rollback(plan)
+                result = {'success': False, 'message': f'Trade failed: {str(e)}'}
+        if not node._batch_record(batch, step, result):
+            break
+
+    barrier_action = node._batch_barrier_action(batch)
+    submit_result = await _submit_action(barrier_action) if barrier_action else None
+
+    body, status = node._batch_response(batch, submit_result)
+    _persist()
+    return web.json_response(body, status=status)
+
+
+async def send_message(request):
+    """Send message"""
+    try:
+        data = await request.json()
+        target = data['target']  # Target node ID or 'all' means broadcast
+        content = data['content']
+        message_type = data.get('type', 'private')  # 'private' or 'broadcast'
+
+        villager = villager_state['villager']
+        if not villager:
+            return web.json_response({'success': False, 'message': 'Villager not initialized'}, status=400)
+
+        coordinator_addr = villager_state['coordinator_address']
+
+        if message_type == 'broadcast':
+            # Send broadcast message via Coordinator
+            status, _ = await _post(coordinator_addr, '/messages/broadcast', {
+                'from': villager_state['node_id'],
+                'from_name': villager.name,
+                'content': content
+            })
+
+            if status == 200:
+                print(f"[Villager-{villager_state['node_id']}] 📢 Sent broadcast message: {content}")
+                return web.json_response({'success': True, 'message': 'Broadcast message sent'})
+            return web.json_response({'success': False, 'message': 'Failed to send broadcast'}, status=500)
+
+        # Send point-to-point message: look up the target address first
+        status, nodes_data = await _get(coordinator_addr, '/nodes')
+        if status != 200:
+            return web.json_response({'success': False, 'message': 'Failed to get node list'}, status=500)
+
+        target_node = node._find_node(nodes_data['nodes'], target)
+        if not target_node:
+            return web.json_response({'success': False, 'message': f'Target node not found: {target}'}, status=404)
+
+        status, _ = await _post(target_node['address'], '/messages', {
+            'from': villager_state['node_id'],
+            'from_name': villager.name,
+            'to': target_node['node_id'],
+            'type': 'private',
+            'content': content,
+            'timestamp': ''
+        })
+
+        if status == 200:
+            print(f"[Villager-{villager_state['node_id']}] 💬 Sent private message to {target}: {content}")
+            return web.json_response({'success': True, 'message': 'Private message sent'})
+        return web.json_response({'success': False, 'message': 'Failed to send private message'}, status=500)
+
+    except Exception as e:
+        return web.json_response({'success': False, 'error': str(e)}, status=500)
+
+
+# ==================== Startup ====================
+
+async def register_to_coordinator(coordinator_addr, port, node_id):
+    """Register to coordinator, then catch up on any missed time advance"""
+    registration = node._registration_payload(port, node_id)
+    try:
+        status, _ = await _post(coordinator_addr, '/register', registration)
+        if status == 200:
+            print(f"[Villager-{node_id}] ({registration['name']}) Successfully registered to coordinator: {coordinator_addr}")
+        else:
+            print(f"[Villager-{node_id}] Registration failed: {status}")
+    except Exception as e:
+        print(f"[Villager-{node_id}] Unable to connect to coordinator {coordinator_addr}: {e}")
+
+    if not villager_state['villager']:
+        return
+    try:
+        status, current_time = await _get(coordinator_addr, '/time')
+        if status == 200:
+            node._catch_up_time(current_time)
+    except Exception as e:
+        print(f"[Villager-{node_id}] Unable to sync time with coordinator: {e}")
+    node._publish_public_state()
+
+
+async def get_events(request):
+    """Long-poll the event log on a worker thread so the event loop keeps serving"""
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(None, poll, node.event_log, request.query)
+    except ValueError as e:
+        return web.json_response({'success': False, 'message': f'Invalid parameter: {e}'}, status=400)
+    return web.json_response({'success': True, **result})
+
+
+def create_app():
+    """Build the aiohttp application (native routes first, everything else to Flask)"""
+    app = web.Application()
+    app.router.add_post('/action/submit', submit_action)
+    app.router.add_post('/action/produce', produce)
+    app.router.add_post('/action/sleep', sleep)
+    app.router.add_post('/action/trade', trade)
+    app.router.add_post('/action/batch', execute_batch)
+    app.router.add_post('/messages/send', send_message)
+    app.router.add_get('/events', get_events)
+    app.router.add_route('*', '/{tail:.*}', dispatch_to_flask)
+    return app
+
+
+async def serve(port, node_id, coordinator_addr, backlog=4096):
+    """Start the server and register; runs until cancelled"""
+    client['session'] = ClientSession(
+        connector=TCPConnector(limit=0, limit_per_host=200),
+        timeout=ClientTimeout(total=5)
+    )
+
+    runner = web.AppRunner(create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '0.0.0.0', port, backlog=backlog)
+    await site.start()
+    print(f"[Villager-{node_id}] Listening on port {port} (asyncio)")
+
+    try:
+        await register_to_coordinator(coordinator_addr, port, node_id)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await client['session'].close()
+
+
+def run_server(port, node_id, coordinator_addr=None, state_dir=None):
+    """Run server"""
+    villager_state['node_id'] = node_id
+    villager_state['coordinator_address'] = coordinator_addr
+    villager_state['port'] = port
+
+    print(f"[Villager-{node_id}] REST Villager Node (asyncio) starting on port {port}")
+
+    # Restore persisted state before registering, so the node rejoins as the same villager
+    restored = False
+    if state_dir:
+        store = StateStore(state_dir, node_id)
+        restored = node._restore_state(store)
+        villager_state['state_store'] = store
+        store.start_periodic_snapshots()
+
+    if not restored:
+        print(f"[Villager-{node_id}] NodeID: {node_id} (Villager name will be set on create)")
+
+    try:
+        asyncio.run(serve(port, node_id, coordinator_addr))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if villager_state['state_store'] is not None:
+            villager_state['state_store'].close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='REST Villager Node service (asyncio)')
+    parser.add_argument('--port', type=int, required=True, help='listen port')
+    parser.add_argument('--id', type=str, required=True, help='NodeID')
+    parser.add_argument('--coordinator', type=str, default=f"{os.getenv('COORDINATOR_HOST', 'localhost')}:{os.getenv('COORDINATOR_PORT', '5000')}",
+                       help='Coordinator address')
+    parser.add_argument('--state-dir', type=str, default=os.getenv('VILLAGER_STATE_DIR'),
+                       help='Directory for state snapshots and mutation log (enables warm restart)')
+    args = parser.parse_args()
+
+    run_server(args.port, args.id, args.coordinator, args.state_dir)
@@ -0,0 +1,85 @@
+"""
+Action Barrier
+The per-period synchronization barrier shared by the REST and gRPC
+coordinators: every registered villager submits one action, and the period
+closes (time advances) when the last one is in.
+
+Accounting is indexed: members still waiting are kept in an insertion-ordered
+dict, so a submission, the "everyone is in" check and the submitted/total
+counts are O(1). Only listing who is waiting walks the waiting set.
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class ActionBarrier:
+    """Thread-safe action barrier for one coordinator"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._members: Dict[str, None] = {}   # registered villagers, in registration order
+        self._waiting: Dict[str, None] = {}   # members that have not submitted this period
+        self._actions: Dict[str, str] = {}    # node_id -> action submitted this period
+        self.period = 0                       # number of closed periods
+
+    def join(self, node_id: str) -> None:
+        """Add a villager to the barrier (idempotent; re-registering keeps its submission)"""
+        with self._lock:
+            if node_id in self._members:
+                return
+            self._members[node_id] = None
+            if node_id not in self._actions:
+                self._waiting[node_id] = None
+
+    def leave(self, node_id: str) -> None:
+        """Remove a node from the barrier (it re-registered as something other than a villager)"""
+        with self._lock:
+            self._members.pop(node_id, None)
+            self._waiting.pop(node_id, None)
+            self._actions.pop(node_id, None)
+
+    def submit(self, node_id: str, action: str) -> Tuple[Optional[Dict[str, str]], List[str]]:
+        """Record an action for the current period
+
+        Returns (closed, waiting_for). When this submission was the last one
+        missing, the period is closed atomically and `closed` holds its
+        actions; exactly one caller sees that, so exactly one caller advances
+        time. Otherwise `closed` is None and waiting_for lists the villagers
+        still missing.
+        """
+        with self._lock:
+            self._actions[node_id] = action
+            self._waiting.pop(node_id, None)
+            if self._members and not self._waiting:
+                return self._close(), []
+            return None, list(self._waiting)
+
+    def reset(self) -> Dict[str, str]:
+        """Close the current period regardless of who has submitted (manual time advance)"""
+        with self._lock:
+            return self._close()
+
+    def _close(self) -> Dict[str, str]:
+        actions = self._actions
+        self._actions = {}
+        self._waiting = dict(self._members)
+        self.period += 1
+        return actions
+
+    def counts(self) -> Tuple[int, int]:
+        """(members submitted, members total)"""
+        with self._lock:
+            total = len(self._members)
+            return total - len(self._waiting), total
+
+    def snapshot(self) -> Dict:
+        """Consistent view of the current period for status endpoints"""
+        with self._lock:
+            return {
+                'period': self.period,
+                'members': list(self._members),
+                'waiting': list(self._waiting),
+                'actions': dict(self._actions),
+                'ready': bool(self._members) and not self._waiting
+            }
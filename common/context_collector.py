@@ -0,0 +1,127 @@
+"""
+Context Collector
+Gathers an agent's decision context from several independent sources at
+once. Each source runs on a shared thread pool with its own timeout; a source
+that fails or is late contributes its default instead of holding up the
+decision. Sources that rarely change (merchant prices, the node list) are
+served from a TTL cache that is also cleared when the game time moves on,
+before the cached sources are read for the new tick.
+"""
+
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, TimeoutError
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+DEFAULT_TIMEOUT = 5.0   # seconds a source may take before its default is used
+MAX_WORKERS = 8         # one thread per source of a typical context
+
+
+class TTLCache:
+    """Small thread-safe cache of loader results, each kept for its own TTL"""
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, loader: Callable[[], Any], ttl: float) -> Any:
+        """Cached value for key, calling loader when missing or expired
+
+        Empty results (None, {}, []) are not cached, so a failed load is
+        retried on the next call.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        value = loader()
+        if value:
+            with self._lock:
+                self._entries[key] = (time.monotonic() + ttl, value)
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one entry, or everything when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class ContextCollector:
+    """Run a fixed set of named sources concurrently and return their results as a dict"""
+
+    def __init__(self, max_workers: int = MAX_WORKERS, cache: Optional[TTLCache] = None,
+                 executor: Optional[Executor] = None):
+        """executor: pool shared with other collectors (e.g. many agents in one process);
+        by default each collector has its own pool of max_workers threads"""
+        self.cache = cache or TTLCache()
+        self._sources: Dict[str, Tuple[Callable[[], Any], Callable[[], Any], float, Optional[float]]] = {}
+        self._owns_pool = executor is None
+        self._pool = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='context')
+        self._tick = None
+
+    def add(self, name: str, fetch: Callable[[], Any], default: Callable[[], Any] = dict,
+            timeout: float = DEFAULT_TIMEOUT, ttl: Optional[float] = None) -> 'ContextCollector':
+        """Register a source
+
+        default: factory for the value used when fetch fails, times out or
+        returns something falsy. ttl: cache the result for this many seconds
+        (within one game tick, see collect()).
+        """
+        self._sources[name] = (fetch, default, timeout, ttl)
+        return self
+
+    def collect(self, tick_source: Optional[str] = None) -> Dict[str, Any]:
+        """Fetch every source concurrently
+
+        tick_source names the (uncached) source holding the game time. Cached
+        sources are submitted once it has returned, and when its value differs
+        from the previous collect() the cache is dropped first, so the first
+        decision of a new tick already sees that tick's prices and nodes.
+        """
+        started = time.monotonic()
+        first = [name for name, source in self._sources.items()
+                 if tick_source is None or source[3] is None or name == tick_source]
+        futures = {name: self._pool.submit(self._fetch, name) for name in first}
+
+        context = {}
+        if tick_source is not None and tick_source in futures:
+            tick = context[tick_source] = self._result(tick_source, futures[tick_source], started)
+            if tick != self._tick:
+                if self._tick is not None:
+                    self.cache.invalidate()
+                self._tick = tick
+            futures.update({name: self._pool.submit(self._fetch, name)
+                            for name in self._sources if name not in futures})
+
+        for name, future in futures.items():
+            if name not in context:
+                context[name] = self._result(name, future, started)
+        return {name: context[name] for name in self._sources}
+
+    def _result(self, name: str, future, started: float) -> Any:
+        """A source's value, or its default when it failed, timed out or returned nothing"""
+        _, default, timeout, _ = self._sources[name]
+        try:
+            value = future.result(timeout=max(0.0, started + timeout - time.monotonic()))
+        except TimeoutError:
+            print(f"[Context] {name} timed out after {timeout}s, using default")
+            value = None
+        except Exception as e:
+            print(f"[Context] {name} failed: {e}")
+            value = None
+        return value or default()
+
+    def _fetch(self, name: str) -> Any:
+        fetch, _, _, ttl = self._sources[name]
+        if ttl is None:
+            return fetch()
+        return self.cache.get(name, fetch, ttl)
+
+    def close(self) -> None:
+        if self._owns_pool:
+            self._pool.shutdown(wait=False)
@@ -0,0 +1,166 @@
+"""
+Decision Cache
+LLM decisions keyed by a hash of the decision-relevant context, so an agent
+whose state has not changed (e.g. waiting at the time barrier with the same
+inventory and no new messages) reuses its last decision instead of paying
+for another multi-second model call.
+
+Entries live in an in-memory LRU with a TTL. With a path, they are also kept
+in a SQLite file that several agent processes can share; it is pruned to the
+same TTL and to the most recently used disk_capacity entries.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_CAPACITY = 256
+DEFAULT_TTL = 600.0         # seconds; about one game period at the usual pace
+DISK_CAPACITY = 10000
+PRUNE_EVERY = 100           # disk writes between prunes
+
+
+def _encode(value: Any) -> str:
+    """Canonical JSON: key order and whitespace do not change the encoding"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def decision_key(parts: Dict[str, Any]) -> str:
+    """Content address of a decision's inputs (sha256 of their canonical JSON)"""
+    return hashlib.sha256(_encode(parts).encode('utf-8')).hexdigest()
+
+
+class DecisionCache:
+    """LRU + TTL cache of JSON-serializable decisions, optionally backed by SQLite"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, ttl: float = DEFAULT_TTL,
+                 path: Optional[str] = None, disk_capacity: int = DISK_CAPACITY):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.path = path
+        self.disk_capacity = disk_capacity
+        self.hits = 0
+        self.misses = 0
+
+        # key -> (expires_at, encoded value); values are stored encoded so every get returns a fresh copy
+        self._entries: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = 0
+        if path:
+            self._open(path)
+
+    # ========== Public API ==========
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value for key, or None when missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                entry = self._disk_get(key, now)
+                if entry is not None:
+                    self._remember(key, entry)
+            else:
+                self._entries.move_to_end(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(entry[1])
+
+    def put(self, key: str, value: Any) -> None:
+        """Store value (encoded immediately, later changes to it are not cached)"""
+        entry = (time.time() + self.ttl, _encode(value))
+        with self._lock:
+            self._remember(key, entry)
+            self._disk_put(key, entry)
+
+    def invalidate(self, key: str) -> None:
+        """Drop one entry, e.g. a decision that failed when executed"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._disk_execute('DELETE FROM decisions WHERE key = ?', (key,))
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'path': self.path
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # ========== Memory ==========
+
+    def _remember(self, key: str, entry: Tuple[float, str]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    # ========== Disk ==========
+
+    def _open(self, path: str) -> None:
+        try:
+            # Autocommit; WAL lets other agent processes read while one writes
+            self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS decisions ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, used_at REAL NOT NULL)'
+            )
+        except sqlite3.Error as e:
+            print(f"[DecisionCache] Disk cache disabled, cannot open {path}: {e}")
+            self._db = None
+
+    def _disk_execute(self, sql: str, params: tuple = ()):
+        """Run one statement, or None on error (the cache keeps working from memory)"""
+        if self._db is None:
+            return None
+        try:
+            return self._db.execute(sql, params)
+        except sqlite3.Error as e:
+            print(f"[DecisionCache] Disk cache error: {e}")
+            return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        cursor = self._disk_execute(
+            'SELECT expires_at, value FROM decisions WHERE key = ? AND expires_at > ?', (key, now)
+        )
+        row = cursor.fetchone() if cursor is not None else None
+        if row is None:
+            return None
+        self._disk_execute('UPDATE decisions SET used_at = ? WHERE key = ?', (now, key))
+        return row[0], row[1]
+
+    def _disk_put(self, key: str, entry: Tuple[float, str]) -> None:
+        if self._disk_execute(
+            'INSERT OR REPLACE INTO decisions (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)',
+            (key, entry[1], entry[0], time.time())
+        ) is None:
+            return
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self._disk_execute(
+                'DELETE FROM decisions WHERE expires_at <= ? OR key NOT IN '
+                '(SELECT key FROM decisions ORDER BY used_at DESC LIMIT ?)',
+                (time.time(), self.disk_capacity)
+            )
@@ -0,0 +1,158 @@
+"""
+Decision History
+An agent's decisions, kept small in memory: a ring of the most recent ones
+(timestamp, decision and how it was made) for the prompt's observations and reflexion.
+
+Full records (with the context the decision was made from and the raw model
+reply) are appended to a JSONL file instead, when a path is given. The file
+is rotated by size like a log (path, path.1 ... path.<backups>), and a path
+ending in .gz is written gzip-compressed. Records are read back lazily, oldest
+first, only when asked for (e.g. the interactive `history` command).
+
+A record is written when the next one is appended (or on flush/close), so
+results the agent adds to the decision after executing it are included.
+"""
+
+import gzip
+import json
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+RECENT_DECISIONS = 20          # decisions kept in memory
+MAX_FILE_BYTES = 10 * 1024 * 1024
+BACKUPS = 3                    # rotated files kept besides the current one
+COMPACT_FIELDS = ('timestamp', 'decision', 'cached', 'fast_path', 'speculative')
+
+
+class DecisionHistory:
+    """Ring of recent decisions in memory, full records spilled to a rotating JSONL file"""
+
+    def __init__(self, path: Optional[str] = None, recent: int = RECENT_DECISIONS,
+                 max_bytes: int = MAX_FILE_BYTES, backups: int = BACKUPS):
+        self.path = path
+        self.compress = bool(path) and path.endswith('.gz')
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.total = 0  # decisions recorded since start
+
+        self._recent = deque(maxlen=recent)
+        self._pending = None  # full record of the latest decision, written on the next append
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0  # bytes in the current file (uncompressed bytes written, once compressed)
+        if path:
+            self._open()
+
+    # ========== Recent decisions (sequence protocol, like the list it replaces) ==========
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(list(self._recent))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._recent)[index]
+        return self._recent[index]
+
+    # ========== Recording ==========
+
+    def append(self, record: Dict[str, Any]) -> Dict:
+        """Record a decision; returns the compact entry kept in memory
+
+        The entry shares the record's decision dict, so updates to it (success,
+        error_message...) also reach the record written to disk.
+        """
+        entry = {field: record[field] for field in COMPACT_FIELDS if field in record}
+        with self._lock:
+            self._recent.append(entry)
+            self.total += 1
+            if self._file is not None:
+                self._write_pending()
+                self._pending = record
+        return entry
+
+    def flush(self) -> None:
+        """Write the latest record out now"""
+        with self._lock:
+            self._write_pending()
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_pending()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ========== Reading back ==========
+
+    def records(self) -> Iterator[Dict]:
+        """Full records still on disk, oldest first (read lazily, file by file)"""
+        self.flush()
+        if not self.path:
+            return
+        for path in self._files()[::-1]:
+            try:
+                with self._open_file(path, 'rt') as f:
+                    for line in f:
+                        if line.strip():
+                            yield json.loads(line)
+            except EOFError:
+                pass  # the gzip stream still being written has no end marker yet
+            except (OSError, ValueError) as e:
+                # A file rotated away while reading, or cut short by a crash
+                print(f"[DecisionHistory] Skipping {path}: {e}")
+
+    def tail(self, count: int) -> List[Dict]:
+        """The last count full records (the compact in-memory entries without a file)"""
+        if not self.path:
+            return self[-count:]
+        return list(deque(self.records(), maxlen=count))
+
+    # ========== Disk ==========
+
+    def _open_file(self, path: str, mode: str):
+        if self.compress:
+            return gzip.open(path, mode, encoding='utf-8')
+        return open(path, mode, encoding='utf-8')
+
+    def _open(self) -> None:
+        try:
+            self._file = self._open_file(self.path, 'at')
+            self._size = os.path.getsize(self.path)
+        except OSError as e:
+            print(f"[DecisionHistory] Not writing history, cannot open {self.path}: {e}")
+            self._file = None
+
+    def _files(self) -> List[str]:
+        """Current file first, then the rotated ones, newest to oldest"""
+        paths = [self.path] + [f"{self.path}.{i}" for i in range(1, self.backups + 1)]
+        return [path for path in paths if os.path.exists(path)]
+
+    def _write_pending(self) -> None:
+        if self._pending is None or self._file is None:
+            return
+        record, self._pending = self._pending, None
+        try:
+            line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+            self._file.write(line)
+            self._size += len(line.encode('utf-8'))
+            if self._size >= self.max_bytes:
+                self._rotate()
+        except OSError as e:
+            print(f"[DecisionHistory] Write failed: {e}")
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for i in range(self.backups, 0, -1):
+            source = f"{self.path}.{i - 1}" if i > 1 else self.path
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i}")
+        if self.backups == 0:
+            os.remove(self.path)
+        self._open()
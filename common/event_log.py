@@ -0,0 +1,98 @@
+"""
+Event Log
+A node's recent events (time advances, trade requests and updates, messages)
+for agents to long-poll via GET /events, so they react when something
+happens instead of on a fixed timer.
+
+Events are kept in a sequenced ring. A reader passes the last seq it has seen
+and blocks until a newer event it cares about arrives or the timeout expires.
+Events may name an audience (the node ids involved) and an actor (the node
+whose request caused them), so an agent can skip events it caused itself.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAX_POLL_TIMEOUT = 30.0  # seconds a long-poll may be held open (each holds a server thread)
+
+
+class EventLog:
+    """Thread-safe ring of recent events with blocking reads"""
+
+    def __init__(self, capacity: int = 1024):
+        self.events = deque(maxlen=capacity)
+        self.seq = 0
+        self._cond = threading.Condition()
+
+    def append(self, event_type: str, data: Optional[Dict] = None,
+               audience: Optional[Iterable[str]] = None, actor: Optional[str] = None) -> int:
+        """Record an event and wake waiting readers, returns its seq
+
+        audience: node ids that should see it (None: every reader).
+        actor: node id whose request caused it.
+        """
+        with self._cond:
+            self.seq += 1
+            self.events.append({
+                'seq': self.seq,
+                'type': event_type,
+                'data': data or {},
+                'audience': list(audience) if audience is not None else None,
+                'actor': actor,
+                'ts': time.time()
+            })
+            self._cond.notify_all()
+            return self.seq
+
+    def read(self, since: int, node_id: Optional[str] = None,
+             types: Optional[Iterable[str]] = None) -> Tuple[List[Dict], int, bool]:
+        """(events after since visible to node_id, current seq, missed)
+
+        missed is True when older events were already dropped from the ring,
+        or since is ahead of the log (the node restarted).
+        """
+        with self._cond:
+            return self._read(since, node_id, types)
+
+    def wait(self, since: int, timeout: float, node_id: Optional[str] = None,
+             types: Optional[Iterable[str]] = None) -> Tuple[List[Dict], int, bool]:
+        """Like read(), but block up to timeout seconds for a matching event"""
+        deadline = time.monotonic() + min(timeout, MAX_POLL_TIMEOUT)
+        with self._cond:
+            while True:
+                events, seq, missed = self._read(since, node_id, types)
+                remaining = deadline - time.monotonic()
+                if events or missed or remaining <= 0:
+                    return events, seq, missed
+                # Non-matching events move the cursor forward so they are not rescanned
+                since = seq
+                self._cond.wait(remaining)
+
+    def _read(self, since, node_id, types):
+        if since > self.seq:
+            return [], self.seq, True
+        # Sequence numbers are contiguous, so the newest (seq - since) entries are the answer
+        count = min(self.seq - since, len(self.events))
+        missed = count < self.seq - since
+        size = len(self.events)
+        events = [
+            event for event in (self.events[i] for i in range(size - count, size))
+            if (event['audience'] is None or node_id in event['audience'])
+            and (not types or event['type'] in types)
+        ]
+        return events, self.seq, missed
+
+
+def poll(log: EventLog, args) -> Dict:
+    """GET /events handler body: ?since=<seq>&timeout=<s>&node_id=<id>&types=<a,b>
+
+    Same parameters and reply as the asyncio coordinator's /events: since
+    defaults to "from now", and next is the seq to pass on the following poll.
+    """
+    since = int(args.get('since', log.seq))
+    timeout = float(args.get('timeout', MAX_POLL_TIMEOUT))
+    types = set(args['types'].split(',')) if args.get('types') else None
+    events, seq, missed = log.wait(since, timeout, args.get('node_id'), types)
+    return {'events': events, 'next': seq, 'missed': missed}
@@ -0,0 +1,31 @@
+"""
+Flask Bridge
+Runs a Flask view in-process for an aiohttp request, so the asyncio servers
+can reuse the in-memory endpoints of their Flask counterparts unchanged
+"""
+
+from aiohttp import web
+
+
+async def dispatch(flask_app, request, environ=None):
+    """Dispatch an aiohttp request to flask_app and convert the response
+
+    environ: extra WSGI environ keys visible to the view as request.environ,
+    e.g. a list the view appends deferred work to.
+    """
+    body = await request.read()
+    with flask_app.test_request_context(
+        request.path,
+        method=request.method,
+        query_string=request.query_string,
+        data=body,
+        content_type=request.headers.get('Content-Type'),
+        environ_overrides=environ
+    ):
+        response = flask_app.full_dispatch_request()
+
+    return web.Response(
+        body=response.get_data(),
+        status=response.status_code,
+        content_type=response.mimetype
+    )
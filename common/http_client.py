@@ -0,0 +1,109 @@
+"""
+Shared HTTP Client
+One pooled requests.Session per process, with keep-alive, per-host connection
+pools, tuned timeouts and a retry policy. REST components call get()/post()
+here instead of bare requests.get/requests.post, which open a new TCP
+connection for every call.
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = 1.0      # seconds; peers are on the local network, fail fast when one is down
+DEFAULT_TIMEOUT = 5.0      # seconds to wait for a response when the caller gives none
+POOL_HOSTS = 64            # number of per-host pools kept
+POOL_SIZE = 32             # idle keep-alive connections kept per host
+
+# Set HTTP_CLIENT_POOLING=0 to open a fresh connection per call (for comparison)
+POOLING_ENABLED = os.getenv('HTTP_CLIENT_POOLING', '1') != '0'
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _retry_policy():
+    """Retry failed connects for every method, but only re-send idempotent requests
+
+    A refused or timed-out connect never reached the peer, so retrying it is
+    safe even for POST. Read errors are only retried for GET/HEAD etc., since a
+    POST such as /action/submit or /trade/execute may already have been applied.
+    """
+    return Retry(
+        total=3,
+        connect=2,
+        read=1,
+        status=0,
+        backoff_factor=0.05,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False
+    )
+
+
+def _new_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_HOSTS,
+        pool_maxsize=POOL_SIZE,
+        max_retries=_retry_policy()
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session():
+    """The process-wide pooled session (created on first use)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _new_session()
+    return _session
+
+
+def _timeout(timeout):
+    """Split a single timeout into (connect, read) so dead peers fail fast"""
+    if timeout is None:
+        timeout = DEFAULT_TIMEOUT
+    if isinstance(timeout, (int, float)):
+        return (min(CONNECT_TIMEOUT, timeout), timeout)
+    return timeout
+
+
+def request(method, url, timeout=None, **kwargs):
+    """Send a request through the pooled session"""
+    if not POOLING_ENABLED:
+        with _new_session() as session:
+            return session.request(method, url, timeout=_timeout(timeout), **kwargs)
+    return get_session().request(method, url, timeout=_timeout(timeout), **kwargs)
+
+
+def get(url, timeout=None, **kwargs):
+    """GET through the pooled session"""
+    return request('GET', url, timeout=timeout, **kwargs)
+
+
+def post(url, timeout=None, **kwargs):
+    """POST through the pooled session"""
+    return request('POST', url, timeout=timeout, **kwargs)
+
+
+def serve(app, port, threads=32):
+    """Run a Flask app with HTTP keep-alive, so pooled clients can reuse connections
+
+    Werkzeug's development server (app.run) sends 'Connection: close' on every
+    response, which defeats client-side pooling. waitress keeps connections
+    open; without it installed this falls back to app.run.
+    """
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        print("[HTTP] waitress not installed, using the Flask development server (no keep-alive)")
+        app.run(host='0.0.0.0', port=port, debug=False)
+        return
+
+    waitress_serve(app, host='0.0.0.0', port=port, threads=threads, connection_limit=1000, ident=None)
@@ -0,0 +1,726 @@
+"""
+LLM Backends
+Where an agent's decision text comes from. The agent builds the prompts and
+parses the reply; a backend only turns (system prompt, prompt) into the
+model's text, in the ReAct format the agent parses:
+
+    THOUGHT: <reasoning>
+    ACTION: <command>
+
+OpenAIBackend calls the chat completion API, and OpenAICompatibleBackend any
+server speaking it over plain HTTP (vLLM, llama.cpp, the stand-in in
+performance_tests/llm_standin.py). RulePolicyBackend is a
+deterministic stand-in that decides from the structured context with a few
+fixed rules, so the agent loop can be run and measured without an API key.
+ReplayBackend plays back replies captured by RecordingBackend.
+RateLimitedBackend shares one request/token budget and concurrency cap
+between every agent that uses it. BatchingBackend packs the decisions of
+agents that ask at the same time into one request, and LatencyModelBackend
+adds a modelled API latency to an offline backend, for benchmarks.
+
+Replies can be streamed: complete_action() reads stream() only up to the end
+of the first ACTION line, which is all the agent parses, and returns without
+waiting for the rest. HedgedBackend sends a second copy of a request that is
+slower than a percentile of recent ones and takes whichever reply comes first.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from common import http_client
+from common.models import MERCHANT_PRICES, PRODUCTION_RECIPES, Occupation
+
+LOW_STAMINA = 40  # RulePolicyBackend eats bread below this
+LLM_TIMEOUT = 60.0         # seconds without a reply (or, streaming, without a chunk) before a call fails
+LLM_CONNECT_TIMEOUT = 5.0  # seconds to connect to an LLM server
+
+# HedgedBackend: hedge requests slower than this percentile of the recent ones
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20     # latencies needed before the percentile is used
+HEDGE_INITIAL_DELAY = 5.0  # seconds before hedging until then
+
+# Appended to the system prompt of a batched request (after it, so the shared prefix stays cacheable)
+BATCH_INSTRUCTIONS = """
+
+## Batch Mode:
+This request covers several villagers. Each villager's state follows its own
+`### VILLAGER <id>` header. Decide for each villager independently, as if it were
+the only one, and reply with one block per villager, in the same order:
+
+### VILLAGER <id>
+THOUGHT: [reasoning for this villager]
+ACTION: [single command for this villager]"""
+
+_BATCH_HEADER = re.compile(r'^#+\s*VILLAGER\s+(\S+)\s*$', re.MULTILINE | re.IGNORECASE)
+
+
+def pack_batch(system_prompt: str, ids: Sequence[str], prompts: Sequence[str]):
+    """(system prompt, prompt) of one request deciding for every (id, prompt)"""
+    return (system_prompt + BATCH_INSTRUCTIONS,
+            "\n\n".join(f"### VILLAGER {batch_id}\n{prompt}" for batch_id, prompt in zip(ids, prompts)))
+
+
+def parse_batch(reply: str, ids: Sequence[str]) -> Dict[str, str]:
+    """id -> that villager's reply block; villagers the reply has no block for are missing"""
+    wanted = set(ids)
+    headers = list(_BATCH_HEADER.finditer(reply))
+    blocks = {}
+    for header, following in zip(headers, headers[1:] + [None]):
+        batch_id = header.group(1).strip('`*:')
+        end = following.start() if following else len(reply)
+        if batch_id in wanted and batch_id not in blocks:
+            blocks[batch_id] = reply[header.end():end].strip()
+    return blocks
+
+
+class ActionStreamParser:
+    """Incremental reader of a streamed ReAct reply, done once its first ACTION line is complete
+
+    The agent's parser takes the THOUGHT before the first non-empty ACTION line
+    and that line's command, so nothing after the end of that line (more text the
+    model keeps generating) can change the decision.
+    """
+
+    def __init__(self):
+        self._lines: List[str] = []
+        self._pending = ''  # the line still being received
+        self.done = False
+
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk of the reply; True once the ACTION line is complete"""
+        if self.done:
+            return True
+        self._pending += chunk
+        while '\n' in self._pending:
+            line, self._pending = self._pending.split('\n', 1)
+            self._lines.append(line)
+            stripped = line.strip()
+            if stripped.startswith('ACTION:') and stripped[7:].strip():
+                self.done = True
+                return True
+        return False
+
+    @property
+    def text(self) -> str:
+        """The reply so far, ending with the ACTION line once done"""
+        lines = self._lines if self.done or not self._pending else self._lines + [self._pending]
+        return '\n'.join(lines).strip()
+
+
+def read_until_action(chunks: Iterable[str], cancel: Optional[threading.Event] = None) -> str:
+    """Reply text from a stream of chunks, read up to the end of its first ACTION line
+
+    The stream is closed as soon as that line is complete, or when cancel is
+    set, which ends the request instead of waiting for the rest of the reply.
+    """
+    parser = ActionStreamParser()
+    try:
+        for chunk in chunks:
+            if parser.feed(chunk) or (cancel is not None and cancel.is_set()):
+                break
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+    return parser.text
+
+
+class AnyEvent:
+    """Read-only view that is set when any of the given events is set, for cancel= arguments"""
+
+    def __init__(self, *events: Optional[threading.Event]):
+        self.events = [event for event in events if event is not None]
+
+    def is_set(self) -> bool:
+        return any(event.is_set() for event in self.events)
+
+
+class LLMBackend:
+    """Turns prompts into decision text"""
+
+    name = 'base'
+
+    def complete(self, system_prompt: str, prompt: str, context: Optional[Dict] = None,
+                 max_tokens: int = 800, temperature: float = 0.7) -> str:
+        """Reply text for the prompts; context is the structured state the prompt was built from"""
+        raise NotImplementedError
+
+    def stream(self, system_prompt: str, prompt: str, context: Optional[Dict] = None,
+               max_tokens: int = 800, temperature: float = 0.7) -> Iterator[str]:
+        """Reply text in chunks as it is generated (a single chunk unless the backend streams)"""
+        yield self.complete(system_prompt, prompt, context, max_tokens, temperature)
+
+    def complete_action(self, system_prompt: str, prompt: str, context: Optional[Dict] = None,
+                        max_tokens: int = 800, temperature: float = 0.7,
+                        cancel: Optional[threading.Event] = None) -> str:
+        """Reply text up to the end of its first ACTION line, returned as soon as that line is complete"""
+        return read_until_action(self.stream(system_prompt, prompt, context, max_tokens, temperature), cancel)
+
+    def complete_batch(self, system_prompt: str, prompts: Sequence[str], contexts: Sequence[Optional[Dict]],
+                       max_tokens: int = 800, temperature: float = 0.7) -> List[Optional[str]]:
+        """One reply per prompt from a single request (None where the reply has no block for it)
+
+        The batch context passed to complete() is {'batch': {id: context}}.
+        """
+        ids = [f"V{i + 1}" for i in range(len(prompts))]
+        batch_system, batch_prompt = pack_batch(system_prompt, ids, prompts)
+        reply = self.complete(batch_system, batch_prompt, {'batch': dict(zip(ids, contexts))},
+                              max_tokens * len(prompts), temperature)
+        blocks = parse_batch(reply, ids)
+        return [blocks.get(batch_id) for batch_id in ids]
+
+
+class OpenAIBackend(LLMBackend):
+    """Chat completion API (openai<1.0 client, as used by the agents)"""
+
+    name = 'openai'
+
+    def __init__(self, model: str, api_key: Optional[str] = None, timeout: float = LLM_TIMEOUT):
+        import openai
+        self._openai = openai
+        self.model = model
+        self.timeout = timeout
+        if api_key:
+            openai.api_key = api_key
+
+    def _create(self, system_prompt, prompt, max_tokens, temperature, stream=False):
+        return self._openai.ChatCompletion.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=stream,
+            request_timeout=self.timeout
+        )
+
+    def complete(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        response = self._create(system_prompt, prompt, max_tokens, temperature)
+        return response.choices[0].message.content.strip()
+
+    def stream(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        for chunk in self._create(system_prompt, prompt, max_tokens, temperature, stream=True):
+            content = chunk.choices[0].delta.get('content') if chunk.choices else None
+            if content:
+                yield content
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """POST <base_url>/chat/completions on any server implementing the OpenAI chat API
+
+    Replies are streamed as server-sent events, through the shared pooled HTTP
+    client. timeout bounds the connect and every wait for the next chunk, so a
+    stalled server fails the call instead of holding the agent.
+    """
+
+    name = 'http'
+
+    def __init__(self, base_url: str, model: str, api_key: Optional[str] = None, timeout: float = LLM_TIMEOUT):
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.model = model
+        self.timeout = timeout
+        self.headers = {'Authorization': f"Bearer {api_key}"} if api_key else {}
+
+    def complete(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        return ''.join(self.stream(system_prompt, prompt, context, max_tokens, temperature)).strip()
+
+    def stream(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        response = http_client.post(self.url, timeout=(LLM_CONNECT_TIMEOUT, self.timeout), stream=True,
+                                    headers=self.headers, json={
+                                        'model': self.model,
+                                        'messages': [
+                                            {'role': 'system', 'content': system_prompt},
+                                            {'role': 'user', 'content': prompt}
+                                        ],
+                                        'max_tokens': max_tokens,
+                                        'temperature': temperature,
+                                        'stream': True
+                                    })
+        try:
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code} from {self.url}: {response.text[:200]}")
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                choices = json.loads(data).get('choices') or [{}]
+                content = (choices[0].get('delta') or {}).get('content')
+                if content:
+                    yield content
+        finally:
+            # Closing mid-reply drops the connection, which ends the generation server-side
+            response.close()
+
+
+class RulePolicyBackend(LLMBackend):
+    """Deterministic policy: eat when tired, sleep in the evening, otherwise buy inputs and produce
+
+    The same context always yields the same reply, and no network call is made.
+    """
+
+    name = 'rule'
+
+    def complete(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        if context and 'batch' in context:
+            return "\n\n".join(f"### VILLAGER {batch_id}\n{self.complete(system_prompt, prompt, villager_context)}"
+                               for batch_id, villager_context in context['batch'].items())
+        thought, action = self.decide(context or {})
+        return f"THOUGHT: {thought}\nACTION: {action}"
+
+    def decide(self, context: Dict):
+        """(thought, command) for a decision context"""
+        villager = context.get('villager') or {}
+        inventory = villager.get('inventory', {})
+        items = inventory.get('items', {})
+        money = inventory.get('money', 0)
+        stamina = villager.get('stamina', 0)
+        time_info = str(context.get('time', '')).lower()
+        buy_prices = (context.get('prices') or {}).get('buy') or MERCHANT_PRICES['buy']
+
+        if villager.get('has_submitted_action'):
+            return "Action already submitted, waiting for the others", "idle"
+
+        if stamina < LOW_STAMINA and items.get('bread', 0) > 0:
+            return f"Stamina is low ({stamina}), eating bread", "eat"
+
+        if 'evening' in time_info or 'night' in time_info:
+            if villager.get('has_slept'):
+                return "Already slept today", "idle"
+            if items.get('house', 0) > 0 or items.get('temp_room', 0) > 0:
+                return "Evening, sleeping to restore stamina", "sleep"
+            if money >= buy_prices.get('temp_room', MERCHANT_PRICES['buy']['temp_room']):
+                return "Evening without a room, buying a temporary room", "buy temp_room 1"
+            return "Evening, no room and not enough money to buy one", "idle"
+
+        try:
+            recipe = PRODUCTION_RECIPES.get(Occupation(villager.get('occupation')))
+        except ValueError:
+            recipe = None
+        if recipe is None:
+            return "No production recipe for this occupation", "idle"
+        if stamina < recipe.stamina_cost:
+            return f"Not enough stamina to produce ({stamina} < {recipe.stamina_cost})", "idle"
+
+        for item, required in recipe.input_items.items():
+            missing = required - items.get(item, 0)
+            if missing > 0:
+                cost = missing * buy_prices.get(item, MERCHANT_PRICES['buy'].get(item, 0))
+                if money >= cost:
+                    return f"Need {missing} more {item} to produce, buying for {cost} gold", f"buy {item} {missing}"
+                return f"Cannot afford {missing} {item} ({cost} gold, have {money})", "idle"
+
+        return f"Have the inputs and stamina, producing {recipe.output_item}", "produce"
+
+
+def _prompt_key(system_prompt: str, prompt: str) -> str:
+    return hashlib.sha256(f"{system_prompt}\x00{prompt}".encode('utf-8')).hexdigest()
+
+
+class RecordingBackend(LLMBackend):
+    """Wraps a backend and appends every exchange to a JSONL file (for ReplayBackend)"""
+
+    def __init__(self, inner: LLMBackend, path: str):
+        self.inner = inner
+        self.name = f"{inner.name}+record"
+        self.path = path
+        self._lock = threading.Lock()
+
+    def complete(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        reply = self.inner.complete(system_prompt, prompt, context, max_tokens, temperature)
+        record = {'key': _prompt_key(system_prompt, prompt), 'prompt': prompt, 'reply': reply}
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return reply
+
+
+class ReplayBackend(LLMBackend):
+    """Plays back recorded replies: the reply recorded for the same prompts, else the next one in order"""
+
+    name = 'replay'
+
+    def __init__(self, path: str):
+        self.replies: List[str] = []
+        self.by_key: Dict[str, str] = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.replies.append(record['reply'])
+                    self.by_key[record['key']] = record['reply']
+        if not self.replies:
+            raise ValueError(f"No recorded replies in {path}")
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def complete(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        reply = self.by_key.get(_prompt_key(system_prompt, prompt))
+        if reply is not None:
+            return reply
+        with self._lock:
+            reply = self.replies[self._next % len(self.replies)]
+            self._next += 1
+        return reply
+
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second, at most burst banked"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost: float = 1.0) -> float:
+        """Take cost tokens, sleeping until they are available; returns seconds waited
+
+        The full cost is always charged. A cost above burst waits for a full bucket
+        and then drives it negative, so the requests after it wait off the excess.
+        """
+        needed = min(cost, self.burst)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= cost
+                    return waited
+                delay = (needed - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class RateLimitedBackend(LLMBackend):
+    """Wraps a backend with a shared request budget, token budget and concurrency cap
+
+    requests_per_minute / tokens_per_minute of 0 mean unlimited. Tokens are
+    estimated as prompt characters / 4 plus max_tokens for the reply, which is
+    what the API reserves against a tokens-per-minute limit.
+    """
+
+    def __init__(self, inner: LLMBackend, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrency: int = 16):
+        self.inner = inner
+        self.name = inner.name
+        self.requests = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60)) \
+            if requests_per_minute else None
+        # A minute of token budget can be banked: a single request (a batch above all) may
+        # be larger than a second's worth, and must still be charged what it uses
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) \
+            if tokens_per_minute else None
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.waited = 0.0  # seconds callers spent waiting for budget or a slot
+        self.queued = 0    # callers waiting for budget or a slot right now
+
+    @contextmanager
+    def admission(self, system_prompt: str, prompt: str, max_tokens: int):
+        """Wait for request and token budget and a concurrency slot; the slot is held inside the block
+
+        For wrappers that time calls themselves (HedgedBackend) and call self.inner
+        inside the block, so the wait here is not counted as call latency.
+        """
+        started = time.monotonic()
+        with self._stats_lock:
+            self.queued += 1
+        try:
+            if self.requests is not None:
+                self.requests.acquire()
+            if self.tokens is not None:
+                self.tokens.acquire((len(system_prompt) + len(prompt)) / 4 + max_tokens)
+            self._slots.acquire()
+        finally:
+            with self._stats_lock:
+                self.queued -= 1
+        try:
+            with self._stats_lock:
+                self.calls += 1
+                self.waited += time.monotonic() - started
+            yield
+        finally:
+            self._slots.release()
+
+    def complete(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        with self.admission(system_prompt, prompt, max_tokens):
+            return self.inner.complete(system_prompt, prompt, context, max_tokens, temperature)
+
+    def stream(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        # The concurrency slot is held until the stream is read to the end or closed
+        with self.admission(system_prompt, prompt, max_tokens):
+            yield from self.inner.stream(system_prompt, prompt, context, max_tokens, temperature)
+
+
+class BatchingBackend(LLMBackend):
+    """Packs concurrent decisions with the same system prompt into one request (up to max_batch)
+
+    The first caller of a batch waits up to max_wait seconds for others to join,
+    then sends them all with the inner backend's complete_batch(); every caller
+    gets its own reply block. A villager the reply has no block for is asked
+    again on its own, and a batch of one is sent as a normal request.
+    """
+
+    def __init__(self, inner: LLMBackend, max_batch: int = 8, max_wait: float = 0.05):
+        self.inner = inner
+        self.name = inner.name
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._open: Dict[tuple, List[Dict]] = {}  # (system prompt, temperature) -> batch still taking callers
+        self._cond = threading.Condition()
+        self.requests = 0
+        self.decisions = 0
+        self.retries = 0  # decisions missing from a batched reply, asked again alone
+
+    def complete(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        request = {'prompt': prompt, 'context': context, 'max_tokens': max_tokens,
+                   'done': threading.Event(), 'reply': None, 'error': None}
+        key = (system_prompt, temperature)
+        with self._cond:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = []
+            batch.append(request)
+            if len(batch) >= self.max_batch:
+                del self._open[key]
+                self._cond.notify_all()
+            elif leader:
+                deadline = time.monotonic() + self.max_wait
+                while self._open.get(key) is batch and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+                if self._open.get(key) is batch:
+                    del self._open[key]
+        if leader:
+            self._send(system_prompt, temperature, batch)
+        request['done'].wait()
+        if request['error'] is not None:
+            raise request['error']
+        return request['reply']
+
+    def _send(self, system_prompt: str, temperature: float, batch: List[Dict]) -> None:
+        try:
+            if len(batch) == 1:
+                replies = [self.inner.complete(system_prompt, batch[0]['prompt'], batch[0]['context'],
+                                               batch[0]['max_tokens'], temperature)]
+            else:
+                replies = self.inner.complete_batch(system_prompt, [r['prompt'] for r in batch],
+                                                    [r['context'] for r in batch],
+                                                    max(r['max_tokens'] for r in batch), temperature)
+            with self._cond:
+                self.requests += 1
+                self.decisions += len(batch)
+        except Exception as e:
+            for request in batch:
+                request['error'] = e
+                request['done'].set()
+            return
+        # Hand out every parsed reply first, so a failing retry only affects its own request
+        missing = []
+        for request, reply in zip(batch, replies):
+            if reply is None:
+                missing.append(request)
+            else:
+                request['reply'] = reply
+                request['done'].set()
+        for request in missing:
+            with self._cond:
+                self.retries += 1
+            try:
+                request['reply'] = self.inner.complete(system_prompt, request['prompt'], request['context'],
+                                                       request['max_tokens'], temperature)
+            except Exception as e:
+                request['error'] = e
+            finally:
+                request['done'].set()
+
+
+class LatencyModelBackend(LLMBackend):
+    """Adds a modelled API latency to a (fast, offline) backend, to benchmark how requests are made
+
+    Each request costs request_ms, plus prompt_token_ms per prompt token (system
+    prompt included, tokens estimated as characters / 4) and output_token_ms per
+    reply token, generated one after another.
+    """
+
+    def __init__(self, inner: LLMBackend, request_ms: float = 300.0, prompt_token_ms: float = 0.05,
+                 output_token_ms: float = 15.0):
+        self.inner = inner
+        self.name = inner.name
+        self.request_ms = request_ms
+        self.prompt_token_ms = prompt_token_ms
+        self.output_token_ms = output_token_ms
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def complete(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        reply = self.inner.complete(system_prompt, prompt, context, max_tokens, temperature)
+        prompt_tokens = (len(system_prompt) + len(prompt)) / 4
+        output_tokens = len(reply) / 4
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+        time.sleep((self.request_ms + prompt_tokens * self.prompt_token_ms
+                    + output_tokens * self.output_token_ms) / 1000)
+        return reply
+
+    def stream(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        # Same latency, but the reply arrives a token (4 characters) at a time
+        reply = self.inner.complete(system_prompt, prompt, context, max_tokens, temperature)
+        prompt_tokens = (len(system_prompt) + len(prompt)) / 4
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+        time.sleep((self.request_ms + prompt_tokens * self.prompt_token_ms) / 1000)
+        for start in range(0, len(reply), 4):
+            time.sleep(self.output_token_ms / 1000)
+            with self._lock:
+                self.output_tokens += 1
+            yield reply[start:start + 4]
+
+
+class HedgedBackend(LLMBackend):
+    """Sends a second copy of a request that is slower than usual; the first reply wins
+
+    The copy goes out once a request has run longer than the given percentile
+    of recent request latencies (initial_delay until min_samples are known), so
+    only the slow tail is duplicated: about 1 - percentile more requests. The
+    losing streamed call is closed; a non-streamed one finishes unused.
+
+    Around a RateLimitedBackend, both copies go through its admission, and
+    latencies and the hedge delay are measured from when a call was admitted,
+    not from when it started queueing for budget. No copy is sent while other
+    callers are queued: the limiter is the bottleneck then, not a slow call.
+    """
+
+    def __init__(self, inner: LLMBackend, percentile: float = HEDGE_PERCENTILE,
+                 min_samples: int = HEDGE_MIN_SAMPLES, initial_delay: float = HEDGE_INITIAL_DELAY,
+                 window: int = 200, max_workers: int = 64):
+        self.inner = inner
+        self.name = inner.name
+        # A rate limiter is entered here, so its queueing can be told apart from call latency
+        self.limiter = inner if isinstance(inner, RateLimitedBackend) else None
+        self._target = self.limiter.inner if self.limiter is not None else inner
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self._latencies = deque(maxlen=window)  # seconds, of first copies that completed
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+        self.requests = 0
+        self.hedges = 0      # second copies sent
+        self.hedge_wins = 0  # ... that replied first
+
+    def hedge_delay(self) -> float:
+        """Seconds a request may take before its copy is sent"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_delay
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+    def complete(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7):
+        return self._race(system_prompt, prompt, max_tokens, lambda stop: self._target.complete(
+            system_prompt, prompt, context, max_tokens, temperature))
+
+    def complete_action(self, system_prompt, prompt, context=None, max_tokens=800, temperature=0.7, cancel=None):
+        # Each copy stops when the other one won or when the caller cancels
+        return self._race(system_prompt, prompt, max_tokens, lambda stop: self._target.complete_action(
+            system_prompt, prompt, context, max_tokens, temperature, cancel=AnyEvent(stop, cancel)), cancel)
+
+    def _attempt(self, call, stop: threading.Event, admitted: threading.Event, marks: Dict,
+                 system_prompt: str, prompt: str, max_tokens: int):
+        """One copy: wait for admission (when rate limited), note the time, then call"""
+        try:
+            with self.limiter.admission(system_prompt, prompt, max_tokens) if self.limiter else nullcontext():
+                marks['admitted'] = time.monotonic()
+                admitted.set()
+                return call(stop)
+        finally:
+            admitted.set()  # also when the admission failed
+
+    def _race(self, system_prompt: str, prompt: str, max_tokens: int, call,
+              cancel: Optional[threading.Event] = None):
+        """call(stop event) -> reply, run once and again after the hedge delay; first success wins
+
+        No copy is sent once cancel is set.
+        """
+        stops = [threading.Event()]
+        admitted, marks = threading.Event(), {}
+        futures = [self._pool.submit(self._attempt, call, stops[0], admitted, marks, system_prompt, prompt, max_tokens)]
+        futures[0].add_done_callback(lambda future: self._record(future, marks))
+        admitted.wait()
+        if 'admitted' in marks:
+            remaining = self.hedge_delay() - (time.monotonic() - marks['admitted'])
+            if not wait(futures, timeout=max(0.0, remaining)).done \
+                    and (self.limiter is None or self.limiter.queued == 0) \
+                    and (cancel is None or not cancel.is_set()):
+                stops.append(threading.Event())
+                futures.append(self._pool.submit(self._attempt, call, stops[1], threading.Event(), {},
+                                                 system_prompt, prompt, max_tokens))
+                with self._lock:
+                    self.hedges += 1
+
+        pending, error = set(futures), None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for stop in stops:
+                    stop.set()
+                with self._lock:
+                    self.requests += 1
+                    self.hedge_wins += future is not futures[0]
+                return future.result()
+        raise error
+
+    def _record(self, future, marks: Dict) -> None:
+        # A first copy stopped because its hedge won ran at least this long: still a useful sample
+        if future.exception() is None and 'admitted' in marks:
+            with self._lock:
+                self._latencies.append(time.monotonic() - marks['admitted'])
+
+
+BACKENDS = ('openai', 'http', 'rule', 'replay')
+
+
+def create_backend(name: str, model: str = None, api_key: Optional[str] = None,
+                   replay_path: Optional[str] = None, record_path: Optional[str] = None,
+                   base_url: Optional[str] = None, timeout: float = LLM_TIMEOUT) -> LLMBackend:
+    """Backend by name ('openai', 'http', 'rule' or 'replay'), optionally recording its replies"""
+    if name == 'openai':
+        backend = OpenAIBackend(model, api_key, timeout)
+    elif name == 'http':
+        if not base_url:
+            raise ValueError("The http backend needs the server's base URL (base_url, e.g. http://localhost:8000/v1)")
+        backend = OpenAICompatibleBackend(base_url, model, api_key, timeout)
+    elif name == 'rule':
+        backend = RulePolicyBackend()
+    elif name == 'replay':
+        if not replay_path:
+            raise ValueError("The replay backend needs a recording (replay_path)")
+        backend = ReplayBackend(replay_path)
+    else:
+        raise ValueError(f"Unknown LLM backend: {name} (choose from {', '.join(BACKENDS)})")
+
+    if record_path:
+        backend = RecordingBackend(backend, record_path)
+    return backend
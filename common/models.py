@@ -3,9 +3,10 @@ Common Data Models
 Defines data structures for all entities in the system
 """
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import Dict, List, Optional
 from enum import Enum
+from itertools import compress
 import json
 
 
@@ -40,48 +41,170 @@ class ItemType(Enum):
     TEMP_ROOM = "temp_room"  # Temporary room voucher
 
 
-@dataclass
+# Fixed slot order for known items, derived from ItemType
+ITEM_NAMES = tuple(item.value for item in ItemType)
+ITEM_INDEX = {name: index for index, name in enumerate(ITEM_NAMES)}
+
+# Past this many changes between serializations the items dict is rebuilt rather than patched
+_MAX_TOUCHED = 8
+
+# Enum member by value (or by itself) without going through EnumMeta.__call__,
+# and cached member values so serialization never touches Enum.value
+_OCCUPATIONS = {**{o.value: o for o in Occupation}, **{o: o for o in Occupation}}
+_GENDERS = {**{g.value: g for g in Gender}, **{g: g for g in Gender}}
+_ENUM_VALUES = {member: member.value for enum in (Occupation, Gender) for member in enum}
+
+
+def _enum_member(members: dict, enum, value):
+    """members[value], raising ValueError for an invalid value like enum(value) does"""
+    try:
+        return members[value]
+    except (KeyError, TypeError):
+        raise ValueError(f"{value!r} is not a valid {enum.__name__}") from None
+
+
 class Inventory:
-    """Inventory system"""
-    money: int = 200  # Initial currency (increased to 200 to ensure can buy raw materials)
-    items: Dict[str, int] = field(default_factory=dict)
+    """Inventory system
+
+    Quantities of the ItemType items live in a fixed-size list indexed by
+    ITEM_INDEX; any other item name goes to a small overflow dict. Every
+    mutation bumps a version counter, and to_dict() is cached until the next
+    mutation, so the returned dict must be treated as read-only. After a change
+    only the touched items are patched into a copy of the previous items dict.
+    """
+    __slots__ = ('_money', '_counts', '_extra', '_touched', '_version', '_cache', '_cache_version')
+    
+    def __init__(self, money: int = 200, items: Optional[Dict[str, int]] = None):
+        self._money = money  # Initial currency (increased to 200 to ensure can buy raw materials)
+        self._counts = counts = [0] * len(ITEM_NAMES)
+        self._extra: Optional[Dict[str, int]] = None  # Items outside ItemType, created on first use
+        self._touched: Optional[List[str]] = None  # Items changed since the last to_dict(), None = rebuild
+        self._version = 0
+        self._cache = None
+        self._cache_version = -1
+        if items:
+            for item, quantity in items.items():
+                index = ITEM_INDEX.get(item)
+                if index is None:
+                    self._add_extra(item, quantity)
+                else:
+                    counts[index] += quantity
+    
+    @property
+    def money(self):
+        return self._money
+    
+    @money.setter
+    def money(self, value):
+        self._money = value
+        self._version += 1
+    
+    @property
+    def items(self) -> Dict[str, int]:
+        """Items held, {item: quantity} (a copy; use add_item/remove_item to change)"""
+        return dict(self.to_dict()["items"])
+    
+    def _add_extra(self, item: str, quantity: int):
+        if self._extra is None:
+            self._extra = {}
+        count = self._extra.get(item, 0) + quantity
+        if count:
+            self._extra[item] = count
+        else:
+            self._extra.pop(item, None)
+    
+    def _get_extra(self, item: str) -> int:
+        return self._extra.get(item, 0) if self._extra else 0
+    
+    def _touch(self, item: str):
+        touched = self._touched
+        if touched is not None:
+            if len(touched) < _MAX_TOUCHED:
+                touched.append(item)
+            else:
+                self._touched = None
     
     def add_item(self, item: str, quantity: int = 1):
         """Add item"""
-        if item not in self.items:
-            self.items[item] = 0
-        self.items[item] += quantity
+        index = ITEM_INDEX.get(item)
+        if index is None:
+            self._add_extra(item, quantity)
+        else:
+            self._counts[index] += quantity
+        self._touch(item)
+        self._version += 1
     
     def remove_item(self, item: str, quantity: int = 1) -> bool:
         """Remove item, returns success status"""
-        if item not in self.items or self.items[item] < quantity:
-            return False
-        self.items[item] -= quantity
-        if self.items[item] == 0:
-            del self.items[item]
+        index = ITEM_INDEX.get(item)
+        if index is None:
+            have = self._get_extra(item)
+            if have <= 0 or have < quantity:
+                return False
+            if have == quantity:
+                del self._extra[item]
+            else:
+                self._extra[item] = have - quantity
+        else:
+            have = self._counts[index]
+            if have <= 0 or have < quantity:
+                return False
+            self._counts[index] = have - quantity
+        self._touch(item)
+        self._version += 1
         return True
     
     def has_item(self, item: str, quantity: int = 1) -> bool:
         """Check if has enough items"""
-        return item in self.items and self.items[item] >= quantity
+        index = ITEM_INDEX.get(item)
+        have = self._get_extra(item) if index is None else self._counts[index]
+        return have > 0 and have >= quantity
     
     def add_money(self, amount: int):
         """Add money"""
-        self.money += amount
+        self._money += amount
+        self._version += 1
     
     def remove_money(self, amount: int) -> bool:
         """Remove money, returns success status"""
-        if self.money < amount:
+        if self._money < amount:
             return False
-        self.money -= amount
+        self._money -= amount
+        self._version += 1
         return True
     
     def to_dict(self) -> dict:
-        """Convert to dictionary"""
-        return {
-            "money": self.money,
-            "items": self.items
-        }
+        """Convert to dictionary (cached until the next mutation, do not modify)
+        
+        The version is read and the touched list swapped out before building, so a
+        mutation from another thread meanwhile leaves the cache stale (rebuilt on
+        the next call) rather than marked current.
+        """
+        version = self._version
+        if self._cache_version != version:
+            touched, self._touched = self._touched, []
+            if touched is None:
+                items = dict(compress(zip(ITEM_NAMES, self._counts), self._counts))
+                if self._extra:
+                    items.update(self._extra)
+            elif touched:
+                items = dict(self._cache["items"])
+                for item in touched:
+                    index = ITEM_INDEX.get(item)
+                    count = self._get_extra(item) if index is None else self._counts[index]
+                    if count:
+                        items[item] = count
+                    else:
+                        items.pop(item, None)
+            else:
+                # Only money changed
+                items = self._cache["items"]
+            self._cache = {
+                "money": self._money,
+                "items": items
+            }
+            self._cache_version = version
+        return self._cache
     
     @classmethod
     def from_dict(cls, data: dict) -> 'Inventory':
@@ -90,31 +213,107 @@ class Inventory:
             money=data.get("money", 100),
             items=data.get("items", {})
         )
+    
+    def __eq__(self, other):
+        if not isinstance(other, Inventory):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+    
+    def __repr__(self):
+        return f"Inventory(money={self._money!r}, items={self.to_dict()['items']!r})"
+
+
+def _tracked(slot: str, doc: str) -> property:
+    """Property over a private slot whose setter marks the villager dirty"""
+    def get(self):
+        return getattr(self, slot)
+    
+    def set(self, value):
+        setattr(self, slot, value)
+        self._version += 1
+    
+    return property(get, set, doc=doc)
 
 
-@dataclass
 class Villager:
-    """Villager data model"""
-    name: str
-    occupation: Occupation
-    gender: Gender
-    personality: str
-    stamina: int = 100  # Stamina
-    max_stamina: int = 100
-    inventory: Inventory = field(default_factory=Inventory)
-    has_submitted_action: bool = False  # Has submitted action for current time period
-    has_slept: bool = False  # Has slept today
+    """Villager data model
+
+    Slotted; every field assignment bumps a version counter, and to_dict() is
+    cached until the villager or its inventory changes, so the returned dict
+    must be treated as read-only (copy it before adding keys).
+    """
+    __slots__ = (
+        '_name', '_occupation', '_gender', '_personality', '_stamina', '_max_stamina',
+        '_inventory', '_has_submitted_action', '_has_slept',
+        '_occupation_value', '_gender_value', '_version', '_cache', '_cache_version', '_cache_inventory_version'
+    )
+    
+    def __init__(self, name: str, occupation: Occupation, gender: Gender, personality: str,
+                 stamina: int = 100, max_stamina: int = 100, inventory: Optional[Inventory] = None,
+                 has_submitted_action: bool = False, has_slept: bool = False):
+        self._name = name
+        # Enum values are looked up once here instead of on every to_dict()
+        self._occupation = occupation = _OCCUPATIONS.get(occupation, occupation)
+        self._occupation_value = _ENUM_VALUES.get(occupation, occupation)
+        self._gender = gender = _GENDERS.get(gender, gender)
+        self._gender_value = _ENUM_VALUES.get(gender, gender)
+        self._personality = personality
+        self._stamina = stamina  # Stamina
+        self._max_stamina = max_stamina
+        self._inventory = inventory if inventory is not None else Inventory()
+        self._has_submitted_action = has_submitted_action  # Has submitted action for current time period
+        self._has_slept = has_slept  # Has slept today
+        self._version = 0
+        self._cache = None
+        self._cache_version = -1
+        self._cache_inventory_version = -1
+    
+    name = _tracked('_name', 'Villager name')
+    personality = _tracked('_personality', 'Personality description')
+    max_stamina = _tracked('_max_stamina', 'Stamina cap')
+    inventory = _tracked('_inventory', 'Inventory')
+    has_submitted_action = _tracked('_has_submitted_action', 'Has submitted action for current time period')
+    has_slept = _tracked('_has_slept', 'Has slept today')
+    
+    @property
+    def stamina(self):
+        return self._stamina
+    
+    @stamina.setter
+    def stamina(self, value):
+        self._stamina = value
+        self._version += 1
+    
+    @property
+    def occupation(self):
+        return self._occupation
+    
+    @occupation.setter
+    def occupation(self, value):
+        self._occupation = value = _OCCUPATIONS.get(value, value)
+        self._occupation_value = _ENUM_VALUES.get(value, value)
+        self._version += 1
+    
+    @property
+    def gender(self):
+        return self._gender
+    
+    @gender.setter
+    def gender(self, value):
+        self._gender = value = _GENDERS.get(value, value)
+        self._gender_value = _ENUM_VALUES.get(value, value)
+        self._version += 1
     
     def consume_stamina(self, amount: int) -> bool:
         """Consume stamina"""
-        if self.stamina < amount:
+        if self._stamina < amount:
             return False
-        self.stamina -= amount
+        self.stamina = self._stamina - amount
         return True
     
     def restore_stamina(self, amount: int):
         """Restore stamina"""
-        self.stamina = min(self.stamina + amount, self.max_stamina)
+        self.stamina = min(self._stamina + amount, self._max_stamina)
     
     def reset_time_period(self):
         """Reset time period state (called each time advancement)"""
@@ -125,43 +324,72 @@ class Villager:
         self.has_submitted_action = False
         self.has_slept = False
         # Hunger deduction
-        self.stamina = max(0, self.stamina - 10)
+        self.stamina = max(0, self._stamina - 10)
         # Daily settlement consumes temporary room voucher
-        if self.inventory.has_item("temp_room", 1):
-            self.inventory.remove_item("temp_room", 1)
+        if self._inventory.has_item("temp_room", 1):
+            self._inventory.remove_item("temp_room", 1)
     
     def eat_bread(self) -> bool:
         """Eat bread to restore stamina"""
-        if not self.inventory.has_item("bread", 1):
+        if not self._inventory.has_item("bread", 1):
             return False
-        self.inventory.remove_item("bread", 1)
+        self._inventory.remove_item("bread", 1)
         self.restore_stamina(30)  # Restore 30 stamina
         return True
     
+    def revert(self, changes: dict):
+        """Undo one action's own changes, keeping everything that happened since
+        
+        changes: {'money': delta, 'items': {item: delta}, 'stamina': delta, 'slept': True}
+        as the action made them. Money or items already spent elsewhere are taken
+        back only as far as they are still held.
+        """
+        inventory = self._inventory
+        held = inventory.items
+        for item, delta in changes.get('items', {}).items():
+            if delta < 0:
+                inventory.add_item(item, -delta)
+            elif held.get(item, 0) > 0:
+                inventory.remove_item(item, min(delta, held[item]))
+        money = changes.get('money', 0)
+        if money < 0:
+            inventory.add_money(-money)
+        elif money > 0:
+            inventory.remove_money(min(money, inventory.money))
+        if changes.get('stamina'):
+            self.stamina = max(0, min(self._stamina - changes['stamina'], self._max_stamina))
+        if changes.get('slept'):
+            self.has_slept = False
+    
     def to_dict(self) -> dict:
-        """Convert to dictionary"""
-        return {
-            "name": self.name,
-            "occupation": self.occupation.value if isinstance(self.occupation, Occupation) else self.occupation,
-            "gender": self.gender.value if isinstance(self.gender, Gender) else self.gender,
-            "personality": self.personality,
-            "stamina": self.stamina,
-            "max_stamina": self.max_stamina,
-            "inventory": self.inventory.to_dict(),
-            "has_submitted_action": self.has_submitted_action,
-            "has_slept": self.has_slept
-        }
+        """Convert to dictionary (cached until the next change, do not modify)"""
+        inventory = self._inventory
+        # Versions are read before building (see Inventory.to_dict)
+        version, inventory_version = self._version, inventory._version
+        if self._cache_version != version or self._cache_inventory_version != inventory_version:
+            inventory_dict = inventory.to_dict()
+            self._cache = {
+                "name": self._name,
+                "occupation": self._occupation_value,
+                "gender": self._gender_value,
+                "personality": self._personality,
+                "stamina": self._stamina,
+                "max_stamina": self._max_stamina,
+                "inventory": inventory_dict,
+                "has_submitted_action": self._has_submitted_action,
+                "has_slept": self._has_slept
+            }
+            self._cache_version = version
+            self._cache_inventory_version = inventory_version
+        return self._cache
     
     @classmethod
     def from_dict(cls, data: dict) -> 'Villager':
         """Create from dictionary"""
-        occupation = Occupation(data["occupation"]) if isinstance(data["occupation"], str) else data["occupation"]
-        gender = Gender(data["gender"]) if isinstance(data["gender"], str) else data["gender"]
-        
         villager = cls(
             name=data["name"],
-            occupation=occupation,
-            gender=gender,
+            occupation=_enum_member(_OCCUPATIONS, Occupation, data["occupation"]),
+            gender=_enum_member(_GENDERS, Gender, data["gender"]),
             personality=data["personality"],
             stamina=data.get("stamina", 100),
             max_stamina=data.get("max_stamina", 100),
@@ -170,6 +398,15 @@ class Villager:
             has_slept=data.get("has_slept", False)
         )
         return villager
+    
+    def __eq__(self, other):
+        if not isinstance(other, Villager):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+    
+    def __repr__(self):
+        return (f"Villager(name={self._name!r}, occupation={self._occupation!r}, gender={self._gender!r}, "
+                f"stamina={self._stamina!r}, inventory={self._inventory!r})")
 
 
 @dataclass
@@ -0,0 +1,190 @@
+"""
+State Persistence
+Compact snapshots plus an append-only mutation log, so a node can be
+restored in milliseconds after a restart
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict
+
+
+def _encode(value: Any) -> str:
+    """Compact JSON encoding used for both snapshot and log records"""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+class StateStore:
+    """Snapshot + mutation log for one node
+
+    State is a flat mapping of section name -> JSON value (e.g. 'villager',
+    'messages', 'pending_trades'). Every change is written as one log line:
+        {"op": "set", "key": ..., "value": ...}
+        {"op": "append", "key": ..., "items": [...]}    (list grew at the end)
+    A snapshot folds the log into a single file and truncates the log.
+    On restore the snapshot is loaded and the log is replayed on top of it.
+    """
+
+    def __init__(self, directory: str, node_id: str, snapshot_every: int = 200,
+                 snapshot_interval: float = 30.0, fsync: bool = False):
+        os.makedirs(directory, exist_ok=True)
+        self.node_id = node_id
+        self.snapshot_path = os.path.join(directory, f"{node_id}.snapshot.json")
+        self.log_path = os.path.join(directory, f"{node_id}.log.jsonl")
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        # key -> encoded value (str), or list of encoded items for list values
+        self._encoded: Dict[str, Any] = {}
+        self._log = None
+        self._records_since_snapshot = 0
+        self._snapshot_thread = None
+        self._closed = False
+
+    # ========== Restore ==========
+
+    def load(self) -> Dict[str, Any]:
+        """Load snapshot and replay the log; returns {} when nothing was persisted"""
+        with self._lock:
+            state: Dict[str, Any] = {}
+
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+
+            replayed = 0
+            torn = False
+            if os.path.exists(self.log_path):
+                with open(self.log_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            # Torn write from a crash: everything before it is intact
+                            torn = True
+                            break
+                        if record['op'] == 'set':
+                            state[record['key']] = record['value']
+                        elif record['op'] == 'append':
+                            state.setdefault(record['key'], []).extend(record['items'])
+                        replayed += 1
+
+            self._encoded = {
+                key: [_encode(item) for item in value] if isinstance(value, list) else _encode(value)
+                for key, value in state.items()
+            }
+            self._records_since_snapshot = replayed
+            if torn:
+                # Rewrite so new records are not appended after the torn line
+                self._write_snapshot()
+            return state
+
+    # ========== Mutations ==========
+
+    def set(self, key: str, value: Any):
+        """Record the current value of a section (no-op if unchanged)
+
+        Lists that only grew at the end are logged as an 'append' record
+        carrying just the new items.
+        """
+        if isinstance(value, list):
+            encoded_items = [_encode(item) for item in value]
+            with self._lock:
+                previous = self._encoded.get(key)
+                if previous == encoded_items:
+                    return
+                if (isinstance(previous, list) and len(previous) < len(encoded_items)
+                        and encoded_items[:len(previous)] == previous):
+                    new_items = encoded_items[len(previous):]
+                    line = '{"op":"append","key":%s,"items":[%s]}' % (_encode(key), ','.join(new_items))
+                else:
+                    line = '{"op":"set","key":%s,"value":[%s]}' % (_encode(key), ','.join(encoded_items))
+                self._encoded[key] = encoded_items
+                self._write_record(line)
+        else:
+            encoded = _encode(value)
+            with self._lock:
+                if self._encoded.get(key) == encoded:
+                    return
+                self._encoded[key] = encoded
+                self._write_record('{"op":"set","key":%s,"value":%s}' % (_encode(key), encoded))
+
+    def _write_record(self, line: str):
+        """Append one record to the log (caller holds the lock)"""
+        if self._closed:
+            return
+        if self._log is None:
+            self._log = open(self.log_path, 'a', encoding='utf-8')
+        self._log.write(line + '\n')
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+
+        self._records_since_snapshot += 1
+        if self._records_since_snapshot >= self.snapshot_every:
+            self._write_snapshot()
+
+    # ========== Snapshots ==========
+
+    def snapshot(self):
+        """Fold the log into a fresh snapshot"""
+        with self._lock:
+            if self._records_since_snapshot > 0:
+                self._write_snapshot()
+
+    def _write_snapshot(self):
+        """Write snapshot atomically and truncate the log (caller holds the lock)"""
+        parts = []
+        for key, encoded in self._encoded.items():
+            if isinstance(encoded, list):
+                encoded = '[' + ','.join(encoded) + ']'
+            parts.append(f"{_encode(key)}:{encoded}")
+
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('{' + ','.join(parts) + '}')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        # Everything in the log is now covered by the snapshot
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self.log_path, 'w', encoding='utf-8')
+        self._records_since_snapshot = 0
+
+    def start_periodic_snapshots(self):
+        """Snapshot in the background every snapshot_interval seconds"""
+        if self._snapshot_thread is not None:
+            return
+
+        def loop():
+            while not self._closed:
+                time.sleep(self.snapshot_interval)
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    print(f"[StateStore-{self.node_id}] Snapshot failed: {e}")
+
+        self._snapshot_thread = threading.Thread(target=loop, daemon=True)
+        self._snapshot_thread.start()
+
+    def close(self):
+        """Write a final snapshot and close the log"""
+        with self._lock:
+            if self._closed:
+                return
+            if self._records_since_snapshot > 0:
+                self._write_snapshot()
+            self._closed = True
+            if self._log is not None:
+                self._log.close()
+                self._log = None
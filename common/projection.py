@@ -0,0 +1,67 @@
+"""
+Field Projection
+Partial responses for read endpoints: a caller names the fields it uses
+(REST: ?fields=name,inventory.items; gRPC: a FieldMask with the same dotted
+paths) and only those are copied and encoded.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, Optional, Union
+
+# Parsed selection: {key: True} keeps the whole value, {key: {...}} recurses into it
+Fields = Dict[str, Union[bool, 'Fields']]
+
+
+@lru_cache(maxsize=256)
+def parse_fields(spec: Optional[str]) -> Optional[Fields]:
+    """Parse 'name,inventory.items' into {'name': True, 'inventory': {'items': True}}
+
+    Returns None (no projection) for an empty spec. Results are cached and
+    shared, so do not modify them.
+    """
+    if not spec:
+        return None
+
+    tree: Fields = {}
+    for path in spec.split(','):
+        parts = [part for part in path.strip().split('.') if part]
+        if not parts:
+            continue
+        node = tree
+        for part in parts[:-1]:
+            child = node.setdefault(part, {})
+            if child is True:
+                # The parent is already selected as a whole
+                break
+            node = child
+        else:
+            node[parts[-1]] = True
+    return tree or None
+
+
+def fields_from_mask(field_mask) -> Optional[Fields]:
+    """Selection for a google.protobuf.FieldMask (None when it has no paths)"""
+    if field_mask is None or not field_mask.paths:
+        return None
+    return parse_fields(','.join(field_mask.paths))
+
+
+def project(data: Any, fields: Optional[Fields]) -> Any:
+    """Keep only the selected fields of a dict; lists are projected per element
+
+    Selected keys missing from data are left out. With fields=None, data is
+    returned unchanged.
+    """
+    if fields is None:
+        return data
+    if isinstance(data, list):
+        return [project(item, fields) for item in data]
+    if not isinstance(data, dict):
+        return data
+
+    result = {}
+    for key, selection in fields.items():
+        if key in data:
+            value = data[key]
+            result[key] = value if selection is True else project(value, selection)
+    return result
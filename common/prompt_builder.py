@@ -0,0 +1,104 @@
+"""
+Prompt Builder
+Assembles the per-decision prompt from titled sections under a token budget.
+
+Each section has a priority. When the prompt is over budget, the lowest
+priority section loses lines first: from its end (sections list their most
+important lines first), or from its start with tail=True (for chronological
+sections), down to the lines it must keep. A section with nothing it must
+keep is dropped. Required sections are never cut. Sections are emitted in
+the order they were added, whatever their priority.
+
+Tokens are estimated as characters / 4, the same estimate the rate limiter
+uses, so no tokenizer is needed.
+"""
+
+from typing import Dict, List, Optional
+
+CHARS_PER_TOKEN = 4
+DEFAULT_BUDGET = 600  # tokens of the per-decision (user) prompt; the agent's --prompt-budget default
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class PromptSection:
+    """A titled block of lines; lines past keep may be cut (from the end, or the start when tail)"""
+
+    def __init__(self, title: Optional[str], lines: List[str], priority: int, keep: int = 0,
+                 required: bool = False, more: Optional[str] = None, tail: bool = False):
+        self.title = title
+        self.lines = list(lines)
+        self.priority = priority
+        self.keep = len(self.lines) if required else min(keep, len(self.lines))
+        self.required = required
+        self.more = more or ("- ... {n} earlier" if tail else "- ... {n} more")  # {n}: lines cut
+        self.tail = tail
+        self.shown = len(self.lines)
+        self.dropped = False
+
+    def render(self) -> str:
+        if self.dropped:
+            return ''
+        cut = len(self.lines) - self.shown
+        lines = self.lines[cut:] if self.tail else self.lines[:self.shown]
+        if cut:
+            lines.insert(0 if self.tail else len(lines), self.more.format(n=cut))
+        if self.title:
+            lines.insert(0, f"=== {self.title} ===")
+        return "\n".join(lines)
+
+
+class PromptBuilder:
+    """Sections + token budget -> prompt text"""
+
+    def __init__(self, budget: int = DEFAULT_BUDGET):
+        self.budget = budget
+        self.sections: List[PromptSection] = []
+        self.stats: Dict = {}
+
+    def add(self, title: Optional[str], lines: List[str], priority: int = 0, keep: int = 0,
+            required: bool = False, more: Optional[str] = None, tail: bool = False) -> 'PromptBuilder':
+        """Add a section (empty sections are skipped); returns self for chaining"""
+        if lines:
+            self.sections.append(PromptSection(title, lines, priority, keep, required, more, tail))
+        return self
+
+    def build(self) -> str:
+        """The prompt, cut to the budget where possible; self.stats says what was cut"""
+        sizes = [estimate_tokens(section.render()) for section in self.sections]
+        total = sum(sizes) + len(self.sections)  # plus the blank lines between sections
+        full = total
+        cut_lines = 0
+        dropped = []
+
+        # Cheapest-first: the lowest priority section gives up lines until the prompt fits
+        for index in sorted(range(len(self.sections)), key=lambda i: self.sections[i].priority):
+            if total <= self.budget:
+                break
+            section = self.sections[index]
+            if section.required:
+                continue
+            while total > self.budget and section.shown > section.keep:
+                section.shown -= 1
+                cut_lines += 1
+                size = estimate_tokens(section.render())
+                total += size - sizes[index]
+                sizes[index] = size
+            if total > self.budget and section.keep == 0:
+                section.dropped = True
+                dropped.append(section.title)
+                total -= sizes[index] + 1
+                sizes[index] = 0
+
+        prompt = "\n\n".join(text for text in (section.render() for section in self.sections) if text)
+        self.stats = {
+            'tokens': estimate_tokens(prompt),
+            'full_tokens': full,
+            'budget': self.budget,
+            'cut_lines': cut_lines,
+            'dropped': dropped
+        }
+        return prompt
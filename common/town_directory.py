@@ -0,0 +1,152 @@
+"""
+Town Directory
+The public state of every villager (name, occupation, stamina, items,
+whether it has submitted this period's action), kept on the coordinator.
+
+Villagers push compact deltas - only the top-level fields that changed - after
+each mutation, from a background thread so requests never wait on it. Agents
+read every peer in one GET /directory call instead of one GET /villager per
+peer, and can pass ?since=<version> to receive only entries changed since
+their last read.
+"""
+
+import copy
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from common import http_client
+from common.projection import parse_fields, project
+
+# Villager fields other villagers may read (same as the agent's ?fields= for GET /villager)
+PUBLIC_FIELDS = 'name,occupation,has_submitted_action,stamina,inventory.items,inventory.money'
+
+
+def public_state(villager_data: Dict) -> Dict:
+    """Public part of Villager.to_dict() (a private copy; to_dict() results are shared)"""
+    return copy.deepcopy(project(villager_data, parse_fields(PUBLIC_FIELDS)))
+
+
+def diff(old: Optional[Dict], new: Dict) -> Dict:
+    """Top-level fields of new that differ from old"""
+    if not old:
+        return dict(new)
+    return {key: value for key, value in new.items() if old.get(key) != value}
+
+
+class TownDirectory:
+    """Coordinator side: node_id -> public state, with a version per change"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[int, Dict]] = {}  # node_id -> (version, state)
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def apply(self, node_id: str, delta: Dict, full: bool = False) -> Optional[int]:
+        """Merge a delta into a villager's entry, returns the new version
+
+        Returns None when the entry is unknown (e.g. the coordinator restarted)
+        and the update is not a full state; the villager then resends in full.
+        """
+        with self._lock:
+            entry = self._entries.get(node_id)
+            if entry is None and not full:
+                return None
+            state = dict(delta) if full else {**entry[1], **delta}
+            self.version += 1
+            self._entries[node_id] = (self.version, state)
+            return self.version
+
+    def ensure(self, node_id: str, state: Dict) -> None:
+        """Create a placeholder entry for a newly registered villager (kept if one exists)"""
+        with self._lock:
+            if node_id not in self._entries:
+                self.version += 1
+                self._entries[node_id] = (self.version, dict(state))
+
+    def read(self, since: Optional[int] = None) -> Tuple[int, bool, Dict[str, Dict]]:
+        """(version, full, {node_id: state}) - all entries, or those changed after since
+
+        full is True when every entry is returned: no since, or a since the
+        directory cannot answer (newer than its version, i.e. it restarted).
+        """
+        with self._lock:
+            full = since is None or since > self.version
+            entries = {
+                node_id: state
+                for node_id, (version, state) in self._entries.items()
+                if full or version > since
+            }
+            return self.version, full, entries
+
+
+class DirectoryPublisher:
+    """Villager side: pushes the changed public fields to the coordinator in the background
+
+    publish() only records the latest state; a single worker thread sends the
+    difference from what the coordinator last acknowledged, so bursts of
+    mutations collapse into one request.
+    """
+
+    def __init__(self, coordinator_address: Callable[[], str], node_id: Callable[[], str], timeout: float = 2.0):
+        self._coordinator_address = coordinator_address
+        self._node_id = node_id
+        self.timeout = timeout
+        self._latest: Optional[Dict] = None
+        self._published: Optional[Dict] = None  # None: coordinator has no entry for us yet
+        self._changed = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self, villager_data: Dict) -> None:
+        """Record the villager's current state (Villager.to_dict())"""
+        state = public_state(villager_data)
+        with self._lock:
+            if state == self._latest:
+                return
+            self._latest = state
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='directory-publisher', daemon=True)
+                self._thread.start()
+        self._changed.set()
+
+    def _run(self) -> None:
+        while True:
+            self._changed.wait()
+            self._changed.clear()
+            with self._lock:
+                latest, published = self._latest, self._published
+            delta = diff(published, latest)
+            if not delta:
+                continue
+            self._send(latest, delta, full=published is None)
+
+    def _send(self, latest: Dict, delta: Dict, full: bool) -> None:
+        try:
+            response = http_client.post(
+                f"http://{self._coordinator_address()}/directory/{self._node_id()}",
+                json={'delta': delta, 'full': full},
+                timeout=self.timeout
+            )
+        except Exception as e:
+            # Coordinator unreachable: the next mutation retries with the accumulated difference
+            print(f"[Directory] Failed to publish state: {e}")
+            return
+
+        with self._lock:
+            if response.status_code == 200:
+                self._published = latest
+            elif response.status_code == 409:
+                # Coordinator lost our entry; send everything
+                self._published = None
+                self._changed.set()
+            else:
+                print(f"[Directory] Failed to publish state: HTTP {response.status_code}")
+
+
+def merge_read(cache: Dict[str, Dict], result: Dict) -> Dict[str, Dict]:
+    """Apply a GET /directory reply to a reader's cache, returns the cache"""
+    if result.get('full'):
+        cache.clear()
+    for entry in result.get('villagers', []):
+        cache[entry['node_id']] = entry
+    return cache
@@ -0,0 +1,176 @@
+"""
+Trade Matcher
+Town-wide supply/demand matching for villager-to-villager trades, computed
+once per tick on the coordinator from the town directory, so agents stop
+proposing overlapping trades to the same partners.
+
+Every villager gets a demand and a surplus vector over the tradeable items:
+- demand: the inputs of its production recipe it is missing (when it has the
+  stamina to produce), bread up to a small reserve, and a house if it has none
+- surplus: whatever it holds beyond what it keeps: its recipe's inputs, the
+  bread reserve, and one house
+
+Items are matched in order (production inputs first). Within an item, sellers
+(largest surplus first) are paired with buyers (largest demand first) by
+overlapping their cumulative quantities (the north-west corner rule of the
+transportation problem), found with one merge of the two cumulative sums. A buyer's demand is
+capped by the money it has left, so the recommended set is consistent: no
+unit is promised twice and no buyer is asked to pay more than it holds.
+
+Each pair becomes one recommendation: the seller proposes it
+(`trade <buyer> sell <item> <quantity> <price>`) and the buyer accepts, so the
+two never send crossing requests for the same trade.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from common.models import MERCHANT_PRICES, PRODUCTION_RECIPES
+
+ITEMS = ('seed', 'wheat', 'wood', 'bread', 'house')  # matching order: inputs before products
+BREAD_RESERVE = 2
+
+
+def unit_prices(prices: Optional[Dict] = None) -> np.ndarray:
+    """P2P price per item: the middle of the merchant's buy and sell prices (whole gold)"""
+    prices = prices or MERCHANT_PRICES
+    return np.array([
+        int((prices['buy'].get(item, 0) + prices['sell'].get(item, 0)) / 2) for item in ITEMS
+    ], dtype=np.int64)
+
+
+def _recipe_rows():
+    """occupation -> (input vector, stamina cost, output item)"""
+    rows = {}
+    for occupation, recipe in PRODUCTION_RECIPES.items():
+        inputs = np.array([recipe.input_items.get(item, 0) for item in ITEMS], dtype=np.int64)
+        rows[occupation.value] = (inputs, recipe.stamina_cost, recipe.output_item)
+    return rows
+
+
+RECIPES = _recipe_rows()
+
+
+def supply_and_demand(villagers: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(surplus, demand, money) for directory entries, one row per villager"""
+    count = len(villagers)
+    held = np.zeros((count, len(ITEMS)), dtype=np.int64)
+    inputs = np.zeros((count, len(ITEMS)), dtype=np.int64)
+    stamina = np.zeros(count, dtype=np.int64)
+    cost = np.zeros(count, dtype=np.int64)
+    producer_of = np.zeros((count, len(ITEMS)), dtype=bool)
+    money = np.zeros(count, dtype=np.int64)
+
+    for row, villager in enumerate(villagers):
+        inventory = villager.get('inventory') or {}
+        items = inventory.get('items') or {}
+        held[row] = [items.get(item, 0) for item in ITEMS]
+        money[row] = inventory.get('money', 0)
+        stamina[row] = villager.get('stamina', 0)
+        recipe = RECIPES.get(villager.get('occupation'))
+        if recipe is not None:
+            inputs[row], cost[row], output = recipe
+            producer_of[row, ITEMS.index(output)] = True
+
+    bread, house = ITEMS.index('bread'), ITEMS.index('house')
+    # What each villager wants to hold: its recipe inputs (only worth buying when it can produce),
+    # a bread reserve unless it bakes, one house unless it builds them
+    want = inputs * (stamina >= cost)[:, None]
+    want[:, bread] = np.where(producer_of[:, bread], 0, BREAD_RESERVE)
+    want[:, house] = np.where(producer_of[:, house], 0, 1)
+    keep = np.maximum(want, inputs)
+    keep[:, bread] = np.maximum(keep[:, bread], BREAD_RESERVE)
+    keep[:, house] = np.maximum(keep[:, house], 1)
+
+    demand = np.maximum(want - held, 0)
+    surplus = np.maximum(held - keep, 0)
+    return surplus, demand, money
+
+
+def _pair(supply: np.ndarray, demand: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(seller, buyer, quantity) arrays for the pairs whose cumulative intervals overlap
+
+    The boundaries of both cumulative sums split [0, matched total) into
+    segments; each segment lies inside exactly one seller's and one buyer's
+    interval, and its length is what that seller sells that buyer.
+    """
+    supply_end = np.cumsum(supply)
+    demand_end = np.cumsum(demand)
+    bounds = np.union1d(supply_end, demand_end)
+    bounds = bounds[bounds <= min(supply_end[-1], demand_end[-1])]
+    starts = np.concatenate(([0], bounds[:-1]))
+    sellers = np.searchsorted(supply_end, starts, side='right')
+    buyers = np.searchsorted(demand_end, starts, side='right')
+    return sellers, buyers, bounds - starts
+
+
+def match(villagers: List[Dict], prices: Optional[Dict] = None) -> List[Dict]:
+    """Recommended trades for directory entries ({node_id, occupation, stamina, inventory})"""
+    if len(villagers) < 2:
+        return []
+    surplus, demand, money = supply_and_demand(villagers)
+    price = unit_prices(prices)
+    node_ids = [villager['node_id'] for villager in villagers]
+
+    trades = []
+    for column, item in enumerate(ITEMS):
+        if price[column] <= 0:
+            continue
+        # A buyer can only take what its remaining money pays for
+        wanted = np.minimum(demand[:, column], money // price[column])
+        sellers = np.flatnonzero(surplus[:, column])
+        buyers = np.flatnonzero(wanted)
+        if not len(sellers) or not len(buyers):
+            continue
+        sellers = sellers[np.argsort(-surplus[sellers, column], kind='stable')]
+        buyers = buyers[np.argsort(-wanted[buyers], kind='stable')]
+
+        seller_index, buyer_index, quantities = _pair(surplus[sellers, column], wanted[buyers])
+        for s, b, quantity in zip(seller_index, buyer_index, quantities.tolist()):
+            trades.append({
+                'seller': node_ids[sellers[s]],
+                'buyer': node_ids[buyers[b]],
+                'item': item,
+                'quantity': quantity,
+                'unit_price': int(price[column]),
+                'price': quantity * int(price[column])
+            })
+        # Spend the buyers' money before the next item
+        np.subtract.at(money, buyers[buyer_index], quantities * price[column])
+
+    return trades
+
+
+def recommendations_for(trades: Iterable[Dict], node_id: str) -> List[Dict]:
+    """The node's side of each trade: 'propose' (it sells) or 'accept' (it buys)"""
+    result = []
+    for trade in trades:
+        if trade['seller'] == node_id:
+            result.append({**trade, 'role': 'propose', 'partner': trade['buyer'],
+                           'command': f"trade {trade['buyer']} sell {trade['item']} {trade['quantity']} {trade['price']}"})
+        elif trade['buyer'] == node_id:
+            result.append({**trade, 'role': 'accept', 'partner': trade['seller']})
+    return result
+
+
+class MarketMatcher:
+    """Coordinator side: the matched trades of the current tick, computed on first request"""
+
+    def __init__(self):
+        self.tick = None
+        self.trades: List[Dict] = []
+        self.computed_ms = 0.0
+        self._lock = threading.Lock()
+
+    def trades_for_tick(self, tick, villagers: Callable[[], List[Dict]]) -> List[Dict]:
+        """Trades for tick; villagers() supplies the directory entries when they must be (re)computed"""
+        with self._lock:
+            if tick != self.tick:
+                started = time.perf_counter()
+                self.trades = match(villagers())
+                self.computed_ms = (time.perf_counter() - started) * 1000
+                self.tick = tick
+            return self.trades
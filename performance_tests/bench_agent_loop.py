@@ -0,0 +1,222 @@
+"""
+Benchmark: the AI agent loop itself (REST architecture), without a live model
+
+A coordinator, a merchant and --agents villager nodes are started, and one
+AIVillagerAgent per villager decides with an offline backend: the
+deterministic rule policy (default) or a recording made with
+`ai_villager_agent.py --record` (--backend replay --replay FILE). Every agent
+keeps deciding until it has submitted its action for the period, then waits
+for the time barrier to advance; the run ends after --ticks time advances.
+
+Reports decisions/s and ticks/s, and how long each phase of
+make_decision_and_act() takes: context gathering, prompt building, the
+backend call, parsing, and executing the action, plus the estimated prompt
+tokens per backend call (static system prompt + budgeted decision prompt),
+and how many decisions the rule fast path settled without a backend call
+(--no-fast-path sends every decision to the backend).
+
+--llm-latency puts a modelled hosted-API latency behind the backend
+(LatencyModelBackend). With --speculate, each agent starts its next decision
+as soon as it sees the time advance, from the predicted state, and the run
+reports how many of those were used.
+
+Usage:
+    python performance_tests/bench_agent_loop.py --agents 4 --ticks 6
+    python performance_tests/bench_agent_loop.py --agents 8 --villager-async --cache
+    python performance_tests/bench_agent_loop.py --agents 4 --ticks 6 --no-fast-path
+    python performance_tests/bench_agent_loop.py --agents 4 --ticks 6 --llm-latency --speculate
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'architecture2_rest'))
+from ai_villager_agent import AIVillagerAgent, REACT_SYSTEM_PROMPT
+from common.decision_cache import DecisionCache
+from common.llm_backends import LatencyModelBackend, create_backend
+from common.prompt_builder import estimate_tokens
+
+from bench_utils import free_port, start_service, stop_service, wait_for_http, summarize, print_table
+
+OCCUPATIONS = ('farmer', 'chef', 'carpenter')
+PHASES = ('context', 'prompt', 'llm', 'parse', 'execute', 'total')
+MAX_DECISIONS_PER_TICK = 10  # an agent that cannot submit within this many decisions idles
+
+
+def start_town(agents, villager_script):
+    """Start coordinator, merchant and villagers; returns (processes, coordinator port, merchant port, villager ports)"""
+    coord_port, merchant_port = free_port(), free_port()
+    coordinator = f"localhost:{coord_port}"
+
+    procs = [start_service('architecture2_rest/coordinator.py', ['--port', coord_port])]
+    wait_for_http(f"http://{coordinator}/health")
+    procs.append(start_service('architecture2_rest/merchant.py', ['--port', merchant_port, '--coordinator', coordinator]))
+    ports = []
+    for i in range(agents):
+        port = free_port()
+        ports.append(port)
+        procs.append(start_service(f'architecture2_rest/{villager_script}',
+                                   ['--port', port, '--id', f"v{i}", '--coordinator', coordinator],
+                                   env={'MERCHANT_PORT': str(merchant_port)}))
+
+    for port in [merchant_port] + ports:
+        wait_for_http(f"http://localhost:{port}/health")
+    return procs, coord_port, merchant_port, ports
+
+
+def events_cursor(agent):
+    """Current seq of the villager's event log"""
+    return requests.get(f"{agent.villager_url}/events", params={'timeout': 0}, timeout=5).json()['next']
+
+
+def time_advances(agent, since, timeout):
+    """(time advance events after since, next cursor), waiting up to timeout seconds"""
+    result = requests.get(f"{agent.villager_url}/events",
+                          params={'since': since, 'timeout': timeout, 'types': 'time_advance'},
+                          timeout=timeout + 5).json()
+    return result['events'], result['next']
+
+
+def has_submitted(agent):
+    response = requests.get(f"{agent.villager_url}/villager", params={'fields': 'has_submitted_action'}, timeout=5)
+    return response.json().get('has_submitted_action', False)
+
+
+def drive(agent, ticks, deadline, samples, errors, debounce=0.0):
+    """Decide until submitted, wait for the time advance, repeat for `ticks` advances
+
+    debounce: seconds between seeing a time advance and deciding, as the agent's
+    event loop waits for a burst of events to settle
+    """
+    try:
+        since = events_cursor(agent)
+        advanced = 0
+        decisions = 0
+        while advanced < ticks and time.time() < deadline:
+            if decisions >= MAX_DECISIONS_PER_TICK:
+                agent.execute_action('idle')
+            else:
+                agent.make_decision_and_act()
+                sample = dict(agent.last_timings)
+                if 'prompt' in sample:  # built a prompt (not served from the decision cache)
+                    sample['prompt_tokens'] = agent.last_prompt_stats.get('tokens', 0)
+                samples.append(sample)
+                decisions += 1
+
+            # The time may already have advanced (this agent was the last to submit)
+            events, since = time_advances(agent, since, 0)
+            if not events and has_submitted(agent):
+                events, since = time_advances(agent, since, max(0.0, min(30.0, deadline - time.time())))
+            if events:
+                agent.start_speculation(events[-1])  # no-op unless the agent speculates
+                advanced += len(events)
+                decisions = 0
+                time.sleep(debounce)
+    except Exception as e:
+        errors.append(f"{agent.villager_name}: {e}")
+
+
+def run(args):
+    villager_script = 'villager_async.py' if args.villager_async else 'villager.py'
+    procs, coord_port, merchant_port, ports = start_town(args.agents, villager_script)
+    try:
+        agents = []
+        for i, port in enumerate(ports):
+            backend = create_backend(args.backend, replay_path=args.replay)
+            if args.llm_latency:
+                backend = LatencyModelBackend(backend)
+            agent = AIVillagerAgent(
+                villager_port=port, coordinator_port=coord_port, merchant_port=merchant_port,
+                model='offline', use_react=True,
+                llm_backend=backend,
+                decision_cache=DecisionCache(capacity=256 if args.cache else 0),
+                fast_path=not args.no_fast_path,
+                speculate=args.speculate
+            )
+            agent.create_villager(f"Agent{i}", OCCUPATIONS[i % len(OCCUPATIONS)], 'female', 'benchmark')
+            agents.append(agent)
+
+        samples, errors = [], []
+        deadline = time.time() + args.timeout
+        threads = [threading.Thread(target=drive, args=(agent, args.ticks, deadline, samples, errors, args.debounce))
+                   for agent in agents]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        day_time = requests.get(f"http://localhost:{coord_port}/time", timeout=5).json()
+        stats = {key: sum(agent.decision_stats[key] for agent in agents)
+                 for key in ('fast_path', 'cached', 'speculative', 'llm')}
+        stats.update({f"speculations_{key}": sum(agent.speculation_stats[key] for agent in agents)
+                      for key in ('started', 'discarded')})
+        return samples, errors, wall, day_time, stats
+    finally:
+        for proc in procs:
+            stop_service(proc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AI agent loop throughput and per-phase latency')
+    parser.add_argument('--agents', type=int, default=4, help='agents (one villager node each)')
+    parser.add_argument('--ticks', type=int, default=6, help='time advances to run for')
+    parser.add_argument('--backend', choices=('rule', 'replay'), default='rule', help='offline decision backend')
+    parser.add_argument('--replay', type=str, help='recording for --backend replay')
+    parser.add_argument('--cache', action='store_true', help='enable the decision cache')
+    parser.add_argument('--no-fast-path', action='store_true', help='send every decision to the backend')
+    parser.add_argument('--llm-latency', action='store_true', help='model a hosted API latency behind the backend')
+    parser.add_argument('--speculate', action='store_true', help='decide ahead on each time advance')
+    parser.add_argument('--debounce', type=float, default=0.0,
+                        help="seconds to wait after a time advance before deciding (the agent loop's debounce)")
+    parser.add_argument('--villager-async', action='store_true', help='run villager_async.py nodes')
+    parser.add_argument('--timeout', type=float, default=120.0, help='give up after this many seconds')
+    parser.add_argument('--verbose', action='store_true', help='show agent output')
+    args = parser.parse_args()
+
+    print(f"Running {args.agents} agents for {args.ticks} ticks ({args.backend} backend)...")
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with output:
+        samples, errors, wall, day_time, stats = run(args)
+
+    for error in errors:
+        print(f"  error: {error}")
+    decisions = len(samples)
+    print(f"\n{decisions} decisions in {wall:.2f}s ({decisions / wall:.1f} decisions/s), "
+          f"{args.ticks / wall:.2f} ticks/s, reached day {day_time['day']} {day_time['time_of_day']}")
+    avoided = stats['fast_path'] + stats['cached']
+    calls = stats['llm'] + stats['speculations_started']
+    print(f"backend calls: {calls}, avoided: {avoided} ({avoided / max(decisions, 1) * 100:.0f}%: "
+          f"{stats['fast_path']} fast path, {stats['cached']} decision cache)")
+    if args.speculate:
+        print(f"speculative decisions: {stats['speculations_started']} started, {stats['speculative']} used, "
+              f"{stats['speculations_discarded']} discarded")
+    prompt_tokens = [sample['prompt_tokens'] for sample in samples if 'prompt_tokens' in sample]
+    if prompt_tokens:
+        print(f"prompt tokens per call: system {estimate_tokens(REACT_SYSTEM_PROMPT)} (static) + "
+              f"decision prompt mean {sum(prompt_tokens) / len(prompt_tokens):.0f}, max {max(prompt_tokens)}")
+
+    total = sum(sample['total'] for sample in samples) or 1.0
+    rows = []
+    for phase in PHASES:
+        values = [sample.get(phase, 0.0) for sample in samples]
+        s = summarize(values)
+        rows.append([phase, sum(values) / max(1, len(values)) * 1000, s['p50_ms'], s['p99_ms'], s['max_ms'],
+                     sum(values) / total * 100])
+    print_table(
+        f"make_decision_and_act() phases, {args.agents} agents",
+        ['phase', 'mean ms', 'p50 ms', 'p99 ms', 'max ms', '% of total'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: asyncio coordinator (coordinator_async.py) with many idle subscribers
+
+The coordinator is pinned to one CPU core. --subscribers clients each hold a
+long-poll on /events; with all of them idle we measure the coordinator's
+memory and the latency of ordinary requests (/time), then advance time and
+measure how long it takes until every subscriber has received the event.
+
+Usage:
+    python performance_tests/bench_coordinator_async.py --subscribers 10000 --rounds 3
+"""
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from bench_utils import (
+    free_port, raise_fd_limit, start_service, stop_service,
+    wait_for_http, rss_mb, summarize, print_table
+)
+
+
+async def wait_for_subscribers(session, base, count, timeout=120.0):
+    """Wait until the coordinator reports count connected subscribers"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        async with session.get(f"{base}/health") as r:
+            if (await r.json())['subscribers'] >= count:
+                return
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"only some of {count} subscribers connected within {timeout}s")
+
+
+async def request_latency(session, base, path, samples):
+    """Latencies of sequential GET requests"""
+    latencies = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        async with session.get(f"{base}{path}") as r:
+            await r.read()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run(base, pid, args):
+    results = []
+    baseline_rss = rss_mb(pid)
+    connector = aiohttp.TCPConnector(limit=0, force_close=False)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as subs, \
+            aiohttp.ClientSession() as control:
+        since = 0
+
+        for round_no in range(1, args.rounds + 1):
+            received = []
+
+            async def subscriber():
+                async with subs.get(f"{base}/events",
+                                    params={'since': since, 'timeout': 60, 'types': 'time_advance'}) as r:
+                    body = await r.json()
+                received.append(time.perf_counter())
+                return body['next']
+
+            connect_started = time.perf_counter()
+            tasks = [asyncio.ensure_future(subscriber()) for _ in range(args.subscribers)]
+            await wait_for_subscribers(control, base, args.subscribers)
+            connect_s = time.perf_counter() - connect_started
+
+            idle_rss = rss_mb(pid)
+            idle_latency = summarize(await request_latency(control, base, '/time', args.samples))
+
+            # Advance time and wait for every subscriber to receive it
+            triggered = time.perf_counter()
+            async with control.post(f"{base}/time/advance") as r:
+                await r.read()
+            next_seqs = await asyncio.gather(*tasks)
+            since = max(next_seqs)
+
+            results.append([
+                round_no, args.subscribers, connect_s, idle_rss - baseline_rss,
+                (idle_rss - baseline_rss) * 1024 / args.subscribers,
+                idle_latency['p50_ms'], idle_latency['p99_ms'],
+                (min(received) - triggered) * 1000, (max(received) - triggered) * 1000
+            ])
+
+    return baseline_rss, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Asyncio coordinator idle-subscriber benchmark')
+    parser.add_argument('--subscribers', type=int, default=10000, help='idle long-poll subscribers')
+    parser.add_argument('--rounds', type=int, default=3, help='time advances to measure')
+    parser.add_argument('--samples', type=int, default=200, help='/time requests per round')
+    parser.add_argument('--cpu', type=int, default=0, help='CPU core to pin the coordinator to')
+    args = parser.parse_args()
+
+    fd_limit = raise_fd_limit()
+    if fd_limit < args.subscribers + 100:
+        print(f"Warning: open file limit {fd_limit} is too low for {args.subscribers} subscribers")
+
+    port = free_port()
+    proc = start_service('architecture2_rest/coordinator_async.py', ['--port', port], cpu=args.cpu)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_http(f"{base}/health")
+        baseline_rss, results = asyncio.run(run(base, proc.pid, args))
+    finally:
+        stop_service(proc)
+
+    print(f"\nCoordinator pinned to CPU {args.cpu}, baseline RSS {baseline_rss:.1f} MB "
+          f"(client runs in this process and shares the machine)")
+    print_table(
+        f"{args.subscribers} idle long-poll subscribers",
+        ['round', 'subscribers', 'connect s', 'RSS +MB', 'KB/sub',
+         '/time p50 ms', '/time p99 ms', 'first event ms', 'all delivered ms'],
+        results
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Benchmark: grpc.aio servers (coordinator_async.py, merchant_async.py,
+villager_async.py) vs the thread-pool servers, on merchant-brokered trades
+
+For each implementation a coordinator, a merchant and --villagers villager
+nodes are started. Then, for each --concurrency level, that many trades run
+at once from an asyncio client: create, accept, confirm x2. Accept and the
+final confirm make the merchant call the villagers (5 outbound calls per
+trade), which holds a worker thread in the thread-pool merchant
+(max_workers=10) but only a suspended coroutine in the grpc.aio one.
+
+Before the trades, each implementation's villager runs two ExecuteBatch
+checks: a batch that succeeds, and an atomic batch whose last step fails and
+must leave money, items and stamina as they were (--check-only stops there).
+
+The generated town_pb2 / town_pb2_grpc modules must be importable (generate
+them into architecture1_grpc/ or put their directory on PYTHONPATH).
+
+Usage:
+    python performance_tests/bench_grpc_async.py --villagers 4 --concurrency 10,100,1000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import grpc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'architecture1_grpc'))
+import town_pb2
+import town_pb2_grpc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.models import MERCHANT_PRICES
+
+from bench_utils import free_port, raise_fd_limit, start_service, stop_service, summarize, print_table
+
+IMPLEMENTATIONS = (('thread pool', ''), ('grpc.aio', '_async'))
+
+
+def wait_for_grpc(address, timeout=15.0):
+    """Wait until a gRPC server accepts connections"""
+    with grpc.insecure_channel(address) as channel:
+        grpc.channel_ready_future(channel).result(timeout=timeout)
+
+
+def start_town(villagers, suffix):
+    """Start coordinator, merchant and villagers; returns (processes, merchant, villager addresses)"""
+    coord_port, merchant_port = free_port(), free_port()
+    coordinator = f"localhost:{coord_port}"
+    merchant = f"localhost:{merchant_port}"
+
+    procs = [start_service(f'architecture1_grpc/coordinator{suffix}.py', ['--port', coord_port])]
+    wait_for_grpc(coordinator)
+    procs.append(start_service(f'architecture1_grpc/merchant{suffix}.py',
+                               ['--port', merchant_port, '--coordinator', coordinator]))
+    addresses = []
+    for i in range(villagers):
+        port = free_port()
+        addresses.append(f"localhost:{port}")
+        procs.append(start_service(f'architecture1_grpc/villager{suffix}.py',
+                                   ['--port', port, '--id', f"v{i}", '--coordinator', coordinator,
+                                    '--merchant', merchant]))
+
+    for address in [merchant] + addresses:
+        wait_for_grpc(address)
+    time.sleep(0.5)
+    return procs, merchant, addresses
+
+
+async def setup_villagers(addresses):
+    """Create farmers with plenty of seeds and money, so no trade fails for lack of either"""
+    for i, address in enumerate(addresses):
+        async with grpc.aio.insecure_channel(address) as channel:
+            stub = town_pb2_grpc.VillagerNodeStub(channel)
+            await stub.CreateVillager(town_pb2.CreateVillagerRequest(
+                name=f"V{i}", occupation='farmer', gender='female', personality='benchmark'
+            ))
+            await stub.TradeExecute(town_pb2.TradeExecuteRequest(action='add_item', item='seed', quantity=100000))
+            await stub.TradeExecute(town_pb2.TradeExecuteRequest(action='refund', money=100000))
+
+
+def snapshot(info):
+    """(money, items, stamina) of a VillagerInfo"""
+    return info.inventory.money, dict(info.inventory.items), info.stamina
+
+
+async def check_batches(address):
+    """Run a succeeding and a rolled-back ExecuteBatch on one villager; raises when a result is wrong"""
+    async with grpc.aio.insecure_channel(address) as channel:
+        stub = town_pb2_grpc.VillagerNodeStub(channel)
+        before = snapshot(await stub.GetInfo(town_pb2.GetInfoRequest()))
+
+        # Buy bread and eat it: the bread count is back where it was, money is down by its price
+        response = await stub.ExecuteBatch(town_pb2.BatchRequest(actions=[
+            town_pb2.BatchAction(type='trade', item='bread', quantity=1, action='buy'),
+            town_pb2.BatchAction(type='eat')
+        ]))
+        after = snapshot(response.villager)
+        if not response.success or after[1].get('bread', 0) != before[1].get('bread', 0) \
+                or after[0] != before[0] - MERCHANT_PRICES['buy']['bread']:
+            raise RuntimeError(f"batch [buy bread, eat] failed: {response.message} ({before} -> {after})")
+
+        # Without a house or room voucher sleep fails, so the buy, eat and produce are undone
+        response = await stub.ExecuteBatch(town_pb2.BatchRequest(actions=[
+            town_pb2.BatchAction(type='trade', item='wheat', quantity=2, action='buy'),
+            town_pb2.BatchAction(type='trade', item='bread', quantity=1, action='buy'),
+            town_pb2.BatchAction(type='eat'),
+            town_pb2.BatchAction(type='produce'),
+            town_pb2.BatchAction(type='sleep')
+        ]))
+        rolled_back = snapshot(response.villager)
+        if response.success or rolled_back != after or not all(r.rolled_back for r in response.results[:4]):
+            raise RuntimeError(f"atomic batch was not rolled back: {response.message} ({after} -> {rolled_back})")
+
+
+async def trade(stub, addresses, i):
+    """One merchant-brokered trade between two neighbouring villagers; returns its latency"""
+    buyer = i % len(addresses)
+    seller = (buyer + 1) % len(addresses)
+    buyer_id, seller_id = f"v{buyer}", f"v{seller}"
+
+    started = time.perf_counter()
+    trade_id = (await stub.CreateTrade(town_pb2.CreateTradeRequest(
+        initiator_id=buyer_id, initiator_address=addresses[buyer],
+        target_id=seller_id, target_address=addresses[seller],
+        offer_type='buy', item='seed', quantity=1, price=1
+    ))).trade_id
+    accepted = await stub.AcceptTrade(town_pb2.AcceptTradeRequest(trade_id=trade_id, node_id=seller_id))
+    if not accepted.success:
+        raise RuntimeError(f"accept failed: {accepted.message}")
+    await stub.ConfirmTrade(town_pb2.ConfirmTradeRequest(trade_id=trade_id, node_id=buyer_id))
+    result = await stub.ConfirmTrade(town_pb2.ConfirmTradeRequest(trade_id=trade_id, node_id=seller_id))
+    if not result.success:
+        raise RuntimeError(f"trade failed: {result.message}")
+    return time.perf_counter() - started
+
+
+async def run_level(merchant, addresses, concurrency):
+    """Run `concurrency` trades at once; returns (wall seconds, latencies)"""
+    async with grpc.aio.insecure_channel(merchant) as channel:
+        stub = town_pb2_grpc.MerchantNodeStub(channel)
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(trade(stub, addresses, i) for i in range(concurrency)))
+        return time.perf_counter() - started, latencies
+
+
+def run_implementation(suffix, args):
+    procs, merchant, addresses = start_town(args.villagers, suffix)
+    results = []
+    try:
+        asyncio.run(setup_villagers(addresses))
+        asyncio.run(check_batches(addresses[0]))
+        if args.check_only:
+            return results
+        for concurrency in args.concurrency:
+            results.append((concurrency,) + asyncio.run(run_level(merchant, addresses, concurrency)))
+    finally:
+        for proc in procs:
+            stop_service(proc)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='grpc.aio vs thread-pool gRPC servers')
+    parser.add_argument('--villagers', type=int, default=4, help='villager nodes (>= 2)')
+    parser.add_argument('--concurrency', type=lambda s: [int(x) for x in s.split(',')], default=[10, 100, 1000],
+                        help='comma-separated numbers of trades in flight at once')
+    parser.add_argument('--check-only', action='store_true', help='only run the ExecuteBatch checks')
+    args = parser.parse_args()
+    raise_fd_limit()
+
+    rows = []
+    for name, suffix in IMPLEMENTATIONS:
+        print(f"Running {name} servers...")
+        results = run_implementation(suffix, args)
+        print("  ExecuteBatch checks passed")
+        for concurrency, wall, latencies in results:
+            s = summarize(latencies)
+            rows.append([name, concurrency, wall * 1000, concurrency / wall, s['p50_ms'], s['p99_ms']])
+
+    if args.check_only:
+        return
+    print_table(
+        f"{args.villagers} villagers, merchant-brokered trades in flight at once",
+        ['servers', 'in flight', 'wall ms', 'trades/s', 'p50 ms', 'p99 ms'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark: shared gRPC channel pool (architecture1_grpc/channel_pool.py) vs a
+new channel per call, on the real gRPC stack
+
+For each mode a coordinator, a merchant and --villagers villager nodes are
+started with GRPC_CHANNEL_POOLING set accordingly, then three workloads run:
+
+  rpc:     GetInfo on one villager from this process (client-side channel only)
+  advance: AdvanceTime; the coordinator notifies every node before replying
+  trade:   a merchant-brokered trade (create, accept, confirm x2); accept and
+           the final confirm make five calls from the merchant to the villagers
+
+The generated town_pb2 / town_pb2_grpc modules must be importable (generate
+them into architecture1_grpc/ or put their directory on PYTHONPATH).
+
+Usage:
+    python performance_tests/bench_grpc_channels.py --villagers 4 --calls 500 --rounds 50 --trades 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import grpc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'architecture1_grpc'))
+import town_pb2
+import town_pb2_grpc
+import channel_pool
+
+from bench_utils import free_port, start_service, stop_service, summarize, print_table
+
+
+def wait_for_grpc(address, timeout=15.0):
+    """Wait until a gRPC server accepts connections"""
+    with grpc.insecure_channel(address) as channel:
+        grpc.channel_ready_future(channel).result(timeout=timeout)
+
+
+def start_town(villagers, pooling):
+    """Start coordinator, merchant and villagers; returns (processes, coordinator, merchant, villager addresses)"""
+    env = {'GRPC_CHANNEL_POOLING': '1' if pooling else '0'}
+    coord_port, merchant_port = free_port(), free_port()
+    coordinator = f"localhost:{coord_port}"
+    merchant = f"localhost:{merchant_port}"
+
+    procs = [start_service('architecture1_grpc/coordinator.py', ['--port', coord_port], env)]
+    wait_for_grpc(coordinator)
+    procs.append(start_service('architecture1_grpc/merchant.py',
+                               ['--port', merchant_port, '--coordinator', coordinator], env))
+    addresses = []
+    for i in range(villagers):
+        port = free_port()
+        addresses.append(f"localhost:{port}")
+        procs.append(start_service('architecture1_grpc/villager.py',
+                                   ['--port', port, '--id', f"v{i}", '--coordinator', coordinator], env))
+
+    for address in [merchant] + addresses:
+        wait_for_grpc(address)
+    # Nodes register with the coordinator right after their server starts
+    time.sleep(0.5)
+    return procs, coordinator, merchant, addresses
+
+
+def setup_villagers(addresses):
+    """Create farmers and give each a stock of seeds to trade"""
+    for i, address in enumerate(addresses):
+        stub = channel_pool.get_stub(address, town_pb2_grpc.VillagerNodeStub)
+        stub.CreateVillager(town_pb2.CreateVillagerRequest(
+            name=f"V{i}", occupation='farmer', gender='female', personality='benchmark'
+        ))
+        stub.TradeExecute(town_pb2.TradeExecuteRequest(action='add_item', item='seed', quantity=100))
+
+
+def rpc_calls(address, count, pooling):
+    """Latency of single GetInfo calls"""
+    request = town_pb2.GetInfoRequest()
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        if pooling:
+            channel_pool.get_stub(address, town_pb2_grpc.VillagerNodeStub).GetInfo(request)
+        else:
+            with grpc.insecure_channel(address) as channel:
+                town_pb2_grpc.VillagerNodeStub(channel).GetInfo(request)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def advance_rounds(coordinator, rounds):
+    """Latency of AdvanceTime, which notifies every registered node"""
+    stub = channel_pool.get_stub(coordinator, town_pb2_grpc.TimeCoordinatorStub)
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        stub.AdvanceTime(town_pb2.Empty())
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def trades(merchant, addresses, count):
+    """Latency of merchant-brokered trades, alternating direction between two villagers"""
+    stub = channel_pool.get_stub(merchant, town_pb2_grpc.MerchantNodeStub)
+    latencies = []
+    for i in range(count):
+        buyer, seller = (0, 1) if i % 2 == 0 else (1, 0)
+        buyer_id, seller_id = f"v{buyer}", f"v{seller}"
+
+        started = time.perf_counter()
+        trade_id = stub.CreateTrade(town_pb2.CreateTradeRequest(
+            initiator_id=buyer_id, initiator_address=addresses[buyer],
+            target_id=seller_id, target_address=addresses[seller],
+            offer_type='buy', item='seed', quantity=1, price=1
+        )).trade_id
+        stub.AcceptTrade(town_pb2.AcceptTradeRequest(trade_id=trade_id, node_id=seller_id))
+        stub.ConfirmTrade(town_pb2.ConfirmTradeRequest(trade_id=trade_id, node_id=buyer_id))
+        result = stub.ConfirmTrade(town_pb2.ConfirmTradeRequest(trade_id=trade_id, node_id=seller_id))
+        if not result.success:
+            raise RuntimeError(f"trade failed: {result.message}")
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run_mode(pooling, args):
+    procs, coordinator, merchant, addresses = start_town(args.villagers, pooling)
+    try:
+        setup_villagers(addresses)
+        rpc = rpc_calls(addresses[0], args.calls, pooling)
+        advance = advance_rounds(coordinator, args.rounds)
+        trade = trades(merchant, addresses, args.trades)
+    finally:
+        for proc in procs:
+            stop_service(proc)
+        channel_pool.close_all()
+
+    return rpc, advance, trade
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pooled vs per-call gRPC channels')
+    parser.add_argument('--villagers', type=int, default=4, help='villager nodes (>= 2)')
+    parser.add_argument('--calls', type=int, default=500, help='single GetInfo calls')
+    parser.add_argument('--rounds', type=int, default=50, help='AdvanceTime rounds')
+    parser.add_argument('--trades', type=int, default=50, help='merchant-brokered trades')
+    args = parser.parse_args()
+
+    rows = []
+    for name, pooling in (('per-call', False), ('pooled', True)):
+        print(f"Running {name} mode...")
+        rpc, advance, trade = run_mode(pooling, args)
+        for workload, latencies in (('GetInfo', rpc), ('AdvanceTime', advance), ('trade', trade)):
+            s = summarize(latencies)
+            rows.append([name, workload, s['p50_ms'], s['p99_ms'], s['max_ms']])
+
+    print_table(
+        f"{args.villagers} villagers, {args.calls} calls, {args.rounds} advances, {args.trades} trades",
+        ['mode', 'workload', 'p50 ms', 'p99 ms', 'max ms'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark: pooled keep-alive HTTP client (common/http_client.py) vs a new
+connection per call, on the real REST stack
+
+For each mode a coordinator, a merchant and --villagers villager nodes are
+started with HTTP_CLIENT_POOLING set accordingly, then two workloads run:
+
+  barrier: every villager submits 'idle'; the last submission makes the
+           coordinator advance time and notify every node
+  trade:   a merchant-brokered trade (create, accept, confirm x2), whose
+           execution makes four sequential calls to the two villagers
+
+Reported per workload: latency per round/trade and the number of TCP
+connections opened (new TIME_WAIT sockets on the machine).
+
+Usage:
+    python performance_tests/bench_http_client.py --villagers 4 --rounds 50 --trades 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import http_client
+
+from bench_utils import free_port, start_service, stop_service, wait_for_http, summarize, print_table
+
+
+def time_wait_sockets():
+    """Set of (local, remote) pairs currently in TIME_WAIT"""
+    sockets = set()
+    for path in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            with open(path) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[3] == '06':  # TIME_WAIT
+                        sockets.add((fields[1], fields[2]))
+        except OSError:
+            pass
+    return sockets
+
+
+def start_town(villagers, pooling):
+    """Start coordinator, merchant and villagers; returns (processes, coordinator, merchant, villager ports)"""
+    env = {'HTTP_CLIENT_POOLING': '1' if pooling else '0'}
+    coord_port, merchant_port = free_port(), free_port()
+    env.update({'COORDINATOR_HOST': '127.0.0.1', 'COORDINATOR_PORT': str(coord_port),
+                'MERCHANT_HOST': '127.0.0.1', 'MERCHANT_PORT': str(merchant_port),
+                'VILLAGER_HOST': '127.0.0.1'})
+
+    procs = [
+        start_service('architecture2_rest/coordinator.py', ['--port', coord_port], env),
+        start_service('architecture2_rest/merchant.py',
+                      ['--port', merchant_port, '--coordinator', f"127.0.0.1:{coord_port}"], env)
+    ]
+    ports = []
+    for i in range(villagers):
+        port = free_port()
+        ports.append(port)
+        procs.append(start_service('architecture2_rest/villager.py',
+                                   ['--port', port, '--id', f"v{i}", '--coordinator', f"127.0.0.1:{coord_port}"], env))
+
+    coordinator = f"http://127.0.0.1:{coord_port}"
+    merchant = f"http://127.0.0.1:{merchant_port}"
+    wait_for_http(f"{coordinator}/health")
+    wait_for_http(f"{merchant}/health")
+    for port in ports:
+        wait_for_http(f"http://127.0.0.1:{port}/health")
+    return procs, coordinator, merchant, ports
+
+
+def setup_villagers(ports):
+    """Create farmers and give each a stock of seeds to trade"""
+    for i, port in enumerate(ports):
+        base = f"http://127.0.0.1:{port}"
+        http_client.post(f"{base}/villager", json={
+            'name': f"V{i}", 'occupation': 'farmer', 'gender': 'female', 'personality': 'benchmark'
+        })
+        http_client.post(f"{base}/action/trade", json={
+            'target': 'merchant', 'item': 'seed', 'quantity': 10, 'action': 'buy'
+        })
+    # Re-registration after create happens in the villager; give it a moment
+    time.sleep(0.5)
+
+
+def barrier_rounds(ports, rounds):
+    """Latency of full barrier rounds (all villagers submit, time advances)"""
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for port in ports:
+            result = http_client.post(f"http://127.0.0.1:{port}/action/submit", json={'action': 'idle'}).json()
+            if not result.get('success'):
+                raise RuntimeError(f"submit failed: {result}")
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def trades(merchant, ports, count):
+    """Latency of merchant-brokered trades, alternating direction between two villagers"""
+    latencies = []
+    a, b = ports[0], ports[1]
+    for i in range(count):
+        buyer, seller = (a, b) if i % 2 == 0 else (b, a)
+        buyer_id, seller_id = f"v{ports.index(buyer)}", f"v{ports.index(seller)}"
+
+        started = time.perf_counter()
+        trade_id = http_client.post(f"{merchant}/trade/create", json={
+            'initiator_id': buyer_id, 'initiator_address': f"127.0.0.1:{buyer}",
+            'target_id': seller_id, 'target_address': f"127.0.0.1:{seller}",
+            'offer_type': 'buy', 'item': 'seed', 'quantity': 1, 'price': 1
+        }).json()['trade_id']
+        http_client.post(f"{merchant}/trade/accept", json={'trade_id': trade_id, 'node_id': seller_id})
+        http_client.post(f"{merchant}/trade/confirm", json={'trade_id': trade_id, 'node_id': buyer_id})
+        result = http_client.post(f"{merchant}/trade/confirm", json={'trade_id': trade_id, 'node_id': seller_id}).json()
+        if not result.get('success'):
+            raise RuntimeError(f"trade failed: {result}")
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run_mode(pooling, args):
+    http_client.POOLING_ENABLED = pooling
+    procs, coordinator, merchant, ports = start_town(args.villagers, pooling)
+    try:
+        setup_villagers(ports)
+
+        before = time_wait_sockets()
+        barrier = barrier_rounds(ports, args.rounds)
+        barrier_conns = len(time_wait_sockets() - before)
+
+        before = time_wait_sockets()
+        trade = trades(merchant, ports, args.trades)
+        trade_conns = len(time_wait_sockets() - before)
+    finally:
+        for proc in procs:
+            stop_service(proc)
+
+    return barrier, barrier_conns, trade, trade_conns
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pooled vs per-call HTTP connections on the REST stack')
+    parser.add_argument('--villagers', type=int, default=4, help='villager nodes (>= 2)')
+    parser.add_argument('--rounds', type=int, default=50, help='barrier rounds')
+    parser.add_argument('--trades', type=int, default=50, help='merchant-brokered trades')
+    args = parser.parse_args()
+
+    rows = []
+    for name, pooling in (('per-call', False), ('pooled', True)):
+        print(f"Running {name} mode...")
+        barrier, barrier_conns, trade, trade_conns = run_mode(pooling, args)
+        b, t = summarize(barrier), summarize(trade)
+        rows.append([name, 'barrier round', b['p50_ms'], b['p99_ms'], barrier_conns / args.rounds])
+        rows.append([name, 'trade', t['p50_ms'], t['p99_ms'], trade_conns / args.trades])
+
+    print_table(
+        f"{args.villagers} villagers, {args.rounds} barrier rounds, {args.trades} trades",
+        ['mode', 'workload', 'p50 ms', 'p99 ms', 'new TCP conns / op'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()
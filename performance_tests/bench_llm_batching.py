@@ -0,0 +1,136 @@
+"""
+Benchmark: one LLM request per agent decision vs batched multi-villager requests
+
+--agents agents decide concurrently, --rounds times each, from ReAct prompts
+built by AIVillagerAgent for varied villager states. No town or API key is
+needed: decisions come from the deterministic rule backend, behind a latency
+model of a hosted API (per-request overhead + prompt tokens + output tokens
+generated one by one; see LatencyModelBackend) and optionally a shared
+requests-per-minute limit.
+
+Batch size 1 is the per-agent baseline. Larger sizes go through
+BatchingBackend, which packs the prompts of agents asking at the same time
+into one request and splits the reply. Every parsed decision is checked
+against the one the agent would get on its own.
+
+Usage:
+    python performance_tests/bench_llm_batching.py --agents 16 --rounds 3
+    python performance_tests/bench_llm_batching.py --agents 32 --batch-sizes 1,8,16 --rpm 120
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'architecture2_rest'))
+from ai_villager_agent import AIVillagerAgent, REACT_SYSTEM_PROMPT
+from common.llm_backends import BatchingBackend, LatencyModelBackend, RateLimitedBackend, RulePolicyBackend
+
+from bench_utils import summarize, print_table
+
+OCCUPATIONS = ('farmer', 'chef', 'carpenter')
+TIMES = ('Day 1 - morning', 'Day 1 - noon', 'Day 1 - evening')
+
+
+def make_contexts(count, seed=7):
+    """Varied decision contexts (occupation, stamina, inventory, time)"""
+    rng = random.Random(seed)
+    contexts = []
+    for i in range(count):
+        items = {item: rng.choice((0, 0, 1, 3, 10)) for item in ('seed', 'wheat', 'wood', 'bread', 'temp_room')}
+        contexts.append({
+            'villager': {'name': f"Villager{i}", 'node_id': f"node{i}", 'occupation': OCCUPATIONS[i % 3],
+                         'stamina': rng.randint(10, 100), 'max_stamina': 100, 'has_slept': False,
+                         'has_submitted_action': False,
+                         'inventory': {'money': rng.randint(0, 200), 'items': {k: v for k, v in items.items() if v}}},
+            'time': TIMES[i % len(TIMES)],
+            'prices': {},
+            'messages': [], 'trades_received': [], 'trades_sent': [],
+            'villagers': [{'node_id': f"node{j}", 'name': f"Villager{j}", 'occupation': OCCUPATIONS[j % 3]}
+                          for j in range(count) if j != i]
+        })
+    return contexts
+
+
+def run(args, batch_size, prompts, contexts, expected, parse):
+    latency = LatencyModelBackend(RulePolicyBackend(), args.request_ms, args.prompt_token_ms, args.output_token_ms)
+    backend = latency
+    if args.rpm:
+        backend = RateLimitedBackend(backend, requests_per_minute=args.rpm, max_concurrency=args.agents)
+    if batch_size > 1:
+        backend = BatchingBackend(backend, max_batch=batch_size, max_wait=args.max_wait)
+
+    samples, mismatches = [], []
+    lock = threading.Lock()
+
+    def agent(index):
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            reply = backend.complete(REACT_SYSTEM_PROMPT, prompts[index], contexts[index])
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.append(elapsed)
+                if parse(reply).get('command') != expected[index]:
+                    mismatches.append(index)
+
+    threads = [threading.Thread(target=agent, args=(i,)) for i in range(args.agents)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return samples, wall, latency, len(mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-agent vs batched LLM decision requests (offline)')
+    parser.add_argument('--agents', type=int, default=16, help='agents deciding concurrently')
+    parser.add_argument('--rounds', type=int, default=3, help='decisions per agent')
+    parser.add_argument('--batch-sizes', type=str, default='1,4,8,16', help='1 = one request per decision')
+    parser.add_argument('--max-wait', type=float, default=0.05, help='seconds a batch waits for more agents')
+    parser.add_argument('--rpm', type=float, default=0, help='shared requests-per-minute limit (0: none)')
+    parser.add_argument('--request-ms', type=float, default=300.0, help='modelled per-request overhead')
+    parser.add_argument('--prompt-token-ms', type=float, default=0.05, help='modelled time per prompt token')
+    parser.add_argument('--output-token-ms', type=float, default=15.0, help='modelled time per output token')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        builder = AIVillagerAgent(villager_port=0, model='offline', use_react=True, llm_backend=RulePolicyBackend())
+    contexts = make_contexts(args.agents)
+    prompts = [builder._build_react_prompt(context) for context in contexts]
+    rule = RulePolicyBackend()
+    expected = [rule.decide(context)[1] for context in contexts]
+
+    def parse(reply):
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            return builder._parse_react_decision(reply)
+
+    print(f"{args.agents} agents x {args.rounds} decisions, modelled API: {args.request_ms:.0f} ms/request, "
+          f"{args.prompt_token_ms} ms/prompt token, {args.output_token_ms} ms/output token"
+          + (f", {args.rpm:.0f} requests/min" if args.rpm else ""))
+
+    rows = []
+    for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+        samples, wall, latency, mismatches = run(args, batch_size, prompts, contexts, expected, parse)
+        s = summarize(samples)
+        rows.append([
+            'per-agent' if batch_size == 1 else f"batch {batch_size}",
+            latency.requests, f"{latency.prompt_tokens / len(samples):.0f}", f"{latency.output_tokens / len(samples):.0f}",
+            wall, len(samples) / wall, s['p50_ms'], s['p99_ms'], mismatches
+        ])
+    print_table(
+        'LLM requests for agent decisions',
+        ['mode', 'requests', 'prompt tok/decision', 'output tok/decision', 'wall s', 'decisions/s',
+         'p50 ms', 'p99 ms', 'wrong'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark: waiting for the whole reply vs streaming to the ACTION line, with and without hedging
+
+Starts the stand-in LLM server (llm_standin.py) and sends --requests decision
+prompts built by AIVillagerAgent from --concurrency threads through
+OpenAICompatibleBackend, in three modes:
+- full: one non-streamed completion per decision, parsed when it has all arrived
+- stream: complete_action(), which returns as soon as the ACTION line is complete
+  and closes the stream
+- stream+hedge: the same through HedgedBackend, which sends a second copy of
+  requests slower than --hedge-percentile of the recent ones
+
+The server keeps generating --trailing tokens after the ACTION line and makes
+--slow-fraction of requests --slow-factor times slower. Every mode's parsed
+decisions are checked against the full replies.
+
+Usage:
+    python performance_tests/bench_llm_streaming.py --requests 200 --concurrency 8
+    python performance_tests/bench_llm_streaming.py --trailing 0 --slow-fraction 0.1
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'architecture2_rest'))
+from ai_villager_agent import AIVillagerAgent, REACT_SYSTEM_PROMPT
+from common.llm_backends import HedgedBackend, OpenAICompatibleBackend, RulePolicyBackend
+
+from bench_llm_batching import make_contexts
+from bench_utils import free_port, start_service, stop_service, wait_for_http, summarize, print_table
+
+
+def run(mode, backend, prompts, concurrency, parse):
+    """Decide every prompt once; returns (latencies, wall seconds, commands)"""
+    samples, commands = [], {}
+    lock = threading.Lock()
+    next_index = iter(range(len(prompts)))
+
+    def worker():
+        while True:
+            with lock:
+                index = next(next_index, None)
+            if index is None:
+                return
+            started = time.perf_counter()
+            if mode == 'full':
+                reply = backend.complete(REACT_SYSTEM_PROMPT, prompts[index])
+            else:
+                reply = backend.complete_action(REACT_SYSTEM_PROMPT, prompts[index])
+            elapsed = time.perf_counter() - started
+            command = parse(reply).get('command')
+            with lock:
+                samples.append(elapsed)
+                commands[index] = command
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started, commands
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full vs streamed vs hedged LLM decision calls (local stand-in server)')
+    parser.add_argument('--requests', type=int, default=200, help='decisions per mode')
+    parser.add_argument('--concurrency', type=int, default=8, help='decisions in flight at once')
+    parser.add_argument('--first-token-ms', type=float, default=300.0, help='stand-in delay before the first token')
+    parser.add_argument('--token-ms', type=float, default=15.0, help='stand-in time per output token')
+    parser.add_argument('--trailing', type=int, default=40, help='tokens the stand-in generates after the ACTION line')
+    parser.add_argument('--slow-fraction', type=float, default=0.05, help='fraction of slow requests')
+    parser.add_argument('--slow-factor', type=float, default=5.0, help='how many times slower they are')
+    parser.add_argument('--hedge-percentile', type=float, default=0.9, help='hedge requests slower than this')
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_service('performance_tests/llm_standin.py', [
+        '--port', port, '--first-token-ms', args.first_token_ms, '--token-ms', args.token_ms,
+        '--trailing', args.trailing, '--slow-fraction', args.slow_fraction, '--slow-factor', args.slow_factor
+    ])
+    try:
+        wait_for_http(f"http://localhost:{port}/health")
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            builder = AIVillagerAgent(villager_port=0, model='offline', use_react=True, llm_backend=RulePolicyBackend())
+        prompts = [builder._build_react_prompt(context) for context in make_contexts(args.requests)]
+
+        def parse(reply):
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                return builder._parse_react_decision(reply)
+
+        client = OpenAICompatibleBackend(f"http://localhost:{port}/v1", 'stand-in')
+        hedged = HedgedBackend(client, percentile=args.hedge_percentile, min_samples=10, initial_delay=2.0)
+        print(f"{args.requests} decisions per mode, {args.concurrency} at once; stand-in: first token "
+              f"{args.first_token_ms:.0f} ms, {args.token_ms:.0f} ms/token, {args.trailing} tokens after ACTION, "
+              f"{args.slow_fraction:.0%} of requests x{args.slow_factor:g} slower")
+
+        rows, expected = [], None
+        for mode, backend in (('full', client), ('stream', client), ('stream+hedge', hedged)):
+            requests.post(f"http://localhost:{port}/stats/reset", timeout=5)
+            samples, wall, commands = run(mode, backend, prompts, args.concurrency, parse)
+            time.sleep(0.2)  # let the server count the streams closed last
+            stats = requests.get(f"http://localhost:{port}/stats", timeout=5).json()
+            expected = expected or commands
+            s = summarize(samples)
+            rows.append([
+                mode, stats['requests'], stats['tokens'], stats['cut_off'],
+                hedged.hedges if backend is hedged else '-', hedged.hedge_wins if backend is hedged else '-',
+                s['p50_ms'], s['p99_ms'], max(samples) * 1000, len(samples) / wall,
+                sum(commands[i] != expected[i] for i in commands)
+            ])
+        print_table(
+            'LLM decision calls',
+            ['mode', 'requests', 'tokens sent', 'cut off', 'hedges', 'hedge wins', 'p50 ms', 'p99 ms', 'max ms',
+             'decisions/s', 'different'],
+            rows
+        )
+    finally:
+        stop_service(server)
+
+
+if __name__ == '__main__':
+    main()
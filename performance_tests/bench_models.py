@@ -0,0 +1,248 @@
+"""
+Benchmark: slotted, array-backed models (common/models.py) vs the previous
+dataclass models (kept below as LegacyInventory / LegacyVillager)
+
+Workloads, all in-process:
+
+  to_dict unchanged:   serialize a villager that has not changed (GET /villager)
+  to_dict after trade: one inventory change, then serialize once
+  trade action:        one inventory change, then serialize for the state store
+                       and again for the reply, as villager.py does per action
+  inventory ops:       add_item / has_item / remove_item on a known item
+  from_dict:           rebuild a villager from its dict (state restore)
+  memory:              bytes allocated per villager (tracemalloc), without and
+                       with the to_dict() cache populated
+
+Usage:
+    python performance_tests/bench_models.py --iterations 200000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.models import Inventory, Villager, Occupation, Gender
+
+from bench_utils import print_table
+
+
+# ==================== Previous implementation (baseline) ====================
+
+@dataclass
+class LegacyInventory:
+    """Inventory system"""
+    money: int = 200  # Initial currency (increased to 200 to ensure can buy raw materials)
+    items: Dict[str, int] = field(default_factory=dict)
+    
+    def add_item(self, item: str, quantity: int = 1):
+        """Add item"""
+        if item not in self.items:
+            self.items[item] = 0
+        self.items[item] += quantity
+    
+    def remove_item(self, item: str, quantity: int = 1) -> bool:
+        """Remove item, returns success status"""
+        if item not in self.items or self.items[item] < quantity:
+            return False
+        self.items[item] -= quantity
+        if self.items[item] == 0:
+            del self.items[item]
+        return True
+    
+    def has_item(self, item: str, quantity: int = 1) -> bool:
+        """Check if has enough items"""
+        return item in self.items and self.items[item] >= quantity
+    
+    def add_money(self, amount: int):
+        """Add money"""
+        self.money += amount
+    
+    def remove_money(self, amount: int) -> bool:
+        """Remove money, returns success status"""
+        if self.money < amount:
+            return False
+        self.money -= amount
+        return True
+    
+    def to_dict(self) -> dict:
+        """Convert to dictionary"""
+        return {
+            "money": self.money,
+            "items": self.items
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LegacyInventory':
+        """Create from dictionary"""
+        return cls(
+            money=data.get("money", 100),
+            items=data.get("items", {})
+        )
+
+
+@dataclass
+class LegacyVillager:
+    """Villager data model"""
+    name: str
+    occupation: Occupation
+    gender: Gender
+    personality: str
+    stamina: int = 100  # Stamina
+    max_stamina: int = 100
+    inventory: LegacyInventory = field(default_factory=LegacyInventory)
+    has_submitted_action: bool = False  # Has submitted action for current time period
+    has_slept: bool = False  # Has slept today
+    
+    def consume_stamina(self, amount: int) -> bool:
+        """Consume stamina"""
+        if self.stamina < amount:
+            return False
+        self.stamina -= amount
+        return True
+    
+    def restore_stamina(self, amount: int):
+        """Restore stamina"""
+        self.stamina = min(self.stamina + amount, self.max_stamina)
+    
+    def reset_time_period(self):
+        """Reset time period state (called each time advancement)"""
+        self.has_submitted_action = False
+    
+    def reset_daily(self):
+        """Daily reset"""
+        self.has_submitted_action = False
+        self.has_slept = False
+        # Hunger deduction
+        self.stamina = max(0, self.stamina - 10)
+        # Daily settlement consumes temporary room voucher
+        if self.inventory.has_item("temp_room", 1):
+            self.inventory.remove_item("temp_room", 1)
+    
+    def eat_bread(self) -> bool:
+        """Eat bread to restore stamina"""
+        if not self.inventory.has_item("bread", 1):
+            return False
+        self.inventory.remove_item("bread", 1)
+        self.restore_stamina(30)  # Restore 30 stamina
+        return True
+    
+    def to_dict(self) -> dict:
+        """Convert to dictionary"""
+        return {
+            "name": self.name,
+            "occupation": self.occupation.value if isinstance(self.occupation, Occupation) else self.occupation,
+            "gender": self.gender.value if isinstance(self.gender, Gender) else self.gender,
+            "personality": self.personality,
+            "stamina": self.stamina,
+            "max_stamina": self.max_stamina,
+            "inventory": self.inventory.to_dict(),
+            "has_submitted_action": self.has_submitted_action,
+            "has_slept": self.has_slept
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LegacyVillager':
+        """Create from dictionary"""
+        occupation = Occupation(data["occupation"]) if isinstance(data["occupation"], str) else data["occupation"]
+        gender = Gender(data["gender"]) if isinstance(data["gender"], str) else data["gender"]
+        
+        villager = cls(
+            name=data["name"],
+            occupation=occupation,
+            gender=gender,
+            personality=data["personality"],
+            stamina=data.get("stamina", 100),
+            max_stamina=data.get("max_stamina", 100),
+            inventory=LegacyInventory.from_dict(data.get("inventory", {})),
+            has_submitted_action=data.get("has_submitted_action", False),
+            has_slept=data.get("has_slept", False)
+        )
+        return villager
+
+
+# ==================== Benchmark ====================
+
+def make_villager(villager_cls, inventory_cls):
+    inventory = inventory_cls(money=200)
+    for item, quantity in (('seed', 5), ('wheat', 3), ('bread', 2), ('wood', 4)):
+        inventory.add_item(item, quantity)
+    return villager_cls(name='Alice', occupation=Occupation.FARMER, gender=Gender.FEMALE,
+                        personality='benchmark', inventory=inventory)
+
+
+def time_per_op(func, iterations):
+    """Best of 3 runs, nanoseconds per call"""
+    return min(timeit.repeat(func, number=iterations, repeat=3)) / iterations * 1e9
+
+
+def bytes_per_villager(villager_cls, inventory_cls, serialized, count=2000):
+    """Memory per villager; with serialized=True the slotted models also hold their to_dict() cache"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    villagers = [make_villager(villager_cls, inventory_cls) for _ in range(count)]
+    if serialized:
+        for villager in villagers:
+            villager.to_dict()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+def measure(villager_cls, inventory_cls, iterations):
+    villager = make_villager(villager_cls, inventory_cls)
+    inventory = villager.inventory
+    data = villager.to_dict()
+
+    def trade_then_serialize():
+        inventory.add_item('seed', 1)
+        inventory.remove_item('seed', 1)
+        return villager.to_dict()
+
+    def trade_action():
+        inventory.add_item('seed', 1)
+        inventory.remove_item('seed', 1)
+        villager.to_dict()  # state store
+        return villager.to_dict()  # reply
+
+    def inventory_ops():
+        inventory.add_item('wheat', 1)
+        inventory.has_item('wheat', 2)
+        inventory.remove_item('wheat', 1)
+
+    return {
+        'to_dict unchanged': time_per_op(villager.to_dict, iterations),
+        'to_dict after trade': time_per_op(trade_then_serialize, iterations // 4),
+        'trade action': time_per_op(trade_action, iterations // 4),
+        'inventory ops': time_per_op(inventory_ops, iterations),
+        'from_dict': time_per_op(lambda: villager_cls.from_dict(data), iterations // 4),
+        'bytes / villager': bytes_per_villager(villager_cls, inventory_cls, False),
+        'bytes / villager + cache': bytes_per_villager(villager_cls, inventory_cls, True)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Slotted vs dataclass model microbenchmarks')
+    parser.add_argument('--iterations', type=int, default=200000, help='calls per timed workload')
+    args = parser.parse_args()
+
+    legacy = measure(LegacyVillager, LegacyInventory, args.iterations)
+    slotted = measure(Villager, Inventory, args.iterations)
+
+    rows = []
+    for name in legacy:
+        unit = 'B' if name.startswith('bytes') else 'ns'
+        rows.append([name, unit, legacy[name], slotted[name], legacy[name] / slotted[name]])
+    print_table(
+        f"{args.iterations} iterations (time: ns per call, best of 3)",
+        ['workload', 'unit', 'dataclass', 'slotted', 'speedup x'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Shared helpers for the performance benchmarks
+"""
+
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def free_port():
+    """Ask the OS for an unused TCP port"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def raise_fd_limit():
+    """Raise the open file limit so thousands of sockets can be opened"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def start_service(script, args, env=None, cpu=None):
+    """Start a service script (path relative to the repo root) as a subprocess
+
+    cpu: pin the service to this CPU core (Linux only)
+    """
+    full_env = dict(os.environ)
+    full_env.update(env or {})
+
+    def setup():
+        raise_fd_limit()
+        if cpu is not None and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, {cpu})
+
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, script)] + [str(a) for a in args],
+        env=full_env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        preexec_fn=setup
+    )
+
+
+def rss_mb(pid):
+    """Resident memory of a process in MB (Linux /proc)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def wait_for_http(url, timeout=15.0):
+    """Poll url until it answers 200"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=0.5).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def stop_service(proc):
+    """Terminate a service subprocess"""
+    proc.terminate()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def percentile(values, p):
+    """p-th percentile (0-100) of a list, nearest-rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies):
+    """p50/p99/max in milliseconds"""
+    return {
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies) * 1000 if latencies else 0.0
+    }
+
+
+def print_table(title, columns, rows):
+    """Print a fixed-width results table"""
+    print(f"\n{title}")
+    widths = [max(len(str(c)), *(len(_fmt(r[i])) for r in rows)) for i, c in enumerate(columns)]
+    print('  '.join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    print('  '.join('-' * w for w in widths))
+    for row in rows:
+        print('  '.join(_fmt(v).ljust(w) for v, w in zip(row, widths)))
+
+
+def _fmt(value):
+    return f"{value:.1f}" if isinstance(value, float) else str(value)
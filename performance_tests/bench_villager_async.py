@@ -0,0 +1,215 @@
+"""
+Benchmark: Flask villager node (villager.py) vs asyncio villager node (villager_async.py)
+
+A stub coordinator/merchant answers every call after --upstream-delay seconds,
+standing in for a slow or busy peer. Two scenarios are measured per node:
+
+  1. inbound-under-load: --outbound clients keep /messages/send (broadcast via
+     the coordinator) in flight while --inbound clients post /messages
+     notifications; reports inbound throughput and latency.
+  2. connections: --connections clients each open their own connection and hit
+     /health at the same moment; reports completion time and failures.
+
+Usage:
+    python performance_tests/bench_villager_async.py --duration 5 --connections 2000
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+import aiohttp
+import requests
+from aiohttp import web
+
+from bench_utils import (
+    free_port, raise_fd_limit, start_service, stop_service,
+    wait_for_http, summarize, print_table
+)
+
+
+# ==================== Stub coordinator / merchant ====================
+
+def start_stub_upstream(port, delay):
+    """Serve coordinator and merchant endpoints with a fixed delay, in a background thread"""
+
+    async def slow_ok(request):
+        await asyncio.sleep(delay)
+        return web.json_response({'success': True, 'all_ready': False, 'waiting_for': []})
+
+    async def get_time(request):
+        return web.json_response({'day': 1, 'time_of_day': 'morning'})
+
+    async def get_nodes(request):
+        await asyncio.sleep(delay)
+        return web.json_response({'success': True, 'nodes': []})
+
+    app = web.Application()
+    app.router.add_get('/time', get_time)
+    app.router.add_get('/nodes', get_nodes)
+    app.router.add_post('/{tail:.*}', slow_ok)
+
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(app, access_log=None)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', port, backlog=8192).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+
+# ==================== Scenarios ====================
+
+async def inbound_under_load(base, duration, outbound_clients, inbound_clients):
+    """Keep outbound calls in flight and measure inbound notification handling"""
+    inbound_latencies = []
+    outbound_done = 0
+    inbound_errors = 0
+    deadline = time.perf_counter() + duration
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30)) as session:
+
+        async def outbound_worker():
+            nonlocal outbound_done
+            while time.perf_counter() < deadline:
+                async with session.post(f"{base}/messages/send",
+                                        json={'target': 'all', 'content': 'bench', 'type': 'broadcast'}) as r:
+                    await r.read()
+                outbound_done += 1
+
+        async def inbound_worker():
+            nonlocal inbound_errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    async with session.post(f"{base}/messages",
+                                            json={'from': 'peer', 'type': 'private', 'content': 'ping'}) as r:
+                        await r.read()
+                        ok = r.status == 200
+                except aiohttp.ClientError:
+                    ok = False
+                if ok:
+                    inbound_latencies.append(time.perf_counter() - started)
+                else:
+                    inbound_errors += 1
+
+        await asyncio.gather(
+            *(outbound_worker() for _ in range(outbound_clients)),
+            *(inbound_worker() for _ in range(inbound_clients))
+        )
+
+    stats = summarize(inbound_latencies)
+    return {
+        'inbound_rps': len(inbound_latencies) / duration,
+        'inbound_p50_ms': stats['p50_ms'],
+        'inbound_p99_ms': stats['p99_ms'],
+        'inbound_errors': inbound_errors,
+        'outbound_done': outbound_done
+    }
+
+
+async def many_connections(base, connections):
+    """Open one connection per client and hit /health concurrently"""
+    latencies = []
+    failures = 0
+    start_gate = asyncio.Event()
+
+    async def client():
+        nonlocal failures
+        # A separate session per client forces a separate TCP connection
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+            await start_gate.wait()
+            started = time.perf_counter()
+            try:
+                async with session.get(f"{base}/health") as r:
+                    await r.read()
+                    if r.status != 200:
+                        failures += 1
+                        return
+                latencies.append(time.perf_counter() - started)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                failures += 1
+
+    tasks = [asyncio.ensure_future(client()) for _ in range(connections)]
+    await asyncio.sleep(0.2)
+    started = time.perf_counter()
+    start_gate.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    stats = summarize(latencies)
+    return {
+        'elapsed_s': elapsed,
+        'p99_ms': stats['p99_ms'],
+        'failures': failures
+    }
+
+
+# ==================== Driver ====================
+
+def run_node(script, upstream_port, args):
+    """Start one villager implementation, create a villager and run both scenarios"""
+    port = free_port()
+    proc = start_service(
+        script,
+        ['--port', port, '--id', 'bench', '--coordinator', f"127.0.0.1:{upstream_port}"],
+        env={'MERCHANT_HOST': '127.0.0.1', 'MERCHANT_PORT': str(upstream_port)}
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_http(f"{base}/health")
+        requests.post(f"{base}/villager", json={
+            'name': 'Bench', 'occupation': 'farmer', 'gender': 'female', 'personality': 'benchmark'
+        }, timeout=10)
+
+        load = asyncio.run(inbound_under_load(base, args.duration, args.outbound, args.inbound))
+        conns = asyncio.run(many_connections(base, args.connections))
+        return load, conns
+    finally:
+        stop_service(proc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flask vs asyncio villager node benchmark')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per load scenario')
+    parser.add_argument('--upstream-delay', type=float, default=0.2, help='stub coordinator/merchant latency (s)')
+    parser.add_argument('--outbound', type=int, default=50, help='clients keeping outbound calls in flight')
+    parser.add_argument('--inbound', type=int, default=20, help='clients posting inbound notifications')
+    parser.add_argument('--connections', type=int, default=2000, help='concurrent connections for the connection test')
+    args = parser.parse_args()
+
+    fd_limit = raise_fd_limit()
+    if fd_limit < args.connections * 2 + 100:
+        print(f"Warning: open file limit {fd_limit} may be too low for {args.connections} connections")
+
+    upstream_port = free_port()
+    start_stub_upstream(upstream_port, args.upstream_delay)
+
+    results = {}
+    for name, script in (('flask', 'architecture2_rest/villager.py'),
+                         ('asyncio', 'architecture2_rest/villager_async.py')):
+        print(f"Running {name} node...")
+        results[name] = run_node(script, upstream_port, args)
+
+    print_table(
+        f"Inbound /messages while {args.outbound} outbound calls ({args.upstream_delay * 1000:.0f} ms each) are in flight",
+        ['node', 'inbound req/s', 'p50 ms', 'p99 ms', 'errors', 'outbound done'],
+        [[name, r[0]['inbound_rps'], r[0]['inbound_p50_ms'], r[0]['inbound_p99_ms'],
+          r[0]['inbound_errors'], r[0]['outbound_done']] for name, r in results.items()]
+    )
+    print_table(
+        f"{args.connections} concurrent connections to /health",
+        ['node', 'elapsed s', 'p99 ms', 'failures'],
+        [[name, r[1]['elapsed_s'], r[1]['p99_ms'], r[1]['failures']] for name, r in results.items()]
+    )
+
+
+if __name__ == '__main__':
+    main()
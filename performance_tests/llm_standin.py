@@ -0,0 +1,145 @@
+"""
+Stand-in LLM server for benchmarks: the OpenAI chat completions API, offline
+
+POST /v1/chat/completions answers from an offline backend (the rule policy,
+which sees only the prompts here, or a recording made with
+`ai_villager_agent.py --record`) with a modelled generation latency: a delay
+before the first token, then one token (4 characters) at a time. With
+"stream": true the tokens are sent as server-sent events, like the real API,
+and generation stops when the client disconnects.
+
+To exercise streaming and hedging:
+- --trailing N: the model keeps going for N tokens after its ACTION line
+  (an invented OBSERVATION), as models often do
+- --slow-fraction / --slow-factor: that fraction of requests is that many
+  times slower (a latency tail)
+
+GET /stats reports requests, tokens sent and replies cut off by the client;
+POST /stats/reset clears them.
+
+Usage:
+    python performance_tests/llm_standin.py --port 8000 --trailing 60 --slow-fraction 0.05
+    python architecture2_rest/ai_villager_agent.py --port 5002 --react --backend http --llm-url http://localhost:8000/v1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.llm_backends import create_backend
+
+TRAILING_TEXT = ("\n\nOBSERVATION: The action was carried out and the villager's state changed accordingly. "
+                 "THOUGHT: Next I should look at my stamina, inventory and the time of day again before")
+
+
+class StandIn:
+    """Reply source and latency model of the stand-in server"""
+
+    def __init__(self, args):
+        self.backend = create_backend(args.backend, replay_path=args.replay)
+        self.first_token_ms = args.first_token_ms
+        self.token_ms = args.token_ms
+        self.trailing = args.trailing
+        self.slow_fraction = args.slow_fraction
+        self.slow_factor = args.slow_factor
+        self.random = random.Random(args.seed)
+        self.stats = {}
+        self.reset()
+
+    def reset(self):
+        self.stats = {'requests': 0, 'streamed': 0, 'tokens': 0, 'cut_off': 0, 'slow': 0}
+
+    def reply_tokens(self, body):
+        """(tokens of the reply, seconds per token scale) for a request body"""
+        messages = body.get('messages', [])
+        system_prompt = next((m['content'] for m in messages if m.get('role') == 'system'), '')
+        prompt = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+        reply = self.backend.complete(system_prompt, prompt, None, body.get('max_tokens', 800))
+        reply += TRAILING_TEXT[:self.trailing * 4]
+        tokens = [reply[i:i + 4] for i in range(0, len(reply), 4)][:body.get('max_tokens', 800)]
+
+        scale = 1.0
+        if self.random.random() < self.slow_fraction:
+            scale = self.slow_factor
+            self.stats['slow'] += 1
+        self.stats['requests'] += 1
+        return tokens, scale
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        tokens, scale = self.reply_tokens(body)
+        await asyncio.sleep(self.first_token_ms * scale / 1000)
+
+        if not body.get('stream'):
+            await asyncio.sleep(len(tokens) * self.token_ms * scale / 1000)
+            self.stats['tokens'] += len(tokens)
+            return web.json_response({
+                'object': 'chat.completion',
+                'model': body.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                             'finish_reason': 'stop'}]
+            })
+
+        self.stats['streamed'] += 1
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+        try:
+            for token in tokens:
+                await asyncio.sleep(self.token_ms * scale / 1000)
+                chunk = {'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': {'content': token}}]}
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.stats['tokens'] += 1
+            await response.write(b"data: [DONE]\n\n")
+        except (ConnectionResetError, asyncio.CancelledError):
+            # The client read what it needed (its ACTION line) or gave up
+            self.stats['cut_off'] += 1
+            raise
+        return response
+
+    async def get_stats(self, request):
+        return web.json_response(self.stats)
+
+    async def reset_stats(self, request):
+        self.reset()
+        return web.json_response({'success': True})
+
+    async def health(self, request):
+        return web.json_response({'status': 'ok'})
+
+
+def create_app(args):
+    standin = StandIn(args)
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', standin.chat_completions)
+    app.router.add_get('/stats', standin.get_stats)
+    app.router.add_post('/stats/reset', standin.reset_stats)
+    app.router.add_get('/health', standin.health)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in OpenAI-compatible LLM server (offline replies, modelled latency)')
+    parser.add_argument('--port', type=int, default=8000, help='listen port')
+    parser.add_argument('--backend', choices=('rule', 'replay'), default='rule', help='reply source')
+    parser.add_argument('--replay', type=str, help='recording for --backend replay')
+    parser.add_argument('--first-token-ms', type=float, default=300.0, help='delay before the first token')
+    parser.add_argument('--token-ms', type=float, default=15.0, help='time per output token')
+    parser.add_argument('--trailing', type=int, default=0, help='tokens generated after the ACTION line')
+    parser.add_argument('--slow-fraction', type=float, default=0.0, help='fraction of requests that are slow')
+    parser.add_argument('--slow-factor', type=float, default=5.0, help='how many times slower they are')
+    parser.add_argument('--seed', type=int, default=7, help='seed for picking slow requests')
+    args = parser.parse_args()
+
+    print(f"[LLM stand-in] Listening on {args.port}: {args.backend} replies, first token {args.first_token_ms:.0f} ms, "
+          f"{args.token_ms:.0f} ms/token, {args.trailing} trailing tokens, {args.slow_fraction:.0%} slow x{args.slow_factor:g}")
+    web.run_app(create_app(args), port=args.port, access_log=None, print=None)
+
+
+if __name__ == '__main__':
+    main()